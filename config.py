@@ -13,10 +13,22 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Set up logging
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()  # Level of every module without its own level
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')  # Per-module levels, e.g. "services.api_service=DEBUG,handlers=WARNING"
+LOG_PAYLOAD_MAX = int(os.environ.get('LOG_PAYLOAD_MAX', '500'))  # Characters of a logged API payload before truncating it
+LOG_DEBUG_SAMPLE_RATE = int(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1'))  # Keep 1 of every N repetitions of each debug message
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # "text" or "json" (one JSON object per line)
+LOG_QUEUE_ENABLED = os.environ.get('LOG_QUEUE_ENABLED', 'true').lower() == 'true'  # Write logs from a background thread
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))  # Records buffered before new ones are dropped
+
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+    level=LOG_LEVEL
 )
+for _entry in LOG_LEVELS.split(','):
+    _module, _, _level = _entry.partition('=')
+    if _module.strip() and _level.strip():
+        logging.getLogger(_module.strip()).setLevel(_level.strip().upper())
 logger = logging.getLogger(__name__)
 
 # Check if we're running inside Docker or on Render 
@@ -35,6 +47,90 @@ else:
 API_BASE_URL = os.environ.get('API_BASE_URL_RENDER', 'http://localhost:8000')
 logger.info(f"Using API base URL: {API_BASE_URL}")
 
+# /metrics endpoint of the health check server; disabled unless a token is set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Sent as "Authorization: Bearer <token>"
+
+# HTTP connection pool used to reach the backend API
+API_TIMEOUT = float(os.environ.get('API_TIMEOUT', '15'))  # Seconds per request
+API_POOL_MAX_CONNECTIONS = int(os.environ.get('API_POOL_MAX_CONNECTIONS', '20'))  # Total open connections
+API_POOL_MAX_KEEPALIVE = int(os.environ.get('API_POOL_MAX_KEEPALIVE', '10'))  # Idle connections kept alive
+API_POOL_KEEPALIVE_EXPIRY = float(os.environ.get('API_POOL_KEEPALIVE_EXPIRY', '30'))  # Seconds an idle connection is kept
+API_POOL_MAX_PER_HOST = int(os.environ.get('API_POOL_MAX_PER_HOST', '10'))  # Concurrent requests per host
+
+# Circuit breaker and adaptive timeouts for the backend API
+API_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('API_BREAKER_FAILURE_THRESHOLD', '5'))  # Consecutive failures that open a circuit
+API_BREAKER_RESET_TIMEOUT = float(os.environ.get('API_BREAKER_RESET_TIMEOUT', '30'))  # Seconds before a half-open probe
+API_TIMEOUT_MIN = float(os.environ.get('API_TIMEOUT_MIN', '3'))  # Lower bound of the adaptive timeout
+API_TIMEOUT_P99_FACTOR = float(os.environ.get('API_TIMEOUT_P99_FACTOR', '3'))  # Adaptive timeout = p99 latency * factor
+API_LATENCY_WINDOW = int(os.environ.get('API_LATENCY_WINDOW', '200'))  # Latency samples kept per endpoint group
+
+# Background retries of writes that failed because the API was unreachable
+API_WRITE_RETRY_ATTEMPTS = int(os.environ.get('API_WRITE_RETRY_ATTEMPTS', '5'))  # 0 disables retries
+API_WRITE_RETRY_BASE_DELAY = float(os.environ.get('API_WRITE_RETRY_BASE_DELAY', '2'))  # First backoff ceiling in seconds
+API_WRITE_RETRY_MAX_DELAY = float(os.environ.get('API_WRITE_RETRY_MAX_DELAY', '60'))  # Maximum backoff ceiling in seconds
+
+# Read-through cache for GET responses from the backend API
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', 'true').lower() == 'true'
+API_CACHE_MAX_ENTRIES = int(os.environ.get('API_CACHE_MAX_ENTRIES', '500'))  # LRU entry cap
+API_CACHE_MAX_BYTES = int(os.environ.get('API_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))  # Approximate LRU memory cap
+API_CACHE_TTL_MEMBER = float(os.environ.get('API_CACHE_TTL_MEMBER', '120'))  # /members/...
+API_CACHE_TTL_FAMILY = float(os.environ.get('API_CACHE_TTL_FAMILY', '60'))  # /families/{id} and /families/{id}/members
+API_CACHE_TTL_BALANCES = float(os.environ.get('API_CACHE_TTL_BALANCES', '15'))  # /families/{id}/balances
+
+# Shared directory of family members (one record per family for all its users)
+FAMILY_DIRECTORY_TTL = float(os.environ.get('FAMILY_DIRECTORY_TTL', '600'))  # Seconds before a family is fetched again
+
+# Telegram ID -> member index used to resolve the user of each conversation
+MEMBER_INDEX_TTL = float(os.environ.get('MEMBER_INDEX_TTL', '300'))  # Seconds a member lookup is reused (0 disables)
+MEMBER_INDEX_NEGATIVE_TTL = float(os.environ.get('MEMBER_INDEX_NEGATIVE_TTL', '30'))  # Seconds a "not a member" answer is reused
+MEMBER_INDEX_MAX_ENTRIES = int(os.environ.get('MEMBER_INDEX_MAX_ENTRIES', '10000'))  # LRU entry cap
+
+# Local balances updated with the deltas of each write
+BALANCE_CACHE_ENABLED = os.environ.get('BALANCE_CACHE_ENABLED', 'true').lower() == 'true'
+BALANCE_RECONCILE_INTERVAL = float(os.environ.get('BALANCE_RECONCILE_INTERVAL', '120'))  # Seconds before balances are checked against the server
+
+# Local settlement engine used when the balances route is unavailable
+SETTLEMENT_FALLBACK_ENABLED = os.environ.get('SETTLEMENT_FALLBACK_ENABLED', 'true').lower() == 'true'
+
+# Debt simplification in "Ajustar Deudas"
+DEBT_SIMPLIFIER_EXACT_MAX = int(os.environ.get('DEBT_SIMPLIFIER_EXACT_MAX', '12'))  # Largest group solved exactly (2^n subsets)
+
+# Conditional GET (ETag / Last-Modified) revalidation of large responses
+API_REVALIDATE_ENABLED = os.environ.get('API_REVALIDATE_ENABLED', 'true').lower() == 'true'
+API_REVALIDATE_MAX_ENTRIES = int(os.environ.get('API_REVALIDATE_MAX_ENTRIES', '200'))  # Stored bodies
+API_REVALIDATE_MAX_BYTES = int(os.environ.get('API_REVALIDATE_MAX_BYTES', str(16 * 1024 * 1024)))  # Approximate memory cap
+
+# Durable user_data, chat_data and conversation states (SQLite, write-behind)
+PERSISTENCE_ENABLED = os.environ.get('PERSISTENCE_ENABLED', 'true').lower() == 'true'
+PERSISTENCE_PATH = os.environ.get('PERSISTENCE_PATH', 'bot_persistence.sqlite3')
+PERSISTENCE_UPDATE_INTERVAL = float(os.environ.get('PERSISTENCE_UPDATE_INTERVAL', '30'))  # Seconds between batched writes
+
+# Bounded memory of context.user_data
+MEMORY_IDLE_TTL = float(os.environ.get('MEMORY_IDLE_TTL', '3600'))  # Seconds of inactivity before heavy keys are evicted
+MEMORY_USER_DATA_MAX_BYTES = int(os.environ.get('MEMORY_USER_DATA_MAX_BYTES', str(256 * 1024)))  # Approximate per-user cap
+MEMORY_SWEEP_INTERVAL = float(os.environ.get('MEMORY_SWEEP_INTERVAL', '300'))  # Seconds between sweeps (0 disables)
+
+# Background cache warm-up of recently active families after a restart
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_MAX_FAMILIES = int(os.environ.get('WARMUP_MAX_FAMILIES', '50'))  # Most recently active families to preload
+WARMUP_CONCURRENCY = int(os.environ.get('WARMUP_CONCURRENCY', '4'))  # Concurrent API requests during warm-up
+
+# Append-only local ledger of the writes of each family
+LEDGER_ENABLED = os.environ.get('LEDGER_ENABLED', 'true').lower() == 'true'
+LEDGER_PATH = os.environ.get('LEDGER_PATH', 'bot_ledger.sqlite3')  # SQLite file holding the events and snapshots
+LEDGER_SNAPSHOT_EVERY = int(os.environ.get('LEDGER_SNAPSHOT_EVERY', '200'))  # Events of a family between snapshots
+LEDGER_RESYNC_INTERVAL = int(os.environ.get('LEDGER_RESYNC_INTERVAL', '300'))  # Seconds before the lists are fetched from the API again
+LEDGER_MAX_FAMILIES = int(os.environ.get('LEDGER_MAX_FAMILIES', '200'))  # Families whose rebuilt state is kept in memory
+LEDGER_MAX_PENDING = int(os.environ.get('LEDGER_MAX_PENDING', '10000'))  # Buffered writes kept while SQLite fails; the oldest are dropped
+LEDGER_RETRY_BASE_DELAY = float(os.environ.get('LEDGER_RETRY_BASE_DELAY', '1'))  # First wait in seconds after a failed write
+LEDGER_RETRY_MAX_DELAY = float(os.environ.get('LEDGER_RETRY_MAX_DELAY', '60'))  # Maximum wait in seconds between write attempts
+
+# Cursor pagination of the expense and payment listings
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', '10'))  # Records per page
+PAGINATION_INDEX_TTL = int(os.environ.get('PAGINATION_INDEX_TTL', '60'))  # Seconds a sorted list is reused between pages (ledger disabled)
+PAGINATION_MAX_INDEXES = int(os.environ.get('PAGINATION_MAX_INDEXES', '500'))  # Sorted lists kept in memory (ledger disabled)
+API_DATE_FILTER_ENABLED = os.environ.get('API_DATE_FILTER_ENABLED', 'false').lower() == 'true'  # The list endpoints accept since/until
+
 # Conversation states
 # For family creation/joining
 ASK_FAMILY_CODE = 1
@@ -65,7 +161,6 @@ LIST_OPTION = 40
 
 # For debt adjustment
 SELECT_CREDIT = 50
-ADJUSTMENT_AMOUNT = 51
 ADJUSTMENT_CONFIRM = 52
 
 # Other configuration
@@ -3,6 +3,8 @@ Adjustment Handler Module
 
 Este módulo maneja el flujo de ajuste de deudas en el bot, permitiendo
 a los usuarios reducir manualmente las deudas que otros miembros tienen con ellos.
+Las deudas se muestran como el plan mínimo de transferencias que liquida a toda
+la familia, y cada transferencia hacia el usuario se registra con un toque.
 """
 
 from telegram import Update, ReplyKeyboardMarkup
@@ -13,10 +15,15 @@ from ui.formatters import Formatters
 from services.payment_service import PaymentService
 from services.family_service import FamilyService
 from services.member_service import MemberService
+from services.debt_simplifier import DebtSimplifier
+from services.models import is_record
+from services.write_retry import WriteRetry
 from utils.context_manager import ContextManager
-from utils.helpers import send_error, notify_unknown_username
-from config import SELECT_CREDIT, ADJUSTMENT_AMOUNT, ADJUSTMENT_CONFIRM
-import traceback
+from utils.helpers import send_error, notify_unknown_username, make_retry_notifier
+from config import SELECT_CREDIT, ADJUSTMENT_CONFIRM
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -35,7 +42,7 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
     try:
         # Obtener el ID de Telegram del usuario
         telegram_id = str(update.effective_user.id)
-        print(f"[AJUSTE_DEUDAS] ID de Telegram del usuario: {telegram_id}")
+        logger.debug("[AJUSTE_DEUDAS] ID de Telegram del usuario: %s", telegram_id)
         
         # Enviar mensaje de carga
         message = await update.message.reply_text(
@@ -54,7 +61,7 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
                         reply_markup=Keyboards.get_main_menu_keyboard()
                     )
                 except Exception as edit_error:
-                    print(f"Error al editar mensaje: {str(edit_error)}")
+                    logger.error("Error al editar mensaje: %s", edit_error)
                     await update.message.reply_text(
                         Messages.ERROR_NOT_IN_FAMILY,
                         reply_markup=Keyboards.get_main_menu_keyboard()
@@ -63,11 +70,11 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
             
             family_id = context.user_data.get("family_id")
         
-        print(f"[AJUSTE_DEUDAS] ID de familia: {family_id}")
+        logger.debug("[AJUSTE_DEUDAS] ID de familia: %s", family_id)
         
         # Obtener información del miembro actual
-        status_code, member = MemberService.get_member(telegram_id)
-        print(f"[AJUSTE_DEUDAS] Respuesta get_member: status={status_code}, member={member}")
+        status_code, member = await MemberService.get_member(telegram_id)
+        logger.debug("[AJUSTE_DEUDAS] Respuesta get_member: status=%s, member=%s", status_code, Payload(member))
         
         if status_code != 200 or not member:
             try:
@@ -76,7 +83,7 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
                     reply_markup=Keyboards.get_main_menu_keyboard()
                 )
             except Exception as edit_error:
-                print(f"Error al editar mensaje: {str(edit_error)}")
+                logger.error("Error al editar mensaje: %s", edit_error)
                 await update.message.reply_text(
                     Messages.ERROR_MEMBER_NOT_FOUND,
                     reply_markup=Keyboards.get_main_menu_keyboard()
@@ -85,17 +92,18 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
         
         member_id = member.get("id")
         member_name = member.get("name")
-        print(f"[AJUSTE_DEUDAS] ID de miembro: {member_id}, Nombre: {member_name}")
+        logger.debug("[AJUSTE_DEUDAS] ID de miembro: %s, Nombre: %s", member_id, member_name)
         
         # Inicializar datos de ajuste en el contexto
         context.user_data["adjustment_data"] = {
             "member_id": member_id,
-            "member_name": member_name
+            "member_name": member_name,
+            "submission_id": WriteRetry.new_submission_id()  # Clave de idempotencia de este ajuste
         }
         
         # Obtener los balances de la familia
-        status_code, balances = FamilyService.get_family_balances(family_id, telegram_id)
-        print(f"[AJUSTE_DEUDAS] Respuesta get_family_balances: status={status_code}, balances={balances}")
+        status_code, balances = await FamilyService.get_family_balances(family_id, telegram_id)
+        logger.debug("[AJUSTE_DEUDAS] Respuesta get_family_balances: status=%s, balances=%s", status_code, Payload(balances))
         
         if status_code != 200 or not balances:
             try:
@@ -104,65 +112,68 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
                     reply_markup=Keyboards.get_main_menu_keyboard()
                 )
             except Exception as edit_error:
-                print(f"Error al editar mensaje: {str(edit_error)}")
+                logger.error("Error al editar mensaje: %s", edit_error)
                 await update.message.reply_text(
                     "No se pudieron obtener los balances de la familia.",
                     reply_markup=Keyboards.get_main_menu_keyboard()
                 )
             return ConversationHandler.END
         
-        # Filtrar los créditos (balances donde otros miembros deben al usuario actual)
-        credits = []
+        # Simplificar las deudas a partir de los saldos netos: el plan mínimo de
+        # transferencias sustituye a la lista de deudas entre pares
+        transfers = DebtSimplifier.simplify(DebtSimplifier.net_balances(balances))
+        pairwise_count = sum(
+            len(balance.get("debts", []) or []) if "member_id" in balance else int(balance.get("amount", 0) > 0)
+            for balance in balances
+            if is_record(balance)
+        )
+        logger.debug("[AJUSTE_DEUDAS] Plan simplificado: %s transferencias en lugar de %s", len(transfers), pairwise_count)
         
-        print(f"[AJUSTE_DEUDAS] Buscando créditos para el miembro con ID: {member_id}")
-        for balance in balances:
-            from_member = balance.get("from_member", {})
-            to_member = balance.get("to_member", {})
-            amount = balance.get("amount", 0)
-            
-            print(f"[AJUSTE_DEUDAS] Verificando balance: from={from_member.get('id')}, to={to_member.get('id')}, amount={amount}")
-            
-            # Si el usuario actual es el acreedor (to_member) y el monto es positivo
-            if to_member.get("id") == member_id and amount > 0:
-                from_member_id = from_member.get("id")
-                from_member_name = from_member.get("name", f"Usuario {from_member_id}")
-                
-                print(f"[AJUSTE_DEUDAS] Crédito encontrado: {from_member_name} debe {amount} a {member_name}")
-                credits.append((from_member_name, from_member_id, amount))
+        # Los créditos que puede ajustar el usuario son las transferencias hacia él
+        credits = [
+            (transfer.from_name, transfer.from_id, transfer.amount)
+            for transfer in transfers
+            if str(transfer.to_id) == str(member_id)
+        ]
         
         # Guardar los créditos en el contexto
         context.user_data["adjustment_data"]["credits"] = credits
-        print(f"[AJUSTE_DEUDAS] Total de créditos encontrados: {len(credits)}")
+        logger.debug("[AJUSTE_DEUDAS] Total de créditos encontrados: %s", len(credits))
         
         # Si no hay créditos, mostrar mensaje y terminar
         if not credits:
-            print(f"[AJUSTE_DEUDAS] No se encontraron créditos para el usuario")
+            logger.debug("[AJUSTE_DEUDAS] No se encontraron créditos para el usuario")
             try:
                 await message.edit_text(
                     Messages.NO_CREDITS,
                     reply_markup=Keyboards.get_main_menu_keyboard()
                 )
             except Exception as edit_error:
-                print(f"Error al editar mensaje: {str(edit_error)}")
+                logger.error("Error al editar mensaje: %s", edit_error)
                 await update.message.reply_text(
                     Messages.NO_CREDITS,
                     reply_markup=Keyboards.get_main_menu_keyboard()
                 )
             return ConversationHandler.END
         
-        # Mostrar los créditos para seleccionar
-        print(f"[AJUSTE_DEUDAS] Mostrando {len(credits)} créditos al usuario")
+        # Mostrar el plan y las transferencias que el usuario puede registrar
+        logger.debug("[AJUSTE_DEUDAS] Mostrando %s créditos al usuario", len(credits))
+        text = (
+            Messages.DEBT_ADJUSTMENT_INTRO + "\n\n"
+            + Formatters.format_settlement_plan(transfers, pairwise_count, member_id) + "\n\n"
+            + Messages.SELECT_SETTLEMENT
+        )
         try:
             await message.edit_text(
-                Messages.DEBT_ADJUSTMENT_INTRO + "\n\n" + Messages.SELECT_CREDIT,
+                text,
                 parse_mode="Markdown",
                 reply_markup=Keyboards.get_credits_keyboard(credits)
             )
         except Exception as edit_error:
-            print(f"Error al editar mensaje para mostrar créditos: {str(edit_error)}")
+            logger.error("Error al editar mensaje para mostrar créditos: %s", edit_error)
             # Si no se puede editar, enviar un nuevo mensaje
             await update.message.reply_text(
-                Messages.DEBT_ADJUSTMENT_INTRO + "\n\n" + Messages.SELECT_CREDIT,
+                text,
                 parse_mode="Markdown",
                 reply_markup=Keyboards.get_credits_keyboard(credits)
             )
@@ -179,8 +190,7 @@ async def start_debt_adjustment(update: Update, context: ContextTypes.DEFAULT_TY
         return SELECT_CREDIT
         
     except Exception as e:
-        print(f"Error en start_debt_adjustment: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en start_debt_adjustment: %s", e)
         await send_error(update, context, f"Error al iniciar el ajuste de deudas: {str(e)}")
         return ConversationHandler.END
 
@@ -226,95 +236,15 @@ async def handle_credit_selection(update: Update, context: ContextTypes.DEFAULT_
             "total_amount": total_amount
         }
         
-        # Pedir el monto del ajuste
-        await update.message.reply_text(
-            Messages.ADJUSTMENT_AMOUNT_PROMPT.format(
-                debtor_name=debtor_name,
-                total_amount=total_amount
-            ),
-            parse_mode="Markdown",
-            reply_markup=Keyboards.get_cancel_keyboard()
-        )
-        
-        return ADJUSTMENT_AMOUNT
-        
-    except Exception as e:
-        print(f"Error en handle_credit_selection: {str(e)}")
-        traceback.print_exc()
-        await send_error(update, context, f"Error al seleccionar el crédito: {str(e)}")
-        return ConversationHandler.END
-
-async def handle_adjustment_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Maneja el ingreso del monto de ajuste.
-
-    Args:
-        update (Update): Objeto Update de Telegram
-        context (ContextTypes.DEFAULT_TYPE): Contexto de Telegram
-        
-    Returns:
-        int: El siguiente estado de la conversación
-    """
-    try:
-        # Obtener el texto ingresado
-        amount_text = update.message.text
-        
-        # Verificar si el usuario canceló
-        if amount_text == "❌ Cancelar":
-            await update.message.reply_text(
-                Messages.CANCEL_OPERATION,
-                reply_markup=Keyboards.get_main_menu_keyboard()
-            )
-            return ConversationHandler.END
-        
-        # Intentar convertir el monto a número
-        try:
-            # Reemplazar comas por puntos para manejar diferentes formatos numéricos
-            amount_text = amount_text.replace(',', '.').strip()
-            amount = float(amount_text)
-            
-            # Verificar que el monto sea positivo
-            if amount <= 0:
-                await update.message.reply_text(
-                    Messages.INVALID_ADJUSTMENT_AMOUNT,
-                    reply_markup=Keyboards.get_cancel_keyboard()
-                )
-                return ADJUSTMENT_AMOUNT
-                
-        except ValueError:
-            await update.message.reply_text(
-                Messages.INVALID_ADJUSTMENT_AMOUNT,
-                reply_markup=Keyboards.get_cancel_keyboard()
-            )
-            return ADJUSTMENT_AMOUNT
-        
-        # Obtener el crédito seleccionado del contexto
-        selected_credit = context.user_data["adjustment_data"].get("selected_credit", {})
-        total_amount = selected_credit.get("total_amount", 0)
-        
-        # Verificar que el monto no exceda la deuda total
-        if amount > total_amount:
-            await update.message.reply_text(
-                Messages.ADJUSTMENT_AMOUNT_TOO_HIGH.format(
-                    amount=amount,
-                    total=total_amount
-                ),
-                reply_markup=Keyboards.get_cancel_keyboard()
-            )
-            return ADJUSTMENT_AMOUNT
-        
-        # Guardar el monto en el contexto
-        context.user_data["adjustment_data"]["amount"] = amount
-        
-        # Pedir confirmación del ajuste
-        debtor_name = selected_credit.get("debtor_name", "")
+        # Las transferencias del plan se registran completas: pasar directamente
+        # a la confirmación con el monto de la transferencia
+        context.user_data["adjustment_data"]["amount"] = total_amount
         creditor_name = context.user_data["adjustment_data"].get("member_name", "")
-        
         await update.message.reply_text(
             Messages.ADJUSTMENT_CONFIRM.format(
                 debtor_name=debtor_name,
                 creditor_name=creditor_name,
-                amount=amount
+                amount=total_amount
             ),
             parse_mode="Markdown",
             reply_markup=Keyboards.get_confirmation_keyboard()
@@ -323,9 +253,8 @@ async def handle_adjustment_amount(update: Update, context: ContextTypes.DEFAULT
         return ADJUSTMENT_CONFIRM
         
     except Exception as e:
-        print(f"Error en handle_adjustment_amount: {str(e)}")
-        traceback.print_exc()
-        await send_error(update, context, f"Error al procesar el monto de ajuste: {str(e)}")
+        logger.exception("Error en handle_credit_selection: %s", e)
+        await send_error(update, context, f"Error al seleccionar el crédito: {str(e)}")
         return ConversationHandler.END
 
 async def handle_adjustment_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -362,15 +291,29 @@ async def handle_adjustment_confirmation(update: Update, context: ContextTypes.D
         telegram_id = str(update.effective_user.id)
         
         # Realizar el ajuste de deuda a través del servicio
-        status_code, response = PaymentService.create_debt_adjustment(
+        status_code, response = await PaymentService.create_debt_adjustment(
             from_member=debtor_id,
             to_member=creditor_id,
             amount=amount,
-            telegram_id=telegram_id
+            telegram_id=telegram_id,
+            family_id=context.user_data.get("family_id"),
+            submission_id=adjustment_data.get("submission_id"),
+            on_retry_result=make_retry_notifier(
+                context,
+                update.effective_chat.id,
+                Messages.ADJUSTMENT_SUCCESS,
+                Messages.ERROR_CREATING_ADJUSTMENT
+            )
         )
         
         # Manejar la respuesta
-        if status_code in [200, 201]:
+        if WriteRetry.is_queued(status_code, response):
+            # Si la API no responde, el ajuste se reintenta en segundo plano
+            await update.message.reply_text(
+                Messages.WRITE_QUEUED,
+                reply_markup=Keyboards.get_main_menu_keyboard()
+            )
+        elif status_code in [200, 201]:
             await update.message.reply_text(
                 Messages.ADJUSTMENT_SUCCESS,
                 reply_markup=Keyboards.get_main_menu_keyboard()
@@ -385,8 +328,7 @@ async def handle_adjustment_confirmation(update: Update, context: ContextTypes.D
         return ConversationHandler.END
         
     except Exception as e:
-        print(f"Error en handle_adjustment_confirmation: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_adjustment_confirmation: %s", e)
         await send_error(update, context, f"Error al confirmar el ajuste: {str(e)}")
         return ConversationHandler.END
 
@@ -0,0 +1,49 @@
+"""
+Admin Handler Module
+
+This module contains handlers for commands reserved to the bot administrator,
+such as inspecting the metrics of the requests made to the backend API.
+"""
+
+import os
+from telegram import Update
+from telegram.ext import ContextTypes
+from services.metrics import ApiMetrics
+from utils.memory_manager import MemoryManager
+from services.log import get_logger, LogPipeline
+
+logger = get_logger(__name__)
+
+def _is_admin(update: Update):
+    """
+    Checks whether the update comes from the administrator chat.
+    
+    Args:
+        update (Update): Telegram Update object
+        
+    Returns:
+        bool: True if ADMIN_CHAT_ID is configured and matches the current chat
+    """
+    admin_chat_id = os.getenv('ADMIN_CHAT_ID')
+    return bool(admin_chat_id) and update.effective_chat is not None and str(update.effective_chat.id) == admin_chat_id
+
+async def show_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Shows the backend API metrics to the administrator.
+    
+    Lists the endpoints with the most accumulated latency, with their request
+    count, average and p95 latency, response size, status codes and errors,
+    followed by the memory used by the user contexts and the state of the log
+    queue.
+    
+    Args:
+        update (Update): Telegram Update object
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+    """
+    if not _is_admin(update):
+        logger.warning("Unauthorized /metrics request from chat %s", update.effective_chat.id if update.effective_chat else None)
+        return
+    
+    await update.message.reply_text(
+        f"{ApiMetrics.format_report()}\n\n{MemoryManager.format_report()}\n\n{LogPipeline.format_report()}"
+    )
@@ -6,19 +6,16 @@ interactúa con botones inline en mensajes, como confirmaciones de pagos.
 """
 
 import json
-import logging
 from telegram import Update
 from telegram.ext import CallbackContext, CallbackQueryHandler
 from services.payment_service import PaymentService
 from services.member_service import MemberService
+from ui.formatters import Formatters
 from datetime import datetime
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
-# Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
 
 async def handle_payment_callback(update: Update, context: CallbackContext):
     """
@@ -63,17 +60,23 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
         telegram_id = update.effective_user.id
         
         # Verificar que el usuario que confirma no sea el mismo que creó el pago
-        status_code, payment_data = PaymentService.get_payment(payment_id)
+        status_code, payment_data = await PaymentService.get_payment(payment_id)
         
         if status_code != 200 or not payment_data:
             await query.answer("No se pudo obtener información del pago")
             return
         
-        # Extraer información relevante del pago
-        from_member_id = payment_data.get("from_member")
-        to_member_id = payment_data.get("to_member")
-        amount = payment_data.get("amount", 0)
-        current_status = payment_data.get("status", "PENDING")
+        # Extraer información relevante del pago (registro Payment con los IDs normalizados)
+        from_member_id = payment_data.from_member.id
+        to_member_id = payment_data.to_member.id
+        amount = payment_data.amount
+        current_status = payment_data.status
+        
+        # Fecha del pago, ya interpretada al obtenerlo
+        if payment_data.created_ts is not None:
+            payment_date = Formatters.format_timestamp(payment_data.created_ts)
+        else:
+            payment_date = datetime.now().strftime("%d/%m/%Y")
         
         # Verificar si el pago ya fue procesado
         if current_status != "PENDING":
@@ -86,7 +89,7 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
             return
         
         # Verificar que quien confirma es el destinatario del pago
-        status_code, to_member_data = MemberService.get_member_by_id(to_member_id)
+        status_code, to_member_data = await MemberService.get_member_by_id(to_member_id)
         
         if status_code != 200 or not to_member_data:
             await query.answer("No se pudo verificar el destinatario del pago")
@@ -102,20 +105,13 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
         # Procesar la acción (confirmar o rechazar)
         if action == "confirm":
             # Confirmar el pago
-            status_code, result = PaymentService.confirm_payment(payment_id, telegram_id)
+            status_code, result = await PaymentService.confirm_payment(payment_id, telegram_id, family_id=to_member_data.get("family_id"))
             
             if status_code == 200:
                 # Obtener datos del pagador para mostrar en la confirmación
-                status_code, from_member_data = MemberService.get_member_by_id(from_member_id)
+                status_code, from_member_data = await MemberService.get_member_by_id(from_member_id)
                 from_member_name = from_member_data.get("name", "Usuario") if status_code == 200 else "Usuario"
                 
-                # Formatear la fecha actual
-                payment_date = payment_data.get("created_at")
-                if isinstance(payment_date, str) and "T" in payment_date:
-                    payment_date = payment_date.split("T")[0].replace("-", "/")
-                else:
-                    payment_date = datetime.now().strftime("%d/%m/%Y")
-                
                 # Actualizar el mensaje con la confirmación
                 await query.edit_message_text(
                     text=(
@@ -132,7 +128,7 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
                 
                 # Intentar notificar al pagador que su pago fue confirmado
                 try:
-                    if from_member_data and "telegram_id" in from_member_data:
+                    if status_code == 200 and from_member_data.get("telegram_id"):
                         from_telegram_id = from_member_data.get("telegram_id")
                         
                         # Obtener nombre del destinatario
@@ -173,20 +169,13 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
                 
         elif action == "reject":
             # Rechazar el pago
-            status_code, result = PaymentService.update_payment_status(payment_id, "REJECT", telegram_id)
+            status_code, result = await PaymentService.update_payment_status(payment_id, "REJECT", telegram_id, family_id=to_member_data.get("family_id"))
             
             if status_code == 200:
                 # Obtener datos del pagador para mostrar en la confirmación
-                status_code, from_member_data = MemberService.get_member_by_id(from_member_id)
+                status_code, from_member_data = await MemberService.get_member_by_id(from_member_id)
                 from_member_name = from_member_data.get("name", "Usuario") if status_code == 200 else "Usuario"
                 
-                # Formatear la fecha actual
-                payment_date = payment_data.get("created_at")
-                if isinstance(payment_date, str) and "T" in payment_date:
-                    payment_date = payment_date.split("T")[0].replace("-", "/")
-                else:
-                    payment_date = datetime.now().strftime("%d/%m/%Y")
-                
                 # Actualizar el mensaje con el rechazo
                 await query.edit_message_text(
                     text=(
@@ -203,7 +192,7 @@ async def handle_payment_callback(update: Update, context: CallbackContext):
                 
                 # Intentar notificar al pagador que su pago fue rechazado
                 try:
-                    if from_member_data and "telegram_id" in from_member_data:
+                    if status_code == 200 and from_member_data.get("telegram_id"):
                         from_telegram_id = from_member_data.get("telegram_id")
                         
                         # Obtener nombre del destinatario
@@ -15,10 +15,13 @@ from services.expense_service import ExpenseService
 from services.payment_service import PaymentService
 from services.member_service import MemberService
 from services.family_service import FamilyService
+from services.pagination import PageIndex, EXPENSES, PAYMENTS, OLDER, NEWER
 from utils.context_manager import ContextManager
 from utils.helpers import send_error, notify_unknown_username
 from config import EDIT_OPTION, SELECT_EXPENSE, SELECT_PAYMENT, CONFIRM_DELETE, EDIT_EXPENSE_AMOUNT
-import traceback
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
 # Conversation states are now imported from config.py
 
@@ -43,7 +46,7 @@ async def show_edit_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # If there's no family_id in the context, try to get it
         if not family_id:
-            print(f"No hay family_id en el contexto, intentando obtenerlo para el usuario {telegram_id}")
+            logger.debug("No hay family_id en el contexto, intentando obtenerlo para el usuario %s", telegram_id)
             is_in_family = await ContextManager.check_user_in_family(context, telegram_id)
             
             if not is_in_family:
@@ -55,7 +58,7 @@ async def show_edit_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return ConversationHandler.END
             
             family_id = context.user_data.get("family_id")
-            print(f"Family ID obtenido y guardado en el contexto: {family_id}")
+            logger.debug("Family ID obtenido y guardado en el contexto: %s", family_id)
         
         # Clear previous edit data
         if "edit_data" in context.user_data:
@@ -75,8 +78,7 @@ async def show_edit_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en show_edit_options: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en show_edit_options: %s", e)
         await send_error(update, context, f"Error al mostrar opciones de edición: {str(e)}")
         return ConversationHandler.END
 
@@ -101,181 +103,14 @@ async def handle_edit_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Save the option in the context
         context.user_data["edit_data"]["option"] = option
         
-        # Get the family ID and Telegram ID
-        family_id = context.user_data.get("family_id")
-        telegram_id = str(update.effective_user.id)
-        
         # Handle different edit options
-        if option == "📝 Editar Gastos":
-            # Get all expenses for the family
-            status_code, expenses = ExpenseService.get_family_expenses(family_id, telegram_id)
-            
-            if status_code != 200 or not expenses:
-                # If there are no expenses or there was an error, show message
-                await update.message.reply_text(
-                    Messages.NO_EXPENSES_TO_EDIT,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
-                return ConversationHandler.END
-            
-            # Sort expenses by date (most recent first)
-            expenses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            
-            # Save expenses in the context
-            context.user_data["edit_data"]["expenses"] = expenses
-            
-            # Create keyboard with expense options
-            expense_buttons = []
-            for expense in expenses[:10]:  # Limit to 10 most recent expenses
-                description = expense.get("description", "Sin descripción")
-                amount = expense.get("amount", 0)
-                expense_id = expense.get("id")
-                
-                # Format the button text
-                button_text = f"{description} - ${amount:.2f}"
-                expense_buttons.append([button_text])
-                
-                # Save the mapping of button text to expense ID
-                if "expense_buttons" not in context.user_data["edit_data"]:
-                    context.user_data["edit_data"]["expense_buttons"] = {}
-                context.user_data["edit_data"]["expense_buttons"][button_text] = expense_id
-            
-            # Add cancel button
-            expense_buttons.append(["❌ Cancelar"])
-            
-            # Show expense selection message
-            await update.message.reply_text(
-                Messages.SELECT_EXPENSE_TO_EDIT,
-                reply_markup=ReplyKeyboardMarkup(
-                    expense_buttons,
-                    one_time_keyboard=True,
-                    resize_keyboard=True
-                )
-            )
-            
-            # Move to the next state: select expense
-            return SELECT_EXPENSE
-            
-        elif option == "🗑️ Eliminar Gastos":
-            # Get all expenses for the family
-            status_code, expenses = ExpenseService.get_family_expenses(family_id, telegram_id)
-            
-            if status_code != 200 or not expenses:
-                # If there are no expenses or there was an error, show message
-                await update.message.reply_text(
-                    Messages.NO_EXPENSES_TO_DELETE,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
-                return ConversationHandler.END
-            
-            # Sort expenses by date (most recent first)
-            expenses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            
-            # Save expenses in the context
-            context.user_data["edit_data"]["expenses"] = expenses
-            
-            # Create keyboard with expense options
-            expense_buttons = []
-            for expense in expenses[:10]:  # Limit to 10 most recent expenses
-                description = expense.get("description", "Sin descripción")
-                amount = expense.get("amount", 0)
-                expense_id = expense.get("id")
-                
-                # Format the button text
-                button_text = f"{description} - ${amount:.2f}"
-                expense_buttons.append([button_text])
-                
-                # Save the mapping of button text to expense ID
-                if "expense_buttons" not in context.user_data["edit_data"]:
-                    context.user_data["edit_data"]["expense_buttons"] = {}
-                context.user_data["edit_data"]["expense_buttons"][button_text] = expense_id
-            
-            # Add cancel button
-            expense_buttons.append(["❌ Cancelar"])
-            
-            # Show expense selection message
-            await update.message.reply_text(
-                Messages.SELECT_EXPENSE_TO_DELETE,
-                reply_markup=ReplyKeyboardMarkup(
-                    expense_buttons,
-                    one_time_keyboard=True,
-                    resize_keyboard=True
-                )
-            )
-            
-            # Move to the next state: select expense
-            return SELECT_EXPENSE
+        if option in ("📝 Editar Gastos", "🗑️ Eliminar Gastos"):
+            # Show the most recent page of expenses
+            return await _show_expense_page(update, context)
             
         elif option == "🗑️ Eliminar Pagos":
-            # Get all payments for the family
-            status_code, payments = PaymentService.get_family_payments(family_id, telegram_id)
-            
-            if status_code != 200 or not payments:
-                # If there are no payments or there was an error, show message
-                await update.message.reply_text(
-                    Messages.NO_PAYMENTS_TO_DELETE,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
-                return ConversationHandler.END
-            
-            # Sort payments by date (most recent first)
-            payments.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            
-            # Save payments in the context
-            context.user_data["edit_data"]["payments"] = payments
-            
-            # Create keyboard with payment options
-            payment_buttons = []
-            for payment in payments[:10]:  # Limit to 10 most recent payments
-                # Obtener los objetos de miembros
-                from_member = payment.get("from_member", {})
-                to_member = payment.get("to_member", {})
-                
-                # Extraer nombres de los objetos de miembros
-                from_member_name = None
-                if isinstance(from_member, dict) and "name" in from_member:
-                    from_member_name = from_member.get("name")
-                
-                to_member_name = None
-                if isinstance(to_member, dict) and "name" in to_member:
-                    to_member_name = to_member.get("name")
-                
-                # Usar ID como respaldo si no se encontró el nombre
-                if not from_member_name:
-                    from_id = from_member.get("id") if isinstance(from_member, dict) else from_member
-                    from_member_name = f"Usuario {from_id}"
-                
-                if not to_member_name:
-                    to_id = to_member.get("id") if isinstance(to_member, dict) else to_member
-                    to_member_name = f"Usuario {to_id}"
-                
-                amount = payment.get("amount", 0)
-                payment_id = payment.get("id")
-                
-                # Format the button text
-                button_text = f"{from_member_name} → {to_member_name} - ${amount:.2f}"
-                payment_buttons.append([button_text])
-                
-                # Save the mapping of button text to payment ID
-                if "payment_buttons" not in context.user_data["edit_data"]:
-                    context.user_data["edit_data"]["payment_buttons"] = {}
-                context.user_data["edit_data"]["payment_buttons"][button_text] = payment_id
-            
-            # Add cancel button
-            payment_buttons.append(["❌ Cancelar"])
-            
-            # Show payment selection message
-            await update.message.reply_text(
-                Messages.SELECT_PAYMENT_TO_DELETE,
-                reply_markup=ReplyKeyboardMarkup(
-                    payment_buttons,
-                    one_time_keyboard=True,
-                    resize_keyboard=True
-                )
-            )
-            
-            # Move to the next state: select payment
-            return SELECT_PAYMENT
+            # Show the most recent page of payments
+            return await _show_payment_page(update, context)
             
         elif option == "📝 Editar Pagos":
             # Mostrar mensaje de que esta funcionalidad no está disponible aún
@@ -300,11 +135,173 @@ async def handle_edit_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
             
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en handle_edit_option: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_edit_option: %s", e)
         await send_error(update, context, f"Error al procesar la opción de edición: {str(e)}")
         return ConversationHandler.END
 
+async def _show_expense_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction=OLDER):
+    """
+    Shows one page of expenses to select for editing or deleting.
+    
+    The keyboard lists the expenses of the page, newest first, followed by the
+    buttons to move to newer or older expenses.
+    
+    Args:
+        update (Update): Telegram Update object
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        cursor (tuple, optional): Cursor of the expense that ends the current page
+        direction (str, optional): OLDER or NEWER than the cursor
+        
+    Returns:
+        int: The next conversation state
+    """
+    edit_data = context.user_data["edit_data"]
+    option = edit_data.get("option")
+    family_id = context.user_data.get("family_id")
+    telegram_id = str(update.effective_user.id)
+    
+    status_code, page = await PageIndex.page(
+        EXPENSES, family_id, lambda: ExpenseService.get_family_expenses(family_id, telegram_id),
+        cursor=cursor, direction=direction
+    )
+    
+    if status_code != 200 or not page.records:
+        # If there are no expenses or there was an error, show message
+        await update.message.reply_text(
+            Messages.NO_EXPENSES_TO_EDIT if option == "📝 Editar Gastos" else Messages.NO_EXPENSES_TO_DELETE,
+            reply_markup=Keyboards.get_main_menu_keyboard()
+        )
+        return ConversationHandler.END
+    
+    # Save the expenses of the page and the mapping of button text to expense ID
+    edit_data["expenses"] = page.records
+    edit_data["expense_buttons"] = {}
+    edit_data["page"] = {"newest": page.newest_cursor, "oldest": page.oldest_cursor}
+    
+    expense_buttons = []
+    for expense in page.records:
+        description = expense.get("description", "Sin descripción")
+        amount = expense.get("amount", 0)
+        
+        # Format the button text
+        button_text = f"{description} - ${amount:.2f}"
+        expense_buttons.append([button_text])
+        edit_data["expense_buttons"][button_text] = expense.get("id")
+    
+    # Add the navigation and cancel buttons
+    expense_buttons.extend(_page_buttons(page))
+    expense_buttons.append(["❌ Cancelar"])
+    
+    # Show expense selection message
+    await update.message.reply_text(
+        (Messages.SELECT_EXPENSE_TO_EDIT if option == "📝 Editar Gastos" else Messages.SELECT_EXPENSE_TO_DELETE)
+        + "\n\n" + Messages.PAGE_FOOTER.format(first=page.first, last=page.last, total=page.total),
+        parse_mode="Markdown",
+        reply_markup=ReplyKeyboardMarkup(
+            expense_buttons,
+            one_time_keyboard=True,
+            resize_keyboard=True
+        )
+    )
+    
+    # Move to the next state: select expense
+    return SELECT_EXPENSE
+
+async def _show_payment_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction=OLDER):
+    """
+    Shows one page of payments to select for deleting.
+    
+    Args:
+        update (Update): Telegram Update object
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        cursor (tuple, optional): Cursor of the payment that ends the current page
+        direction (str, optional): OLDER or NEWER than the cursor
+        
+    Returns:
+        int: The next conversation state
+    """
+    edit_data = context.user_data["edit_data"]
+    family_id = context.user_data.get("family_id")
+    telegram_id = str(update.effective_user.id)
+    
+    status_code, page = await PageIndex.page(
+        PAYMENTS, family_id, lambda: PaymentService.get_family_payments(family_id, telegram_id),
+        cursor=cursor, direction=direction
+    )
+    
+    if status_code != 200 or not page.records:
+        # If there are no payments or there was an error, show message
+        await update.message.reply_text(
+            Messages.NO_PAYMENTS_TO_DELETE,
+            reply_markup=Keyboards.get_main_menu_keyboard()
+        )
+        return ConversationHandler.END
+    
+    # Save the payments of the page and the mapping of button text to payment ID
+    edit_data["payments"] = page.records
+    edit_data["payment_buttons"] = {}
+    edit_data["page"] = {"newest": page.newest_cursor, "oldest": page.oldest_cursor}
+    
+    payment_buttons = []
+    for payment in page.records:
+        # Los miembros del pago son registros Member; sin nombre se muestra su ID
+        button_text = f"{payment.from_member.display_name} → {payment.to_member.display_name} - ${payment.amount:.2f}"
+        payment_buttons.append([button_text])
+        edit_data["payment_buttons"][button_text] = payment.id
+    
+    # Add the navigation and cancel buttons
+    payment_buttons.extend(_page_buttons(page))
+    payment_buttons.append(["❌ Cancelar"])
+    
+    # Show payment selection message
+    await update.message.reply_text(
+        Messages.SELECT_PAYMENT_TO_DELETE + "\n\n" + Messages.PAGE_FOOTER.format(first=page.first, last=page.last, total=page.total),
+        parse_mode="Markdown",
+        reply_markup=ReplyKeyboardMarkup(
+            payment_buttons,
+            one_time_keyboard=True,
+            resize_keyboard=True
+        )
+    )
+    
+    # Move to the next state: select payment
+    return SELECT_PAYMENT
+
+def _page_buttons(page):
+    """
+    Returns the keyboard row with the page navigation buttons.
+    
+    Args:
+        page (Page): The page shown
+        
+    Returns:
+        list: A list with one row of buttons, or an empty list if there is only one page
+    """
+    row = []
+    if page.has_newer:
+        row.append(Messages.PAGE_NEWER_BUTTON)
+    if page.has_older:
+        row.append(Messages.PAGE_OLDER_BUTTON)
+    return [row] if row else []
+
+def _page_request(context: ContextTypes.DEFAULT_TYPE, selected_text):
+    """
+    Translates a navigation button into the cursor of the requested page.
+    
+    Args:
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        selected_text (str): Text of the pressed button
+        
+    Returns:
+        tuple: (cursor, direction), or None if it is not a navigation button
+    """
+    current = context.user_data["edit_data"].get("page") or {}
+    if selected_text == Messages.PAGE_OLDER_BUTTON:
+        return current.get("oldest"), OLDER
+    if selected_text == Messages.PAGE_NEWER_BUTTON:
+        return current.get("newest"), NEWER
+    return None
+
 async def handle_select_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles the selection of an expense to edit or delete.
@@ -332,6 +329,11 @@ async def handle_select_expense(update: Update, context: ContextTypes.DEFAULT_TY
             )
             return ConversationHandler.END
         
+        # Move to another page of expenses
+        page_request = _page_request(context, selected_text)
+        if page_request is not None:
+            return await _show_expense_page(update, context, *page_request)
+        
         # Get the expense ID from the context using the button text
         expense_buttons = context.user_data["edit_data"].get("expense_buttons", {})
         selected_id = expense_buttons.get(selected_text)
@@ -403,8 +405,7 @@ async def handle_select_expense(update: Update, context: ContextTypes.DEFAULT_TY
             
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en handle_select_expense: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_select_expense: %s", e)
         await send_error(update, context, f"Error al seleccionar el gasto: {str(e)}")
         return ConversationHandler.END
 
@@ -470,7 +471,7 @@ async def handle_edit_expense_amount(update: Update, context: ContextTypes.DEFAU
         
         # Update the expense with the new amount
         data = {"amount": new_amount}
-        status_code, response = ExpenseService.update_expense(expense_id, data, telegram_id)
+        status_code, response = await ExpenseService.update_expense(expense_id, data, telegram_id, family_id=context.user_data.get("family_id"))
         
         if status_code in [200, 201]:
             # If the update was successful, show success message
@@ -491,8 +492,7 @@ async def handle_edit_expense_amount(update: Update, context: ContextTypes.DEFAU
         
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en handle_edit_expense_amount: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_edit_expense_amount: %s", e)
         await send_error(update, context, f"Error al editar el monto del gasto: {str(e)}")
         return ConversationHandler.END
 
@@ -523,6 +523,11 @@ async def handle_select_payment(update: Update, context: ContextTypes.DEFAULT_TY
             )
             return ConversationHandler.END
         
+        # Move to another page of payments
+        page_request = _page_request(context, selected_text)
+        if page_request is not None:
+            return await _show_payment_page(update, context, *page_request)
+        
         # Get the payment ID from the context using the button text
         payment_buttons = context.user_data["edit_data"].get("payment_buttons", {})
         selected_id = payment_buttons.get(selected_text)
@@ -562,35 +567,11 @@ async def handle_select_payment(update: Update, context: ContextTypes.DEFAULT_TY
         
         if option == "🗑️ Eliminar Pagos":
             # For deleting, ask for confirmation
-            # Obtener los objetos de miembros
-            from_member = selected_payment.get("from_member", {})
-            to_member = selected_payment.get("to_member", {})
-            
-            # Extraer nombres de los objetos de miembros
-            from_member_name = None
-            if isinstance(from_member, dict) and "name" in from_member:
-                from_member_name = from_member.get("name")
-            
-            to_member_name = None
-            if isinstance(to_member, dict) and "name" in to_member:
-                to_member_name = to_member.get("name")
-            
-            # Usar ID como respaldo si no se encontró el nombre
-            if not from_member_name:
-                from_id = from_member.get("id") if isinstance(from_member, dict) else from_member
-                from_member_name = f"Usuario {from_id}"
-            
-            if not to_member_name:
-                to_id = to_member.get("id") if isinstance(to_member, dict) else to_member
-                to_member_name = f"Usuario {to_id}"
-            
-            amount = selected_payment.get("amount", 0)
-            
             await update.message.reply_text(
                 Messages.CONFIRM_DELETE_PAYMENT.format(
-                    details=f"*De:* {from_member_name}\n"
-                           f"*Para:* {to_member_name}\n"
-                           f"*Monto:* ${amount:.2f}"
+                    details=f"*De:* {selected_payment.from_member.display_name}\n"
+                           f"*Para:* {selected_payment.to_member.display_name}\n"
+                           f"*Monto:* ${selected_payment.amount:.2f}"
                 ),
                 parse_mode="Markdown",
                 reply_markup=Keyboards.get_confirmation_keyboard()
@@ -607,8 +588,7 @@ async def handle_select_payment(update: Update, context: ContextTypes.DEFAULT_TY
             
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en handle_select_payment: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_select_payment: %s", e)
         await send_error(update, context, f"Error al seleccionar el pago: {str(e)}")
         return ConversationHandler.END
 
@@ -654,7 +634,7 @@ async def handle_confirm_delete(update: Update, context: ContextTypes.DEFAULT_TY
         # Handle different delete options
         if option == "🗑️ Eliminar Gastos":
             # Delete the expense
-            status_code, response = ExpenseService.delete_expense(selected_id)
+            status_code, response = await ExpenseService.delete_expense(selected_id, family_id=context.user_data.get("family_id"))
             
             if status_code in [200, 204]:
                 # If the deletion was successful, show success message
@@ -672,7 +652,7 @@ async def handle_confirm_delete(update: Update, context: ContextTypes.DEFAULT_TY
                 
         elif option == "🗑️ Eliminar Pagos":
             # Delete the payment
-            status_code, response = PaymentService.delete_payment(selected_id)
+            status_code, response = await PaymentService.delete_payment(selected_id, family_id=context.user_data.get("family_id"))
             
             if status_code in [200, 204]:
                 # If the deletion was successful, show success message
@@ -700,8 +680,7 @@ async def handle_confirm_delete(update: Update, context: ContextTypes.DEFAULT_TY
         
     except Exception as e:
         # Handle unexpected errors
-        print(f"Error en handle_confirm_delete: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en handle_confirm_delete: %s", e)
         await send_error(update, context, f"Error al confirmar la eliminación: {str(e)}")
         return ConversationHandler.END
 
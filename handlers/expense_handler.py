@@ -7,16 +7,22 @@ creating new expenses, listing existing expenses, and managing expense data.
 
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from config import DESCRIPTION, AMOUNT, SELECT_MEMBERS, CONFIRM, logger
+from config import DESCRIPTION, AMOUNT, SELECT_MEMBERS, CONFIRM
 from ui.keyboards import Keyboards
 from ui.messages import Messages
 from ui.formatters import Formatters
+from services.api_service import ApiService
 from services.expense_service import ExpenseService
+from services.write_retry import WriteRetry
 from utils.context_manager import ContextManager
-from utils.helpers import send_error
+from utils.helpers import send_error, make_retry_notifier
 from services.member_service import MemberService
 from services.family_service import FamilyService
-import traceback
+from services.family_directory import FamilyDirectory
+from services.pagination import PageIndex, EXPENSES, OLDER, NEWER, this_month
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 # Eliminamos la importación circular
 # from handlers.menu_handler import show_main_menu
@@ -53,7 +59,7 @@ async def crear_gasto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Verificar que el usuario está en una familia usando su ID de Telegram
         telegram_id = str(update.effective_user.id)
-        status_code, member = MemberService.get_member(telegram_id)
+        status_code, member = await MemberService.get_member(telegram_id)
         
         # Si el usuario no está en una familia, mostrar error y terminar la conversación
         if status_code != 200 or not member or not member.get("family_id"):
@@ -69,17 +75,14 @@ async def crear_gasto(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "telegram_id": telegram_id,
             "member_id": member.get("id"),
             "family_id": member.get("family_id"),
-            "member_name": member.get("name", update.effective_user.first_name)  # Guardar el nombre del usuario
+            "member_name": member.get("name", update.effective_user.first_name),  # Guardar el nombre del usuario
+            "submission_id": WriteRetry.new_submission_id()  # Clave de idempotencia de este gasto
         }
         
-        # También actualizar o crear la caché de nombres de miembros
-        if "member_names" not in context.user_data:
-            context.user_data["member_names"] = {}
-        
-        # Guardar el nombre del miembro actual en la caché
-        member_id = member.get("id")
-        if member_id:
-            context.user_data["member_names"][str(member_id)] = member.get("name", update.effective_user.first_name)
+        # Enlazar los nombres compartidos de la familia si ya están cargados
+        family_record = FamilyDirectory.get(member.get("family_id"))
+        if family_record is not None:
+            ContextManager.attach_family(context, family_record)
         
         # Mostrar mensaje introductorio y pedir la descripción del gasto
         await update.message.reply_text(
@@ -92,8 +95,7 @@ async def crear_gasto(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en crear_gasto: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en crear_gasto: %s", e)
         await send_error(update, context, "Ocurrió un error al iniciar la creación del gasto.")
         return ConversationHandler.END
 
@@ -149,8 +151,7 @@ async def get_expense_description(update: Update, context: ContextTypes.DEFAULT_
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en get_expense_description: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en get_expense_description: %s", e)
         await send_error(update, context, "Ocurrió un error al procesar la descripción del gasto.")
         return ConversationHandler.END
 
@@ -215,8 +216,7 @@ async def get_expense_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en get_expense_amount: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en get_expense_amount: %s", e)
         await send_error(update, context, "Ocurrió un error al procesar el monto del gasto.")
         return ConversationHandler.END
 
@@ -247,8 +247,7 @@ async def show_expense_division_options(update: Update, context: ContextTypes.DE
         return SELECT_MEMBERS
         
     except Exception as e:
-        print(f"Error en show_expense_division_options: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en show_expense_division_options: %s", e)
         await send_error(update, context, "Ocurrió un error al mostrar las opciones de división del gasto.")
         return ConversationHandler.END
 
@@ -295,7 +294,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
         # Si el usuario elige seleccionar miembros específicos
         elif selection == "👤 Seleccionar miembros específicos":
             # Obtener la lista de miembros de la familia
-            members_status, members = FamilyService.get_family_members(family_id, token=telegram_id)
+            members_status, members = await FamilyService.get_family_members(family_id, token=telegram_id)
             
             if members_status != 200 or not members:
                 await update.message.reply_text(
@@ -304,18 +303,11 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
                 )
                 return ConversationHandler.END
             
-            # Guardar la lista completa de miembros en el contexto para uso futuro
-            context.user_data["family_members"] = members
-            
-            # Actualizar la caché de nombres con todos los miembros
-            if "member_names" not in context.user_data:
-                context.user_data["member_names"] = {}
-            
-            for member in members:
-                member_id = member.get("id")
-                member_name = member.get("name", f"Usuario {member_id}")
-                if member_id:
-                    context.user_data["member_names"][str(member_id)] = member_name
+            # Enlazar la lista de miembros y los nombres compartidos de la familia
+            family_record = FamilyDirectory.update(family_id, members)
+            ContextManager.attach_family(context, family_record)
+            context.user_data["family_members"] = family_record.members
+            members = family_record.members
             
             # Filtrar los miembros para excluir al creador del gasto
             filtered_members = [member for member in members if str(member.get("id")) != str(current_member_id)]
@@ -348,7 +340,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
             # Verificar si tenemos la lista de miembros en el contexto
             if "family_members" not in context.user_data:
                 # Si no tenemos la lista, obtenerla nuevamente
-                members_status, members = FamilyService.get_family_members(family_id, token=telegram_id)
+                members_status, members = await FamilyService.get_family_members(family_id, token=telegram_id)
                 
                 if members_status != 200 or not members:
                     await update.message.reply_text(
@@ -357,6 +349,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
                     )
                     return ConversationHandler.END
                 
+                members = FamilyDirectory.update(family_id, members).members
                 context.user_data["family_members"] = members
             else:
                 members = context.user_data["family_members"]
@@ -401,7 +394,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
             # Verificar si tenemos la lista de miembros en el contexto
             if "family_members" not in context.user_data:
                 # Si no tenemos la lista, obtenerla nuevamente
-                members_status, members = FamilyService.get_family_members(family_id, token=telegram_id)
+                members_status, members = await FamilyService.get_family_members(family_id, token=telegram_id)
                 
                 if members_status != 200 or not members:
                     await update.message.reply_text(
@@ -410,6 +403,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
                     )
                     return ConversationHandler.END
                 
+                members = FamilyDirectory.update(family_id, members).members
                 context.user_data["family_members"] = members
             else:
                 members = context.user_data["family_members"]
@@ -438,7 +432,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
             # Verificar si tenemos la lista de miembros en el contexto
             if "family_members" not in context.user_data:
                 # Si no tenemos la lista, obtenerla nuevamente
-                members_status, members = FamilyService.get_family_members(family_id, token=telegram_id)
+                members_status, members = await FamilyService.get_family_members(family_id, token=telegram_id)
                 
                 if members_status != 200 or not members:
                     await update.message.reply_text(
@@ -447,6 +441,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
                     )
                     return ConversationHandler.END
                 
+                members = FamilyDirectory.update(family_id, members).members
                 context.user_data["family_members"] = members
             else:
                 members = context.user_data["family_members"]
@@ -493,8 +488,7 @@ async def select_members_for_expense(update: Update, context: ContextTypes.DEFAU
             return SELECT_MEMBERS
             
     except Exception as e:
-        print(f"Error en select_members_for_expense: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en select_members_for_expense: %s", e)
         await send_error(update, context, "Ocurrió un error al seleccionar los miembros para el gasto.")
         return ConversationHandler.END
 
@@ -566,17 +560,97 @@ async def show_expense_confirmation(update: Update, context: ContextTypes.DEFAUL
         return CONFIRM
         
     except Exception as e:
-        print(f"Error en show_expense_confirmation: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en show_expense_confirmation: %s", e)
         await send_error(update, context, "Ocurrió un error al mostrar la confirmación del gasto.")
         return ConversationHandler.END
 
+def _format_expense_item(expense, member_names, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Formats one expense of the expense list.
+    
+    Args:
+        expense (Expense): The expense
+        member_names (dict): Member ID to member name
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        
+    Returns:
+        str: The formatted expense
+    """
+    # El ID del pagador ya viene normalizado como string
+    paid_by_id = expense.paid_by
+    paid_by_name = member_names.get(paid_by_id)
+    
+    # Buscar directamente en los miembros de la familia si no está en los nombres
+    if not paid_by_name:
+        for family_member in context.user_data.get("family", {}).get("members", []):
+            if str(family_member.get("id")) == paid_by_id:
+                paid_by_name = family_member.get("name")
+                break
+    
+    # Valor por defecto si no se encuentra
+    if not paid_by_name:
+        paid_by_name = f"Usuario {paid_by_id}"
+    
+    # Formatear la información del gasto
+    return Messages.EXPENSE_LIST_ITEM.format(
+        id=expense.id,
+        description=expense.description,
+        amount=Formatters.format_currency(expense.amount),
+        paid_by=paid_by_name,
+        date=Formatters.format_timestamp(expense.created_ts)
+    )
+
+async def _month_summary(family_id, telegram_id):
+    """
+    Summarizes the expenses of the current month.
+    
+    Args:
+        family_id (str): ID of the family
+        telegram_id (str): Telegram ID of the user
+        
+    Returns:
+        str: The summary line, or an empty string if it is not available
+    """
+    since, until = this_month()
+    status_code, expenses = await ExpenseService.get_family_expenses_between(family_id, telegram_id, since, until)
+    if status_code != 200:
+        return ""
+    return Messages.EXPENSES_MONTH_SUMMARY.format(
+        count=len(expenses),
+        amount=Formatters.format_currency(sum(expense.amount_cents for expense in expenses) / 100)
+    )
+
+def _render_expenses_page(page, member_names, context: ContextTypes.DEFAULT_TYPE, summary="", stale=False):
+    """
+    Builds the text and navigation buttons of one page of the expense list.
+    
+    Args:
+        page (Page): The page, newest expense first
+        member_names (dict): Member ID to member name
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        summary (str, optional): Summary line shown under the header
+        stale (bool, optional): True if the list may be out of date
+        
+    Returns:
+        tuple: (message text, InlineKeyboardMarkup or None)
+    """
+    message = Messages.EXPENSES_LIST_HEADER + (Messages.STALE_DATA_NOTICE if stale else "") + summary
+    for expense in page.records:
+        message += _format_expense_item(expense, member_names, context)
+    message += Messages.PAGE_FOOTER.format(first=page.first, last=page.last, total=page.total)
+    
+    keyboard = Keyboards.get_page_keyboard(
+        PageIndex.callback_data(EXPENSES, NEWER, page.newest_cursor) if page.has_newer else None,
+        PageIndex.callback_data(EXPENSES, OLDER, page.oldest_cursor) if page.has_older else None
+    )
+    return message, keyboard
+
 async def listar_gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Lists all expenses for the user's family.
+    Lists the expenses of the user's family.
     
-    This function retrieves and displays all expenses for the family
-    that the user belongs to.
+    This function shows the most recent page of expenses of the family that
+    the user belongs to, with buttons to move to older or newer pages.
     
     Args:
         update (Update): Telegram Update object
@@ -590,8 +664,8 @@ async def listar_gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         telegram_id = str(update.effective_user.id)
         
         # Verificar que el usuario pertenece a una familia
-        status_code, member = MemberService.get_member(telegram_id)
-        print(f"Respuesta de get_member en listar_gastos: {status_code}, {member}")
+        status_code, member = await MemberService.get_member(telegram_id)
+        logger.debug("Respuesta de get_member en listar_gastos: %s, %s", status_code, Payload(member))
         
         if status_code != 200 or not member or not member.get("family_id"):
             # Si el usuario no está en una familia, mostrar error
@@ -603,122 +677,41 @@ async def listar_gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Obtener el ID de la familia del usuario
         family_id = member.get("family_id")
         
-        # Intentar obtener los nombres de los miembros desde el contexto
-        member_names = context.user_data.get("member_names", {})
-        
-        # Si no hay nombres en el contexto, intentar cargarlos desde la familia
-        if not member_names:
-            print("No se encontraron nombres de miembros en el contexto. Cargando desde la API...")
-            # Obtener información de la familia completa para tener la lista de miembros
-            status_code, family = FamilyService.get_family(family_id, telegram_id)
-            print(f"Respuesta de get_family en listar_gastos: {status_code}, {family}")
-            
-            if status_code == 200 and family and "members" in family:
-                # Crear diccionario de ID -> nombre para los miembros
-                member_names = {}
-                for family_member in family.get("members", []):
-                    member_id = family_member.get("id")
-                    member_name = family_member.get("name", f"Usuario {member_id}")
-                    print(f"Procesando miembro: ID={member_id} ({type(member_id)}), Nombre={member_name}")
-                    
-                    # Guardar el ID como string siempre
-                    member_names[str(member_id)] = member_name
-                    
-                    # Si el ID es un número o puede convertirse a número, también guardarlo como número
-                    if isinstance(member_id, int) or (isinstance(member_id, str) and member_id.isdigit()):
-                        numeric_id = int(member_id) if isinstance(member_id, str) else member_id
-                        member_names[numeric_id] = member_name
-                
-                # Guardar los nombres en el contexto para futuros usos
-                context.user_data["member_names"] = member_names
-                print(f"Nombres de miembros cargados y guardados en el contexto: {member_names}")
-                
-                # También guardar la familia completa para referencia futura
-                context.user_data["family"] = family
+        # Obtener los nombres de los miembros del directorio compartido de familias
+        # (solo se consulta la API si la familia no está cargada)
+        member_names = {}
+        status_code, family_record = await FamilyService.get_family_record(family_id, telegram_id)
+        if status_code == 200:
+            ContextManager.attach_family(context, family_record)
+            member_names = family_record.member_names
         
-        # Obtener todos los gastos de la familia desde el servicio
-        status_code, expenses = ExpenseService.get_family_expenses(family_id, telegram_id)
-        print(f"Respuesta de get_family_expenses: {status_code}, {expenses}")
+        # Obtener la página más reciente de gastos de la familia
+        status_code, page = await PageIndex.page(
+            EXPENSES, family_id, lambda: ExpenseService.get_family_expenses(family_id, telegram_id)
+        )
         
         if status_code != 200:
             # Si hubo un error al obtener los gastos, mostrar mensaje de error
-            error_message = expenses.get("error", "Error desconocido")
+            error_message = page.get("error", "Error desconocido") if isinstance(page, dict) else "Error desconocido"
             await send_error(update, context, f"Error al obtener los gastos: {error_message}")
             return await _show_menu(update, context)
             
         # Verificar si la familia tiene gastos registrados
-        if not expenses or len(expenses) == 0:
+        if not page.records:
             await update.message.reply_text(
             Messages.NO_EXPENSES,
             parse_mode="Markdown"
             )
             return await _show_menu(update, context)
             
-        # Preparar el mensaje con la lista de gastos
-        message = Messages.EXPENSES_LIST_HEADER
-        
-        # Ordenar los gastos por fecha (más recientes primero)
-        expenses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        # Iterar sobre cada gasto para formatear la información (limitado a 10 más recientes)
-        for expense in expenses[:10]:
-            expense_id = expense.get("id")
-            description = expense.get("description", "Sin descripción")
-            amount = expense.get("amount", 0)
-            paid_by_id = expense.get("paid_by")
-            created_at = expense.get("created_at", "")
-            
-            print(f"Procesando gasto: ID={expense_id}, pagado por ID={paid_by_id} ({type(paid_by_id)})")
-            
-            # Intentar buscar el nombre del miembro de diferentes maneras
-            paid_by_name = None
-            
-            # 1. Buscar como string (el caso más común y seguro)
-            if paid_by_id is not None:
-                str_id = str(paid_by_id)
-                if str_id in member_names:
-                    paid_by_name = member_names[str_id]
-                    print(f"Nombre encontrado usando string ID: {paid_by_name}")
-            
-            # 2. Buscar como número si es aplicable
-            if not paid_by_name and paid_by_id is not None:
-                if isinstance(paid_by_id, int) or (isinstance(paid_by_id, str) and paid_by_id.isdigit()):
-                    numeric_id = int(paid_by_id) if isinstance(paid_by_id, str) else paid_by_id
-                    if numeric_id in member_names:
-                        paid_by_name = member_names[numeric_id]
-                        print(f"Nombre encontrado usando numeric ID: {paid_by_name}")
-            
-            # 3. Buscar directamente en los miembros de la familia
-            if not paid_by_name and "family" in context.user_data and "members" in context.user_data["family"]:
-                for family_member in context.user_data["family"]["members"]:
-                    member_id = family_member.get("id")
-                    # Comparar como strings para mayor seguridad
-                    if str(member_id) == str(paid_by_id):
-                        paid_by_name = family_member.get("name")
-                        print(f"Nombre encontrado en familia directamente: {paid_by_name}")
-                        break
-            
-            # 4. Valor por defecto si no se encuentra
-            if not paid_by_name:
-                paid_by_name = f"Usuario {paid_by_id}"
-                print(f"No se encontró nombre, usando valor por defecto: {paid_by_name}")
-                
-            # Formatear la fecha de creación del gasto
-            formatted_date = Formatters.format_date(created_at)
-            
-            # Añadir la información del gasto al mensaje
-            message += Messages.EXPENSE_LIST_ITEM.format(
-                id=expense_id,
-                description=description,
-                amount=Formatters.format_currency(amount),
-                paid_by=paid_by_name,
-                date=formatted_date
-            )
-            
-        # Enviar el mensaje con la lista de gastos
+        # Enviar el mensaje con la página de gastos, el resumen del mes y los
+        # botones de navegación
+        summary = await _month_summary(family_id, telegram_id)
+        message, keyboard = _render_expenses_page(page, member_names, context, summary, ApiService.is_stale(status_code))
         await update.message.reply_text(
             message,
-            parse_mode="Markdown"
+            parse_mode="Markdown",
+            reply_markup=keyboard
         )
         
         # Mostrar el menú principal
@@ -726,11 +719,61 @@ async def listar_gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en listar_gastos: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en listar_gastos: %s", e)
         await send_error(update, context, "Ocurrió un error al listar los gastos.")
         return await _show_menu(update, context)
 
+async def navegar_gastos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handles the "◀" / "▶" buttons of the expense list.
+    
+    The message of the list is edited in place with the requested page.
+    
+    Args:
+        update (Update): Telegram Update object
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+    """
+    query = update.callback_query
+    await query.answer()
+    
+    parsed = PageIndex.parse_callback(query.data)
+    if parsed is None:
+        return
+    _, direction, cursor = parsed
+    
+    try:
+        telegram_id = str(update.effective_user.id)
+        family_id = context.user_data.get("family_id")
+        if not family_id:
+            status_code, member = await MemberService.get_member(telegram_id)
+            if status_code != 200 or not member or not member.get("family_id"):
+                await query.edit_message_text(Messages.ERROR_NOT_IN_FAMILY)
+                return
+            family_id = member["family_id"]
+        
+        member_names = {}
+        status_code, family_record = await FamilyService.get_family_record(family_id, telegram_id)
+        if status_code == 200:
+            ContextManager.attach_family(context, family_record)
+            member_names = family_record.member_names
+        
+        status_code, page = await PageIndex.page(
+            EXPENSES, family_id, lambda: ExpenseService.get_family_expenses(family_id, telegram_id),
+            cursor=cursor, direction=direction
+        )
+        if status_code != 200:
+            await query.edit_message_text(Messages.ERROR_NO_EXPENSES)
+            return
+        if not page.records:
+            await query.edit_message_text(Messages.NO_EXPENSES, parse_mode="Markdown")
+            return
+        
+        summary = await _month_summary(family_id, telegram_id) if not page.has_newer else ""
+        message, keyboard = _render_expenses_page(page, member_names, context, summary, ApiService.is_stale(status_code))
+        await query.edit_message_text(message, parse_mode="Markdown", reply_markup=keyboard)
+    except Exception as e:
+        logger.exception("Error en navegar_gastos: %s", e)
+
 async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles the user's confirmation of a new expense.
@@ -780,15 +823,32 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return ConversationHandler.END
             
             # Crear el gasto a través del servicio
-            status_code, response = ExpenseService.create_expense(
+            status_code, response = await ExpenseService.create_expense(
                 description=description,
                 amount=amount,
                 paid_by=paid_by,
                 family_id=family_id,
                 telegram_id=telegram_id,
-                split_among=split_among
+                split_among=split_among,
+                submission_id=expense_data.get("submission_id"),
+                on_retry_result=make_retry_notifier(
+                    context,
+                    update.effective_chat.id,
+                    Messages.SUCCESS_EXPENSE_CREATED,
+                    Messages.ERROR_CREATING_EXPENSE
+                )
             )
             
+            # Si la API no responde, el gasto se reintenta en segundo plano
+            if WriteRetry.is_queued(status_code, response):
+                await update.message.reply_text(
+                    Messages.WRITE_QUEUED,
+                    reply_markup=Keyboards.get_main_menu_keyboard()
+                )
+                if "expense_data" in context.user_data:
+                    del context.user_data["expense_data"]
+                return ConversationHandler.END
+            
             # Procesar según el resultado
             if status_code in [200, 201]:
                 # Si se creó correctamente, mostrar mensaje de éxito
@@ -828,11 +888,6 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                 if str(member.get("id")) == str(paid_by):
                                     paid_by_name = member.get("name", "Desconocido")
                                     logger.info(f"[NOTIFY_EXPENSE] Nombre encontrado en familia: {paid_by_name}")
-                                    
-                                    # Actualizar caché
-                                    if "member_names" not in context.user_data:
-                                        context.user_data["member_names"] = {}
-                                    context.user_data["member_names"][str(paid_by)] = paid_by_name
                                     break
                     
                     # Determinar los miembros que deben recibir la notificación
@@ -842,7 +897,7 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     
                     # Obtener la lista de miembros de la familia
                     logger.info(f"[NOTIFY_EXPENSE] Obteniendo miembros de la familia {family_id} para notificar sobre nuevo gasto")
-                    members_status, members = FamilyService.get_family_members(family_id, token=telegram_id)
+                    members_status, members = await FamilyService.get_family_members(family_id, token=telegram_id)
                     
                     if members_status == 200 and members:
                         # Actualizar caché de nombres y guardar la familia para uso futuro
@@ -853,18 +908,9 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                     logger.info(f"[NOTIFY_EXPENSE] Nombre encontrado en miembros obtenidos: {paid_by_name}")
                                     break
                         
-                        # Actualizar la caché de nombres con todos los miembros
-                        if "member_names" not in context.user_data:
-                            context.user_data["member_names"] = {}
-                        
-                        for member in members:
-                            member_id = member.get("id")
-                            member_name = member.get("name", f"Usuario {member_id}")
-                            if member_id:
-                                context.user_data["member_names"][str(member_id)] = member_name
-                        
-                        # Guardar la familia en el contexto para uso futuro
-                        context.user_data["family"] = {"members": members}
+                        # Actualizar el registro compartido de la familia y enlazarlo en el contexto
+                        family_record = FamilyDirectory.update(family_id, members)
+                        ContextManager.attach_family(context, family_record)
                         
                         # Filtrar los miembros que deberían recibir la notificación
                         if split_among is None:
@@ -941,8 +987,7 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         logger.warning(f"[NOTIFY_EXPENSE] No se pudo obtener la lista de miembros. Status: {members_status}")
                 
                 except Exception as notify_error:
-                    logger.error(f"[NOTIFY_EXPENSE] Error en proceso de notificación: {str(notify_error)}")
-                    traceback.print_exc()
+                    logger.exception("[NOTIFY_EXPENSE] Error en proceso de notificación: %s", notify_error)
                     # No bloqueamos el flujo principal si la notificación falla
                 
                 # Limpiar los datos del gasto del contexto
@@ -986,7 +1031,6 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en confirm_expense: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en confirm_expense: %s", e)
         await send_error(update, context, f"Error al confirmar el gasto: {str(e)}")
         return ConversationHandler.END 
\ No newline at end of file
@@ -11,10 +11,14 @@ from telegram.ext import ContextTypes, ConversationHandler
 from ui.messages import Messages
 from ui.formatters import Formatters
 from ui.keyboards import Keyboards
+from services.api_service import ApiService
 from services.family_service import FamilyService
+from services.dashboard_service import DashboardService
 from utils.context_manager import ContextManager
 from utils.helpers import send_error, create_qr_code
-import traceback
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 # Eliminamos la importación circular
 # from handlers.menu_handler import show_main_menu
@@ -51,11 +55,11 @@ async def show_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Obtener el ID de la familia del contexto o del usuario
         family_id = ContextManager.get_family_id(context)
-        print(f"Obteniendo balances para la familia con ID: {family_id}")
+        logger.debug("Obteniendo balances para la familia con ID: %s", family_id)
         
         # Verificar que el usuario pertenece a una familia
         if not family_id:
-            print("No se encontró el ID de familia en el contexto")
+            logger.debug("No se encontró el ID de familia en el contexto")
             await update.message.reply_text(Messages.ERROR_NOT_IN_FAMILY)
             return ConversationHandler.END
         
@@ -65,83 +69,28 @@ async def show_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Guardar el ID de Telegram en el contexto para uso futuro
         context.user_data["telegram_id"] = telegram_id
         
-        # Verificar si ya tenemos el ID del miembro actual en el contexto
-        current_member_id = context.user_data.get("current_member_id")
-        print(f"ID del miembro recuperado del contexto: {current_member_id}")
-        
-        # Primero, obtener la información completa de la familia para tener la lista de miembros
-        status_code, family = FamilyService.get_family(family_id, telegram_id)
-        print(f"Respuesta de get_family: status_code={status_code}, family={family}")
+        # Obtener miembro, familia y balances en paralelo
+        snapshot = await DashboardService.get_snapshot(telegram_id, family_id)
+        status_code, family = snapshot.family_status, snapshot.family
+        logger.debug("Respuesta de get_family: status_code=%s, family=%s", status_code, Payload(family))
         
         # Verificar si hubo un error al obtener la información de la familia
         if status_code >= 400 or not family:
             error_msg = f"❌ Error al obtener la información de la familia. Código de error: {status_code}"
             if isinstance(family, dict) and "detail" in family:
                 error_msg += f"\nDetalle: {family['detail']}"
-            print(f"Error al obtener información de familia: {error_msg}")
+            logger.error("Error al obtener información de familia: %s", error_msg)
             await update.message.reply_text(error_msg)
             return ConversationHandler.END
-            
-        # Crear un diccionario de IDs de miembros a nombres
-        member_names = {}
         
-        # Buscar el ID del miembro actual si no lo tenemos en el contexto
-        if not current_member_id:
-            if "members" in family and isinstance(family["members"], list):
-                for member in family["members"]:
-                    member_id = member.get("id")
-                    member_name = member.get("name", "Desconocido")
-                    telegram_member_id = member.get("telegram_id")
-                    
-                    # Si este miembro corresponde al usuario actual, guardar su ID en el contexto
-                    if telegram_member_id and str(telegram_member_id) == telegram_id:
-                        current_member_id = member_id
-                        context.user_data["current_member_id"] = current_member_id
-                        print(f"ID del miembro actual encontrado y guardado en contexto: {current_member_id}")
-                    
-                    # Guardar en el diccionario tanto como string como como ID nativo
-                    if member_id is not None:
-                        # Guardar como string
-                        member_names[str(member_id)] = member_name
-                        
-                        # Intentar guardar como entero si es posible
-                        if isinstance(member_id, int) or (isinstance(member_id, str) and member_id.isdigit()):
-                            try:
-                                numeric_id = int(member_id) if isinstance(member_id, str) else member_id
-                                member_names[numeric_id] = member_name
-                            except (ValueError, TypeError):
-                                pass
-                        
-                        # Guardar con el formato "Usuario X" para compatibilidad
-                        member_names[f"Usuario {member_id}"] = member_name
-        else:
-            # Si ya teníamos el ID del miembro, solo necesitamos cargar los nombres
-            if "members" in family and isinstance(family["members"], list):
-                for member in family["members"]:
-                    member_id = member.get("id")
-                    member_name = member.get("name", "Desconocido")
-                    
-                    if member_id is not None:
-                        member_names[str(member_id)] = member_name
-                        
-                        # Otras conversiones (entero, Usuario X, etc.)
-                        if isinstance(member_id, int) or (isinstance(member_id, str) and member_id.isdigit()):
-                            try:
-                                numeric_id = int(member_id) if isinstance(member_id, str) else member_id
-                                member_names[numeric_id] = member_name
-                            except (ValueError, TypeError):
-                                pass
-                        
-                        member_names[f"Usuario {member_id}"] = member_name
-                    
-        # Guardar los nombres de los miembros en el contexto
-        context.user_data["member_names"] = member_names
-        print(f"Nombres de miembros guardados en el contexto: {member_names}")
+        # Guardar los nombres de los miembros y el ID del miembro actual en el contexto
+        snapshot.store_in_context(context)
+        member_names = context.user_data["member_names"]
+        current_member_id = snapshot.member_id
+        logger.debug("Nombres de miembros guardados en el contexto: %s", member_names)
         
-        # Obtener los balances de la familia desde la API
-        print(f"Solicitando balances a la API para la familia {family_id} con telegram_id={telegram_id}")
-        status_code, balances = FamilyService.get_family_balances(family_id, telegram_id)
-        print(f"Respuesta de get_family_balances: status_code={status_code}, balances={balances}")
+        status_code, balances = snapshot.balances_status, snapshot.balances
+        logger.debug("Respuesta de get_family_balances: status_code=%s, balances=%s", status_code, Payload(balances))
         
         # Verificar si hubo un error al obtener los balances
         if status_code >= 400 or not balances:
@@ -149,7 +98,7 @@ async def show_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
             error_msg = f"❌ Error al obtener los balances. Código de error: {status_code}"
             if isinstance(balances, dict) and "detail" in balances:
                 error_msg += f"\nDetalle: {balances['detail']}"
-            print(f"Error al obtener balances: {error_msg}")
+            logger.error("Error al obtener balances: %s", error_msg)
             await update.message.reply_text(error_msg)
             # No mostrar el menú aquí, solo informar del error
             return ConversationHandler.END
@@ -158,9 +107,10 @@ async def show_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # y el ID del miembro actual para que aparezca primero
         formatted_balances = Formatters.format_balances(balances, member_names, current_member_id)
         
-        # Mostrar los balances al usuario
+        # Mostrar los balances al usuario, avisando si vienen de una copia antigua
+        stale_notice = Messages.STALE_DATA_NOTICE if ApiService.is_stale(status_code) else ""
         await update.message.reply_text(
-            Messages.BALANCES_HEADER + formatted_balances,
+            Messages.BALANCES_HEADER + stale_notice + formatted_balances,
             parse_mode="Markdown",
             reply_markup=Keyboards.get_main_menu_keyboard()
         )
@@ -170,8 +120,7 @@ async def show_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en show_balances: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en show_balances: %s", e)
         await send_error(update, context, f"Error al mostrar los balances: {str(e)}")
         return ConversationHandler.END
 
@@ -192,11 +141,11 @@ async def mostrar_info_familia(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         # Obtener el ID de la familia del contexto o del usuario
         family_id = ContextManager.get_family_id(context)
-        print(f"Obteniendo información para la familia con ID: {family_id}")
+        logger.debug("Obteniendo información para la familia con ID: %s", family_id)
         
         # Verificar que el usuario pertenece a una familia
         if not family_id:
-            print("No se encontró el ID de familia en el contexto")
+            logger.debug("No se encontró el ID de familia en el contexto")
             await update.message.reply_text(Messages.ERROR_NOT_IN_FAMILY)
             return ConversationHandler.END
         
@@ -204,15 +153,15 @@ async def mostrar_info_familia(update: Update, context: ContextTypes.DEFAULT_TYP
         telegram_id = str(update.effective_user.id)
         
         # Obtener la información de la familia desde la API
-        status_code, family = FamilyService.get_family(family_id, telegram_id)
-        print(f"Respuesta de get_family: status_code={status_code}, family={family}")
+        status_code, family = await FamilyService.get_family(family_id, telegram_id)
+        logger.debug("Respuesta de get_family: status_code=%s, family=%s", status_code, Payload(family))
         
         # Verificar si hubo un error al obtener la información
         if status_code >= 400 or not family:
             error_msg = f"❌ Error al obtener la información de la familia. Código de error: {status_code}"
             if isinstance(family, dict) and "detail" in family:
                 error_msg += f"\nDetalle: {family['detail']}"
-            print(f"Error al obtener información de familia: {error_msg}")
+            logger.error("Error al obtener información de familia: %s", error_msg)
             await update.message.reply_text(error_msg)
             return ConversationHandler.END
         
@@ -230,8 +179,7 @@ async def mostrar_info_familia(update: Update, context: ContextTypes.DEFAULT_TYP
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en mostrar_info_familia: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en mostrar_info_familia: %s", e)
         await send_error(update, context, f"Error al mostrar la información de la familia: {str(e)}")
         return ConversationHandler.END
 
@@ -252,11 +200,11 @@ async def compartir_invitacion(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         # Obtener el ID de la familia del contexto o del usuario
         family_id = ContextManager.get_family_id(context)
-        print(f"Generando invitación para la familia con ID: {family_id}")
+        logger.debug("Generando invitación para la familia con ID: %s", family_id)
         
         # Verificar que el usuario pertenece a una familia
         if not family_id:
-            print("No se encontró el ID de familia en el contexto")
+            logger.debug("No se encontró el ID de familia en el contexto")
             await update.message.reply_text(Messages.ERROR_NOT_IN_FAMILY)
             return ConversationHandler.END
         
@@ -281,7 +229,6 @@ async def compartir_invitacion(update: Update, context: ContextTypes.DEFAULT_TYP
         
     except Exception as e:
         # Manejo de errores inesperados
-        print(f"Error en compartir_invitacion: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error en compartir_invitacion: %s", e)
         await send_error(update, context, f"Error al generar la invitación: {str(e)}")
         return ConversationHandler.END 
\ No newline at end of file
@@ -5,6 +5,7 @@ This module handles the main menu of the bot and processes user selections
 from the menu, routing them to the appropriate handlers.
 """
 
+import asyncio
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 from config import DESCRIPTION, AMOUNT, CONFIRM, SELECT_TO_MEMBER, PAYMENT_AMOUNT, PAYMENT_CONFIRM, LIST_OPTION
@@ -13,8 +14,9 @@ from ui.messages import Messages
 from ui.formatters import Formatters
 from services.expense_service import ExpenseService
 from services.payment_service import PaymentService
-from services.family_service import FamilyService
-from services.member_service import MemberService
+from services.api_service import ApiService
+from services.dashboard_service import DashboardService
+from services.models import MemberBalance
 from utils.context_manager import ContextManager
 from utils.helpers import send_error
 
@@ -24,6 +26,9 @@ from handlers.payment_handler import registrar_pago, listar_pagos
 from handlers.family_handler import show_balances, mostrar_info_familia, compartir_invitacion
 from handlers.edit_handler import show_edit_options
 from handlers.adjustment_handler import start_debt_adjustment
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -40,51 +45,33 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         int: The next conversation state
     """
     try:
-        # Verificar si tenemos datos de familia y miembro
         telegram_id = str(update.effective_user.id)
-        family_id = context.user_data.get("family_id")
         
-        # Si no tenemos el ID de familia, obtenerlo
-        if not family_id:
-            status_code, member = MemberService.get_member(telegram_id)
-            if status_code == 200 and member and member.get("family_id"):
-                family_id = member.get("family_id")
-                context.user_data["family_id"] = family_id
-        
-        # Primero limpiar el teclado para forzar la actualización
-        await update.message.reply_text(
-            "Preparando menú...",
-            reply_markup=Keyboards.remove_keyboard()
+        # Obtener miembro, familia y balances en paralelo mientras se limpia el
+        # teclado para forzar la actualización
+        snapshot, _ = await asyncio.gather(
+            DashboardService.get_snapshot(telegram_id, context.user_data.get("family_id")),
+            update.message.reply_text(
+                "Preparando menú...",
+                reply_markup=Keyboards.remove_keyboard()
+            )
         )
-        
-        # Cargar miembros si no están en el contexto
-        if not context.user_data.get("member_names"):
-            await ContextManager.load_family_members(context, family_id)
+        snapshot.store_in_context(context)
+        family_id = snapshot.family_id
             
         # Obtener balances para mostrar resumen
         message_menu = Messages.MAIN_MENU
         bottom_balance = ""
         
         if family_id:
-            # Obtener los balances del usuario
-            status_code, balances = FamilyService.get_family_balances(family_id, telegram_id)
+            # Balances del usuario obtenidos en el snapshot
+            status_code, balances = snapshot.balances_status, snapshot.balances
             
             if status_code == 200 and balances:
                 member_names = context.user_data.get("member_names", {})
                 
                 # Identificar el ID del miembro actual
-                member_id = None
-                if "family" in context.user_data and "members" in context.user_data["family"]:
-                    for member in context.user_data["family"]["members"]:
-                        if member.get("telegram_id") == telegram_id:
-                            member_id = member.get("id")
-                            break
-                
-                # Si no encontramos el ID de esta manera, buscarlo en la API
-                if not member_id and "family_id" in context.user_data:
-                    status_code, member = MemberService.get_member(telegram_id)
-                    if status_code == 200 and member:
-                        member_id = member.get("id")
+                member_id = snapshot.member_id
                 
                 # Si tenemos el ID del miembro, buscar sus balances
                 if member_id:
@@ -93,27 +80,24 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     
                     # Procesar según el formato de balances
                     if isinstance(balances, list) and len(balances) > 0:
-                        if "member_id" in balances[0]:
-                            # Formato detallado
+                        if isinstance(balances[0], MemberBalance):
+                            # Formato detallado: los IDs ya vienen normalizados
+                            member_id = str(member_id)
                             for balance in balances:
-                                if str(balance.get("member_id")) == str(member_id):
-                                    for debt in balance.get("debts", []):
-                                        to_id = debt.get("to")
-                                        amount = debt.get("amount", 0)
-                                        to_name = member_names.get(str(to_id), f"Usuario {to_id}")
-                                        if amount > 0:
-                                            debts.append({"name": to_name, "amount": amount})
+                                if balance.member_id == member_id:
+                                    for debt in balance.debts:
+                                        to_name = debt.to_name or member_names.get(debt.to_id) or f"Usuario {debt.to_id}"
+                                        if debt.amount_cents > 0:
+                                            debts.append({"name": to_name, "amount": debt.amount})
                                     
-                                    for credit in balance.get("credits", []):
-                                        from_id = credit.get("from")
-                                        amount = credit.get("amount", 0)
-                                        from_name = member_names.get(str(from_id), f"Usuario {from_id}")
-                                        if amount > 0:
-                                            credits.append({"name": from_name, "amount": amount})
+                                    for credit in balance.credits:
+                                        from_name = credit.from_name or member_names.get(credit.from_id) or f"Usuario {credit.from_id}"
+                                        if credit.amount_cents > 0:
+                                            credits.append({"name": from_name, "amount": credit.amount})
                         
                         else:
                             # Formato no reconocido
-                            print(f"Formato de balances no reconocido: {balances}")
+                            logger.debug("Formato de balances no reconocido: %s", Payload(balances))
                             await update.message.reply_text(
                                 "❌ Error: Formato de balances no reconocido. Contacte al administrador."
                             )
@@ -152,6 +136,10 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                 bottom_balance += f"└ Mayor crédito de {credits[0]['name']}: ${credits[0]['amount']:.2f}\n"
                         else:
                             bottom_balance += "💰 *Nadie te debe dinero*\n"
+                        
+                        # Avisar si los balances vienen de una copia antigua
+                        if ApiService.is_stale(status_code):
+                            bottom_balance += "\n" + Messages.STALE_DATA_NOTICE.rstrip("\n")
         
         # Mostrar el mensaje del menú principal con el teclado de opciones y resumen de balance
         await update.message.reply_text(
@@ -164,9 +152,7 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
         
     except Exception as e:
-        print(f"Error en show_main_menu: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en show_main_menu: %s", e)
         
         # En caso de error, mostrar solo el menú básico
     await update.message.reply_text(
@@ -197,9 +183,7 @@ async def show_list_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return LIST_OPTION
     except Exception as e:
-        print(f"Error en show_list_options: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en show_list_options: %s", e)
         
         await update.message.reply_text(
             "Error al mostrar las opciones de listado. Por favor, intenta de nuevo.",
@@ -239,9 +223,7 @@ async def handle_list_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
             return LIST_OPTION
     except Exception as e:
-        print(f"Error en handle_list_option: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en handle_list_option: %s", e)
         
         await update.message.reply_text(
             "Error al procesar la opción seleccionada. Por favor, intenta de nuevo.",
@@ -267,15 +249,15 @@ async def handle_menu_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
     option = update.message.text
     
     # Imprimir la opción para depuración
-    print(f"Opción seleccionada: {option}")
+    logger.debug("Opción seleccionada: %s", option)
     
     # Verificar si ya tenemos el ID de familia en el contexto
     if "family_id" in context.user_data:
         family_id = context.user_data["family_id"]
-        print(f"Ya tenemos el family_id en el contexto: {family_id}")
+        logger.debug("Ya tenemos el family_id en el contexto: %s", family_id)
     else:
         # Si no tenemos el family_id, intentamos obtenerlo
-        print("No tenemos el family_id en el contexto, intentando obtenerlo")
+        logger.debug("No tenemos el family_id en el contexto, intentando obtenerlo")
         telegram_id = str(update.effective_user.id)
         
         # Verificar si el usuario está en una familia
@@ -291,7 +273,7 @@ async def handle_menu_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         # Ya deberíamos tener el family_id en el contexto
         family_id = context.user_data.get("family_id")
-        print(f"Family ID obtenido del contexto: {family_id}")
+        logger.debug("Family ID obtenido del contexto: %s", family_id)
     
     # Procesar la opción seleccionada y redirigir al manejador correspondiente
     if option == "💸 Crear Gasto":
@@ -6,22 +6,30 @@ seleccionar montos, destinatarios y confirmar transacciones.
 """
 
 import re
-import traceback
 from typing import Dict, List, Tuple, Any
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
+from services.api_service import ApiService
 from services.payment_service import PaymentService
 from services.member_service import MemberService
 from services.family_service import FamilyService
+from services.write_retry import WriteRetry
+from services.dashboard_service import DashboardService
+from services.family_directory import FamilyDirectory
+from services.pagination import PageIndex, PAYMENTS, OLDER, NEWER, last_days
 from ui.keyboards import Keyboards
 from ui.messages import Messages
+from ui.formatters import Formatters
 from config import (
     SELECT_TO_MEMBER,
     PAYMENT_AMOUNT,
-    PAYMENT_CONFIRM,
-    logger
+    PAYMENT_CONFIRM
 )
-from utils.helpers import send_error
+from utils.helpers import send_error, make_retry_notifier
+from utils.context_manager import ContextManager
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 # Eliminamos la importación circular
 # from handlers.menu_handler import show_main_menu
@@ -61,13 +69,16 @@ async def registrar_pago(update: Update, context: ContextTypes.DEFAULT_TYPE):
             del context.user_data["payment_data"]
         
         # Inicializar estructura de datos para el pago en el contexto
-        context.user_data["payment_data"] = {}
+        context.user_data["payment_data"] = {
+            "submission_id": WriteRetry.new_submission_id()  # Clave de idempotencia de este pago
+        }
         
         # Obtener el ID de Telegram del usuario actual
         telegram_id = str(update.effective_user.id)
         
-        # Verificar si el usuario pertenece a una familia
-        status_code, member = MemberService.get_member(telegram_id)
+        # Obtener miembro, familia y balances en paralelo
+        snapshot = await DashboardService.get_snapshot(telegram_id, context.user_data.get("family_id"))
+        status_code, member = snapshot.member_status, snapshot.member
         
         # Si el usuario no está en una familia, mostrar error y terminar
         if status_code != 200 or not member or not member.get("family_id"):
@@ -89,8 +100,8 @@ async def registrar_pago(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["payment_data"]["family_id"] = family_id
         context.user_data["payment_data"]["telegram_id"] = telegram_id
         
-        # Obtener todos los miembros de la familia para mostrar opciones de pago
-        status_code, family = FamilyService.get_family(family_id, telegram_id)
+        # Todos los miembros de la familia para mostrar opciones de pago
+        status_code, family = snapshot.family_status, snapshot.family
         
         if status_code != 200 or not family:
             # Si hay error al obtener la familia, mostrar mensaje y terminar
@@ -116,8 +127,8 @@ async def registrar_pago(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await _show_menu(update, context)
             return ConversationHandler.END
         
-        # Obtener los balances de la familia
-        status_code, balances = FamilyService.get_family_balances(family_id, telegram_id)
+        # Balances de la familia
+        status_code, balances = snapshot.balances_status, snapshot.balances
         
         # Crear diccionarios para mapear miembros a sus saldos
         balances_dict = {}  # Lo que otros te deben a ti
@@ -630,14 +641,32 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return ConversationHandler.END
             
             # Crear el pago a través del servicio
-            print(f"Creando pago: from={from_member_id}, to={to_member_id}, amount={amount}, telegram_id={telegram_id}")
-            status_code, response_data = PaymentService.create_payment(
+            logger.debug("Creando pago: from=%s, to=%s, amount=%s, telegram_id=%s", from_member_id, to_member_id, amount, telegram_id)
+            status_code, response_data = await PaymentService.create_payment(
                 from_member=from_member_id,
                 to_member=to_member_id,
                 amount=amount,
-                telegram_id=telegram_id
+                family_id=family_id,
+                telegram_id=telegram_id,
+                submission_id=payment_data.get("submission_id"),
+                on_retry_result=make_retry_notifier(
+                    context,
+                    update.effective_chat.id,
+                    Messages.SUCCESS_PAYMENT_CREATED,
+                    Messages.ERROR_CREATING_PAYMENT
+                )
             )
             
+            # Si la API no responde, el pago se reintenta en segundo plano
+            if WriteRetry.is_queued(status_code, response_data):
+                await update.message.reply_text(
+                    Messages.WRITE_QUEUED,
+                    reply_markup=Keyboards.get_main_menu_keyboard()
+                )
+                if "payment_data" in context.user_data:
+                    del context.user_data["payment_data"]
+                return ConversationHandler.END
+            
             if status_code in [200, 201]:
                 # Obtener información sobre el estado del pago
                 payment_status = response_data.get("status", "PENDING")
@@ -666,24 +695,24 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         if isinstance(from_member_id, dict) and "id" in from_member_id:
                             actual_member_id = from_member_id["id"]
                             from_member_name = from_member_id.get("name", "")
-                            print(f"from_member_id es un objeto completo, extrayendo id: {actual_member_id}")
+                            logger.debug("from_member_id es un objeto completo, extrayendo id: %s", actual_member_id)
                         else:
                             actual_member_id = from_member_id
                             
                         # Usar el ID real para la consulta API si aún necesitamos el nombre
                         if not from_member_name:
-                            status_code, from_member_data = MemberService.get_member_by_id(actual_member_id)
+                            status_code, from_member_data = await MemberService.get_member_by_id(actual_member_id)
                             if status_code == 200 and from_member_data:
                                 from_member_name = from_member_data.get("name", "")
-                                print(f"Nombre obtenido del API: {from_member_name}")
+                                logger.debug("Nombre obtenido del API: %s", from_member_name)
                     
                     # Si aún no tenemos un nombre, usar un valor por defecto
                     if not from_member_name:
                         from_member_name = "Usuario"
-                        print("No se pudo obtener el nombre del remitente, usando valor por defecto")
+                        logger.debug("No se pudo obtener el nombre del remitente, usando valor por defecto")
                     
                     # Obtener información del destinatario para enviar la notificación
-                    print(f"Obteniendo datos del miembro receptor con ID: {to_member_id}")
+                    logger.debug("Obteniendo datos del miembro receptor con ID: %s", to_member_id)
                     to_member_data = None
                     to_telegram_id = None
                     to_member_name = None
@@ -691,7 +720,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     # ESTRATEGIA 1: Verificar primero la caché de nombres
                     if "member_names" in context.user_data and str(to_member_id) in context.user_data["member_names"]:
                         to_member_name = context.user_data["member_names"][str(to_member_id)]
-                        print(f"Nombre del receptor encontrado en caché: {to_member_name}")
+                        logger.debug("Nombre del receptor encontrado en caché: %s", to_member_name)
                     
                     # ESTRATEGIA 2: Buscar en los datos de la familia (si ya los tenemos cargados)
                     if "family" in context.user_data and "members" in context.user_data["family"]:
@@ -700,12 +729,12 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                 to_member_data = member
                                 to_telegram_id = member.get("telegram_id")
                                 to_member_name = member.get("name", to_member_name)
-                                print(f"Información del receptor encontrada en familia en caché: {to_member_name}, ID: {to_telegram_id}")
+                                logger.debug("Información del receptor encontrada en familia en caché: %s, ID: %s", to_member_name, to_telegram_id)
                                 break
                     
                     # ESTRATEGIA 3: Consultar la API para obtener los datos del miembro
                     if not to_telegram_id:
-                        print(f"Consultando API para obtener información del receptor con ID: {to_member_id}")
+                        logger.debug("Consultando API para obtener información del receptor con ID: %s", to_member_id)
                         token = context.user_data.get("token")
                         
                         # Verificar si to_member_id es un objeto y extraer el ID real
@@ -713,29 +742,31 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                             actual_to_id = to_member_id["id"]
                             to_member_name = to_member_id.get("name", "")
                             to_telegram_id = to_member_id.get("telegram_id")
-                            print(f"to_member_id es un objeto completo, extrayendo id: {actual_to_id}")
+                            logger.debug("to_member_id es un objeto completo, extrayendo id: %s", actual_to_id)
                         else:
                             actual_to_id = to_member_id
                         
                         # Solo consultar API si necesitamos más datos
                         if not to_telegram_id or not to_member_name:
-                            status_code, member_response = MemberService.get_member_by_id(actual_to_id, token)
-                            print(f"Respuesta de API: status_code={status_code}, data={member_response}")
+                            status_code, member_response = await MemberService.get_member_by_id(actual_to_id, token)
+                            logger.debug("Respuesta de API: status_code=%s, data=%s", status_code, Payload(member_response))
                             
                             if status_code == 200 and member_response:
                                 to_member_data = member_response
                                 to_telegram_id = member_response.get("telegram_id")
                                 to_member_name = member_response.get("name", to_member_name)
-                                print(f"Información obtenida de API: {to_member_name}, ID: {to_telegram_id}")
+                                logger.debug("Información obtenida de API: %s, ID: %s", to_member_name, to_telegram_id)
                     
                     # ESTRATEGIA 4: Si no lo encontramos, obtener todos los miembros de la familia
                     if not to_telegram_id and family_id:
-                        print(f"Último intento: obteniendo todos los miembros de la familia {family_id}")
-                        status_code, family = FamilyService.get_family(family_id)
+                        logger.debug("Último intento: obteniendo todos los miembros de la familia %s", family_id)
+                        status_code, family = await FamilyService.get_family(family_id)
                         
                         if status_code == 200 and family and "members" in family:
-                            # Guardar familia en contexto para futuras búsquedas
-                            context.user_data["family"] = family
+                            # Enlazar el registro compartido de la familia para futuras búsquedas
+                            family_record = FamilyDirectory.get(family_id)
+                            if family_record is not None:
+                                ContextManager.attach_family(context, family_record)
                             
                             # Buscar el miembro en la lista
                             for member in family.get("members", []):
@@ -743,20 +774,15 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                     to_member_data = member
                                     to_telegram_id = member.get("telegram_id")
                                     to_member_name = member.get("name", "")
-                                    print(f"Miembro encontrado en familia completa: {to_member_name}, ID: {to_telegram_id}")
-                                    
-                                    # Actualizar caché de nombres
-                                    if "member_names" not in context.user_data:
-                                        context.user_data["member_names"] = {}
-                                    context.user_data["member_names"][str(to_member_id)] = to_member_name
+                                    logger.debug("Miembro encontrado en familia completa: %s, ID: %s", to_member_name, to_telegram_id)
                                     break
                     
                     if to_member_data or to_member_name:
-                        print(f"ID de Telegram del receptor: '{to_telegram_id}', Nombre: '{to_member_name}'")
+                        logger.debug("ID de Telegram del receptor: '%s', Nombre: '%s'", to_telegram_id, to_member_name)
                         
                         # Verificar que el ID de Telegram es válido
                         if not to_telegram_id:
-                            print("Error: El receptor no tiene un ID de Telegram válido")
+                            logger.error("Error: El receptor no tiene un ID de Telegram válido")
                             await update.message.reply_text(
                                 f"✅ Pago registrado correctamente, pero no se pudo notificar a {to_member_name} porque no tiene un ID de Telegram válido.\n\n" +
                                 f"Para arreglar esto, {to_member_name} debe:\n" +
@@ -765,7 +791,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                 parse_mode="Markdown"
                             )
                         elif to_telegram_id == telegram_id:
-                            print("El remitente y el receptor son el mismo usuario, omitiendo notificación")
+                            logger.debug("El remitente y el receptor son el mismo usuario, omitiendo notificación")
                         else:
                             # Formatear fecha si está disponible
                             import datetime
@@ -821,15 +847,15 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                             
                             # Enviar notificación al receptor del pago
                             try:
-                                print(f"Intentando enviar notificación a {to_member_name} (ID: {to_telegram_id})")
+                                logger.debug("Intentando enviar notificación a %s (ID: %s)", to_member_name, to_telegram_id)
                                 
                                 # Intentar convertir el ID a entero si es posible (Telegram espera IDs numéricos)
                                 try:
                                     numeric_telegram_id = int(to_telegram_id)
-                                    print(f"ID convertido a formato numérico: {numeric_telegram_id}")
+                                    logger.debug("ID convertido a formato numérico: %s", numeric_telegram_id)
                                     to_telegram_id = numeric_telegram_id
                                 except (ValueError, TypeError):
-                                    print(f"No se pudo convertir el ID a formato numérico, usando el valor original: {to_telegram_id}")
+                                    logger.debug("No se pudo convertir el ID a formato numérico, usando el valor original: %s", to_telegram_id)
                                 
                                 # Enviar el mensaje
                                 await context.bot.send_message(
@@ -838,7 +864,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                     parse_mode="Markdown",
                                     reply_markup=reply_markup
                                 )
-                                print(f"✅ Notificación enviada exitosamente a {to_member_name} (ID: {to_telegram_id})")
+                                logger.debug("✅ Notificación enviada exitosamente a %s (ID: %s)", to_member_name, to_telegram_id)
                                 
                                 # Informar al pagador que la notificación se envió
                                 await update.message.reply_text(
@@ -847,7 +873,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                 )
                             except Exception as e:
                                 error_msg = str(e)
-                                print(f"❌ Error al enviar notificación: {error_msg}")
+                                logger.error("❌ Error al enviar notificación: %s", error_msg)
                                 
                                 # Informar al pagador sobre el problema
                                 if "bot was blocked by the user" in error_msg:
@@ -872,7 +898,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                         parse_mode="Markdown"
                                     )
                     else:
-                        print(f"❌ No se pudo obtener información del receptor: {to_member_id}")
+                        logger.error("❌ No se pudo obtener información del receptor: %s", to_member_id)
                         await update.message.reply_text(
                             f"⚠️ El pago fue registrado, pero no se pudo notificar al receptor porque no se encontró su información.\n\n" +
                             f"ID del miembro: {to_member_id}\n\n" +
@@ -884,8 +910,7 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         )
                 
                 except Exception as e:
-                    print(f"❌ Error general al enviar notificación de pago: {str(e)}")
-                    traceback.print_exc()
+                    logger.exception("❌ Error general al enviar notificación de pago: %s", e)
                     await update.message.reply_text(
                         "⚠️ El pago fue registrado correctamente, pero ocurrió un error al notificar al receptor.",
                         parse_mode="Markdown"
@@ -970,12 +995,81 @@ async def confirm_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await send_error(update, context, f"Error al confirmar el pago: {str(e)}")
         return ConversationHandler.END
     
+def _format_payment_item(payment, member_names):
+    """
+    Formatea un pago de la lista de pagos.
+    
+    Args:
+        payment (Payment): El pago
+        member_names (dict): ID de miembro a nombre
+        
+    Returns:
+        str: El pago formateado
+    """
+    # Los miembros del pago ya vienen como registros Member con el ID normalizado
+    from_member, to_member = payment.from_member, payment.to_member
+    from_name = from_member.name or member_names.get(from_member.id) or f"Usuario {from_member.id}"
+    to_name = to_member.name or member_names.get(to_member.id) or f"Usuario {to_member.id}"
+    
+    # Formatear la información del pago
+    return Messages.PAYMENT_LIST_ITEM.format(
+        id=payment.id,
+        from_member=from_name,
+        to_member=to_name,
+        amount=f"${payment.amount:.2f}",
+        date=Formatters.format_timestamp(payment.created_ts, with_time=True)
+    )
+
+async def _week_summary(family_id, telegram_id):
+    """
+    Resume los pagos de los últimos 7 días.
+    
+    Args:
+        family_id (str): ID de la familia
+        telegram_id (str): ID de Telegram del usuario
+        
+    Returns:
+        str: La línea de resumen, o una cadena vacía si no está disponible
+    """
+    since, until = last_days(7)
+    status_code, payments = await PaymentService.get_family_payments_between(family_id, telegram_id, since, until)
+    if status_code != 200:
+        return ""
+    return Messages.PAYMENTS_WEEK_SUMMARY.format(
+        count=len(payments),
+        amount=f"${sum(payment.amount_cents for payment in payments) / 100:.2f}"
+    )
+
+def _render_payments_page(page, member_names, summary="", stale=False):
+    """
+    Construye el texto y los botones de navegación de una página de pagos.
+    
+    Args:
+        page (Page): La página, con el pago más reciente primero
+        member_names (dict): ID de miembro a nombre
+        summary (str, opcional): Línea de resumen bajo el encabezado
+        stale (bool, opcional): True si la lista puede estar desactualizada
+        
+    Returns:
+        tuple: (texto del mensaje, InlineKeyboardMarkup o None)
+    """
+    message_text = Messages.PAYMENTS_LIST_HEADER + (Messages.STALE_DATA_NOTICE if stale else "") + summary
+    for payment in page.records:
+        message_text += _format_payment_item(payment, member_names)
+    message_text += Messages.PAGE_FOOTER.format(first=page.first, last=page.last, total=page.total)
+    
+    keyboard = Keyboards.get_page_keyboard(
+        PageIndex.callback_data(PAYMENTS, NEWER, page.newest_cursor) if page.has_newer else None,
+        PageIndex.callback_data(PAYMENTS, OLDER, page.oldest_cursor) if page.has_older else None
+    )
+    return message_text, keyboard
+
 async def listar_pagos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Muestra la lista de pagos de la familia.
     
-    Esta función recupera todos los pagos de la familia actual y los muestra
-    al usuario en un formato ordenado.
+    Esta función muestra la página más reciente de pagos de la familia actual,
+    con botones para navegar a los pagos más antiguos.
     
     Args:
         update (Update): Objeto Update de Telegram
@@ -999,7 +1093,7 @@ async def listar_pagos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Si no tenemos el ID de familia en el contexto, intentar obtenerlo desde la API
         if not family_id:
-            status_code, member = MemberService.get_member(telegram_id)
+            status_code, member = await MemberService.get_member(telegram_id)
             if status_code == 200 and member and member.get("family_id"):
                 family_id = member.get("family_id")
                 context.user_data["family_id"] = family_id
@@ -1010,197 +1104,119 @@ async def listar_pagos(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return ConversationHandler.END
         
-        # Obtener los pagos de la familia
-        status_code, payments = PaymentService.get_family_payments(family_id)
+        # Obtener la página más reciente de pagos de la familia
+        status_code, page = await PageIndex.page(
+            PAYMENTS, family_id, lambda: PaymentService.get_family_payments(family_id, telegram_id)
+        )
+        stale = ApiService.is_stale(status_code)
         
         # Si hubo un error al obtener los pagos, mostrar mensaje de error
-        if status_code != 200 or not payments:
-            error_message = payments.get("error", "Error desconocido") if isinstance(payments, dict) else "No se encontraron pagos"
-            try:
-                await message.edit_text(
-                    Messages.ERROR_NO_PAYMENTS,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
-            except Exception as edit_error:
-                # Si hay un error al editar el mensaje, enviamos uno nuevo
-                await update.message.reply_text(
-                    Messages.ERROR_NO_PAYMENTS,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
-            return ConversationHandler.END
-        
-        # Verificar si hay pagos para mostrar
-        if len(payments) == 0:
+        if status_code != 200:
             try:
-                await message.edit_text(
-                    Messages.NO_PAYMENTS,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
+                await message.edit_text(Messages.ERROR_NO_PAYMENTS)
             except Exception as edit_error:
                 # Si hay un error al editar el mensaje, enviamos uno nuevo
-                await update.message.reply_text(
-                    Messages.NO_PAYMENTS,
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
+                await update.message.reply_text(Messages.ERROR_NO_PAYMENTS)
+            await _show_menu(update, context)
             return ConversationHandler.END
         
-        # Cargar los nombres de los miembros si no están en el contexto
-        member_names = context.user_data.get("member_names", {})
-        if not member_names:
-            # Cargar los nombres de los miembros desde la API
-            status_code, family = FamilyService.get_family(family_id, telegram_id)
-            if status_code == 200 and family and "members" in family:
-                # Crear un diccionario para mapear IDs a nombres de miembros
-                for member in family.get("members", []):
-                    member_id = member.get("id")
-                    member_name = member.get("name", f"Usuario {member_id}")
-                    # Guardar tanto como string como de forma numérica si corresponde
-                    member_names[str(member_id)] = member_name
-                    if isinstance(member_id, (int, float)) or (isinstance(member_id, str) and member_id.isdigit()):
-                        member_names[int(member_id) if isinstance(member_id, str) else member_id] = member_name
-                
-                # Guardar en el contexto para uso futuro
-                context.user_data["member_names"] = member_names
-        
-        # Construir mensaje con la lista de pagos
-        message_text = Messages.PAYMENTS_LIST_HEADER
-        
-        # Ordenar pagos por fecha (más recientes primero)
-        from datetime import datetime, timedelta
-        import pytz
-        
-        # Obtener la fecha actual con zona horaria
-        now = datetime.now(pytz.UTC)
-        # Calcular la fecha de una semana atrás
-        one_week_ago = now - timedelta(days=7)
-        
-        # Intentamos ordenar por fecha si está disponible
-        try:
-            # Filtrar y ordenar pagos
-            filtered_payments = []
-            for payment in payments:
-                created_at = payment.get("created_at", "")
-                if created_at:
-                    try:
-                        # Convertir la fecha de creación a objeto datetime con zona horaria
-                        payment_date = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                        # Verificar si el pago es de la última semana
-                        if payment_date >= one_week_ago:
-                            filtered_payments.append(payment)
-                    except (ValueError, AttributeError):
-                        # Si hay un error al procesar la fecha, incluir el pago por defecto
-                        filtered_payments.append(payment)
-            
-            # Ordenar los pagos filtrados
-            sorted_payments = sorted(
-                filtered_payments, 
-                key=lambda x: datetime.fromisoformat(x.get("created_at").replace("Z", "+00:00")), 
-                reverse=True
-            )
-        except (AttributeError, ValueError):
-            # Si hay un error al ordenar, usar la lista filtrada
-            sorted_payments = filtered_payments if 'filtered_payments' in locals() else payments
-        
-        # Si no hay pagos después del filtrado, mostrar mensaje
-        if len(sorted_payments) == 0:
+        # Si no hay pagos, mostrar mensaje
+        if not page.records:
             try:
-                await message.edit_text(
-                    "No hay pagos registrados en la última semana.",
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
+                await message.edit_text(Messages.NO_PAYMENTS)
             except Exception as edit_error:
-                await update.message.reply_text(
-                    "No hay pagos registrados en la última semana.",
-                    reply_markup=Keyboards.get_main_menu_keyboard()
-                )
+                await update.message.reply_text(Messages.NO_PAYMENTS)
+            await _show_menu(update, context)
             return ConversationHandler.END
         
-        # Construir mensaje con la lista de pagos
-        message_text = Messages.PAYMENTS_LIST_HEADER
-        
-        # Construir el mensaje con los pagos
-        for payment in sorted_payments:
-            # Los miembros ahora son objetos completos, no solo IDs
-            from_member = payment.get("from_member", {})
-            to_member = payment.get("to_member", {})
-            
-            # Obtener información del miembro que realiza el pago
-            from_id = from_member.get("id") if isinstance(from_member, dict) else from_member
-            
-            # Intentar obtener el nombre de diferentes formas
-            from_name = None
-            if isinstance(from_member, dict) and "name" in from_member:
-                from_name = from_member.get("name")
-            elif str(from_id) in member_names:
-                from_name = member_names[str(from_id)]
-            elif from_id in member_names:
-                from_name = member_names[from_id]
-            
-            # Si aún no tenemos nombre, usar un valor por defecto
-            if not from_name:
-                from_name = f"Usuario {from_id}"
-            
-            # Obtener información del miembro que recibe el pago
-            to_id = to_member.get("id") if isinstance(to_member, dict) else to_member
-            
-            # Intentar obtener el nombre de diferentes formas
-            to_name = None
-            if isinstance(to_member, dict) and "name" in to_member:
-                to_name = to_member.get("name")
-            elif str(to_id) in member_names:
-                to_name = member_names[str(to_id)]
-            elif to_id in member_names:
-                to_name = member_names[to_id]
-            
-            # Si aún no tenemos nombre, usar un valor por defecto
-            if not to_name:
-                to_name = f"Usuario {to_id}"
-            
-            amount = payment.get("amount", 0)
-            date = payment.get("created_at", "Fecha desconocida")
-            
-            # Formatear la fecha si es posible
-            try:
-                date_obj = datetime.fromisoformat(date.replace("Z", "+00:00"))
-                formatted_date = date_obj.strftime("%d/%m/%Y %H:%M")
-            except (ValueError, AttributeError):
-                formatted_date = date
-            
-            # Añadir este pago al mensaje
-            message_text += Messages.PAYMENT_LIST_ITEM.format(
-                id=payment.get("id", "ID desconocido"),
-                from_member=from_name,
-                to_member=to_name,
-                amount=f"${amount:.2f}",
-                date=formatted_date
-            )
-        
-        # Añadir mensaje con el total de pagos encontrados
-        message_text += f"\n_Mostrando {len(sorted_payments)} pagos de la última semana._"
-        
-        # Mostrar el mensaje con la lista de pagos
+        # Obtener los nombres de los miembros del directorio compartido de familias
+        member_names = {}
+        status_code, family_record = await FamilyService.get_family_record(family_id, telegram_id)
+        if status_code == 200:
+            ContextManager.attach_family(context, family_record)
+            member_names = family_record.member_names
+        
+        # Mostrar la página de pagos con el resumen de la semana y los botones
+        # de navegación
+        summary = await _week_summary(family_id, telegram_id)
+        message_text, keyboard = _render_payments_page(page, member_names, summary, stale)
         try:
             await message.edit_text(
                 message_text,
-                reply_markup=Keyboards.get_main_menu_keyboard(),
+                reply_markup=keyboard,
                 parse_mode="Markdown"
             )
         except Exception as edit_error:
             # Si hay un error al editar el mensaje, enviamos uno nuevo
             await update.message.reply_text(
                 message_text,
-                reply_markup=Keyboards.get_main_menu_keyboard(),
+                reply_markup=keyboard,
                 parse_mode="Markdown"
             )
         
+        # Restaurar el teclado del menú principal
+        await _show_menu(update, context)
         return ConversationHandler.END
         
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Error al mostrar los pagos: %s", e)
         await send_error(update, context, f"Error al mostrar los pagos: {str(e)}")
         await _show_menu(update, context)
         return ConversationHandler.END
 
+async def navegar_pagos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Gestiona los botones "◀" / "▶" de la lista de pagos.
+    
+    El mensaje de la lista se edita con la página pedida.
+    
+    Args:
+        update (Update): Objeto Update de Telegram
+        context (ContextTypes.DEFAULT_TYPE): Contexto de Telegram
+    """
+    query = update.callback_query
+    await query.answer()
+    
+    parsed = PageIndex.parse_callback(query.data)
+    if parsed is None:
+        return
+    _, direction, cursor = parsed
+    
+    try:
+        telegram_id = str(update.effective_user.id)
+        family_id = context.user_data.get("family_id")
+        if not family_id:
+            status_code, member = await MemberService.get_member(telegram_id)
+            if status_code != 200 or not member or not member.get("family_id"):
+                await query.edit_message_text(Messages.ERROR_NOT_IN_FAMILY)
+                return
+            family_id = member["family_id"]
+            context.user_data["family_id"] = family_id
+        
+        status_code, page = await PageIndex.page(
+            PAYMENTS, family_id, lambda: PaymentService.get_family_payments(family_id, telegram_id),
+            cursor=cursor, direction=direction
+        )
+        stale = ApiService.is_stale(status_code)
+        if status_code != 200:
+            await query.edit_message_text(Messages.ERROR_NO_PAYMENTS)
+            return
+        if not page.records:
+            await query.edit_message_text(Messages.NO_PAYMENTS)
+            return
+        
+        member_names = {}
+        status_code, family_record = await FamilyService.get_family_record(family_id, telegram_id)
+        if status_code == 200:
+            ContextManager.attach_family(context, family_record)
+            member_names = family_record.member_names
+        
+        summary = await _week_summary(family_id, telegram_id) if not page.has_newer else ""
+        message_text, keyboard = _render_payments_page(page, member_names, summary, stale)
+        await query.edit_message_text(message_text, parse_mode="Markdown", reply_markup=keyboard)
+    except Exception as e:
+        logger.exception("Error en navegar_pagos: %s", e)
+
 # Función para forzar la actualización del teclado
 async def update_keyboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
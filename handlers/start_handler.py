@@ -7,14 +7,17 @@ family creation, joining existing families, and deep link processing.
 
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from config import ASK_FAMILY_CODE, ASK_FAMILY_NAME, ASK_USER_NAME, JOIN_FAMILY_CODE, logger
+from config import ASK_FAMILY_CODE, ASK_FAMILY_NAME, ASK_USER_NAME, JOIN_FAMILY_CODE
 from ui.keyboards import Keyboards
 from ui.messages import Messages
 from services.family_service import FamilyService
 from services.member_service import MemberService
+from services.family_directory import FamilyDirectory
 from utils.helpers import create_qr_code, parse_deep_link, send_error
 from utils.context_manager import ContextManager
-import traceback
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
 async def _show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -61,7 +64,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         logger.info(f"[START] Mostrando mensaje de bienvenida y teclado de inicio al usuario {user_id}")
         keyboard = Keyboards.get_start_keyboard()
-        logger.debug(f"[START] Botones del teclado de inicio: {keyboard.keyboard}")
+        logger.debug("[START] Botones del teclado de inicio: %s", keyboard.keyboard)
             
         await update.message.reply_text(
             Messages.WELCOME,
@@ -166,7 +169,7 @@ async def create_family_with_names(update: Update, context: ContextTypes.DEFAULT
         logger.info(f"[CREATE_FAMILY_WITH_NAMES] Creando familia '{family_name}' con usuario '{user_name}' (telegram_id: {telegram_id})")
         
         # Crear la familia con el miembro inicial
-        status_code, response = FamilyService.create_family(
+        status_code, response = await FamilyService.create_family(
             name=family_name,
             members=[{
                 "name": user_name,
@@ -211,11 +214,11 @@ async def create_family_with_names(update: Update, context: ContextTypes.DEFAULT
             ]
         }
         
-        # Crear diccionario de nombres de miembros
-        member_id = response.get("member_id", "")
-        context.user_data["member_names"] = {
-            str(member_id): user_name
-        }
+        # Registrar la familia en el directorio compartido y enlazarla en el contexto
+        # (si la API no devolvió el ID del miembro, se cargará más adelante)
+        if response.get("member_id"):
+            family_record = FamilyDirectory.update(family_id, context.user_data["family_info"]["members"], family_name)
+            ContextManager.attach_family(context, family_record)
         
         # Enviar mensaje de éxito con el ID
         logger.info(f"[CREATE_FAMILY_WITH_NAMES] Enviando mensaje de éxito para familia '{family_name}' (ID: {family_id})")
@@ -239,8 +242,7 @@ async def create_family_with_names(update: Update, context: ContextTypes.DEFAULT
         await show_main_menu(update, context)
 
     except Exception as e:
-        logger.error(f"[CREATE_FAMILY_WITH_NAMES] Error para usuario {user_id}: {str(e)}")
-        traceback.print_exc()
+        logger.exception("[CREATE_FAMILY_WITH_NAMES] Error para usuario %s: %s", user_id, e)
         await send_error(update, context, str(e))
         # No limpiar el contexto para poder depurar
         # context.user_data.clear()
@@ -270,7 +272,7 @@ async def join_family(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Verificar si la familia existe
         logger.info(f"[JOIN_FAMILY] Verificando si existe la familia con ID: {family_id}")
-        status_code, response = FamilyService.get_family(family_id)
+        status_code, response = await FamilyService.get_family(family_id)
         
         logger.info(f"[JOIN_FAMILY] Respuesta de get_family: status_code={status_code}, response={response}")
         
@@ -298,7 +300,7 @@ async def join_family(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         logger.info(f"[JOIN_FAMILY] Añadiendo usuario {telegram_id} ({user_name}) a la familia {family_id}")
         
-        status_code, add_response = FamilyService.add_member_to_family(
+        status_code, add_response = await FamilyService.add_member_to_family(
             family_id=family_id,
             telegram_id=telegram_id,
             name=user_name
@@ -348,10 +350,10 @@ async def handle_deep_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
             telegram_id = str(update.effective_user.id)
             user_name = update.effective_user.first_name
             
-            print(f"Procesando enlace de invitación para unirse a la familia {family_id}. Usuario: {user_name} ({telegram_id})")
+            logger.debug("Procesando enlace de invitación para unirse a la familia %s. Usuario: %s (%s)", family_id, user_name, telegram_id)
             
             # Verificar si el usuario ya está en una familia
-            status_code, member = MemberService.get_member(telegram_id)
+            status_code, member = await MemberService.get_member(telegram_id)
             
             if status_code == 200 and member and member.get("family_id"):
                 existing_family_id = member.get("family_id")
@@ -377,7 +379,7 @@ async def handle_deep_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     return await _show_menu(update, context)
             
             # Verificar si la familia existe
-            status_code, response = FamilyService.get_family(family_id)
+            status_code, response = await FamilyService.get_family(family_id)
             
             if status_code == 404:
                 await update.message.reply_text(
@@ -401,7 +403,7 @@ async def handle_deep_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
                 
             # Agregar al usuario a la familia
-            status_code, add_response = FamilyService.add_member_to_family(
+            status_code, add_response = await FamilyService.add_member_to_family(
                 family_id=family_id,
                 telegram_id=telegram_id,
                 name=user_name
@@ -435,8 +437,7 @@ async def handle_deep_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await _show_menu(update, context)
             
         except Exception as e:
-            print(f"Error al procesar el enlace de invitación: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error al procesar el enlace de invitación: %s", e)
             await send_error(update, context, f"Error al procesar la invitación: {str(e)}")
             await update.message.reply_text(
                 "Por favor, intenta unirte a la familia manualmente o solicita un nuevo enlace de invitación.",
@@ -2,13 +2,21 @@
 Health Check Module
 
 This module provides a simple HTTP server for health checks.
-It is used by Render to verify that the application is running correctly.
+It is used by Render to verify that the application is running correctly,
+and exposes the backend API metrics as JSON under /metrics. The port is public,
+so /metrics requires the METRICS_TOKEN bearer token and is disabled without it.
 """
 
+import hmac
 import http.server
+import json
 import socketserver
 import threading
-from config import logger
+from config import METRICS_TOKEN
+from services.metrics import ApiMetrics
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
 # Define the port to listen on
 PORT = 10000
@@ -24,6 +32,20 @@ class HealthCheckHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Content-type', 'text/plain')
             self.end_headers()
             self.wfile.write(b'OK')
+        elif self.path == '/metrics' and METRICS_TOKEN:
+            if not self._authorized():
+                self.send_response(401)
+                self.send_header('Content-type', 'text/plain')
+                self.send_header('WWW-Authenticate', 'Bearer')
+                self.end_headers()
+                self.wfile.write(b'Unauthorized')
+                return
+            # Return the backend API metrics as JSON
+            body = json.dumps(ApiMetrics.get_snapshot()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
         else:
             # Return 404 for other paths
             self.send_response(404)
@@ -31,6 +53,14 @@ class HealthCheckHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b'Not Found')
     
+    def _authorized(self):
+        """Check the bearer token of a /metrics request."""
+        header = self.headers.get('Authorization', '')
+        scheme, _, token = header.partition(' ')
+        if scheme.lower() != 'bearer':
+            return False
+        return hmac.compare_digest(token.strip().encode('utf-8'), METRICS_TOKEN.encode('utf-8'))
+
     def log_message(self, format, *args):
         """Override to use our logger instead of printing to stderr."""
         logger.info("%s - - [%s] %s" %
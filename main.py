@@ -8,11 +8,14 @@ register payments, and view balances between family members.
 
 import os
 import sys
+from telegram import Update
 from telegram.ext import (
     Application, 
     CommandHandler, 
     MessageHandler, 
     ConversationHandler,
+    CallbackQueryHandler,
+    TypeHandler,
     filters
 )
 from config import (
@@ -35,9 +38,10 @@ from config import (
     EDIT_EXPENSE_AMOUNT,
     LIST_OPTION,
     SELECT_CREDIT,
-    ADJUSTMENT_AMOUNT,
     ADJUSTMENT_CONFIRM,
-    logger
+    PERSISTENCE_ENABLED,
+    PERSISTENCE_PATH,
+    PERSISTENCE_UPDATE_INTERVAL
 )
 from handlers.start_handler import (
     start, 
@@ -63,7 +67,8 @@ from handlers.expense_handler import (
     show_expense_confirmation,
     confirm_expense,
     crear_gasto,
-    listar_gastos
+    listar_gastos,
+    navegar_gastos
 )
 from handlers.payment_handler import (
     select_to_member,
@@ -72,7 +77,8 @@ from handlers.payment_handler import (
     confirm_payment,
     registrar_pago,
     update_keyboard,
-    listar_pagos
+    listar_pagos,
+    navegar_pagos
 )
 from handlers.family_handler import (
     show_balances,
@@ -91,13 +97,22 @@ from handlers.edit_handler import (
 from handlers.adjustment_handler import (
     start_debt_adjustment,
     handle_credit_selection,
-    handle_adjustment_amount,
     handle_adjustment_confirmation,
     cancel as adjustment_cancel
 )
 from handlers.callback_handler import payment_callback_handler
+from handlers.admin_handler import show_metrics
 from utils.error_handler import register_error_handlers
+from services.http_client import HttpClient
+from services.warmup_service import WarmupService
+from services.ledger import Ledger
+from services.pagination import PageIndex, EXPENSES, PAYMENTS
+from utils.sqlite_persistence import SQLitePersistence
+from utils.memory_manager import MemoryManager
 from health_check import start_health_check_server
+from services.log import get_logger, LogPipeline
+
+logger = get_logger(__name__)
 
 # Importar la función para verificar instancias duplicadas
 # Primero intentamos importar el verificador específico para Render
@@ -119,6 +134,33 @@ except ImportError as e:
     has_instance_checker = False
     is_render_checker = False
 
+async def start_background_tasks(application: Application):
+    """
+    Starts the background tasks once the application is initialized.
+    
+    The local ledger is opened first; the cache warm-up runs in the background,
+    so polling starts right away.
+    
+    Args:
+        application (Application): The telegram bot application
+    """
+    await Ledger.open()
+    MemoryManager.start(application)
+    WarmupService.start(application)
+
+async def close_api_clients(application: Application):
+    """
+    Stops the background tasks and closes the pooled API connections when the
+    application shuts down.
+    
+    Args:
+        application (Application): The telegram bot application
+    """
+    await WarmupService.stop()
+    await MemoryManager.stop()
+    await Ledger.close()
+    await HttpClient.close()
+
 def main():
     """
     Main function that initializes and starts the Telegram bot.
@@ -132,6 +174,9 @@ def main():
     
     The bot uses a conversation-based approach to guide users through different processes.
     """
+    # Escribir los logs desde un hilo en segundo plano
+    LogPipeline.start()
+    
     # Verificar si hay instancias duplicadas del bot
     if has_instance_checker:
         logger.info("Verificando instancias duplicadas del bot...")
@@ -151,17 +196,34 @@ def main():
     
     # Crear la aplicación
     logger.info("Starting Financial Bot for Telegram")
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(start_background_tasks)
+        .post_shutdown(close_api_clients)
+    )
+    if PERSISTENCE_ENABLED:
+        # Conversaciones y user_data sobreviven a reinicios y redeploys
+        builder = builder.persistence(SQLitePersistence(PERSISTENCE_PATH, update_interval=PERSISTENCE_UPDATE_INTERVAL))
+    application = builder.build()
     
     # Register global error handler
     register_error_handlers(application)
     
     # REESTRUCTURACIÓN COMPLETA DE HANDLERS
     
+    # Registrar la actividad de cada usuario antes que cualquier otro handler
+    application.add_handler(TypeHandler(Update, MemoryManager.touch), group=-1)
+    
     # Comandos básicos que deben estar siempre disponibles
     application.add_handler(CommandHandler("menu", show_main_menu))
     application.add_handler(CommandHandler("teclado", update_keyboard))
     application.add_handler(CommandHandler("pagos", listar_pagos))
+    application.add_handler(CommandHandler("metrics", show_metrics))
+    
+    # Botones "◀ / ▶" de las listas de gastos y pagos
+    application.add_handler(CallbackQueryHandler(navegar_gastos, pattern=PageIndex.callback_pattern(EXPENSES)))
+    application.add_handler(CallbackQueryHandler(navegar_pagos, pattern=PageIndex.callback_pattern(PAYMENTS)))
     
     # Crear el manejador para el flujo de creación de familia con alta prioridad
     family_conv_handler = ConversationHandler(
@@ -189,7 +251,7 @@ def main():
             CommandHandler("cancel", cancel)
         ],
         name="family_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     # Manejadores para otros flujos
@@ -208,7 +270,7 @@ def main():
             CommandHandler("cancel", edit_cancel)
         ],
         name="edit_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     expense_conv_handler = ConversationHandler(
@@ -225,7 +287,7 @@ def main():
             CommandHandler("cancel", cancel)
         ],
         name="expense_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     payment_conv_handler = ConversationHandler(
@@ -241,7 +303,7 @@ def main():
             CommandHandler("cancel", cancel)
         ],
         name="payment_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     adjustment_conv_handler = ConversationHandler(
@@ -250,14 +312,13 @@ def main():
         ],
         states={
             SELECT_CREDIT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_credit_selection)],
-            ADJUSTMENT_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_adjustment_amount)],
             ADJUSTMENT_CONFIRM: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_adjustment_confirmation)]
         },
         fallbacks=[
             CommandHandler("cancel", adjustment_cancel)
         ],
         name="adjustment_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     list_conv_handler = ConversationHandler(
@@ -271,7 +332,7 @@ def main():
             CommandHandler("cancel", cancel)
         ],
         name="list_conversation",
-        persistent=False
+        persistent=PERSISTENCE_ENABLED
     )
     
     # Añadir todos los handlers en el orden correcto
@@ -0,0 +1,485 @@
+"""
+Mock API Server Script
+
+Este script levanta un servidor local que imita la API del backend del bot
+financiero, para poder ejecutar y medir el bot sin el backend real. Implementa
+las rutas que usan los servicios (miembros, familias, balances, gastos y
+pagos) sobre un conjunto de datos sintético en memoria, con latencia, tasa de
+errores y tamaño de los datos configurables.
+
+Uso:
+    python -m scripts.mock_api_server --port 8000 --expenses 5000 --latency-ms 80 --error-rate 0.05
+
+y luego arrancar el bot con API_BASE_URL_RENDER=http://127.0.0.1:8000.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+class MockDataset:
+    """
+    In-memory data of the mock API: members, families, expenses and payments.
+
+    Access is serialised with a lock because the server handles each request
+    in its own thread.
+    """
+
+    def __init__(self, families=3, members_per_family=4, expenses=200, payments=50, telegram_id=None, seed=None):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.members = {}
+        self.families = {}
+        self.expenses = {}
+        self.payments = {}
+        self.idempotent_responses = {}
+        self._next_member_id = 1
+        self._populate(families, members_per_family, expenses, payments, telegram_id)
+
+    def _new_id(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def _timestamp(self, days_back=90):
+        moment = datetime.now(timezone.utc) - timedelta(seconds=self.random.uniform(0, days_back * 86400))
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _populate(self, families, members_per_family, expenses, payments, telegram_id):
+        """Builds the synthetic dataset."""
+        next_telegram_id = 100000
+        for family_index in range(families):
+            family_id = self._new_id()
+            self.families[family_id] = {"id": family_id, "name": f"Familia {family_index + 1}", "created_at": self._timestamp()}
+
+            for member_index in range(members_per_family):
+                # El primer miembro de la primera familia puede ser un usuario real
+                if family_index == 0 and member_index == 0 and telegram_id:
+                    member_telegram_id = str(telegram_id)
+                else:
+                    next_telegram_id += 1
+                    member_telegram_id = str(next_telegram_id)
+                self.add_member(family_id, member_telegram_id, f"Miembro {family_index + 1}.{member_index + 1}")
+
+            member_ids = self.family_member_ids(family_id)
+            for _ in range(expenses):
+                paid_by = self.random.choice(member_ids)
+                split_among = self.random.sample(member_ids, self.random.randint(1, len(member_ids)))
+                self.add_expense({
+                    "description": self.random.choice(["Supermercado", "Alquiler", "Luz", "Agua", "Internet", "Cena", "Gasolina", "Farmacia"]),
+                    "amount": round(self.random.uniform(5, 300), 2),
+                    "paid_by": paid_by,
+                    "split_among": split_among
+                }, created_at=self._timestamp())
+
+            for _ in range(payments if len(member_ids) > 1 else 0):
+                from_member, to_member = self.random.sample(member_ids, 2)
+                payment = self.add_payment({
+                    "from_member": from_member,
+                    "to_member": to_member,
+                    "amount": round(self.random.uniform(5, 100), 2)
+                }, created_at=self._timestamp())
+                payment["status"] = self.random.choice(["PENDING", "CONFIRM", "CONFIRM"])
+
+    def add_member(self, family_id, telegram_id, name):
+        member_id = str(self._next_member_id)
+        self._next_member_id += 1
+        member = {
+            "id": member_id,
+            "telegram_id": str(telegram_id),
+            "name": name,
+            "family_id": family_id,
+            "created_at": self._timestamp()
+        }
+        self.members[member_id] = member
+        return member
+
+    def family_member_ids(self, family_id):
+        return [member_id for member_id, member in self.members.items() if member["family_id"] == family_id]
+
+    def member_summary(self, member_id):
+        member = self.members.get(str(member_id))
+        if member is None:
+            return {"id": member_id, "name": f"Usuario {member_id}"}
+        return {"id": member["id"], "name": member["name"], "telegram_id": member["telegram_id"]}
+
+    def member_by_telegram_id(self, telegram_id):
+        for member in self.members.values():
+            if member["telegram_id"] == str(telegram_id):
+                return member
+        return None
+
+    def family_view(self, family_id):
+        family = self.families.get(family_id)
+        if family is None:
+            return None
+        members = [dict(self.members[member_id]) for member_id in self.family_member_ids(family_id)]
+        return {**family, "members": members}
+
+    def add_expense(self, data, created_at=None):
+        paid_by = str(data.get("paid_by"))
+        payer = self.members.get(paid_by)
+        family_id = data.get("family_id") or (payer["family_id"] if payer else None)
+        split_among = data.get("split_among") or self.family_member_ids(family_id)
+        expense_id = self._new_id()
+        expense = {
+            "id": expense_id,
+            "description": data.get("description", "Sin descripción"),
+            "amount": float(data.get("amount", 0)),
+            "paid_by": paid_by,
+            "family_id": family_id,
+            "split_among": [self.member_summary(member_id) for member_id in split_among],
+            "created_at": created_at or self._timestamp(0)
+        }
+        self.expenses[expense_id] = expense
+        return expense
+
+    def add_payment(self, data, created_at=None, status="PENDING"):
+        from_member = self.members.get(str(data.get("from_member")))
+        payment_id = self._new_id()
+        payment = {
+            "id": payment_id,
+            "from_member": self.member_summary(data.get("from_member")),
+            "to_member": self.member_summary(data.get("to_member")),
+            "amount": float(data.get("amount", 0)),
+            "status": status,
+            "family_id": from_member["family_id"] if from_member else None,
+            "created_at": created_at or self._timestamp(0)
+        }
+        self.payments[payment_id] = payment
+        return payment
+
+    def balances(self, family_id):
+        """
+        Computes the balances of a family from its expenses and confirmed payments.
+
+        Returns:
+            list: [{member_id, name, net_balance, total_owed, total_debt,
+                    debts: [{to, to_id, amount}], credits: [{from, from_id, amount}]}]
+            where "to" and "from" are member names, as in the real API
+        """
+        member_ids = self.family_member_ids(family_id)
+        owed = {}
+        for expense in self.expenses.values():
+            if expense["family_id"] != family_id or not expense["split_among"]:
+                continue
+            share = expense["amount"] / len(expense["split_among"])
+            for participant in expense["split_among"]:
+                if participant["id"] != expense["paid_by"]:
+                    key = (participant["id"], expense["paid_by"])
+                    owed[key] = owed.get(key, 0) + share
+        for payment in self.payments.values():
+            if payment["family_id"] == family_id and payment["status"] == "CONFIRM":
+                key = (payment["from_member"]["id"], payment["to_member"]["id"])
+                owed[key] = owed.get(key, 0) - payment["amount"]
+
+        balances = {member_id: {"member_id": member_id, "name": self.members[member_id]["name"], "debts": [], "credits": []}
+                    for member_id in member_ids}
+        for debtor, creditor in {tuple(sorted(pair)) for pair in owed}:
+            net = owed.get((debtor, creditor), 0) - owed.get((creditor, debtor), 0)
+            if abs(net) < 0.01 or debtor not in balances or creditor not in balances:
+                continue
+            if net < 0:
+                debtor, creditor, net = creditor, debtor, -net
+            balances[debtor]["debts"].append({"to": balances[creditor]["name"], "to_id": creditor, "amount": round(net, 2)})
+            balances[creditor]["credits"].append({"from": balances[debtor]["name"], "from_id": debtor, "amount": round(net, 2)})
+        # Totales como los devuelve la API real
+        for balance in balances.values():
+            balance["total_owed"] = round(sum(credit["amount"] for credit in balance["credits"]), 2)
+            balance["total_debt"] = round(sum(debt["amount"] for debt in balance["debts"]), 2)
+            balance["net_balance"] = round(balance["total_owed"] - balance["total_debt"], 2)
+        return list(balances.values())
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """Routes the requests of the bot to the mock dataset."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockFinancialApi/1.0"
+
+    # Rutas: (método, patrón) -> nombre del método que la atiende
+    ROUTES = [
+        ("GET", r"/members/id/(?P<member_id>[^/]+)", "get_member_by_id"),
+        ("GET", r"/members/(?P<telegram_id>[^/]+)", "get_member"),
+        ("PUT", r"/members/(?P<member_id>[^/]+)", "update_member"),
+        ("POST", r"/families", "create_family"),
+        ("GET", r"/families/(?P<family_id>[^/]+)", "get_family"),
+        ("GET", r"/families/(?P<family_id>[^/]+)/members", "get_family_members"),
+        ("POST", r"/families/(?P<family_id>[^/]+)/members", "add_family_member"),
+        ("GET", r"/families/(?P<family_id>[^/]+)/balances", "get_balances"),
+        ("POST", r"/expenses", "create_expense"),
+        ("GET", r"/expenses/family/(?P<family_id>[^/]+)", "get_family_expenses"),
+        ("GET", r"/expenses/(?P<expense_id>[^/]+)", "get_expense"),
+        ("PUT", r"/expenses/(?P<expense_id>[^/]+)", "update_expense"),
+        ("DELETE", r"/expenses/(?P<expense_id>[^/]+)", "delete_expense"),
+        ("POST", r"/payments/debt-adjustment", "create_debt_adjustment"),
+        ("POST", r"/payments", "create_payment"),
+        ("GET", r"/payments/family/(?P<family_id>[^/]+)", "get_family_payments"),
+        ("GET", r"/payments/(?P<payment_id>[^/]+)", "get_payment"),
+        ("DELETE", r"/payments/(?P<payment_id>[^/]+)", "delete_payment"),
+        ("POST", r"/payments/(?P<payment_id>[^/]+)/confirm", "confirm_payment"),
+        ("PATCH", r"/payments/(?P<payment_id>[^/]+)/status", "update_payment_status"),
+    ]
+    COMPILED_ROUTES = [(method, re.compile(f"^{pattern}/?$"), name) for method, pattern, name in ROUTES]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _dispatch(self, method):
+        options = self.server.options
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+
+        # Latencia simulada
+        delay = max(0.0, options.latency_ms + random.uniform(-options.jitter_ms, options.jitter_ms)) / 1000
+        if delay:
+            time.sleep(delay)
+
+        # Errores simulados
+        if options.error_rate and random.random() < options.error_rate:
+            return self._send(options.error_status, {"detail": "Simulated backend error"})
+
+        path = urlsplit(self.path).path
+        for route_method, pattern, name in self.COMPILED_ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return self._send(404, {"detail": "Not Found"})
+
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except ValueError:
+            return self._send(422, {"detail": "Invalid JSON body"})
+
+        dataset = self.server.dataset
+        idempotency_key = self.headers.get("Idempotency-Key")
+        with dataset.lock:
+            # Repetir la respuesta original de una escritura ya procesada
+            if method == "POST" and idempotency_key and idempotency_key in dataset.idempotent_responses:
+                status_code, payload = dataset.idempotent_responses[idempotency_key]
+            else:
+                status_code, payload = getattr(self, name)(dataset, body, **match.groupdict())
+                if method == "POST" and idempotency_key and status_code < 400:
+                    dataset.idempotent_responses[idempotency_key] = (status_code, payload)
+            # Serializar dentro del bloqueo: el payload puede cambiar después
+            payload = json.loads(json.dumps(payload))
+
+        self._send(status_code, payload)
+
+    def _send(self, status_code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        etag = None
+        if self.command == "GET" and status_code == 200 and self.server.options.etag:
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Miembros
+
+    def get_member(self, dataset, body, telegram_id):
+        member = dataset.member_by_telegram_id(telegram_id)
+        return (200, member) if member else (404, {"detail": "Member not found"})
+
+    def get_member_by_id(self, dataset, body, member_id):
+        member = dataset.members.get(member_id)
+        return (200, member) if member else (404, {"detail": "Member not found"})
+
+    def update_member(self, dataset, body, member_id):
+        member = dataset.members.get(member_id)
+        if member is None:
+            return 404, {"detail": "Member not found"}
+        member.update({key: value for key, value in body.items() if key in ("name", "telegram_id")})
+        return 200, member
+
+    # Familias
+
+    def create_family(self, dataset, body):
+        family_id = dataset._new_id()
+        dataset.families[family_id] = {"id": family_id, "name": body.get("name", "Familia"), "created_at": dataset._timestamp(0)}
+        for member in body.get("members", []):
+            if dataset.member_by_telegram_id(member.get("telegram_id")) is None:
+                dataset.add_member(family_id, member.get("telegram_id"), member.get("name", "Miembro"))
+        return 201, dataset.family_view(family_id)
+
+    def get_family(self, dataset, body, family_id):
+        family = dataset.family_view(family_id)
+        return (200, family) if family else (404, {"detail": "Family not found"})
+
+    def get_family_members(self, dataset, body, family_id):
+        family = dataset.family_view(family_id)
+        return (200, family["members"]) if family else (404, {"detail": "Family not found"})
+
+    def add_family_member(self, dataset, body, family_id):
+        if family_id not in dataset.families:
+            return 404, {"detail": "Family not found"}
+        if dataset.member_by_telegram_id(body.get("telegram_id")) is not None:
+            return 400, {"detail": "Member already belongs to a family"}
+        return 201, dataset.add_member(family_id, body.get("telegram_id"), body.get("name", "Miembro"))
+
+    def get_balances(self, dataset, body, family_id):
+        if family_id not in dataset.families:
+            return 404, {"detail": "Family not found"}
+        return 200, dataset.balances(family_id)
+
+    # Gastos
+
+    def create_expense(self, dataset, body):
+        if str(body.get("paid_by")) not in dataset.members:
+            return 400, {"detail": "paid_by is not a valid member"}
+        return 201, dataset.add_expense(body)
+
+    def get_family_expenses(self, dataset, body, family_id):
+        return 200, [expense for expense in dataset.expenses.values() if expense["family_id"] == family_id]
+
+    def get_expense(self, dataset, body, expense_id):
+        expense = dataset.expenses.get(expense_id)
+        return (200, expense) if expense else (404, {"detail": "Expense not found"})
+
+    def update_expense(self, dataset, body, expense_id):
+        expense = dataset.expenses.get(expense_id)
+        if expense is None:
+            return 404, {"detail": "Expense not found"}
+        for key in ("description", "amount"):
+            if key in body:
+                expense[key] = float(body[key]) if key == "amount" else body[key]
+        return 200, expense
+
+    def delete_expense(self, dataset, body, expense_id):
+        expense = dataset.expenses.pop(expense_id, None)
+        return (200, {"id": expense_id, "family_id": expense["family_id"]}) if expense else (404, {"detail": "Expense not found"})
+
+    # Pagos
+
+    def create_payment(self, dataset, body):
+        if str(body.get("from_member")) not in dataset.members or str(body.get("to_member")) not in dataset.members:
+            return 400, {"detail": "Invalid members"}
+        return 201, dataset.add_payment(body)
+
+    def create_debt_adjustment(self, dataset, body):
+        if str(body.get("from_member")) not in dataset.members or str(body.get("to_member")) not in dataset.members:
+            return 400, {"detail": "Invalid members"}
+        return 201, dataset.add_payment(body, status="CONFIRM")
+
+    def get_family_payments(self, dataset, body, family_id):
+        return 200, [payment for payment in dataset.payments.values() if payment["family_id"] == family_id]
+
+    def get_payment(self, dataset, body, payment_id):
+        payment = dataset.payments.get(payment_id)
+        return (200, payment) if payment else (404, {"detail": "Payment not found"})
+
+    def delete_payment(self, dataset, body, payment_id):
+        payment = dataset.payments.pop(payment_id, None)
+        return (200, {"id": payment_id, "family_id": payment["family_id"]}) if payment else (404, {"detail": "Payment not found"})
+
+    def confirm_payment(self, dataset, body, payment_id):
+        return self.update_payment_status(dataset, {"status": "CONFIRM"}, payment_id)
+
+    def update_payment_status(self, dataset, body, payment_id):
+        payment = dataset.payments.get(payment_id)
+        if payment is None:
+            return 404, {"detail": "Payment not found"}
+        if body.get("status") not in ("PENDING", "CONFIRM", "INACTIVE"):
+            return 422, {"detail": "Invalid status"}
+        payment["status"] = body["status"]
+        return 200, payment
+
+def create_server(options):
+    """
+    Creates the mock API server without starting it.
+
+    Args:
+        options (argparse.Namespace): Parsed command line options
+
+    Returns:
+        ThreadingHTTPServer: The server, with its dataset attached
+    """
+    server = ThreadingHTTPServer((options.host, options.port), MockApiHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.quiet = options.quiet
+    server.dataset = MockDataset(
+        families=options.families,
+        members_per_family=options.members,
+        expenses=options.expenses,
+        payments=options.payments,
+        telegram_id=options.telegram_id,
+        seed=options.seed
+    )
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor local que imita la API del backend del bot financiero.')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escuchar')
+    parser.add_argument('--port', type=int, default=8000, help='Puerto en el que escuchar')
+    parser.add_argument('--families', type=int, default=3, help='Número de familias')
+    parser.add_argument('--members', type=int, default=4, help='Miembros por familia')
+    parser.add_argument('--expenses', type=int, default=200, help='Gastos por familia')
+    parser.add_argument('--payments', type=int, default=50, help='Pagos por familia')
+    parser.add_argument('--telegram-id', help='ID de Telegram del primer miembro de la primera familia (tu usuario)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latencia añadida a cada respuesta, en ms')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Variación aleatoria de la latencia, en ms')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fracción de solicitudes que fallan (0-1)')
+    parser.add_argument('--error-status', type=int, default=503, help='Código devuelto en los errores simulados')
+    parser.add_argument('--no-etag', dest='etag', action='store_false', help='No enviar ETag ni responder 304')
+    parser.add_argument('--seed', type=int, default=None, help='Semilla para generar siempre los mismos datos')
+    parser.add_argument('--quiet', action='store_true', help='No registrar cada solicitud')
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Función principal que arranca el servidor de la API simulada.
+    """
+    options = parse_args()
+    server = create_server(options)
+    dataset = server.dataset
+
+    print(f"API simulada escuchando en http://{options.host}:{options.port}")
+    print(f"{len(dataset.families)} familias, {len(dataset.members)} miembros, "
+          f"{len(dataset.expenses)} gastos, {len(dataset.payments)} pagos")
+    for family_id, family in dataset.families.items():
+        telegram_ids = ", ".join(dataset.members[member_id]["telegram_id"] for member_id in dataset.family_member_ids(family_id))
+        print(f"  {family['name']} ({family_id}): telegram_id {telegram_ids}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Deteniendo la API simulada...")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Settlement Benchmark Script
+
+Este script mide el motor local de balances (services/settlement_engine.py)
+con familias sintéticas de distintos tamaños, y comprueba que sus resultados
+coinciden con los balances que calcula la API simulada para los mismos datos.
+El tiempo por gasto debe mantenerse aproximadamente constante al crecer el
+número de gastos (escalado lineal).
+
+Uso:
+    python -m scripts.settlement_benchmark --sizes 1000,10000,100000 --members 6
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Permitir ejecutar el script sin variables de entorno del bot
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from scripts.mock_api_server import MockDataset
+from services.settlement_engine import SettlementEngine, np
+
+def build_family(expenses, members, seed):
+    """
+    Generates one synthetic family with the mock API dataset.
+
+    Args:
+        expenses (int): Number of expenses
+        members (int): Number of members
+        seed (int): Random seed
+
+    Returns:
+        tuple: (members, expenses, payments, server balances)
+    """
+    dataset = MockDataset(families=1, members_per_family=members, expenses=expenses, payments=max(1, expenses // 10), seed=seed)
+    family_id = next(iter(dataset.families))
+    family = dataset.family_view(family_id)
+    return family["members"], list(dataset.expenses.values()), list(dataset.payments.values()), dataset.balances(family_id)
+
+def best_of(repeat, function):
+    """
+    Runs a function several times and returns the fastest run.
+
+    Returns:
+        tuple: (seconds, result of the last run)
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark del motor local de balances')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Número de gastos por familia, separados por comas')
+    parser.add_argument('--members', type=int, default=6, help='Miembros de la familia')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones de cada medida (se toma la mejor)')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de los datos sintéticos')
+    parser.add_argument('--no-python', dest='python', action='store_false', help='No medir la versión sin NumPy')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    engines = []
+    if np is not None:
+        engines.append(("numpy", True))
+    else:
+        print("NumPy no está instalado; solo se mide la versión en Python puro")
+    if args.python or np is None:
+        engines.append(("python", False))
+
+    print(f"{'gastos':>8} {'pagos':>7} {'motor':>7} {'ms':>10} {'µs/gasto':>10} {'coincide':>9}")
+    failed = False
+    for size in sizes:
+        members, expenses, payments, server = build_family(size, args.members, args.seed)
+        for name, use_numpy in engines:
+            seconds, balances = best_of(
+                args.repeat,
+                lambda: SettlementEngine.compute(members, expenses, payments, use_numpy=use_numpy)
+            )
+            matches = not SettlementEngine.cross_check(server, balances)
+            failed = failed or not matches
+            print(
+                f"{size:>8} {len(payments):>7} {name:>7} {seconds * 1000:>10.2f} "
+                f"{seconds * 1e6 / size:>10.3f} {'sí' if matches else 'NO':>9}"
+            )
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,9 +5,36 @@ This module provides a service for interacting with the backend API.
 It handles HTTP requests, error handling, and response processing.
 """
 
-import requests
-import traceback
-from config import API_BASE_URL, logger
+import httpx
+from contextlib import AsyncExitStack, asynccontextmanager
+from config import API_BASE_URL, API_TIMEOUT
+from services.http_client import HttpClient
+from services.circuit_breaker import CircuitOpenError
+from services.json_codec import JsonCodec
+from services.request_coalescer import RequestCoalescer
+from services.response_cache import ResponseCache
+from services.revalidation_store import RevalidationStore
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
+
+# Códigos que indican que la API no está disponible (no un error de la solicitud)
+UNAVAILABLE_STATUS_CODES = (502, 503, 504)
+
+class StaleStatus(int):
+    """
+    Status code of a response served from an old copy because the API was
+    unavailable.
+
+    It compares equal to 200, so callers that only check for success keep
+    working, while ApiService.is_stale() tells it apart from a fresh answer.
+    """
+
+    def __repr__(self):
+        return f"StaleStatus({int(self)})"
+
+# 200 de una respuesta posiblemente desactualizada
+STALE_OK = StaleStatus(200)
 
 class ApiService:
     """
@@ -18,17 +45,28 @@ class ApiService:
     """
     
     @staticmethod
-    def request(method, endpoint, data=None, token=None, params=None, check_status=True):
+    async def request(method, endpoint, data=None, token=None, params=None, check_status=True, headers=None):
         """
         Makes an HTTP request to the API.
         
+        The request is performed with the shared asyncio HTTP client, so a slow
+        backend call only suspends the handler that awaits it and reuses a pooled
+        keep-alive connection instead of opening a new one. Successful GET responses
+        for cacheable endpoints are served from the ResponseCache until they expire
+        or a write invalidates them, and identical GET requests that are already in
+        flight are coalesced into a single upstream call. When the API sends an
+        ETag or Last-Modified header, later GETs revalidate the stored body instead
+        of downloading it again. While the API is unavailable, GETs fall back to
+        the last response seen for the same request, if any.
+        
         Args:
-            method (str): HTTP method (GET, POST, PUT, DELETE)
+            method (str): HTTP method (GET, POST, PUT, PATCH, DELETE)
             endpoint (str): API endpoint
             data (dict, optional): Data to send in the request
             token (str, optional): Authentication token or Telegram ID
             params (dict, optional): Query parameters to include in the request
             check_status (bool, optional): If True, raises an exception if status code indicates error
+            headers (dict, optional): Extra headers, such as an idempotency key
             
         Returns:
             tuple: (status_code, response_data)
@@ -38,55 +76,178 @@ class ApiService:
             endpoint = '/' + endpoint
             
         url = f"{API_BASE_URL}{endpoint}"
-        logger.debug(f"Making {method} request to {url}")
+        logger.debug("Making %s request to %s", method, url)
         if data:
-            logger.debug(f"Request data: {data}")
+            logger.debug("Request data: %s", Payload(data))
+        
+        if method not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            logger.error("Unsupported HTTP method: %s", method)
+            return 400, {"error": f"Unsupported HTTP method: {method}"}
+        
+        # Inicializar parámetros de consulta
+        request_params = dict(params or {})
+        
+        # Añadir identificación si está disponible
+        # En lugar de usar un token JWT, simplemente pasamos el ID de Telegram
+        # como un parámetro de consulta o en los datos
+        if token and isinstance(token, str):
+            # Usar el token como ID de Telegram en un parámetro de consulta
+            request_params['telegram_id'] = token
+            logger.debug("Including telegram_id=%s in request", token)
+        
+        # Las lecturas se sirven desde la caché y las idénticas en curso
+        # comparten una sola solicitud a la API
+        if method == "GET":
+            key = RequestCoalescer.make_key(method, url, request_params)
+            cache_rule = ResponseCache.get_rule(endpoint)
+            if cache_rule is not None:
+                cached = ResponseCache.get(key)
+                if cached is not None:
+                    logger.debug("Cache hit for GET %s", url)
+                    return cached
+            family_id = cache_rule[1] if cache_rule is not None else None
+            result = await RequestCoalescer.run(
+                key,
+                lambda: ApiService._fetch(key, url, request_params, check_status, cache_rule),
+                family_id
+            )
+            if result[0] in UNAVAILABLE_STATUS_CODES:
+                return ApiService._degraded(key, url, result)
+            return result
+        
+        return await ApiService._send(method, url, data, request_params, check_status, extra_headers=headers)
+    
+    @staticmethod
+    def _degraded(key, url, result):
+        """
+        Replaces an "API unavailable" answer with the last known response, if any.
+        
+        Args:
+            key (tuple): Request key
+            url (str): Absolute request URL
+            result (tuple): The (status_code, response_data) that failed
+            
+        Returns:
+            tuple: (STALE_OK, last known response_data), or the original result
+        """
+        stale = ResponseCache.get_stale(key)
+        if stale is not None:
+            stale_data = stale[1]
+        else:
+            stale_data = RevalidationStore.peek(key)
+        
+        if stale_data is None:
+            return result
+        
+        logger.warning("API unavailable (%s), serving last known response for %s", result[0], url)
+        return STALE_OK, stale_data
+    
+    @staticmethod
+    def is_stale(status_code):
+        """
+        Tells whether a result was served from an old copy because the API was unavailable.
+        
+        Args:
+            status_code (int): Status code returned by a service
             
+        Returns:
+            bool: True if the data may be out of date
+        """
+        return isinstance(status_code, StaleStatus)
+    
+    @staticmethod
+    async def _fetch(key, url, request_params, check_status, cache_rule):
+        """
+        Performs a GET request and stores a successful response in the cache.
+        
+        A successful response of a cacheable endpoint is parsed into records
+        before it is stored, and returned parsed to every coalesced caller.
+        
+        The version of the family is taken before the request, so the response
+        is not stored if a write invalidates the family while it is in flight.
+        
+        Args:
+            key (tuple): Request key shared by the coalescer and the cache
+            url (str): Absolute request URL
+            request_params (dict): Query parameters, including telegram_id
+            check_status (bool): If True, logs an error when the status code indicates one
+            cache_rule (tuple): (ttl, family_id, parse) for cacheable endpoints, or None
+            
+        Returns:
+            tuple: (status_code, response_data)
+        """
+        version = ResponseCache.version(cache_rule[1]) if cache_rule is not None else None
+        result = await ApiService._send("GET", url, None, request_params, check_status, key)
+        if cache_rule is not None and result[0] == 200:
+            ttl, family_id, parse = cache_rule
+            result = result[0], parse(result[1])
+            ResponseCache.put(key, result, ttl, family_id, version)
+        return result
+    
+    @staticmethod
+    async def _send(method, url, data, request_params, check_status, revalidation_key=None, extra_headers=None):
+        """
+        Sends a prepared request through the shared transport and parses the response.
+        
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            data (dict): JSON body for POST, PUT and PATCH requests
+            request_params (dict): Query parameters, including telegram_id
+            check_status (bool): If True, logs an error when the status code indicates one
+            revalidation_key (tuple, optional): Key of a GET whose body can be revalidated
+            extra_headers (dict, optional): Headers added to the request
+            
+        Returns:
+            tuple: (status_code, response_data). A 304 Not Modified is returned as
+            200 with the stored body.
+        """
         try:
             # Configurar headers para JSON
             headers = {'Content-Type': 'application/json'}
+            if extra_headers:
+                headers.update(extra_headers)
+            if revalidation_key is not None:
+                headers.update(RevalidationStore.conditional_headers(revalidation_key))
             
-            # Inicializar parámetros de consulta
-            request_params = params or {}
-            
-            # Añadir identificación si está disponible
-            # En lugar de usar un token JWT, simplemente pasamos el ID de Telegram
-            # como un parámetro de consulta o en los datos
-            if token and isinstance(token, str):
-                # Usar el token como ID de Telegram en un parámetro de consulta
-                request_params['telegram_id'] = token
-                logger.debug(f"Including telegram_id={token} in request")
-            
-            if method == "GET":
-                response = requests.get(url, params=request_params, headers=headers, timeout=15)
-            elif method == "POST":
-                # Para solicitudes POST, solo incluir el telegram_id en los parámetros de consulta
-                # y no duplicarlo en el cuerpo de la solicitud
-                response = requests.post(url, json=data, params=request_params, headers=headers, timeout=15)
-            elif method == "PUT":
-                # Para solicitudes PUT, solo incluir el telegram_id en los parámetros de consulta
-                # y no duplicarlo en el cuerpo de la solicitud
-                response = requests.put(url, json=data, params=request_params, headers=headers, timeout=15)
-            elif method == "DELETE":
-                response = requests.delete(url, params=request_params, headers=headers, timeout=15)
-            else:
-                logger.error(f"Unsupported HTTP method: {method}")
-                return 400, {"error": f"Unsupported HTTP method: {method}"}
+            # Para solicitudes POST, PUT y PATCH, solo incluir el telegram_id en los
+            # parámetros de consulta y no duplicarlo en el cuerpo de la solicitud
+            json_body = data if method in ("POST", "PUT", "PATCH") else None
+            
+            response = await HttpClient.request(
+                method,
+                url,
+                json=json_body,
+                params=request_params,
+                headers=headers,
+                timeout=API_TIMEOUT
+            )
             
             # Obtener el status code
             status_code = response.status_code
-            logger.debug(f"Response status code: {status_code}")
+            logger.debug("Response status code: %s", status_code)
+            
+            # El cuerpo no cambió: reutilizar el que ya tenemos
+            if status_code == 304 and revalidation_key is not None:
+                stored_data = RevalidationStore.reuse(revalidation_key)
+                if stored_data is not None:
+                    return 200, stored_data
+                # El cuerpo se descartó mientras tanto; pedirlo completo
+                return await ApiService._send(method, url, data, request_params, check_status)
             
             # Intentar obtener el contenido como JSON
             try:
                 if response.content:
-                    response_data = response.json()
+                    response_data = JsonCodec.loads(response.content)
                 else:
                     response_data = {}
             except ValueError:
-                logger.warning(f"Response is not valid JSON: {response.content}")
+                logger.warning("Response is not valid JSON: %s", Payload(response.content))
                 response_data = {"error": "Response is not valid JSON", "content": str(response.content)}
             
+            if status_code == 200 and revalidation_key is not None:
+                RevalidationStore.store(revalidation_key, response, response_data)
+            
             # Verificar si hubo un error
             if check_status and status_code >= 400:
                 error_message = response_data.get("detail", "Unknown error")
@@ -94,21 +255,163 @@ class ApiService:
                 
             return status_code, response_data
             
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error: {e}")
-            traceback.print_exc()
-            return 503, {"error": f"Connection error: {str(e)}"}
-        except requests.exceptions.Timeout as e:
-            logger.error(f"Request timeout: {e}")
-            traceback.print_exc()
+        except CircuitOpenError as e:
+            # Fallar rápido sin esperar al timeout mientras la API no responde
+            logger.warning(str(e))
+            return 503, {"error": "El servicio no está disponible temporalmente. Inténtalo de nuevo en unos momentos.", "circuit_open": True}
+        except httpx.TimeoutException as e:
+            logger.exception("Request timeout: %s", e)
             return 504, {"error": f"Request timeout: {str(e)}"}
+        except httpx.TransportError as e:
+            logger.exception("Connection error: %s", e)
+            return 503, {"error": f"Connection error: {str(e)}"}
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            traceback.print_exc()
+            logger.exception("Unexpected error: %s", e)
             return 500, {"error": f"Unexpected error: {str(e)}"}
             
     @staticmethod
-    def api_request(method, endpoint, data=None, token=None, check_status=True):
+    @asynccontextmanager
+    async def stream_list(endpoint, token=None, params=None):
+        """
+        Makes a GET request to a list endpoint and decodes its records as they arrive.
+        
+        A 200 response is yielded together with an async iterator over the
+        elements of the JSON array, so callers can process records one by one
+        without the whole list being decoded at once. Other status codes are
+        yielded with their decoded body. List responses are not cached: their
+        parsed records are kept by the Ledger.
+        
+        Args:
+            endpoint (str): API endpoint returning a JSON array
+            token (str, optional): Telegram ID of the user
+            params (dict, optional): Query parameters to include in the request
+            
+        Yields:
+            tuple: (status_code, records) where records is an async iterator if
+            status_code is 200, or the response data otherwise
+        """
+        if not endpoint.startswith('/'):
+            endpoint = '/' + endpoint
+        
+        url = f"{API_BASE_URL}{endpoint}"
+        request_params = dict(params or {})
+        if token and isinstance(token, str):
+            request_params['telegram_id'] = token
+        
+        async with AsyncExitStack() as stack:
+            try:
+                response = await stack.enter_async_context(HttpClient.stream(
+                    "GET",
+                    url,
+                    params=request_params,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=API_TIMEOUT
+                ))
+                if response.status_code != 200:
+                    await response.aread()
+            except CircuitOpenError as e:
+                logger.warning(str(e))
+                result = 503, {"error": "El servicio no está disponible temporalmente. Inténtalo de nuevo en unos momentos.", "circuit_open": True}
+            except httpx.TimeoutException as e:
+                logger.error("Request timeout: %s", e)
+                result = 504, {"error": f"Request timeout: {str(e)}"}
+            except httpx.TransportError as e:
+                logger.error("Connection error: %s", e)
+                result = 503, {"error": f"Connection error: {str(e)}"}
+            else:
+                if response.status_code == 200:
+                    records = JsonCodec.iter_array(response.aiter_bytes())
+                    try:
+                        yield 200, records
+                    finally:
+                        await records.aclose()
+                    return
+                
+                try:
+                    response_data = JsonCodec.loads(response.content) if response.content else {}
+                except ValueError:
+                    response_data = {"error": "Response is not valid JSON", "content": str(response.content)}
+                result = response.status_code, response_data
+        
+        yield result
+    
+    @staticmethod
+    async def get_list(endpoint, token=None, params=None, parse=None, family_id=None):
+        """
+        Makes a GET request to a list endpoint and returns its parsed records.
+        
+        The records are decoded and parsed one by one while the body is being
+        downloaded (see stream_list), so neither the raw body nor a list of
+        decoded objects is kept next to the parsed records. Identical requests
+        in flight share one download.
+        
+        Args:
+            endpoint (str): API endpoint returning a JSON array
+            token (str, optional): Telegram ID of the user
+            params (dict, optional): Query parameters to include in the request
+            parse (callable, optional): Function converting each decoded object,
+                such as Expense.from_api; objects whose record has no ID are skipped
+            family_id (str, optional): Family the list belongs to, so that a
+                write to the family is not answered with a download started before it
+            
+        Returns:
+            tuple: (status_code, records) in the order of the API, or
+            (status_code, response_data) if the request failed
+        """
+        if not endpoint.startswith('/'):
+            endpoint = '/' + endpoint
+        request_params = dict(params or {})
+        if token and isinstance(token, str):
+            request_params['telegram_id'] = token
+        key = RequestCoalescer.make_key("LIST", f"{API_BASE_URL}{endpoint}", request_params)
+        return await RequestCoalescer.run(
+            key,
+            lambda: ApiService._collect(endpoint, token, params, parse),
+            family_id
+        )
+    
+    @staticmethod
+    async def _collect(endpoint, token, params, parse):
+        """
+        Streams a list endpoint into a list of records.
+        
+        Args:
+            endpoint (str): API endpoint returning a JSON array
+            token (str): Telegram ID of the user
+            params (dict): Query parameters to include in the request
+            parse (callable): Function converting each decoded object, or None
+            
+        Returns:
+            tuple: (status_code, records) or (status_code, response_data)
+        """
+        records = []
+        try:
+            async with ApiService.stream_list(endpoint, token, params) as (status_code, items):
+                if status_code != 200:
+                    return status_code, items
+                
+                async for item in items:
+                    if not isinstance(item, dict):
+                        continue
+                    if parse is not None:
+                        item = parse(item)
+                        if item.id is None:
+                            continue
+                    records.append(item)
+        except httpx.TimeoutException as e:
+            logger.error("Request timeout: %s", e)
+            return 504, {"error": f"Request timeout: {str(e)}"}
+        except httpx.TransportError as e:
+            logger.error("Connection error: %s", e)
+            return 503, {"error": f"Connection error: {str(e)}"}
+        except ValueError as e:
+            logger.warning("Response of %s is not a valid JSON array: %s", endpoint, e)
+            return 500, {"error": "Response is not valid JSON"}
+        
+        return 200, records
+    
+    @staticmethod
+    async def api_request(method, endpoint, data=None, token=None, check_status=True):
         """
         Alias for request method to maintain compatibility.
         
@@ -125,4 +428,4 @@ class ApiService:
         Returns:
             tuple: (status_code, response_data)
         """
-        return ApiService.request(method, endpoint, data, token, None, check_status)
\ No newline at end of file
+        return await ApiService.request(method, endpoint, data, token, None, check_status)
\ No newline at end of file
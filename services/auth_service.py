@@ -1,11 +1,13 @@
-from services.api_service import ApiService
-import traceback
+from services.member_service import MemberService
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class AuthService:
     """Servicio para manejar la autenticación con la API."""
     
     @staticmethod
-    def authenticate(telegram_id):
+    async def authenticate(telegram_id):
         """Autentica al usuario con la API y obtiene un token.
         
         En lugar de usar un endpoint específico de autenticación,
@@ -18,23 +20,22 @@ class AuthService:
             tuple: (status_code, token)
         """
         try:
-            print(f"Verificando si el usuario {telegram_id} existe en la API")
+            logger.debug("Verificando si el usuario %s existe en la API", telegram_id)
             
             # Verificar si el usuario existe
-            status_code, response = ApiService.request("GET", f"/members/{telegram_id}", check_status=False)
-            print(f"Respuesta de verificación: status_code={status_code}, response={response}")
+            status_code, response = await MemberService.get_member(telegram_id)
+            logger.debug("Respuesta de verificación: status_code=%s, response=%s", status_code, Payload(response))
             
             if status_code == 200 and response:
                 # Si el usuario existe, usamos su ID de Telegram como "token"
                 # Esto es un enfoque simplificado que no usa JWT
-                print(f"Usuario {telegram_id} existe en la API")
+                logger.debug("Usuario %s existe en la API", telegram_id)
                 return status_code, telegram_id
             else:
                 error_msg = response.get("detail", "Error desconocido")
-                print(f"Error al verificar usuario: {error_msg}")
+                logger.error("Error al verificar usuario: %s", error_msg)
                 return status_code, None
                 
         except Exception as e:
-            print(f"Error en authenticate: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error en authenticate: %s", e)
             return 500, None 
\ No newline at end of file
@@ -0,0 +1,334 @@
+"""
+Balance Cache Module
+
+This module keeps a local copy of the balances of each family and applies every
+successful write to it as a delta, so the balance screens shown right after
+creating an expense, a payment or a debt adjustment do not need to wait for
+/families/{id}/balances.
+
+The balances are stored as the net amount owed between each pair of members,
+which is how the API reports them: one debt (and the matching credit) per pair.
+A family is fetched from the server again once BALANCE_RECONCILE_INTERVAL
+seconds have passed since the last server copy, and the local copy is replaced
+by the server one; any difference is logged and counted as a mismatch. Writes
+that cannot be expressed as a delta (edits, deletions, status changes) drop the
+family so the next read goes to the server.
+"""
+
+import threading
+import time
+from config import BALANCE_CACHE_ENABLED, BALANCE_RECONCILE_INTERVAL
+from services.models import MemberBalance, Debt, Credit, is_record, normalize_id, to_cents
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Diferencias menores que esto se consideran cero, como hace la API
+_EPSILON = 0.01
+
+class FamilyBalances:
+    """
+    Pairwise balances of one family.
+
+    Attributes:
+        members (dict): Member ID to the server MemberBalance of that member
+        net (dict): (member_a, member_b) with member_a < member_b to the amount
+            member_a owes member_b (negative if member_b owes member_a)
+        verified_at (float): time.monotonic() of the last server copy
+        deltas (int): Writes applied since the last server copy
+    """
+
+    __slots__ = ("members", "net", "verified_at", "deltas", "_materialized")
+
+    def __init__(self, members, net):
+        self.members = members
+        self.net = net
+        self.verified_at = time.monotonic()
+        self.deltas = 0
+        self._materialized = None
+
+    @staticmethod
+    def parse(balances):
+        """
+        Builds the pairwise balances from a /families/{id}/balances response.
+
+        Args:
+            balances (list): MemberBalance records, or [{member_id, name,
+                debts: [{to, to_id, amount}], credits: [...]}]
+
+        Returns:
+            FamilyBalances: The parsed balances, or None if the response has
+            another format
+        """
+        if not isinstance(balances, list):
+            return None
+        members = {}
+        for entry in balances:
+            if not is_record(entry) or entry.get("member_id") is None or not isinstance(entry.get("debts", []), (list, tuple)):
+                return None
+            entry = MemberBalance.from_api(entry)
+            members[entry.member_id] = entry
+        ids_by_name = {entry.name: member_id for member_id, entry in members.items()}
+
+        net = {}
+        for member_id, entry in members.items():
+            for debt in entry.debts:
+                creditor = debt.to_id if debt.to_id is not None else ids_by_name.get(debt.to_name)
+                if creditor is None or creditor not in members:
+                    return None
+                FamilyBalances._add(net, member_id, creditor, debt.amount)
+        return FamilyBalances(members, net)
+
+    @staticmethod
+    def _add(net, debtor, creditor, amount):
+        """Adds an amount owed by debtor to creditor to a pairwise mapping."""
+        if debtor == creditor:
+            return
+        if debtor < creditor:
+            net[(debtor, creditor)] = net.get((debtor, creditor), 0.0) + amount
+        else:
+            net[(creditor, debtor)] = net.get((creditor, debtor), 0.0) - amount
+
+    def owe(self, debtor, creditor, amount):
+        """
+        Records that debtor owes creditor an additional amount.
+
+        Args:
+            debtor (str): Member ID of the debtor
+            creditor (str): Member ID of the creditor
+            amount (float): Amount; negative to reduce the debt
+
+        Returns:
+            bool: False if one of the members is unknown
+        """
+        debtor, creditor = str(debtor), str(creditor)
+        if debtor not in self.members or creditor not in self.members:
+            return False
+        FamilyBalances._add(self.net, debtor, creditor, amount)
+        self._materialized = None
+        return True
+
+    def pairs(self):
+        """
+        Lists the non-zero debts.
+
+        Returns:
+            dict: (debtor, creditor) to the rounded amount owed
+        """
+        result = {}
+        for (first, second), amount in self.net.items():
+            if abs(amount) < _EPSILON:
+                continue
+            if amount > 0:
+                result[(first, second)] = round(amount, 2)
+            else:
+                result[(second, first)] = round(-amount, 2)
+        return result
+
+    def materialize(self):
+        """
+        Builds the balances in the per-member format of the API.
+
+        Returns:
+            list: One MemberBalance per member with its debts and credits
+        """
+        if self._materialized is not None:
+            return self._materialized
+
+        debts = {member_id: [] for member_id in self.members}
+        credits = {member_id: [] for member_id in self.members}
+        for (debtor, creditor), amount in self.pairs().items():
+            cents = to_cents(amount)
+            debts[debtor].append(Debt(creditor, self.members[creditor].name, cents))
+            credits[creditor].append(Credit(debtor, self.members[debtor].name, cents))
+
+        self._materialized = [
+            entry.with_entries(debts[member_id], credits[member_id])
+            for member_id, entry in self.members.items()
+        ]
+        return self._materialized
+
+class BalanceCache:
+    """
+    Process-wide cache of family balances updated with local deltas.
+
+    Each family also has a version that changes with every write, so a server
+    response requested before a write is not stored over the newer local copy.
+    """
+
+    _families = {}
+    _versions = {}
+    _epoch = 0
+    _lock = threading.Lock()
+    _hits = 0
+    _deltas = 0
+    _reconciles = 0
+    _mismatches = 0
+
+    @staticmethod
+    def get(family_id):
+        """
+        Returns the local balances of a family, if they do not need reconciling.
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            list: MemberBalance records, or None
+        """
+        if not BALANCE_CACHE_ENABLED or not family_id:
+            return None
+        with BalanceCache._lock:
+            balances = BalanceCache._families.get(str(family_id))
+            if balances is None or time.monotonic() - balances.verified_at > BALANCE_RECONCILE_INTERVAL:
+                return None
+            BalanceCache._hits += 1
+            return balances.materialize()
+
+    @staticmethod
+    def version(family_id):
+        """
+        Returns the current version of a family, to be passed to store().
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            tuple: The version
+        """
+        return BalanceCache._epoch, BalanceCache._versions.get(str(family_id), 0)
+
+    @staticmethod
+    def store(family_id, response, version):
+        """
+        Replaces the local balances of a family with a server response.
+
+        Args:
+            family_id (str): ID of the family
+            response (list): Response of /families/{id}/balances
+            version (tuple): Value of version() before the request was made
+        """
+        if not BALANCE_CACHE_ENABLED or not family_id:
+            return
+        family_id = str(family_id)
+        server = FamilyBalances.parse(response)
+        with BalanceCache._lock:
+            if (BalanceCache._epoch, BalanceCache._versions.get(family_id, 0)) != version:
+                # Una escritura terminó mientras se pedían los balances
+                return
+            if server is None:
+                BalanceCache._families.pop(family_id, None)
+                return
+            local = BalanceCache._families.get(family_id)
+            if local is not None and local.deltas:
+                BalanceCache._reconciles += 1
+                if local.pairs() != server.pairs():
+                    BalanceCache._mismatches += 1
+                    logger.warning(
+                        "Local balances of family %s differed from the server after %s local updates; using the server balances",
+                        family_id, local.deltas
+                    )
+            BalanceCache._families[family_id] = server
+
+    @staticmethod
+    def _apply(family_id, changes):
+        """
+        Applies a list of (debtor, creditor, amount) changes to a family.
+
+        If the family is not cached nothing is done; if a member is unknown the
+        family is dropped so it is fetched again. If the family itself is
+        unknown, every family is dropped.
+
+        Args:
+            family_id (str): ID of the family
+            changes (list): (debtor, creditor, amount) tuples
+        """
+        if not family_id:
+            BalanceCache.invalidate()
+            return
+        family_id = str(family_id)
+        with BalanceCache._lock:
+            BalanceCache._versions[family_id] = BalanceCache._versions.get(family_id, 0) + 1
+            balances = BalanceCache._families.get(family_id)
+            if balances is None or not changes:
+                return
+            for debtor, creditor, amount in changes:
+                if not balances.owe(debtor, creditor, amount):
+                    logger.info("Unknown member in balance update of family %s; dropping local balances", family_id)
+                    BalanceCache._families.pop(family_id, None)
+                    return
+            balances.deltas += 1
+            BalanceCache._deltas += 1
+
+    @staticmethod
+    def apply_expense(family_id, paid_by, amount, split_among=None):
+        """
+        Applies a new expense, split evenly among its members.
+
+        Args:
+            family_id (str): ID of the family
+            paid_by (str): Member ID of the payer
+            amount (float): Amount of the expense
+            split_among (list, optional): Member IDs (or member dicts) sharing the
+                expense; every member of the family if omitted
+        """
+        with BalanceCache._lock:
+            balances = BalanceCache._families.get(str(family_id)) if family_id else None
+            members = list(balances.members) if balances is not None else []
+        if split_among:
+            members = [normalize_id(member) for member in split_among]
+        if not members:
+            BalanceCache._apply(family_id, [])
+            return
+        share = float(amount) / len(members)
+        BalanceCache._apply(family_id, [
+            (member_id, str(paid_by), share)
+            for member_id in members
+            if member_id != str(paid_by)
+        ])
+
+    @staticmethod
+    def apply_payment(family_id, from_member, to_member, amount):
+        """
+        Applies a confirmed payment or a debt adjustment.
+
+        Args:
+            family_id (str): ID of the family
+            from_member (str): Member ID of the debtor
+            to_member (str): Member ID of the creditor
+            amount (float): Amount paid or adjusted
+        """
+        BalanceCache._apply(family_id, [(str(from_member), str(to_member), -float(amount))])
+
+    @staticmethod
+    def invalidate(family_id=None):
+        """
+        Drops the local balances of a family, or of every family if no ID is given.
+
+        Args:
+            family_id (str, optional): ID of the family
+        """
+        with BalanceCache._lock:
+            if family_id is None:
+                BalanceCache._families.clear()
+                BalanceCache._epoch += 1
+                return
+            family_id = str(family_id)
+            BalanceCache._families.pop(family_id, None)
+            BalanceCache._versions[family_id] = BalanceCache._versions.get(family_id, 0) + 1
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing the cache.
+
+        Returns:
+            dict: families, hits, deltas applied, reconciliations and mismatches
+        """
+        return {
+            "families": len(BalanceCache._families),
+            "hits": BalanceCache._hits,
+            "deltas": BalanceCache._deltas,
+            "reconciles": BalanceCache._reconciles,
+            "mismatches": BalanceCache._mismatches
+        }
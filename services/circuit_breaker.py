@@ -0,0 +1,265 @@
+"""
+Circuit Breaker Module
+
+This module protects the bot from a slow or unavailable backend API. Requests
+are grouped by endpoint family (members, families, expenses, payments); when a
+group keeps failing its circuit opens and further requests fail immediately
+instead of waiting for the full timeout. After a cool-down a single probe
+request is let through to check whether the backend has recovered.
+
+The timeout of each request also adapts to the latency observed for its group,
+so a healthy backend is not given the whole configured timeout to answer.
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+from config import (
+    API_BASE_URL,
+    API_BREAKER_FAILURE_THRESHOLD,
+    API_BREAKER_RESET_TIMEOUT,
+    API_TIMEOUT_MIN,
+    API_TIMEOUT_P99_FACTOR,
+    API_LATENCY_WINDOW
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Grupos de endpoints con su propio circuito
+ENDPOINT_GROUPS = ("members", "families", "expenses", "payments")
+
+# Número mínimo de muestras antes de adaptar el timeout
+MIN_LATENCY_SAMPLES = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the circuit of its group is open."""
+
+class _CircuitState:
+    """
+    Mutable state of the circuit for one endpoint group.
+
+    The latency window is kept twice: in arrival order, to know which sample
+    leaves the window, and sorted, so the p99 is read without sorting.
+    """
+
+    __slots__ = ("state", "failures", "opened_at", "probe_in_flight", "latencies", "ordered")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.latencies = deque(maxlen=API_LATENCY_WINDOW)
+        self.ordered = []
+
+    def add_latency(self, latency):
+        """Adds a sample to the window, dropping the oldest one if it is full."""
+        if self.latencies.maxlen == 0:
+            return
+        if len(self.latencies) == self.latencies.maxlen:
+            del self.ordered[bisect.bisect_left(self.ordered, self.latencies[0])]
+        self.latencies.append(latency)
+        bisect.insort(self.ordered, latency)
+
+    @property
+    def p99(self):
+        """p99 latency of the window, or None if it is empty."""
+        if not self.ordered:
+            return None
+        return self.ordered[min(len(self.ordered) - 1, math.ceil(0.99 * len(self.ordered)) - 1)]
+
+class CircuitBreaker:
+    """
+    Per endpoint group circuit breaker with half-open probing and adaptive timeouts.
+
+    The state is shared by the asynchronous services layer and the synchronous
+    helpers in utils, so every change is made under a lock.
+    """
+
+    _circuits = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def group_for(url):
+        """
+        Finds the endpoint group of a request URL.
+
+        Args:
+            url (str): Absolute request URL
+
+        Returns:
+            str: One of ENDPOINT_GROUPS, or "other"
+        """
+        path = urlsplit(url).path
+        base_path = urlsplit(API_BASE_URL).path.rstrip("/")
+        if base_path and path.startswith(base_path):
+            path = path[len(base_path):]
+        first_segment = path.lstrip("/").split("/", 1)[0]
+        return first_segment if first_segment in ENDPOINT_GROUPS else "other"
+
+    @staticmethod
+    def _get_circuit(group):
+        """
+        Returns the state of a group, creating it on first use. Callers hold the lock.
+
+        Args:
+            group (str): Endpoint group
+
+        Returns:
+            _CircuitState: Mutable circuit state
+        """
+        circuit = CircuitBreaker._circuits.get(group)
+        if circuit is None:
+            circuit = _CircuitState()
+            CircuitBreaker._circuits[group] = circuit
+        return circuit
+
+    @staticmethod
+    def allow(group):
+        """
+        Decides whether a request of the group may be sent.
+
+        An open circuit rejects requests until the reset timeout has elapsed;
+        then it becomes half-open and lets exactly one probe through.
+
+        Args:
+            group (str): Endpoint group
+
+        Returns:
+            bool: True if the request may be sent
+        """
+        with CircuitBreaker._lock:
+            circuit = CircuitBreaker._get_circuit(group)
+
+            if circuit.state == CLOSED:
+                return True
+
+            if circuit.state == OPEN:
+                if time.monotonic() - circuit.opened_at < API_BREAKER_RESET_TIMEOUT:
+                    return False
+                circuit.state = HALF_OPEN
+                logger.info("Circuit for '%s' is half-open, probing the API", group)
+
+            # Semiabierto: solo una solicitud de prueba a la vez
+            if circuit.probe_in_flight:
+                return False
+            circuit.probe_in_flight = True
+            return True
+
+    @staticmethod
+    def record_success(group, latency):
+        """
+        Records a request that reached the API and got a non-5xx answer.
+
+        Args:
+            group (str): Endpoint group
+            latency (float): Time the request took, in seconds
+        """
+        with CircuitBreaker._lock:
+            circuit = CircuitBreaker._get_circuit(group)
+            circuit.add_latency(latency)
+            circuit.failures = 0
+            circuit.probe_in_flight = False
+            if circuit.state != CLOSED:
+                circuit.state = CLOSED
+                logger.info("Circuit for '%s' closed, the API is answering again", group)
+
+    @staticmethod
+    def record_failure(group):
+        """
+        Records a request that timed out, could not connect or got a 5xx answer.
+
+        Args:
+            group (str): Endpoint group
+        """
+        with CircuitBreaker._lock:
+            circuit = CircuitBreaker._get_circuit(group)
+            circuit.failures += 1
+            circuit.probe_in_flight = False
+
+            if circuit.state == HALF_OPEN or circuit.failures >= API_BREAKER_FAILURE_THRESHOLD:
+                if circuit.state != OPEN:
+                    logger.warning(
+                        "Circuit for '%s' opened after %s failures; failing fast for %ss",
+                        group, circuit.failures, API_BREAKER_RESET_TIMEOUT
+                    )
+                circuit.state = OPEN
+                circuit.opened_at = time.monotonic()
+
+    @staticmethod
+    def record_abandoned(group):
+        """
+        Releases the probe slot of a request that was cancelled before finishing.
+
+        Args:
+            group (str): Endpoint group
+        """
+        with CircuitBreaker._lock:
+            CircuitBreaker._get_circuit(group).probe_in_flight = False
+
+    @staticmethod
+    def timeout_for(group, default_timeout):
+        """
+        Computes the timeout for a request from the latency observed for its group.
+
+        The timeout is the observed p99 latency times a safety factor, clamped
+        between API_TIMEOUT_MIN and the timeout requested by the caller.
+
+        Args:
+            group (str): Endpoint group
+            default_timeout (float): Timeout requested by the caller
+
+        Returns:
+            float: Timeout in seconds
+        """
+        with CircuitBreaker._lock:
+            circuit = CircuitBreaker._get_circuit(group)
+            if len(circuit.latencies) < MIN_LATENCY_SAMPLES:
+                return default_timeout
+            p99 = circuit.p99
+
+        return max(API_TIMEOUT_MIN, min(default_timeout, p99 * API_TIMEOUT_P99_FACTOR))
+
+    @staticmethod
+    def is_open(group):
+        """
+        Tells whether the circuit of a group is currently rejecting requests.
+
+        Args:
+            group (str): Endpoint group
+
+        Returns:
+            bool: True if the circuit is open or half-open
+        """
+        with CircuitBreaker._lock:
+            return CircuitBreaker._get_circuit(group).state != CLOSED
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns the state of every circuit.
+
+        Returns:
+            dict: For each group, its state, consecutive failures, latency samples and p99
+        """
+        with CircuitBreaker._lock:
+            groups = list(CircuitBreaker._circuits.items())
+        return {
+            group: {
+                "state": circuit.state,
+                "failures": circuit.failures,
+                "samples": len(circuit.latencies),
+                "p99": circuit.p99
+            }
+            for group, circuit in groups
+        }
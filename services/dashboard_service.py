@@ -0,0 +1,181 @@
+"""
+Dashboard Service Module
+
+This module builds the "dashboard snapshot" used by the main menu, the balances
+view and the payment flow: the current member, their family and the family
+balances. The three requests are made concurrently, so building the snapshot
+takes about as long as the slowest of them instead of their sum.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from services.member_service import MemberService
+from services.family_service import FamilyService
+from services.family_directory import FamilyDirectory
+from services.models import is_record
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class DashboardSnapshot:
+    """
+    Member, family and balances of a user, fetched together.
+
+    Each part keeps the status code returned by the API so callers can report
+    errors exactly as they did when they made the requests one by one.
+    """
+
+    telegram_id: str
+    family_id: Optional[str]
+    member_status: int
+    member: Optional[Dict[str, Any]]
+    family_status: int
+    family: Optional[Dict[str, Any]]
+    balances_status: int
+    balances: Optional[List[Dict[str, Any]]]
+
+    @property
+    def members(self):
+        """List of family members, or an empty list if the family was not loaded."""
+        if self.family_status == 200 and is_record(self.family):
+            return self.family.get("members", []) or []
+        return []
+
+    @property
+    def member_id(self):
+        """ID of the current member, from the member record or the family members."""
+        if self.member_status == 200 and is_record(self.member) and self.member.get("id"):
+            return self.member.get("id")
+        for member in self.members:
+            if str(member.get("telegram_id")) == str(self.telegram_id):
+                return member.get("id")
+        return None
+
+    def store_in_context(self, context):
+        """
+        Saves the snapshot in the user context under the keys used by the handlers.
+
+        Args:
+            context (ContextTypes.DEFAULT_TYPE): Telegram context
+        """
+        context.user_data["telegram_id"] = self.telegram_id
+        if self.family_id:
+            context.user_data["family_id"] = self.family_id
+        if self.member_status == 200 and is_record(self.member):
+            context.user_data["member"] = self.member
+        member_id = self.member_id
+        if member_id:
+            context.user_data["member_id"] = member_id
+            context.user_data["current_member_id"] = member_id
+        if self.family_id and self.family_status == 200 and is_record(self.family):
+            # Referencias al registro compartido de la familia, no una copia por usuario
+            record = FamilyDirectory.update(self.family_id, self.members, self.family.get("name"))
+            context.user_data["family"] = record.family
+            context.user_data["member_names"] = record.member_names
+
+class DashboardService:
+    """Service that fetches the dashboard snapshot of a user."""
+
+    @staticmethod
+    async def get_snapshot(telegram_id, family_id=None):
+        """
+        Fetches the member, family and balances of a user concurrently.
+
+        When the family ID is not known yet, the member is fetched first to
+        find it, and then the family and balances are fetched concurrently.
+
+        Args:
+            telegram_id (str): Telegram ID of the user
+            family_id (str, optional): ID of the family, if already known
+
+        Returns:
+            DashboardSnapshot: The combined result
+        """
+        telegram_id = str(telegram_id)
+
+        if family_id:
+            member_result, family_result, balances_result = await asyncio.gather(
+                MemberService.get_member(telegram_id),
+                FamilyService.get_family(family_id, telegram_id),
+                FamilyService.get_family_balances(family_id, telegram_id),
+                return_exceptions=True
+            )
+            member_status, member = DashboardService._unpack(member_result)
+
+            # Si el miembro pertenece ahora a otra familia, recargar la correcta
+            member_family_id = member.get("family_id") if member_status == 200 and is_record(member) else None
+            if member_family_id and str(member_family_id) != str(family_id):
+                logger.info("Member %s moved from family %s to %s", telegram_id, family_id, member_family_id)
+                family_id = member_family_id
+                family_result, balances_result = await asyncio.gather(
+                    FamilyService.get_family(family_id, telegram_id),
+                    FamilyService.get_family_balances(family_id, telegram_id),
+                    return_exceptions=True
+                )
+        else:
+            member_status, member = DashboardService._unpack(
+                await DashboardService._safe(MemberService.get_member(telegram_id))
+            )
+            if member_status == 200 and is_record(member):
+                family_id = member.get("family_id")
+
+            if not family_id:
+                return DashboardSnapshot(telegram_id, None, member_status, member, 404, None, 404, None)
+
+            family_result, balances_result = await asyncio.gather(
+                FamilyService.get_family(family_id, telegram_id),
+                FamilyService.get_family_balances(family_id, telegram_id),
+                return_exceptions=True
+            )
+
+        family_status, family = DashboardService._unpack(family_result)
+        balances_status, balances = DashboardService._unpack(balances_result)
+
+        return DashboardSnapshot(
+            telegram_id, family_id,
+            member_status, member,
+            family_status, family,
+            balances_status, balances
+        )
+
+    @staticmethod
+    async def _safe(coroutine):
+        """
+        Awaits a service call, returning the exception instead of raising it.
+
+        Args:
+            coroutine: Service call returning (status_code, response)
+
+        Returns:
+            tuple or Exception: The result of the call
+        """
+        try:
+            return await coroutine
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def _unpack(result):
+        """
+        Converts a service result (or the exception it raised) into (status_code, response).
+
+        A cancellation collected by asyncio.gather(return_exceptions=True) is
+        raised again instead of being reported as an API error.
+
+        Args:
+            result: (status_code, response) tuple or an exception
+
+        Returns:
+            tuple: (status_code, response)
+
+        Raises:
+            asyncio.CancelledError: If the service call was cancelled
+        """
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.error("Error fetching dashboard data: %s", result)
+            return 500, {"error": str(result)}
+        return result
@@ -0,0 +1,211 @@
+"""
+Debt Simplifier Module
+
+This module turns the balances of a family into the smallest set of transfers
+that settles everyone up. Only the net balance of each member matters: whoever
+owes money pays, whoever is owed receives, regardless of which pairs of
+members the debts came from. With n members the pairwise debts can need up to
+n·(n-1)/2 transfers, while the simplified plan needs at most n-1.
+
+Two solvers are used:
+- Exact, for groups of up to DEBT_SIMPLIFIER_EXACT_MAX members with a non-zero
+  balance: the members are split into the largest number of groups whose
+  balances add up to zero, each of which settles with one transfer less than
+  its size. This is the true minimum, found with a dynamic program over the
+  subsets of members.
+- Greedy, for larger groups: the largest debtor pays the largest creditor
+  until both lists are empty. It needs at most n-1 transfers.
+
+Amounts are handled in integer cents to avoid rounding drift.
+"""
+
+import heapq
+from config import DEBT_SIMPLIFIER_EXACT_MAX
+from services.models import MemberBalance, is_record
+
+class Transfer:
+    """
+    One settle-up transfer.
+
+    Attributes:
+        from_id: Member ID of the debtor
+        from_name (str): Name of the debtor
+        to_id: Member ID of the creditor
+        to_name (str): Name of the creditor
+        amount (float): Amount to transfer
+    """
+
+    __slots__ = ("from_id", "from_name", "to_id", "to_name", "amount")
+
+    def __init__(self, from_id, from_name, to_id, to_name, amount):
+        self.from_id = from_id
+        self.from_name = from_name
+        self.to_id = to_id
+        self.to_name = to_name
+        self.amount = amount
+
+    def __repr__(self):
+        return f"Transfer({self.from_name} -> {self.to_name}: {self.amount:.2f})"
+
+class DebtSimplifier:
+    """Minimum-transfer settlement of family balances."""
+
+    @staticmethod
+    def net_balances(balances):
+        """
+        Extracts the net balance of each member from a balances response.
+
+        Accepts both formats used by the API: one entry per member with
+        "debts" and "credits", or one entry per pair with "from_member",
+        "to_member" and "amount".
+
+        Args:
+            balances (list): MemberBalance records, or the raw response of
+                /families/{id}/balances
+
+        Returns:
+            dict: Member ID (str) to {"id", "name", "net"}; a positive net
+            means the member is owed money
+        """
+        nets = {}
+
+        def entry(member_id, name):
+            key = str(member_id)
+            if key not in nets:
+                nets[key] = {"id": member_id, "name": name or f"Usuario {member_id}", "net": 0.0}
+            return nets[key]
+
+        for balance in balances or []:
+            if isinstance(balance, MemberBalance):
+                entry(balance.member_id, balance.name)["net"] += balance.net_balance
+            elif not is_record(balance):
+                continue
+            elif "member_id" in balance:
+                member = entry(balance["member_id"], balance.get("name"))
+                member["net"] += sum(float(credit.get("amount", 0) or 0) for credit in balance.get("credits", []) or [])
+                member["net"] -= sum(float(debt.get("amount", 0) or 0) for debt in balance.get("debts", []) or [])
+            elif isinstance(balance.get("from_member"), dict) and isinstance(balance.get("to_member"), dict):
+                amount = float(balance.get("amount", 0) or 0)
+                debtor, creditor = balance["from_member"], balance["to_member"]
+                entry(debtor.get("id"), debtor.get("name"))["net"] -= amount
+                entry(creditor.get("id"), creditor.get("name"))["net"] += amount
+        return nets
+
+    @staticmethod
+    def simplify(nets, exact_max=None):
+        """
+        Computes the minimal set of transfers that settles the given balances.
+
+        Args:
+            nets (dict): Output of net_balances()
+            exact_max (int, optional): Largest group solved exactly;
+                DEBT_SIMPLIFIER_EXACT_MAX by default
+
+        Returns:
+            list: Transfer objects, largest amount first
+        """
+        exact_max = DEBT_SIMPLIFIER_EXACT_MAX if exact_max is None else exact_max
+        members = [member for member in nets.values() if round(member["net"] * 100) != 0]
+        cents = [int(round(member["net"] * 100)) for member in members]
+
+        # El redondeo puede dejar unos céntimos sueltos; se asignan al mayor saldo
+        drift = sum(cents)
+        if drift and cents:
+            largest = max(range(len(cents)), key=lambda position: abs(cents[position]))
+            cents[largest] -= drift
+
+        if len(members) <= exact_max:
+            groups = DebtSimplifier._zero_sum_groups(cents)
+        else:
+            groups = [list(range(len(members)))]
+
+        transfers = []
+        for group in groups:
+            for debtor, creditor, amount in DebtSimplifier._greedy([(position, cents[position]) for position in group]):
+                transfers.append(Transfer(
+                    members[debtor]["id"], members[debtor]["name"],
+                    members[creditor]["id"], members[creditor]["name"],
+                    amount / 100
+                ))
+        transfers.sort(key=lambda transfer: transfer.amount, reverse=True)
+        return transfers
+
+    @staticmethod
+    def _greedy(balances):
+        """
+        Settles a group by matching the largest debtor with the largest creditor.
+
+        Args:
+            balances (list): (position, cents) pairs that add up to zero
+
+        Returns:
+            list: (debtor position, creditor position, cents) transfers
+        """
+        creditors = [(-amount, position) for position, amount in balances if amount > 0]
+        debtors = [(amount, position) for position, amount in balances if amount < 0]
+        heapq.heapify(creditors)
+        heapq.heapify(debtors)
+
+        transfers = []
+        while creditors and debtors:
+            credit, creditor = heapq.heappop(creditors)
+            debt, debtor = heapq.heappop(debtors)
+            amount = min(-credit, -debt)
+            transfers.append((debtor, creditor, amount))
+            if -credit > amount:
+                heapq.heappush(creditors, (credit + amount, creditor))
+            if -debt > amount:
+                heapq.heappush(debtors, (debt + amount, debtor))
+        return transfers
+
+    @staticmethod
+    def _zero_sum_groups(cents):
+        """
+        Splits the members into the largest number of groups that add up to zero.
+
+        A group of k members settles with k-1 transfers, so maximising the
+        number of groups minimises the total number of transfers.
+
+        Args:
+            cents (list): Net balance of each member in cents, adding up to zero
+
+        Returns:
+            list: Lists of member positions
+        """
+        size = len(cents)
+        if size == 0:
+            return []
+        full = (1 << size) - 1
+
+        # Suma de cada subconjunto, construida a partir del subconjunto sin su bit más bajo
+        sums = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            low = mask & -mask
+            sums[mask] = sums[mask ^ low] + cents[low.bit_length() - 1]
+
+        # best[mask]: máximo número de grupos de suma cero en que se puede cerrar mask
+        best = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            value = 0
+            rest = mask
+            while rest:
+                low = rest & -rest
+                value = max(value, best[mask ^ low])
+                rest ^= low
+            best[mask] = value + (1 if sums[mask] == 0 else 0)
+
+        # Reconstruir los grupos: en cada paso, un subconjunto de suma cero cuyo
+        # resto conserve el óptimo; por eso no puede partirse en dos grupos
+        groups = []
+        mask = full
+        while mask:
+            group_mask = mask
+            sub = (mask - 1) & mask
+            while sub:
+                if sums[sub] == 0 and best[mask ^ sub] == best[mask] - 1:
+                    group_mask = sub
+                    break
+                sub = (sub - 1) & mask
+            groups.append([position for position in range(size) if group_mask >> position & 1])
+            mask ^= group_mask
+        return groups
@@ -5,10 +5,17 @@ This module provides services for managing expenses in the application.
 It handles expense creation, retrieval, updating, and deletion.
 """
 
-from services.api_service import ApiService
-import traceback
-import requests
-from config import API_BASE_URL
+from services.api_service import ApiService, UNAVAILABLE_STATUS_CODES, STALE_OK
+from services.response_cache import ResponseCache
+from services.balance_cache import BalanceCache
+from services.ledger import Ledger, EXPENSE_CREATED, EXPENSE_UPDATED, EXPENSE_DELETED
+from services.pagination import PageIndex, SortedIndex, EXPENSES
+from services.models import Expense
+from config import API_DATE_FILTER_ENABLED
+from services.write_retry import WriteRetry, IDEMPOTENCY_HEADER
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class ExpenseService:
     """
@@ -19,10 +26,13 @@ class ExpenseService:
     """
     
     @staticmethod
-    def create_expense(description, amount, paid_by, family_id, telegram_id=None, split_among=None):
+    async def create_expense(description, amount, paid_by, family_id, telegram_id=None, split_among=None, on_retry_result=None, submission_id=None):
         """
         Crea un nuevo gasto.
         
+        Si la API no responde, el gasto se reintenta en segundo plano con la misma
+        clave de idempotencia y se devuelve 202 con {"queued": True}.
+        
         Args:
             description (str): Descripción del gasto
             amount (float): Monto del gasto
@@ -30,56 +40,70 @@ class ExpenseService:
             family_id (str): ID de la familia del gasto
             telegram_id (str, opcional): ID de Telegram para validación
             split_among (list, opcional): Lista de IDs de miembros entre los que dividir el gasto
+            on_retry_result (callable, opcional): Corrutina llamada con (status_code, response)
+                cuando termina un reintento en segundo plano
+            submission_id (str, opcional): ID de la conversación que creó el gasto
+                (WriteRetry.new_submission_id), parte de la clave de idempotencia
             
         Returns:
             tuple: (status_code, response_json)
         """
-        try:
-            # Construir la URL para la solicitud
-            url = f"{API_BASE_URL}/expenses/"
-            
-            # Preparar los datos para la solicitud
-            expense_data = {
-                "description": description,
-                "amount": amount,
-                "paid_by": paid_by
-            }
-            
-            # Añadir split_among solo si está especificado
-            if split_among is not None:
-                expense_data["split_among"] = split_among
-            
-            # Parámetros para la solicitud
-            params = {}
-            if telegram_id:
-                params["telegram_id"] = telegram_id
-                
-            print(f"[API] Creando gasto con datos: {expense_data} y params: {params}")
-            
-            # Realizar la solicitud POST a la API
-            response = requests.post(
-                url,
-                json=expense_data,
-                params=params
-            )
-            
-            # Parsear y devolver la respuesta
-            status_code = response.status_code
+        # Preparar los datos para la solicitud
+        expense_data = {
+            "description": description,
+            "amount": amount,
+            "paid_by": paid_by
+        }
+        
+        # Añadir split_among solo si está especificado
+        if split_among is not None:
+            expense_data["split_among"] = split_among
+        
+        idempotency_key = WriteRetry.make_key(telegram_id, "expense", {"family_id": family_id, **expense_data}, submission_id)
+        return await WriteRetry.submit(
+            idempotency_key,
+            lambda: ExpenseService._send_expense(expense_data, family_id, telegram_id, idempotency_key),
+            on_retry_result
+        )
+    
+    @staticmethod
+    async def _send_expense(expense_data, family_id, telegram_id, idempotency_key):
+        """
+        Realiza un intento de creación de gasto.
+        
+        Args:
+            expense_data (dict): Datos del gasto
+            family_id (str): ID de la familia del gasto
+            telegram_id (str): ID de Telegram para validación
+            idempotency_key (str): Clave de idempotencia compartida por todos los intentos
             
-            try:
-                response_json = response.json()
-            except ValueError:
-                # Si no es JSON válido, usar el texto como respuesta
-                response_json = {"detail": response.text}
-                
-            return status_code, response_json
+        Returns:
+            tuple: (status_code, response_json)
+        """
+        logger.debug("[API] Creando gasto con datos: %s y telegram_id: %s", expense_data, telegram_id)
+        
+        status_code, response = await ApiService.request(
+            "POST",
+            "/expenses/",
+            expense_data,
+            token=telegram_id,
+            check_status=False,
+            headers={IDEMPOTENCY_HEADER: idempotency_key}
+        )
+        
+        # Los listados cacheados de la familia ya no son válidos; los balances
+        # locales se actualizan con el nuevo gasto
+        if status_code < 400:
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            BalanceCache.apply_expense(family_id, expense_data["paid_by"], expense_data["amount"], expense_data.get("split_among"))
+            if isinstance(response, dict):
+                Ledger.record(family_id, EXPENSE_CREATED, response.get("id"), response)
             
-        except Exception as e:
-            print(f"Error en create_expense: {str(e)}")
-            return 500, {"detail": str(e)}
+        return status_code, response
     
     @staticmethod
-    def get_family_expenses(family_id, telegram_id=None):
+    async def get_family_expenses(family_id, telegram_id=None):
         """
         Retrieves all expenses for a specific family.
         
@@ -88,22 +112,78 @@ class ExpenseService:
             telegram_id (str, optional): Telegram ID of the user
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, list of Expense records) or (status_code, error response);
+            the status is STALE_OK if the list was served from the ledger because
+            the API was unavailable
         """
-        print(f"Obteniendo gastos para la familia con ID: {family_id}, telegram_id: {telegram_id}")
+        logger.debug("Obteniendo gastos para la familia con ID: %s, telegram_id: %s", family_id, telegram_id)
         
         # Verificar que family_id sea un valor válido
         if not family_id:
-            print("Error: family_id es None o vacío")
+            logger.error("Error: family_id es None o vacío")
             return 400, {"error": "ID de familia no válido"}
         
         # Ya no necesitamos convertir family_id a entero, ahora es un UUID como string
         
+        # Usar la lista reconstruida desde el registro local si es reciente
+        expenses = await Ledger.get_expenses(family_id)
+        if expenses is not None:
+            return 200, expenses
+        
         # Llamar a la API con el ID de Telegram si está disponible
-        return ApiService.request("GET", f"/expenses/family/{family_id}", token=telegram_id, check_status=False)
+        version = Ledger.version(family_id)
+        status_code, response = await ApiService.get_list(
+            f"/expenses/family/{family_id}", token=telegram_id, parse=Expense.from_api, family_id=family_id
+        )
+        if status_code == 200:
+            await Ledger.sync_expenses(family_id, response, version)
+        elif status_code in UNAVAILABLE_STATUS_CODES:
+            # La API no responde: usar la última lista conocida, aunque sea antigua
+            expenses = await Ledger.get_expenses(family_id, stale=True)
+            if expenses is not None:
+                logger.warning("API unavailable (%s), serving the last known expenses of family %s", status_code, family_id)
+                return STALE_OK, expenses
+        return status_code, response
     
     @staticmethod
-    def get_expense(expense_id):
+    async def get_family_expenses_between(family_id, telegram_id=None, since=None, until=None):
+        """
+        Retrieves the expenses of a family created in a date window.
+        
+        If the API accepts date filters only the expenses of the window are
+        downloaded. Otherwise the window is found by bisection in the sorted
+        index of the family, which is reused between queries.
+        
+        Args:
+            family_id (str): ID of the family (UUID as string)
+            telegram_id (str, optional): Telegram ID of the user
+            since (datetime, optional): Start of the window, inclusive
+            until (datetime, optional): End of the window, exclusive
+            
+        Returns:
+            tuple: (status_code, Expense records sorted from most to least recent)
+        """
+        if not family_id:
+            return 400, {"error": "ID de familia no válido"}
+        
+        if API_DATE_FILTER_ENABLED:
+            status_code, response = await ApiService.get_list(
+                f"/expenses/family/{family_id}",
+                token=telegram_id,
+                params=PageIndex.date_params(since, until),
+                parse=Expense.from_api,
+                family_id=family_id
+            )
+            if status_code != 200:
+                return status_code, response
+            return 200, SortedIndex(response).window(since, until)
+        
+        return await PageIndex.window(
+            EXPENSES, family_id, lambda: ExpenseService.get_family_expenses(family_id, telegram_id), since, until
+        )
+    
+    @staticmethod
+    async def get_expense(expense_id):
         """
         Retrieves information about a specific expense.
         
@@ -111,12 +191,15 @@ class ExpenseService:
             expense_id (str): ID of the expense (UUID as string)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Expense) or (status_code, error response)
         """
-        return ApiService.request("GET", f"/expenses/{expense_id}", check_status=False)
+        status_code, response = await ApiService.request("GET", f"/expenses/{expense_id}", check_status=False)
+        if status_code == 200 and isinstance(response, dict):
+            response = Expense.from_api(response)
+        return status_code, response
     
     @staticmethod
-    def update_expense(expense_id, data, telegram_id=None):
+    async def update_expense(expense_id, data, telegram_id=None, family_id=None):
         """
         Updates an existing expense.
         
@@ -124,35 +207,49 @@ class ExpenseService:
             expense_id (str): ID of the expense (UUID as string)
             data (dict): Data to update (dictionary)
             telegram_id (str, optional): Telegram ID of the user
+            family_id (str, optional): ID of the family, used to invalidate cached responses
             
         Returns:
             tuple: (status_code, response)
         """
         try:
-            print(f"Actualizando gasto con ID: {expense_id}, datos: {data}, telegram_id: {telegram_id}")
+            logger.debug("Actualizando gasto con ID: %s, datos: %s, telegram_id: %s", expense_id, Payload(data), telegram_id)
             
             # Usar el endpoint PUT para actualizar el gasto
-            status_code, response = ApiService.request("PUT", f"/expenses/{expense_id}", data, token=telegram_id, check_status=False)
-            print(f"Resultado de update_expense: status_code={status_code}, response={response}")
+            status_code, response = await ApiService.request("PUT", f"/expenses/{expense_id}", data, token=telegram_id, check_status=False)
+            logger.debug("Resultado de update_expense: status_code=%s, response=%s", status_code, Payload(response))
             
             if status_code >= 400:
-                print(f"Error al actualizar gasto: status_code={status_code}, response={response}")
+                logger.error("Error al actualizar gasto: status_code=%s, response=%s", status_code, Payload(response))
+            else:
+                family_id = family_id or ResponseCache.family_of(response)
+                ResponseCache.invalidate_family(family_id)
+                PageIndex.invalidate(family_id)
+                BalanceCache.invalidate(family_id)
+                Ledger.record(family_id, EXPENSE_UPDATED, expense_id, response)
             
             return status_code, response
         except Exception as e:
-            print(f"Excepción en update_expense: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Excepción en update_expense: %s", e)
             return 500, {"error": f"Error al actualizar gasto: {str(e)}"}
     
     @staticmethod
-    def delete_expense(expense_id):
+    async def delete_expense(expense_id, family_id=None):
         """
         Deletes an expense.
         
         Args:
             expense_id (str): ID of the expense (UUID as string)
+            family_id (str, optional): ID of the family, used to invalidate cached responses
             
         Returns:
             tuple: (status_code, response)
         """
-        return ApiService.request("DELETE", f"/expenses/{expense_id}", check_status=False)
\ No newline at end of file
+        status_code, response = await ApiService.request("DELETE", f"/expenses/{expense_id}", check_status=False)
+        if status_code < 400:
+            family_id = family_id or ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            BalanceCache.invalidate(family_id)
+            Ledger.record(family_id, EXPENSE_DELETED, expense_id)
+        return status_code, response
\ No newline at end of file
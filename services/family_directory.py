@@ -0,0 +1,246 @@
+"""
+Family Directory Module
+
+This module keeps one process-wide record per family with its members and the
+member ID to name mapping used by the handlers and formatters. Every user of a
+family references the same record instead of keeping a private copy in their
+context, so the memory used grows with the number of families rather than
+with families × members. A record is replaced when the family is fetched again
+with different members, and dropped when a write changes the members.
+"""
+
+import threading
+import time
+from config import FAMILY_DIRECTORY_TTL
+from services.models import is_record
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Prefijo usado por algunos balances antiguos en lugar del ID
+_USER_PREFIX = "Usuario "
+
+class MemberNames(dict):
+    """
+    Member ID to name mapping keyed by the string form of each ID.
+
+    Lookups also accept integer IDs and the "Usuario X" form, so a single key
+    per member serves every caller that used to store the IDs several times.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def _normalize(key):
+        """
+        Converts a lookup key into the stored string ID.
+
+        Args:
+            key: Member ID as str, int or "Usuario X"
+
+        Returns:
+            str: The normalised ID
+        """
+        if isinstance(key, str) and key.startswith(_USER_PREFIX):
+            return key[len(_USER_PREFIX):]
+        return str(key)
+
+    def __missing__(self, key):
+        normalized = MemberNames._normalize(key)
+        if normalized != key and dict.__contains__(self, normalized):
+            return dict.__getitem__(self, normalized)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or dict.__contains__(self, MemberNames._normalize(key))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class FamilyRecord:
+    """
+    Shared, compact view of one family.
+
+    Attributes:
+        family_id (str): ID of the family
+        family (dict): {"id", "name", "members"} with one {"id", "name", "telegram_id"}
+            dict per member, in the shape handlers expect in context.user_data["family"]
+        member_names (MemberNames): Member ID to name mapping
+        loaded_at (float): time.monotonic() when the record was built
+    """
+
+    __slots__ = ("family_id", "family", "member_names", "loaded_at", "_fingerprint")
+
+    def __init__(self, family_id, name, compact_members):
+        self.family_id = family_id
+        self.family = {"id": family_id, "name": name, "members": compact_members}
+        self.member_names = MemberNames((str(member["id"]), member["name"]) for member in compact_members)
+        self.loaded_at = time.monotonic()
+        self._fingerprint = FamilyRecord.fingerprint(name, compact_members)
+
+    @staticmethod
+    def compact(members):
+        """
+        Keeps only the fields the bot uses from the member dicts of the API.
+
+        Args:
+            members (list): Member records or dicts as returned by the API
+
+        Returns:
+            list: {"id", "name", "telegram_id"} dicts
+        """
+        return [
+            {
+                "id": member.get("id"),
+                "name": member.get("name", f"Usuario {member.get('id')}"),
+                "telegram_id": member.get("telegram_id")
+            }
+            for member in members
+            if is_record(member) and member.get("id") is not None
+        ]
+
+    @staticmethod
+    def fingerprint(name, compact_members):
+        """
+        Summarises the data of a family to detect changes.
+
+        Args:
+            name (str): Name of the family
+            compact_members (list): Member dicts returned by compact()
+
+        Returns:
+            tuple: Comparable summary of the family
+        """
+        return (name, tuple(
+            (str(member["id"]), member["name"], str(member["telegram_id"]))
+            for member in compact_members
+        ))
+
+    @property
+    def members(self):
+        """List of compact member dicts."""
+        return self.family["members"]
+
+    def member(self, member_id):
+        """
+        Finds a member by ID.
+
+        Args:
+            member_id: Member ID as str or int
+
+        Returns:
+            dict: The compact member dict, or None if not found
+        """
+        member_id = str(member_id)
+        for member in self.family["members"]:
+            if str(member["id"]) == member_id:
+                return member
+        return None
+
+class FamilyDirectory:
+    """
+    Process-wide directory of families keyed by family ID.
+
+    FamilyService refreshes a record whenever it fetches the family, and the
+    member-changing writes invalidate it. Records older than
+    FAMILY_DIRECTORY_TTL are treated as missing so they are fetched again.
+    """
+
+    _records = {}
+    _lock = threading.Lock()
+    _refreshes = 0
+
+    @staticmethod
+    def get(family_id):
+        """
+        Returns the record of a family, if it is known and fresh.
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            FamilyRecord: The shared record, or None
+        """
+        if not family_id:
+            return None
+        record = FamilyDirectory._records.get(str(family_id))
+        if record is None or time.monotonic() - record.loaded_at > FAMILY_DIRECTORY_TTL:
+            return None
+        return record
+
+    @staticmethod
+    def update(family_id, members, name=None):
+        """
+        Stores the members of a family, keeping the current record if nothing changed.
+
+        Args:
+            family_id (str): ID of the family
+            members (list): Member dicts as returned by the API
+            name (str, optional): Name of the family; the known name is kept if omitted
+
+        Returns:
+            FamilyRecord: The shared record of the family
+        """
+        family_id = str(family_id)
+        compact_members = FamilyRecord.compact(members)
+        with FamilyDirectory._lock:
+            current = FamilyDirectory._records.get(family_id)
+            if name is None and current is not None:
+                name = current.family.get("name")
+            # Sin cambios: todos los usuarios siguen compartiendo el mismo registro
+            if current is not None and current._fingerprint == FamilyRecord.fingerprint(name, compact_members):
+                current.loaded_at = time.monotonic()
+                return current
+
+            record = FamilyRecord(family_id, name, compact_members)
+            FamilyDirectory._records[family_id] = record
+            FamilyDirectory._refreshes += 1
+            logger.debug("Family directory refreshed for %s (%s members)", family_id, len(record.members))
+            return record
+
+    @staticmethod
+    def update_from_family(family):
+        """
+        Stores a family response from the API.
+
+        Args:
+            family (Family or dict): Family with "id", "name" and "members"
+
+        Returns:
+            FamilyRecord: The shared record, or None if the response has no ID
+        """
+        if not is_record(family) or not family.get("id"):
+            return None
+        return FamilyDirectory.update(family["id"], family.get("members", []) or [], family.get("name"))
+
+    @staticmethod
+    def invalidate(family_id=None):
+        """
+        Drops the record of a family, or every record if no ID is given.
+
+        Args:
+            family_id (str, optional): ID of the family
+        """
+        with FamilyDirectory._lock:
+            if family_id is None:
+                FamilyDirectory._records.clear()
+            else:
+                FamilyDirectory._records.pop(str(family_id), None)
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing the directory.
+
+        Returns:
+            dict: families, members and refreshes (records rebuilt)
+        """
+        records = list(FamilyDirectory._records.values())
+        return {
+            "families": len(records),
+            "members": sum(len(record.members) for record in records),
+            "refreshes": FamilyDirectory._refreshes
+        }
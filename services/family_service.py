@@ -5,8 +5,17 @@ This module provides services for managing families in the application.
 It handles family creation, retrieval, member management, and balance calculations.
 """
 
-from services.api_service import ApiService
-import traceback
+from services.api_service import ApiService, UNAVAILABLE_STATUS_CODES
+from services.response_cache import ResponseCache
+from services.family_directory import FamilyDirectory
+from services.member_index import MemberIndex
+from services.balance_cache import BalanceCache
+from services.settlement_engine import SettlementEngine
+from services.models import Family, Member, MemberBalance, is_record
+from config import SETTLEMENT_FALLBACK_ENABLED
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class FamilyService:
     """
@@ -17,7 +26,7 @@ class FamilyService:
     """
     
     @staticmethod
-    def create_family(name, members, token=None):
+    async def create_family(name, members, token=None):
         """
         Creates a new family with initial members.
         
@@ -29,17 +38,22 @@ class FamilyService:
         Returns:
             tuple: (status_code, response)
         """
-        print(f"Creando familia con nombre '{name}' y miembros: {members}")
+        logger.debug("Creando familia con nombre '%s' y miembros: %s", name, Payload(members))
         data = {
             "name": name,
             "members": members
         }
-        status_code, response = ApiService.request("POST", "/families/", data, token=token, check_status=False)
-        print(f"Respuesta de create_family: status_code={status_code}, response={response}")
+        status_code, response = await ApiService.request("POST", "/families/", data, token=token, check_status=False)
+        logger.debug("Respuesta de create_family: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code < 400:
+            # Los miembros iniciales ya no son "usuarios sin familia"
+            for member in members or []:
+                if isinstance(member, dict) and member.get("telegram_id"):
+                    MemberIndex.invalidate(member["telegram_id"])
         return status_code, response
     
     @staticmethod
-    def get_family(family_id, token=None):
+    async def get_family(family_id, token=None):
         """
         Retrieves information about a specific family.
         
@@ -48,15 +62,43 @@ class FamilyService:
             token (str, optional): Authentication token
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Family) or (status_code, error response)
         """
-        print(f"Obteniendo información de la familia con ID: {family_id}")
-        status_code, response = ApiService.request("GET", f"/families/{family_id}", token=token, check_status=False)
-        print(f"Respuesta de get_family: status_code={status_code}, response={response}")
+        logger.debug("Obteniendo información de la familia con ID: %s", family_id)
+        status_code, response = await ApiService.request("GET", f"/families/{family_id}", token=token, check_status=False)
+        logger.debug("Respuesta de get_family: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code == 200 and is_record(response):
+            response = Family.from_api(response)
+            FamilyDirectory.update_from_family(response)
         return status_code, response
     
     @staticmethod
-    def get_family_members(family_id, token=None):
+    async def get_family_record(family_id, token=None):
+        """
+        Returns the shared directory record of a family, fetching it if needed.
+        
+        Args:
+            family_id (str): ID of the family
+            token (str, optional): Authentication token
+            
+        Returns:
+            tuple: (status_code, FamilyRecord) or (status_code, error response)
+        """
+        record = FamilyDirectory.get(family_id)
+        if record is not None:
+            return 200, record
+        
+        status_code, response = await FamilyService.get_family(family_id, token)
+        if status_code != 200:
+            return status_code, response
+        
+        record = FamilyDirectory.get(family_id)
+        if record is None:
+            return 500, {"error": "Respuesta de familia no válida"}
+        return 200, record
+    
+    @staticmethod
+    async def get_family_members(family_id, token=None):
         """
         Retrieves the members of a specific family.
         
@@ -65,15 +107,17 @@ class FamilyService:
             token (str, optional): Authentication token
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, list of Member) or (status_code, error response)
         """
-        print(f"Obteniendo miembros de la familia con ID: {family_id}")
-        status_code, response = ApiService.request("GET", f"/families/{family_id}/members", token=token, check_status=False)
-        print(f"Respuesta de get_family_members: status_code={status_code}, response={response}")
+        logger.debug("Obteniendo miembros de la familia con ID: %s", family_id)
+        status_code, response = await ApiService.request("GET", f"/families/{family_id}/members", token=token, check_status=False)
+        logger.debug("Respuesta de get_family_members: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code == 200 and isinstance(response, list):
+            response = Member.parse_list(response)
         return status_code, response
     
     @staticmethod
-    def add_member_to_family(family_id, telegram_id, name, token=None):
+    async def add_member_to_family(family_id, telegram_id, name, token=None):
         """Añade un miembro a una familia.
         
         Args:
@@ -85,43 +129,88 @@ class FamilyService:
         Returns:
             tuple: (status_code, response)
         """
-        print(f"Añadiendo miembro a la familia {family_id}: telegram_id={telegram_id}, name={name}")
+        logger.debug("Añadiendo miembro a la familia %s: telegram_id=%s, name=%s", family_id, telegram_id, name)
         data = {
             "telegram_id": telegram_id,
             "name": name
         }
-        status_code, response = ApiService.request("POST", f"/families/{family_id}/members", data, token=token, check_status=False)
-        print(f"Respuesta de add_member_to_family: status_code={status_code}, response={response}")
+        status_code, response = await ApiService.request("POST", f"/families/{family_id}/members", data, token=token, check_status=False)
+        logger.debug("Respuesta de add_member_to_family: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code < 400:
+            ResponseCache.invalidate_family(family_id)
+            FamilyDirectory.invalidate(family_id)
+            BalanceCache.invalidate(family_id)
+            MemberIndex.invalidate(telegram_id)
         return status_code, response
     
     @staticmethod
-    def get_family_balances(family_id, token=None):
+    async def get_family_balances(family_id, token=None):
         """Obtiene los balances de una familia.
         
+        Si la familia está en el BalanceCache (actualizado localmente tras cada
+        escritura) se devuelve sin consultar la API. Si la ruta de balances no
+        está disponible, se calculan localmente a partir de los gastos y pagos.
+        
         Args:
             family_id: ID de la familia
             token: Token de autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, response); el código es STALE_OK si los balances
+            pueden estar desactualizados (ver ApiService.is_stale)
         """
         try:
-            print(f"Solicitando balances para la familia {family_id}")
-            status_code, response = ApiService.request("GET", f"/families/{family_id}/balances", token=token, check_status=False)
-            print(f"Respuesta de get_family_balances: status_code={status_code}, response={response}")
+            local_balances = BalanceCache.get(family_id)
+            if local_balances is not None:
+                return 200, local_balances
+            
+            logger.debug("Solicitando balances para la familia %s", family_id)
+            version = BalanceCache.version(family_id)
+            status_code, response = await ApiService.request("GET", f"/families/{family_id}/balances", token=token, check_status=False)
+            logger.debug("Respuesta de get_family_balances: status_code=%s, response=%s", status_code, Payload(response))
             
             # Verificar si la respuesta es válida
             if status_code >= 400:
-                print(f"Error al obtener balances: status_code={status_code}, response={response}")
+                logger.error("Error al obtener balances: status_code=%s, response=%s", status_code, Payload(response))
+                if status_code in UNAVAILABLE_STATUS_CODES and SETTLEMENT_FALLBACK_ENABLED:
+                    return await FamilyService._compute_family_balances(family_id, token, status_code, response)
                 return status_code, response
                 
             # Verificar si la respuesta es una lista o un diccionario
             if not isinstance(response, list) and not isinstance(response, dict):
-                print(f"Respuesta de balances no es una lista ni un diccionario: {response}")
+                logger.warning("Respuesta de balances no es una lista ni un diccionario: %s", Payload(response))
                 return status_code, []
-                
+            
+            if status_code == 200:
+                response = MemberBalance.parse_list(response)
+                # Una copia antigua servida sin API no reemplaza a la local
+                if not ApiService.is_stale(status_code):
+                    BalanceCache.store(family_id, response, version)
             return status_code, response
         except Exception as e:
-            print(f"Error en get_family_balances: {str(e)}")
-            traceback.print_exc()
-            return 500, {"error": f"Error al obtener balances: {str(e)}"} 
\ No newline at end of file
+            logger.exception("Error en get_family_balances: %s", e)
+            return 500, {"error": f"Error al obtener balances: {str(e)}"}
+    
+    @staticmethod
+    async def _compute_family_balances(family_id, token, status_code, response):
+        """
+        Calcula los balances localmente cuando la ruta de balances no responde.
+        
+        Args:
+            family_id: ID de la familia
+            token: Token de autenticación
+            status_code: Código devuelto por la ruta de balances
+            response: Respuesta devuelta por la ruta de balances
+            
+        Returns:
+            tuple: (200, balances) calculados localmente, (STALE_OK, balances) si
+            alguna lista era una copia antigua, o el error original
+        """
+        family_status, family = await FamilyService.get_family(family_id, token)
+        if family_status != 200 or not is_record(family):
+            return status_code, response
+        local_status, balances = await SettlementEngine.compute_family(family_id, family.get("members", []) or [], token)
+        if local_status != 200:
+            return status_code, response
+        logger.warning("Balances route unavailable (%s); computed balances of family %s locally", status_code, family_id)
+        return local_status, MemberBalance.parse_list(balances) 
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+HTTP Client Module
+
+This module owns the process-wide HTTP transport used to reach the backend API.
+It keeps a bounded pool of keep-alive connections so consecutive requests reuse
+the same TCP (and TLS) connection instead of opening a new one every time.
+Every request goes through the CircuitBreaker of its endpoint group and is
+recorded in ApiMetrics, so this is the single instrumented path to the API.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+from config import (
+    API_TIMEOUT,
+    API_POOL_MAX_CONNECTIONS,
+    API_POOL_MAX_KEEPALIVE,
+    API_POOL_KEEPALIVE_EXPIRY,
+    API_POOL_MAX_PER_HOST
+)
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.metrics import ApiMetrics
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+class HttpClient:
+    """
+    Shared transport for every request made to the backend API.
+
+    The asynchronous client is used by the services layer and the synchronous
+    client by the legacy helpers in utils. Both are created lazily with the same
+    pool limits, and concurrent requests are additionally capped per host.
+    """
+
+    _async_client = None
+    _sync_client = None
+    _async_host_limits = {}
+    _sync_host_limits = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _limits():
+        """
+        Builds the connection pool limits from the configuration.
+
+        Returns:
+            httpx.Limits: Limits shared by the sync and async clients
+        """
+        return httpx.Limits(
+            max_connections=API_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=API_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=API_POOL_KEEPALIVE_EXPIRY
+        )
+
+    @staticmethod
+    def get_async_client():
+        """
+        Returns the process-wide asynchronous client, creating it on first use.
+
+        Returns:
+            httpx.AsyncClient: Pooled asynchronous client
+        """
+        if HttpClient._async_client is None or HttpClient._async_client.is_closed:
+            logger.info(
+                "Creating pooled API client (max_connections=%s, keepalive=%s, per_host=%s)",
+                API_POOL_MAX_CONNECTIONS, API_POOL_MAX_KEEPALIVE, API_POOL_MAX_PER_HOST
+            )
+            HttpClient._async_client = httpx.AsyncClient(
+                limits=HttpClient._limits(),
+                timeout=API_TIMEOUT
+            )
+            # Los semáforos pertenecen al event loop en el que se crearon
+            HttpClient._async_host_limits = {}
+        return HttpClient._async_client
+
+    @staticmethod
+    def get_sync_client():
+        """
+        Returns the process-wide synchronous client, creating it on first use.
+
+        Returns:
+            httpx.Client: Pooled synchronous client
+        """
+        with HttpClient._lock:
+            if HttpClient._sync_client is None or HttpClient._sync_client.is_closed:
+                HttpClient._sync_client = httpx.Client(
+                    limits=HttpClient._limits(),
+                    timeout=API_TIMEOUT
+                )
+            return HttpClient._sync_client
+
+    @staticmethod
+    def _host_key(url):
+        """
+        Extracts the scheme and host used to group per-host limits.
+
+        Args:
+            url (str): Absolute request URL
+
+        Returns:
+            str: Key such as "https://api.example.com"
+        """
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @staticmethod
+    def _prepare(url, kwargs):
+        """
+        Checks the circuit of a request and applies its adaptive timeout.
+
+        Args:
+            url (str): Absolute request URL
+            kwargs (dict): Extra arguments for the client, updated in place
+
+        Returns:
+            str: The endpoint group of the request
+
+        Raises:
+            CircuitOpenError: If the circuit of the group is open
+        """
+        group = CircuitBreaker.group_for(url)
+        if not CircuitBreaker.allow(group):
+            raise CircuitOpenError(f"Circuit open for '{group}' endpoints, the API is unavailable")
+        requested_timeout = kwargs.get("timeout", API_TIMEOUT)
+        if isinstance(requested_timeout, (int, float)):
+            kwargs["timeout"] = CircuitBreaker.timeout_for(group, requested_timeout)
+        return group
+
+    @staticmethod
+    def _record(group, method, url, response, started_at, response_bytes=None):
+        """
+        Records the outcome of a request that got an answer from the API.
+
+        Args:
+            group (str): Endpoint group
+            method (str): HTTP method
+            url (str): Absolute request URL
+            response (httpx.Response): The response received
+            started_at (float): time.monotonic() when the request was sent
+            response_bytes (int, optional): Bytes downloaded, for streamed responses
+        """
+        latency = time.monotonic() - started_at
+        if response.status_code >= 500:
+            CircuitBreaker.record_failure(group)
+        else:
+            CircuitBreaker.record_success(group, latency)
+
+        ApiMetrics.record(
+            method,
+            url,
+            latency,
+            status_code=response.status_code,
+            request_bytes=int(response.request.headers.get("Content-Length", 0)),
+            response_bytes=len(response.content) if response_bytes is None else response_bytes
+        )
+
+    @staticmethod
+    def _record_error(group, method, url, error, started_at):
+        """
+        Records a request that failed without an answer from the API.
+
+        Args:
+            group (str): Endpoint group
+            method (str): HTTP method
+            url (str): Absolute request URL
+            error (httpx.TransportError): The error raised
+            started_at (float): time.monotonic() when the request was sent
+        """
+        CircuitBreaker.record_failure(group)
+        ApiMetrics.record(method, url, time.monotonic() - started_at, error=error)
+
+    @staticmethod
+    async def request(method, url, **kwargs):
+        """
+        Sends a request through the shared asynchronous client.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            **kwargs: Extra arguments for httpx.AsyncClient.request
+
+        Returns:
+            httpx.Response: The response received from the API
+
+        Raises:
+            CircuitOpenError: If the circuit of the endpoint group is open
+        """
+        group = HttpClient._prepare(url, kwargs)
+        client = HttpClient.get_async_client()
+        host = HttpClient._host_key(url)
+        semaphore = HttpClient._async_host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(API_POOL_MAX_PER_HOST)
+            HttpClient._async_host_limits[host] = semaphore
+
+        try:
+            async with semaphore:
+                started_at = time.monotonic()
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            HttpClient._record_error(group, method, url, e, started_at)
+            raise
+        except BaseException:
+            CircuitBreaker.record_abandoned(group)
+            raise
+
+        HttpClient._record(group, method, url, response, started_at)
+        return response
+
+    @staticmethod
+    @asynccontextmanager
+    async def stream(method, url, **kwargs):
+        """
+        Sends a request through the shared asynchronous client without reading its body.
+
+        The body is read by the caller (e.g. with response.aiter_bytes()) inside
+        the context, and the connection goes back to the pool when it exits.
+        The request is recorded once the body has been consumed or abandoned.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            **kwargs: Extra arguments for httpx.AsyncClient.stream
+
+        Yields:
+            httpx.Response: The response, with its body not yet read
+
+        Raises:
+            CircuitOpenError: If the circuit of the endpoint group is open
+        """
+        group = HttpClient._prepare(url, kwargs)
+        client = HttpClient.get_async_client()
+        host = HttpClient._host_key(url)
+        semaphore = HttpClient._async_host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(API_POOL_MAX_PER_HOST)
+            HttpClient._async_host_limits[host] = semaphore
+
+        response = None
+        try:
+            async with semaphore:
+                started_at = time.monotonic()
+                async with client.stream(method, url, **kwargs) as response:
+                    yield response
+        except httpx.TransportError as e:
+            HttpClient._record_error(group, method, url, e, started_at)
+            raise
+        except BaseException:
+            # Si la API ya respondió, el fallo es del consumidor del cuerpo
+            if response is None:
+                CircuitBreaker.record_abandoned(group)
+            else:
+                HttpClient._record(group, method, url, response, started_at, response.num_bytes_downloaded)
+            raise
+
+        HttpClient._record(group, method, url, response, started_at, response.num_bytes_downloaded)
+
+    @staticmethod
+    def request_sync(method, url, **kwargs):
+        """
+        Sends a request through the shared synchronous client.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            **kwargs: Extra arguments for httpx.Client.request
+
+        Returns:
+            httpx.Response: The response received from the API
+
+        Raises:
+            CircuitOpenError: If the circuit of the endpoint group is open
+        """
+        group = HttpClient._prepare(url, kwargs)
+        client = HttpClient.get_sync_client()
+        host = HttpClient._host_key(url)
+        with HttpClient._lock:
+            semaphore = HttpClient._sync_host_limits.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(API_POOL_MAX_PER_HOST)
+                HttpClient._sync_host_limits[host] = semaphore
+
+        try:
+            with semaphore:
+                started_at = time.monotonic()
+                response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            HttpClient._record_error(group, method, url, e, started_at)
+            raise
+        except BaseException:
+            CircuitBreaker.record_abandoned(group)
+            raise
+
+        HttpClient._record(group, method, url, response, started_at)
+        return response
+
+    @staticmethod
+    async def close():
+        """
+        Closes both clients and releases their pooled connections.
+
+        This is registered as a shutdown hook of the Telegram application.
+        """
+        if HttpClient._async_client is not None and not HttpClient._async_client.is_closed:
+            await HttpClient._async_client.aclose()
+        with HttpClient._lock:
+            if HttpClient._sync_client is not None and not HttpClient._sync_client.is_closed:
+                HttpClient._sync_client.close()
+        HttpClient._async_client = None
+        HttpClient._sync_client = None
+        HttpClient._async_host_limits = {}
+        logger.info("Pooled API clients closed")
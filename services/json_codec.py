@@ -0,0 +1,165 @@
+"""
+JSON Codec Module
+
+This module decodes the JSON bodies received from the backend API. Whole
+bodies are decoded with orjson when it is installed and with the standard
+library otherwise. Large list responses (expenses and payments) can also be
+decoded incrementally: the elements of a top-level JSON array are produced one
+by one while the body is still being downloaded, so callers that only need a
+page of records never hold the whole decoded list in memory.
+"""
+
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Espacios en blanco permitidos entre los elementos de un array JSON
+_WHITESPACE = " \t\n\r"
+
+# Caracteres que pueden seguir a un elemento completo
+_DELIMITERS = _WHITESPACE + ",]"
+
+class JsonCodec:
+    """Fast and incremental JSON decoding for API responses."""
+
+    _decoder = json.JSONDecoder()
+
+    @staticmethod
+    def loads(data):
+        """
+        Decodes a complete JSON document.
+
+        Args:
+            data (bytes or str): The JSON document
+
+        Returns:
+            Any: The decoded value
+
+        Raises:
+            ValueError: If the document is not valid JSON
+        """
+        if orjson is not None:
+            return orjson.loads(data)
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    @staticmethod
+    def _default(value):
+        """Converts values JSON cannot encode: records with to_dict(), anything else with str()."""
+        to_dict = getattr(value, "to_dict", None)
+        return to_dict() if to_dict is not None else str(value)
+
+    @staticmethod
+    def dumps(value):
+        """
+        Encodes a value as a JSON string.
+
+        Args:
+            value: The value to encode; records are encoded with their
+                to_dict() and other unknown types are converted with str()
+
+        Returns:
+            str: The JSON document
+        """
+        if orjson is not None:
+            return orjson.dumps(value, default=JsonCodec._default).decode("utf-8")
+        return json.dumps(value, default=JsonCodec._default)
+
+    @staticmethod
+    async def iter_array(chunks):
+        """
+        Decodes the elements of a top-level JSON array as its bytes arrive.
+
+        If the document turns out not to be an array, it is decoded whole and,
+        when it is a list, its elements are produced as usual.
+
+        Args:
+            chunks: Async iterator of byte chunks, such as response.aiter_bytes()
+
+        Yields:
+            Any: Each element of the array, in order
+
+        Raises:
+            ValueError: If the document is not valid JSON or not an array
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        position = 0
+        started = False
+        finished = False
+        exhausted = False
+        # Tras un elemento se espera "," o "]"; tras una coma, otro elemento
+        after_item = False
+        after_comma = False
+        chunks = chunks.__aiter__()
+
+        while not finished:
+            # Saltar espacios entre elementos
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        # No es un array: decodificar el documento completo
+                        async for chunk in chunks:
+                            buffer += decoder.decode(chunk)
+                        buffer += decoder.decode(b"", final=True)
+                        value = JsonCodec.loads(buffer[position:])
+                        if not isinstance(value, list):
+                            raise ValueError("JSON document is not an array")
+                        for item in value:
+                            yield item
+                        return
+                    started = True
+                    position += 1
+                    continue
+
+                if buffer[position] == "]" and not after_comma:
+                    finished = True
+                    continue
+
+                if after_item:
+                    if buffer[position] != ",":
+                        raise ValueError("Expected ',' or ']' in JSON array")
+                    position += 1
+                    after_item = False
+                    after_comma = True
+                    continue
+
+                try:
+                    item, end = JsonCodec._decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if exhausted:
+                        raise
+                    end = None
+
+                # Un valor solo está completo si le sigue un separador; si no,
+                # puede ser un número cortado entre dos bloques (p. ej. "-4." de "-4.5")
+                if end is not None and end < len(buffer) and buffer[end] in _DELIMITERS:
+                    yield item
+                    position = end
+                    after_item = True
+                    after_comma = False
+                    continue
+
+            if exhausted:
+                raise ValueError("Unexpected end of JSON array")
+
+            # Descartar lo ya decodificado antes de añadir el siguiente bloque
+            if started:
+                buffer = buffer[position:]
+                position = 0
+
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                exhausted = True
+                buffer += decoder.decode(b"", final=True)
+                continue
+            buffer += decoder.decode(chunk)
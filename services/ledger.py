@@ -0,0 +1,715 @@
+"""
+Ledger Module
+
+This module keeps a local, append-only log of the writes made by the bot for
+each family: expenses created, updated and deleted, payments created,
+confirmed, rejected and deleted, and debt adjustments. Every entry is recorded
+when the corresponding call of ExpenseService or PaymentService succeeds.
+
+The expense and payment lists of a family are rebuilt from a snapshot plus the
+events recorded after it. A snapshot is taken whenever a full list is fetched
+from the API and every LEDGER_SNAPSHOT_EVERY events, so a replay never goes
+through more than that many events. While the lists of a family were fetched
+less than LEDGER_RESYNC_INTERVAL seconds ago they are served locally; after
+that they are fetched again, which also picks up the writes made by other
+clients of the API.
+
+The lists hold Expense and Payment records (services/models.py), parsed once
+when they enter the ledger and served without copying. The ledger is the only
+place where they are kept: list responses are not cached by ResponseCache, and
+the sorted indexes used for pagination are built from these lists and dropped
+whenever an event changes them.
+
+Events and snapshots are stored in SQLite. Like the persistence of the user
+data, they are buffered in memory and written in background batches, off the
+event loop; snapshots are buffered as shallow copies of the record lists and
+only serialized in the writer thread. A failed batch is retried with
+exponential backoff, and while SQLite keeps failing at most LEDGER_MAX_PENDING
+operations are buffered: the oldest are dropped and every list is fetched
+again from the API on its next read.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from services.json_codec import JsonCodec
+from services.models import Expense, Payment
+from config import (
+    LEDGER_ENABLED,
+    LEDGER_PATH,
+    LEDGER_SNAPSHOT_EVERY,
+    LEDGER_RESYNC_INTERVAL,
+    LEDGER_MAX_FAMILIES,
+    LEDGER_MAX_PENDING,
+    LEDGER_RETRY_BASE_DELAY,
+    LEDGER_RETRY_MAX_DELAY
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Tipos de evento
+EXPENSE_CREATED = "expense_created"
+EXPENSE_UPDATED = "expense_updated"
+EXPENSE_DELETED = "expense_deleted"
+PAYMENT_CREATED = "payment_created"
+PAYMENT_CONFIRMED = "payment_confirmed"
+PAYMENT_REJECTED = "payment_rejected"
+PAYMENT_UPDATED = "payment_updated"
+PAYMENT_DELETED = "payment_deleted"
+DEBT_ADJUSTMENT = "debt_adjustment"
+
+# Evento registrado para cada cambio de estado de un pago
+PAYMENT_STATUS_EVENTS = {
+    "CONFIRM": PAYMENT_CONFIRMED,
+    "REJECT": PAYMENT_REJECTED,
+    "INACTIVE": PAYMENT_REJECTED
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_events (
+    seq INTEGER PRIMARY KEY,
+    family_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    entity_id TEXT,
+    data TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_events_family ON ledger_events (family_id, seq);
+CREATE TABLE IF NOT EXISTS ledger_snapshots (
+    family_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    expenses TEXT,
+    expenses_synced_at REAL,
+    payments TEXT,
+    payments_synced_at REAL
+);
+"""
+
+class FamilyLedger:
+    """
+    Expense and payment lists of one family, rebuilt from the log.
+
+    Attributes:
+        expenses (OrderedDict): Expense ID to Expense record, or None if the
+            list was never fetched
+        payments (OrderedDict): Payment ID to Payment record, or None if the
+            list was never fetched
+        expenses_synced_at (float): time.time() of the last fetch of the expenses
+        payments_synced_at (float): time.time() of the last fetch of the payments
+        seq (int): Sequence number of the last event applied
+        since_snapshot (int): Events applied since the last snapshot
+        indexes (dict): List name ("expenses" or "payments") to the sorted
+            index built from it, if any
+    """
+
+    __slots__ = ("expenses", "payments", "expenses_synced_at", "payments_synced_at", "seq", "since_snapshot", "indexes")
+
+    def __init__(self):
+        self.expenses = None
+        self.payments = None
+        self.expenses_synced_at = None
+        self.payments_synced_at = None
+        self.seq = 0
+        self.since_snapshot = 0
+        self.indexes = {}
+
+    @staticmethod
+    def _index(records, model):
+        """Parses a list of records and indexes it by ID, keeping its order."""
+        return OrderedDict((record.id, record) for record in model.parse_list(records))
+
+    def apply(self, seq, kind, entity_id, data):
+        """
+        Applies one event.
+
+        Events for a list that was never fetched are ignored: they are already
+        included in the first fetch.
+
+        Args:
+            seq (int): Sequence number of the event
+            kind (str): Event type
+            entity_id (str): ID of the expense or payment
+            data (dict): Record returned by the API, if any
+        """
+        self.seq = max(self.seq, seq)
+        self.since_snapshot += 1
+        attribute, model = ("expenses", Expense) if kind.startswith("expense_") else ("payments", Payment)
+        records = getattr(self, attribute)
+        if records is None or entity_id is None:
+            return
+        self.indexes.pop(attribute, None)
+
+        if kind in (EXPENSE_DELETED, PAYMENT_DELETED):
+            records.pop(entity_id, None)
+        elif kind in (EXPENSE_CREATED, PAYMENT_CREATED, DEBT_ADJUSTMENT):
+            if isinstance(data, dict):
+                records[entity_id] = model.from_api({"id": entity_id, **data})
+        elif isinstance(data, dict):
+            # Actualizaciones: la respuesta puede traer solo los campos cambiados
+            current = records.get(entity_id)
+            records[entity_id] = model.from_api({**(current.to_dict() if current is not None else {"id": entity_id}), **data})
+
+    def to_row(self, family_id):
+        """
+        Captures the state as an unencoded snapshot row.
+
+        Only the record lists are copied: records are replaced, never modified,
+        when an event is applied, so the row stays valid while the state moves
+        on. encode_row turns it into the values stored in SQLite.
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            tuple: (family_id, seq, expenses, expenses_synced_at, payments,
+            payments_synced_at), with lists of records or None
+        """
+        return (
+            family_id,
+            self.seq,
+            list(self.expenses.values()) if self.expenses is not None else None,
+            self.expenses_synced_at,
+            list(self.payments.values()) if self.payments is not None else None,
+            self.payments_synced_at
+        )
+
+    @staticmethod
+    def encode_row(row):
+        """
+        Serializes a row of to_row as the values of a ledger_snapshots row.
+
+        Args:
+            row (tuple): Row returned by to_row
+
+        Returns:
+            tuple: The row with the record lists encoded as JSON
+        """
+        family_id, seq, expenses, expenses_synced_at, payments, payments_synced_at = row
+        return (
+            family_id,
+            seq,
+            JsonCodec.dumps(expenses) if expenses is not None else None,
+            expenses_synced_at,
+            JsonCodec.dumps(payments) if payments is not None else None,
+            payments_synced_at
+        )
+
+    @staticmethod
+    def from_row(row):
+        """
+        Restores the state from a snapshot row.
+
+        Args:
+            row (tuple): (seq, expenses, expenses_synced_at, payments, payments_synced_at)
+
+        Returns:
+            FamilyLedger: The restored state
+        """
+        state = FamilyLedger()
+        seq, expenses, expenses_synced_at, payments, payments_synced_at = row
+        state.seq = seq
+        if expenses is not None:
+            state.expenses = FamilyLedger._index(JsonCodec.loads(expenses), Expense)
+            state.expenses_synced_at = expenses_synced_at
+        if payments is not None:
+            state.payments = FamilyLedger._index(JsonCodec.loads(payments), Payment)
+            state.payments_synced_at = payments_synced_at
+        return state
+
+class Ledger:
+    """
+    Append-only log of the writes of each family, with snapshots and replay.
+
+    The rebuilt state of the most recently used LEDGER_MAX_FAMILIES families
+    is kept in memory; the rest is replayed from SQLite when needed.
+    """
+
+    _connection = None
+    _db_lock = threading.Lock()
+    _states = OrderedDict()
+    _family_seq = {}
+    _seq = 0
+    _epoch = 0
+    _stale_before = 0.0
+    _pending = []
+    _flush_task = None
+    _retrying = False
+    _closing = False
+    _dropped = 0
+    _events = 0
+    _replays = 0
+    _local_reads = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def open():
+        """Opens the ledger database, creating the tables the first time."""
+        if not LEDGER_ENABLED or Ledger._connection is not None:
+            return
+
+        def connect():
+            connection = sqlite3.connect(LEDGER_PATH, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            seq = connection.execute("SELECT MAX(seq) FROM ledger_events").fetchone()[0]
+            return connection, seq or 0
+
+        try:
+            connection, seq = await asyncio.to_thread(connect)
+        except Exception as e:
+            logger.error("Could not open the ledger at %s: %s", LEDGER_PATH, e)
+            return
+        Ledger._connection = connection
+        Ledger._seq = max(Ledger._seq, seq)
+        logger.info("Ledger opened at %s (last event %s)", LEDGER_PATH, seq)
+
+    @staticmethod
+    async def close():
+        """Writes the buffered events and snapshots and closes the database."""
+        if Ledger._connection is None:
+            return
+        Ledger._closing = True
+        try:
+            task = Ledger._flush_task
+            if task is not None and not task.done():
+                # Una escritura en curso termina; una espera entre reintentos no
+                if Ledger._retrying:
+                    task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            operations = Ledger._take_pending()
+            if operations:
+                try:
+                    await asyncio.to_thread(Ledger._write, operations)
+                except Exception as e:
+                    logger.error("Could not write %s buffered ledger operations on close: %s", len(operations), e)
+        finally:
+            Ledger._closing = False
+        with Ledger._db_lock:
+            Ledger._connection.close()
+            Ledger._connection = None
+        Ledger._states.clear()
+        Ledger._family_seq.clear()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def record(family_id, kind, entity_id, data=None):
+        """
+        Appends an event to the log of a family.
+
+        If the family of the write is unknown the event cannot be recorded;
+        instead, the lists of every family are fetched again on their next read.
+
+        Args:
+            family_id (str): ID of the family
+            kind (str): Event type (EXPENSE_CREATED, PAYMENT_CONFIRMED...)
+            entity_id (str): ID of the expense or payment
+            data (dict, optional): Record returned by the API
+        """
+        if Ledger._connection is None:
+            return
+        if not family_id:
+            Ledger.invalidate()
+            return
+        family_id = str(family_id)
+        entity_id = str(entity_id) if entity_id is not None else None
+        data = data if isinstance(data, dict) else None
+
+        Ledger._seq += 1
+        seq = Ledger._seq
+        Ledger._family_seq[family_id] = seq
+        Ledger._events += 1
+        Ledger._pending.append(("event", (seq, family_id, kind, entity_id, JsonCodec.dumps(data) if data is not None else None, time.time())))
+
+        state = Ledger._states.get(family_id)
+        if state is not None:
+            state.apply(seq, kind, entity_id, data)
+            if state.since_snapshot >= LEDGER_SNAPSHOT_EVERY:
+                Ledger._snapshot(family_id, state)
+        Ledger._schedule_flush()
+
+    @staticmethod
+    def invalidate():
+        """
+        Marks the lists of every family to be fetched again on their next read.
+
+        Used after a write whose family is unknown, which any of them could
+        include. Lists requested before the call are not stored.
+        """
+        Ledger._epoch += 1
+        Ledger._stale_before = time.time()
+        logger.debug("Ledger lists marked for resync after a write with unknown family")
+
+    @staticmethod
+    def _snapshot(family_id, state):
+        """Queues a snapshot of the state of a family."""
+        state.since_snapshot = 0
+        Ledger._pending.append(("snapshot", state.to_row(family_id)))
+
+    @staticmethod
+    def _take_pending():
+        """Returns the buffered operations and starts a new buffer."""
+        operations, Ledger._pending = Ledger._pending, []
+        return operations
+
+    @staticmethod
+    def _schedule_flush():
+        """Starts the background write of the buffered operations, if it is not running."""
+        if Ledger._flush_task is None or Ledger._flush_task.done():
+            Ledger._flush_task = asyncio.get_running_loop().create_task(Ledger._flush_pending())
+
+    @staticmethod
+    def _trim_pending():
+        """
+        Drops the oldest buffered operations beyond LEDGER_MAX_PENDING.
+
+        The dropped events never reach SQLite, so every list is marked to be
+        fetched again instead of being rebuilt from an incomplete log.
+        """
+        excess = len(Ledger._pending) - LEDGER_MAX_PENDING
+        if excess <= 0:
+            return
+        del Ledger._pending[:excess]
+        Ledger._dropped += excess
+        Ledger.invalidate()
+        logger.warning("Ledger buffer full: dropped the %s oldest operations", excess)
+
+    @staticmethod
+    async def _flush_pending():
+        """
+        Writes the buffered operations in a thread until the buffer is empty.
+
+        A failed batch goes back to the front of the buffer and is retried with
+        exponential backoff (LEDGER_RETRY_BASE_DELAY doubling up to
+        LEDGER_RETRY_MAX_DELAY), together with the operations buffered meanwhile.
+        """
+        await asyncio.sleep(0)
+        attempt = 0
+        while Ledger._pending and Ledger._connection is not None:
+            operations = Ledger._take_pending()
+            try:
+                await asyncio.to_thread(Ledger._write, operations)
+                attempt = 0
+            except Exception as e:
+                # Conservar el orden: las operaciones fallidas van delante de las nuevas
+                Ledger._pending[:0] = operations
+                Ledger._trim_pending()
+                if Ledger._closing:
+                    logger.error("Error writing the ledger: %s", e)
+                    return
+                attempt += 1
+                delay = min(LEDGER_RETRY_MAX_DELAY, LEDGER_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+                logger.error("Error writing the ledger (attempt %s, retrying in %.1fs): %s", attempt, delay, e)
+                Ledger._retrying = True
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    Ledger._retrying = False
+
+    @staticmethod
+    def _write(operations):
+        """
+        Writes a batch of events and snapshots in a single transaction.
+
+        Runs in a worker thread, which is also where the snapshots are encoded.
+
+        Args:
+            operations (list): ("event", row) and ("snapshot", row) tuples, in
+                order; snapshot rows as returned by FamilyLedger.to_row
+        """
+        with Ledger._db_lock:
+            connection = Ledger._connection
+            if connection is None:
+                return
+            with connection:
+                for operation, row in operations:
+                    if operation == "event":
+                        connection.execute(
+                            "INSERT OR IGNORE INTO ledger_events (seq, family_id, kind, entity_id, data, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                            row
+                        )
+                    else:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO ledger_snapshots (family_id, seq, expenses, expenses_synced_at, payments, payments_synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+                            FamilyLedger.encode_row(row)
+                        )
+
+    # ------------------------------------------------------------------
+    # Reconstrucción
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _replay(family_id):
+        """
+        Rebuilds the state of a family from its last snapshot and the events after it.
+
+        Runs in a worker thread.
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            FamilyLedger: The rebuilt state
+        """
+        with Ledger._db_lock:
+            connection = Ledger._connection
+            if connection is None:
+                return FamilyLedger()
+            row = connection.execute(
+                "SELECT seq, expenses, expenses_synced_at, payments, payments_synced_at FROM ledger_snapshots WHERE family_id = ?",
+                (family_id,)
+            ).fetchone()
+            state = FamilyLedger.from_row(row) if row else FamilyLedger()
+            events = connection.execute(
+                "SELECT seq, kind, entity_id, data FROM ledger_events WHERE family_id = ? AND seq > ? ORDER BY seq",
+                (family_id, state.seq)
+            ).fetchall()
+        for seq, kind, entity_id, data in events:
+            state.apply(seq, kind, entity_id, JsonCodec.loads(data) if data else None)
+        return state
+
+    @staticmethod
+    async def _state(family_id):
+        """
+        Returns the state of a family, replaying it if it is not in memory.
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            FamilyLedger: The state
+        """
+        state = Ledger._states.get(family_id)
+        if state is not None:
+            Ledger._states.move_to_end(family_id)
+            return state
+
+        # Las operaciones aún no escritas también forman parte del registro
+        if Ledger._flush_task is not None and not Ledger._flush_task.done():
+            await Ledger._flush_task
+        state = await asyncio.to_thread(Ledger._replay, family_id)
+        Ledger._replays += 1
+
+        # Otra tarea pudo reconstruir la familia mientras tanto
+        current = Ledger._states.get(family_id)
+        if current is not None:
+            return current
+        if state.seq < Ledger._family_seq.get(family_id, 0):
+            # Se registró un evento durante la reconstrucción; se leerá de nuevo
+            return None
+        Ledger._states[family_id] = state
+        while len(Ledger._states) > LEDGER_MAX_FAMILIES:
+            Ledger._states.popitem(last=False)
+        return state
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def version(family_id):
+        """
+        Returns the version of a family, to be passed to sync_*().
+
+        It changes with every event of the family and with invalidate().
+
+        Args:
+            family_id (str): ID of the family
+
+        Returns:
+            tuple: The epoch and the sequence number of the last event
+        """
+        return Ledger._epoch, Ledger._family_seq.get(str(family_id), 0)
+
+    @staticmethod
+    def is_open():
+        """
+        Returns whether the ledger is in use.
+
+        Returns:
+            bool: True if the database is open
+        """
+        return Ledger._connection is not None
+
+    @staticmethod
+    async def _fresh_state(family_id, attribute, stale=False):
+        """Returns the state of a family if its list was fetched recently enough."""
+        if Ledger._connection is None or not family_id:
+            return None
+        state = await Ledger._state(str(family_id))
+        if state is None or getattr(state, attribute) is None:
+            return None
+        synced_at = getattr(state, f"{attribute}_synced_at")
+        if not stale and (synced_at is None or synced_at <= Ledger._stale_before
+                          or time.time() - synced_at > LEDGER_RESYNC_INTERVAL):
+            return None
+        return state
+
+    @staticmethod
+    async def _get(family_id, attribute, stale=False):
+        """Returns a list of a family if it was fetched recently enough."""
+        state = await Ledger._fresh_state(family_id, attribute, stale)
+        if state is None:
+            return None
+        Ledger._local_reads += 1
+        # Los registros no se modifican: se sustituyen, así que no hace falta copiarlos
+        return list(getattr(state, attribute).values())
+
+    @staticmethod
+    async def get_expenses(family_id, stale=False):
+        """
+        Returns the expenses of a family rebuilt from the log.
+
+        Args:
+            family_id (str): ID of the family
+            stale (bool, optional): If True, the list is returned however long
+                ago it was fetched; used while the API is unavailable
+
+        Returns:
+            list: Expenses in the order of the API, or None if they must be
+            fetched from the API
+        """
+        return await Ledger._get(family_id, "expenses", stale)
+
+    @staticmethod
+    async def get_payments(family_id, stale=False):
+        """
+        Returns the payments of a family rebuilt from the log.
+
+        Args:
+            family_id (str): ID of the family
+            stale (bool, optional): If True, the list is returned however long
+                ago it was fetched; used while the API is unavailable
+
+        Returns:
+            list: Payments in the order of the API, or None if they must be
+            fetched from the API
+        """
+        return await Ledger._get(family_id, "payments", stale)
+
+    @staticmethod
+    async def get_index(family_id, attribute, build):
+        """
+        Returns a sorted index of a list of a family, built from the ledger.
+
+        The index is kept with the state of the family until an event or a new
+        fetch changes the list, so it never holds records of its own.
+
+        Args:
+            family_id (str): ID of the family
+            attribute (str): "expenses" or "payments"
+            build (callable): Function building the index from the records,
+                such as SortedIndex
+
+        Returns:
+            Any: The index, or None if the list must be fetched from the API
+        """
+        state = await Ledger._fresh_state(family_id, attribute)
+        if state is None:
+            return None
+        index = state.indexes.get(attribute)
+        if index is None:
+            index = build(getattr(state, attribute).values())
+            state.indexes[attribute] = index
+        Ledger._local_reads += 1
+        return index
+
+    @staticmethod
+    async def _sync(family_id, attribute, records, version):
+        """Replaces a list of a family with a full response of the API and takes a snapshot."""
+        if Ledger._connection is None or not family_id or not isinstance(records, list):
+            return
+        family_id = str(family_id)
+        if Ledger.version(family_id) != version:
+            # Una escritura terminó mientras se pedía la lista
+            return
+        state = await Ledger._state(family_id)
+        if state is None or Ledger.version(family_id) != version:
+            return
+        setattr(state, attribute, FamilyLedger._index(records, Expense if attribute == "expenses" else Payment))
+        setattr(state, f"{attribute}_synced_at", time.time())
+        state.indexes.pop(attribute, None)
+        Ledger._snapshot(family_id, state)
+        Ledger._schedule_flush()
+
+    @staticmethod
+    async def sync_expenses(family_id, expenses, version):
+        """
+        Stores the full expense list of a family fetched from the API.
+
+        Args:
+            family_id (str): ID of the family
+            expenses (list): Response of /expenses/family/{id}
+            version (tuple): Value of version() before the request was made
+        """
+        await Ledger._sync(family_id, "expenses", expenses, version)
+
+    @staticmethod
+    async def sync_payments(family_id, payments, version):
+        """
+        Stores the full payment list of a family fetched from the API.
+
+        Args:
+            family_id (str): ID of the family
+            payments (list): Response of /payments/family/{id}
+            version (tuple): Value of version() before the request was made
+        """
+        await Ledger._sync(family_id, "payments", payments, version)
+
+    @staticmethod
+    async def history(family_id, limit=50):
+        """
+        Returns the most recent events of a family, for audits.
+
+        Args:
+            family_id (str): ID of the family
+            limit (int, optional): Maximum number of events
+
+        Returns:
+            list: {seq, kind, entity_id, data, recorded_at} dicts, most recent first
+        """
+        if Ledger._connection is None or not family_id:
+            return []
+        if Ledger._flush_task is not None and not Ledger._flush_task.done():
+            await Ledger._flush_task
+
+        def query():
+            with Ledger._db_lock:
+                if Ledger._connection is None:
+                    return []
+                return Ledger._connection.execute(
+                    "SELECT seq, kind, entity_id, data, recorded_at FROM ledger_events WHERE family_id = ? ORDER BY seq DESC LIMIT ?",
+                    (str(family_id), limit)
+                ).fetchall()
+
+        return [
+            {"seq": seq, "kind": kind, "entity_id": entity_id, "data": JsonCodec.loads(data) if data else None, "recorded_at": recorded_at}
+            for seq, kind, entity_id, data, recorded_at in await asyncio.to_thread(query)
+        ]
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing the ledger.
+
+        Returns:
+            dict: events recorded, families in memory, replays, local reads,
+            pending operations and operations dropped because the buffer was full
+        """
+        return {
+            "events": Ledger._events,
+            "families": len(Ledger._states),
+            "replays": Ledger._replays,
+            "local_reads": Ledger._local_reads,
+            "pending": len(Ledger._pending),
+            "dropped": Ledger._dropped
+        }
@@ -0,0 +1,254 @@
+"""
+Log Module
+
+This module provides the loggers used by the services, handlers and
+formatters in place of print(). Debug output is off unless LOG_LEVEL or
+LOG_LEVELS enable it for a module, and it is built lazily:
+
+- Messages use %-style arguments, so nothing is formatted unless the record
+  is emitted. With debug disabled, a logger.debug() call costs one level
+  check.
+- API payloads are wrapped in Payload, which converts them to text only when
+  emitted and truncates the text to LOG_PAYLOAD_MAX characters.
+- Repeated debug messages are sampled: only 1 of every LOG_DEBUG_SAMPLE_RATE
+  records with the same message template is emitted.
+
+Once LogPipeline is started, loggers never write to stderr themselves: the
+records are put in a bounded queue and written by a background thread, so a
+slow log collector does not stall the event loop. When the queue is full the
+records are dropped and counted instead of blocking. The output can be plain
+text or one JSON object per line (LOG_FORMAT=json).
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import (
+    LOG_PAYLOAD_MAX,
+    LOG_DEBUG_SAMPLE_RATE,
+    LOG_FORMAT,
+    LOG_QUEUE_ENABLED,
+    LOG_QUEUE_SIZE
+)
+from services.json_codec import JsonCodec
+
+class Payload:
+    """
+    Lazily formatted, truncated view of a value for log messages.
+
+    Attributes:
+        value: The value to log
+        limit (int): Maximum number of characters
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit=None):
+        self.value = value
+        self.limit = LOG_PAYLOAD_MAX if limit is None else limit
+
+    def __str__(self):
+        text = str(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+    __repr__ = __str__
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps 1 of every `rate` debug records with the same message template.
+
+    Records above DEBUG are never dropped.
+    """
+
+    def __init__(self, rate=None):
+        super().__init__()
+        self.rate = max(1, LOG_DEBUG_SAMPLE_RATE if rate is None else rate)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate == 1 or record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.rate == 0
+
+def get_logger(name):
+    """
+    Returns the logger of a module, with debug sampling.
+
+    The level of the logger comes from LOG_LEVELS (set up in config.py) or is
+    inherited from its package and from LOG_LEVEL.
+
+    Args:
+        name (str): Name of the module, usually __name__
+
+    Returns:
+        logging.Logger: The logger
+    """
+    logger = logging.getLogger(name)
+    if not any(isinstance(existing, DebugSampler) for existing in logger.filters):
+        logger.addFilter(DebugSampler())
+    return logger
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return JsonCodec.dumps(entry)
+
+class _BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full.
+
+    The number of dropped records is reported with a warning as soon as the
+    queue has room again.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.unreported = 0
+        self.peak = 0
+
+    def prepare(self, record):
+        # Solo se resuelve el mensaje; el formato completo se aplica en el hilo de escritura
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # Handler.handle() ya serializa las llamadas con el lock del handler
+        try:
+            if self.unreported:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"{self.unreported} log records dropped: the log queue was full"
+                }))
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+            return
+        self.peak = max(self.peak, self.queue.qsize())
+
+class _Listener(QueueListener):
+    """Queue listener whose stop waits for room in a full queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class LogPipeline:
+    """Process-wide queue between the loggers and the log output."""
+
+    _handler = None
+    _listener = None
+    _targets = []
+
+    @staticmethod
+    def start():
+        """
+        Moves the handlers of the root logger behind a bounded queue.
+
+        The handlers set up by config.py keep writing the records, from a
+        background thread. With LOG_FORMAT=json they write JSON lines. Does
+        nothing if the pipeline is already running; with LOG_QUEUE_ENABLED
+        set to false only the format is applied.
+        """
+        if LogPipeline._listener is not None:
+            return
+        root = logging.getLogger()
+        targets = list(root.handlers)
+        if LOG_FORMAT == "json":
+            for handler in targets:
+                handler.setFormatter(JsonFormatter())
+        if not LOG_QUEUE_ENABLED or not targets:
+            return
+
+        handler = _BoundedQueueHandler(queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE)))
+        listener = _Listener(handler.queue, *targets, respect_handler_level=True)
+        listener.start()
+        for target in targets:
+            root.removeHandler(target)
+        root.addHandler(handler)
+        LogPipeline._handler = handler
+        LogPipeline._listener = listener
+        LogPipeline._targets = targets
+        # Vaciar la cola también si el proceso termina con sys.exit()
+        atexit.register(LogPipeline.stop)
+
+    @staticmethod
+    def stop():
+        """
+        Writes the queued records and gives the handlers back to the root logger.
+        """
+        listener = LogPipeline._listener
+        if listener is None:
+            return
+        root = logging.getLogger()
+        root.removeHandler(LogPipeline._handler)
+        for target in LogPipeline._targets:
+            root.addHandler(target)
+        LogPipeline._listener = None
+        listener.stop()
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns the state of the log queue.
+
+        Returns:
+            dict: Whether the queue is running, the output format, the records
+            queued now and at most, the queue size and the dropped records
+        """
+        handler = LogPipeline._handler
+        return {
+            "running": LogPipeline._listener is not None,
+            "format": LOG_FORMAT,
+            "queued": handler.queue.qsize() if handler else 0,
+            "peak": handler.peak if handler else 0,
+            "size": LOG_QUEUE_SIZE,
+            "dropped": handler.dropped if handler else 0
+        }
+
+    @staticmethod
+    def format_report():
+        """
+        Formats the state of the log queue as a text report.
+
+        Returns:
+            str: Plain text report
+        """
+        stats = LogPipeline.get_stats()
+        if not stats["running"]:
+            return f"Logs: escritura directa, formato {stats['format']}"
+        return (
+            f"Logs: cola {stats['queued']}/{stats['size']} (máx. {stats['peak']}), "
+            f"{stats['dropped']} descartados, formato {stats['format']}"
+        )
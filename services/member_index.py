@@ -0,0 +1,141 @@
+"""
+Member Index Module
+
+This module keeps an in-memory index from Telegram IDs to the member record
+returned by the API. Almost every conversation starts by resolving the member
+of the user, so in the steady state that becomes a local lookup. Users that
+are not members of any family get a short-lived negative entry, so repeated
+commands from them do not hit the API either. Entries are dropped when the
+user creates or joins a family, or when their member record changes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    MEMBER_INDEX_TTL,
+    MEMBER_INDEX_NEGATIVE_TTL,
+    MEMBER_INDEX_MAX_ENTRIES
+)
+from services.models import is_record
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+class _IndexEntry:
+    """The (status_code, response) of a member lookup together with its expiry."""
+
+    __slots__ = ("status_code", "response", "expires_at")
+
+    def __init__(self, status_code, response, expires_at):
+        self.status_code = status_code
+        self.response = response
+        self.expires_at = expires_at
+
+class MemberIndex:
+    """
+    Process-wide LRU index of member lookups keyed by Telegram ID.
+
+    Only definitive answers are indexed: 200 (the member) for MEMBER_INDEX_TTL
+    seconds and 404 (not a member) for MEMBER_INDEX_NEGATIVE_TTL seconds.
+    Errors and unavailable responses are never indexed.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def get(telegram_id):
+        """
+        Returns the indexed lookup of a Telegram ID, if it has not expired.
+
+        Args:
+            telegram_id (str): Telegram ID of the user
+
+        Returns:
+            tuple: (status_code, response), or None if the ID is not indexed
+        """
+        key = str(telegram_id)
+        with MemberIndex._lock:
+            entry = MemberIndex._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    del MemberIndex._entries[key]
+                MemberIndex._misses += 1
+                return None
+            MemberIndex._entries.move_to_end(key)
+            MemberIndex._hits += 1
+            return entry.status_code, entry.response
+
+    @staticmethod
+    def resolve(telegram_id):
+        """
+        Returns the member and family IDs of a Telegram ID from the index.
+
+        Args:
+            telegram_id (str): Telegram ID of the user
+
+        Returns:
+            tuple: (member_id, family_id), or None if the user is not indexed
+            as a member
+        """
+        result = MemberIndex.get(telegram_id)
+        if result is None or result[0] != 200 or not is_record(result[1]):
+            return None
+        return result[1].get("id"), result[1].get("family_id")
+
+    @staticmethod
+    def store(telegram_id, status_code, response):
+        """
+        Indexes the result of a member lookup made against the API.
+
+        Args:
+            telegram_id (str): Telegram ID of the user
+            status_code (int): Status code returned by the API
+            response: Response returned by the API
+        """
+        if status_code == 200 and is_record(response):
+            ttl = MEMBER_INDEX_TTL
+        elif status_code == 404:
+            ttl = MEMBER_INDEX_NEGATIVE_TTL
+        else:
+            return
+        if ttl <= 0:
+            return
+
+        key = str(telegram_id)
+        with MemberIndex._lock:
+            MemberIndex._entries[key] = _IndexEntry(status_code, response, time.monotonic() + ttl)
+            MemberIndex._entries.move_to_end(key)
+            while len(MemberIndex._entries) > MEMBER_INDEX_MAX_ENTRIES:
+                MemberIndex._entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(telegram_id=None):
+        """
+        Drops the entry of a Telegram ID, or every entry if no ID is given.
+
+        Args:
+            telegram_id (str, optional): Telegram ID of the user
+        """
+        with MemberIndex._lock:
+            if telegram_id is None:
+                MemberIndex._entries.clear()
+            elif MemberIndex._entries.pop(str(telegram_id), None) is not None:
+                logger.debug("Member index entry dropped for %s", telegram_id)
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing how often lookups were served locally.
+
+        Returns:
+            dict: entries, hits and misses
+        """
+        return {
+            "entries": len(MemberIndex._entries),
+            "hits": MemberIndex._hits,
+            "misses": MemberIndex._misses
+        }
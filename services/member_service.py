@@ -1,85 +1,113 @@
 from services.api_service import ApiService
+from services.response_cache import ResponseCache
+from services.family_directory import FamilyDirectory
+from services.member_index import MemberIndex
+from services.balance_cache import BalanceCache
+from services.models import Member, is_record
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class MemberService:
     """Servicio para interactuar con miembros."""
     
     @staticmethod
-    def get_member(telegram_id, token=None):
+    async def get_member(telegram_id, token=None):
         """Obtiene información de un miembro por su ID de Telegram.
         
+        La respuesta se resuelve primero en el MemberIndex; solo se consulta la
+        API si el usuario no está indexado o su entrada expiró.
+        
         Args:
             telegram_id: ID de Telegram del miembro
             token: Token de autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Member) o (status_code, respuesta de error)
         """
-        print(f"Obteniendo información del miembro con telegram_id: {telegram_id}")
+        indexed = MemberIndex.get(telegram_id)
+        if indexed is not None:
+            return indexed
+        
+        logger.debug("Obteniendo información del miembro con telegram_id: %s", telegram_id)
         # La ruta para obtener miembros por ID de Telegram es /members/{telegram_id}
-        status_code, response = ApiService.request("GET", f"/members/{telegram_id}", token=token, check_status=False)
-        print(f"Respuesta de get_member: status_code={status_code}, response={response}")
+        status_code, response = await ApiService.request("GET", f"/members/{telegram_id}", token=token, check_status=False)
+        logger.debug("Respuesta de get_member: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code == 200 and is_record(response):
+            response = Member.from_api(response)
+        MemberIndex.store(telegram_id, status_code, response)
         return status_code, response
     
     @staticmethod
-    def get_member_by_id(member_id, token=None):
+    async def get_member_by_id(member_id, token=None):
         """Obtiene información de un miembro por su ID.
         
         Args:
-            member_id: ID del miembro o diccionario con datos del miembro
+            member_id: ID del miembro, Member o diccionario con datos del miembro
             token: Token de autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Member) o (status_code, respuesta de error)
         """
+        if isinstance(member_id, Member):
+            member_id = member_id.id
+        
         # Verificar si member_id es un diccionario (objeto completo)
         if isinstance(member_id, dict):
             # Extraer el ID del diccionario
             if "id" in member_id:
                 actual_id = member_id["id"]
-                print(f"Se pasó un objeto miembro completo, extrayendo ID: {actual_id}")
+                logger.debug("Se pasó un objeto miembro completo, extrayendo ID: %s", actual_id)
                 member_id = actual_id
             else:
-                print(f"Se pasó un diccionario sin campo 'id', usando como está: {member_id}")
+                logger.debug("Se pasó un diccionario sin campo 'id', usando como está: %s", member_id)
         
-        print(f"Obteniendo información del miembro con ID: {member_id}")
+        logger.debug("Obteniendo información del miembro con ID: %s", member_id)
         
         # Verificar si el ID parece ser un UUID (contiene guiones o letras)
         is_uuid = isinstance(member_id, str) and ('-' in member_id or any(c.isalpha() for c in member_id))
         
         # Todos los IDs (numéricos o UUIDs) usan la misma ruta en este endpoint
-        status_code, response = ApiService.request("GET", f"/members/id/{member_id}", token=token, check_status=False)
-        print(f"Respuesta de get_member_by_id: status_code={status_code}, response={response}")
+        status_code, response = await ApiService.request("GET", f"/members/id/{member_id}", token=token, check_status=False)
+        logger.debug("Respuesta de get_member_by_id: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code == 200 and is_record(response):
+            response = Member.from_api(response)
         return status_code, response
     
     @staticmethod
-    def get_member_by_uuid(uuid, token=None):
+    async def get_member_by_uuid(uuid, token=None):
         """Obtiene información de un miembro por su UUID.
         
         Args:
-            uuid: UUID del miembro o diccionario con datos del miembro
+            uuid: UUID del miembro, Member o diccionario con datos del miembro
             token: Token de autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Member) o (status_code, respuesta de error)
         """
+        if isinstance(uuid, Member):
+            uuid = uuid.id
+        
         # Verificar si uuid es un diccionario (objeto completo)
         if isinstance(uuid, dict):
             # Extraer el ID del diccionario
             if "id" in uuid:
                 actual_uuid = uuid["id"]
-                print(f"Se pasó un objeto miembro completo a get_member_by_uuid, extrayendo UUID: {actual_uuid}")
+                logger.debug("Se pasó un objeto miembro completo a get_member_by_uuid, extrayendo UUID: %s", actual_uuid)
                 uuid = actual_uuid
             else:
-                print(f"Se pasó un diccionario sin campo 'id' a get_member_by_uuid, usando como está: {uuid}")
+                logger.debug("Se pasó un diccionario sin campo 'id' a get_member_by_uuid, usando como está: %s", uuid)
                 
-        print(f"Obteniendo información del miembro con UUID: {uuid}")
+        logger.debug("Obteniendo información del miembro con UUID: %s", uuid)
         # Usar la ruta correcta para UUIDs: /members/id/{uuid}
-        status_code, response = ApiService.request("GET", f"/members/id/{uuid}", token=token, check_status=False)
-        print(f"Respuesta de get_member_by_uuid: status_code={status_code}, response={response}")
+        status_code, response = await ApiService.request("GET", f"/members/id/{uuid}", token=token, check_status=False)
+        logger.debug("Respuesta de get_member_by_uuid: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code == 200 and is_record(response):
+            response = Member.from_api(response)
         return status_code, response
     
     @staticmethod
-    def update_member(member_id, data, token=None):
+    async def update_member(member_id, data, token=None):
         """Actualiza la información de un miembro.
         
         Args:
@@ -90,7 +118,19 @@ class MemberService:
         Returns:
             tuple: (status_code, response)
         """
-        print(f"Actualizando información del miembro con ID: {member_id}")
-        status_code, response = ApiService.request("PUT", f"/members/{member_id}", data, token=token, check_status=False)
-        print(f"Respuesta de update_member: status_code={status_code}, response={response}")
+        logger.debug("Actualizando información del miembro con ID: %s", member_id)
+        status_code, response = await ApiService.request("PUT", f"/members/{member_id}", data, token=token, check_status=False)
+        logger.debug("Respuesta de update_member: status_code=%s, response=%s", status_code, Payload(response))
+        if status_code < 400:
+            if isinstance(response, dict) and response.get("telegram_id"):
+                MemberIndex.invalidate(response["telegram_id"])
+            else:
+                MemberIndex.invalidate()
+            family_id = ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            BalanceCache.invalidate(family_id)
+            if family_id:
+                FamilyDirectory.invalidate(family_id)
+            else:
+                FamilyDirectory.invalidate()
         return status_code, response 
\ No newline at end of file
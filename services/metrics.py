@@ -0,0 +1,224 @@
+"""
+API Metrics Module
+
+This module records metrics for every request sent to the backend API: latency
+histograms, payload sizes, status code counts and error types, grouped by HTTP
+method and endpoint. Endpoints are normalised (IDs replaced by "{id}") so that
+each backend route has a single series. The metrics can be queried at runtime
+through the health check server and the /metrics admin command.
+"""
+
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from config import API_BASE_URL
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Segmentos de ruta que contienen algún dígito se consideran IDs
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w-]+$")
+
+class _EndpointStats:
+    """Counters for one (method, endpoint) pair."""
+
+    __slots__ = (
+        "count", "latency_buckets", "latency_sum", "latency_max",
+        "request_bytes", "response_bytes", "response_bytes_max",
+        "status_codes", "errors"
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.response_bytes_max = 0
+        self.status_codes = {}
+        self.errors = {}
+
+class ApiMetrics:
+    """
+    Process-wide metrics of the requests sent to the backend API.
+
+    Requests are recorded by HttpClient, which is used by the services layer,
+    ExpenseService and the legacy utils.api_request helper alike. Recording is
+    thread-safe because the synchronous helper may run in worker threads.
+    """
+
+    _endpoints = {}
+    _lock = threading.Lock()
+    _started_at = time.time()
+
+    @staticmethod
+    def normalize_endpoint(url):
+        """
+        Converts a request URL into its route template.
+
+        Args:
+            url (str): Absolute request URL
+
+        Returns:
+            str: Route such as "/families/{id}/balances"
+        """
+        path = urlsplit(url).path
+        base_path = urlsplit(API_BASE_URL).path.rstrip("/")
+        if base_path and path.startswith(base_path):
+            path = path[len(base_path):]
+        segments = [
+            "{id}" if _ID_SEGMENT.match(segment) else segment
+            for segment in path.strip("/").split("/")
+            if segment
+        ]
+        return "/" + "/".join(segments)
+
+    @staticmethod
+    def record(method, url, latency, status_code=None, request_bytes=0, response_bytes=0, error=None):
+        """
+        Records one request.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            latency (float): Time the request took, in seconds
+            status_code (int, optional): Status code, if a response was received
+            request_bytes (int, optional): Size of the request body
+            response_bytes (int, optional): Size of the response body
+            error (BaseException, optional): Exception raised instead of a response
+        """
+        key = (method.upper(), ApiMetrics.normalize_endpoint(url))
+        latency_ms = latency * 1000
+
+        bucket = len(LATENCY_BUCKETS_MS)
+        for index, upper_bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= upper_bound:
+                bucket = index
+                break
+
+        with ApiMetrics._lock:
+            stats = ApiMetrics._endpoints.get(key)
+            if stats is None:
+                stats = _EndpointStats()
+                ApiMetrics._endpoints[key] = stats
+
+            stats.count += 1
+            stats.latency_buckets[bucket] += 1
+            stats.latency_sum += latency_ms
+            stats.latency_max = max(stats.latency_max, latency_ms)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.response_bytes_max = max(stats.response_bytes_max, response_bytes)
+            if status_code is not None:
+                stats.status_codes[status_code] = stats.status_codes.get(status_code, 0) + 1
+            if error is not None:
+                error_type = type(error).__name__
+                stats.errors[error_type] = stats.errors.get(error_type, 0) + 1
+
+    @staticmethod
+    def _percentile(buckets, count, fraction):
+        """
+        Estimates a latency percentile from a histogram.
+
+        Args:
+            buckets (list): Counts per bucket
+            count (int): Total number of samples
+            fraction (float): Percentile as a fraction (e.g. 0.95)
+
+        Returns:
+            float: Upper bound (ms) of the bucket containing the percentile,
+            or None if it falls in the overflow bucket
+        """
+        threshold = count * fraction
+        cumulative = 0
+        for index, bucket_count in enumerate(buckets):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    @staticmethod
+    def get_snapshot():
+        """
+        Returns a copy of the metrics of every endpoint.
+
+        Returns:
+            dict: uptime_seconds and a list of endpoints, each with method,
+            endpoint, count, latency (avg, max, p50, p95, p99 and histogram),
+            payload sizes, status codes and error types
+        """
+        with ApiMetrics._lock:
+            items = [
+                (method, endpoint, stats.count, list(stats.latency_buckets), stats.latency_sum,
+                 stats.latency_max, stats.request_bytes, stats.response_bytes,
+                 stats.response_bytes_max, dict(stats.status_codes), dict(stats.errors))
+                for (method, endpoint), stats in ApiMetrics._endpoints.items()
+            ]
+
+        endpoints = []
+        for (method, endpoint, count, buckets, latency_sum, latency_max, request_bytes,
+             response_bytes, response_bytes_max, status_codes, errors) in items:
+            histogram = {f"le_{bound}": buckets[i] for i, bound in enumerate(LATENCY_BUCKETS_MS)}
+            histogram["overflow"] = buckets[-1]
+            endpoints.append({
+                "method": method,
+                "endpoint": endpoint,
+                "count": count,
+                "latency_ms": {
+                    "avg": round(latency_sum / count, 1) if count else 0.0,
+                    "max": round(latency_max, 1),
+                    "p50": ApiMetrics._percentile(buckets, count, 0.50),
+                    "p95": ApiMetrics._percentile(buckets, count, 0.95),
+                    "p99": ApiMetrics._percentile(buckets, count, 0.99),
+                    "histogram": histogram
+                },
+                "request_bytes_avg": round(request_bytes / count) if count else 0,
+                "response_bytes_avg": round(response_bytes / count) if count else 0,
+                "response_bytes_max": response_bytes_max,
+                "status_codes": {str(code): n for code, n in sorted(status_codes.items())},
+                "errors": errors
+            })
+
+        endpoints.sort(key=lambda e: e["latency_ms"]["avg"] * e["count"], reverse=True)
+        return {
+            "uptime_seconds": round(time.time() - ApiMetrics._started_at),
+            "endpoints": endpoints
+        }
+
+    @staticmethod
+    def format_report(limit=10):
+        """
+        Formats the endpoints with the most total latency as a text report.
+
+        Args:
+            limit (int, optional): Maximum number of endpoints to include
+
+        Returns:
+            str: Plain text report
+        """
+        snapshot = ApiMetrics.get_snapshot()
+        if not snapshot["endpoints"]:
+            return "No se han registrado solicitudes a la API todavía."
+
+        lines = [f"Métricas de la API (últimos {snapshot['uptime_seconds']} s)", ""]
+        for entry in snapshot["endpoints"][:limit]:
+            latency = entry["latency_ms"]
+            p95 = f"≤{latency['p95']}" if latency["p95"] is not None else f">{LATENCY_BUCKETS_MS[-1]}"
+            statuses = ", ".join(f"{code}×{n}" for code, n in entry["status_codes"].items()) or "-"
+            errors = ", ".join(f"{name}×{n}" for name, n in entry["errors"].items())
+            lines.append(f"{entry['method']} {entry['endpoint']}")
+            lines.append(
+                f"  n={entry['count']} avg={latency['avg']}ms p95{p95}ms max={latency['max']}ms "
+                f"resp≈{entry['response_bytes_avg']}B"
+            )
+            lines.append(f"  status: {statuses}" + (f" | errores: {errors}" if errors else ""))
+        return "\n".join(lines)
+
+    @staticmethod
+    def reset():
+        """Discards every recorded metric."""
+        with ApiMetrics._lock:
+            ApiMetrics._endpoints.clear()
+            ApiMetrics._started_at = time.time()
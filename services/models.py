@@ -0,0 +1,615 @@
+"""
+Record Models Module
+
+This module defines the records the services return for the members,
+families, expenses, payments and balances of the API. Each API response is
+parsed once, when it enters the bot:
+
+- IDs are normalised to strings, so lookups never need to try both str(id)
+  and int(id).
+- Members referenced by expenses and payments are always Member records,
+  whether the API sent a member object or only its ID.
+- created_at dates are parsed once into POSIX timestamps (created_ts).
+- Amounts are stored as integer cents (fixed point); the float value is
+  derived on access.
+
+The records use __slots__, so a cached record does not carry a per-instance
+dict. They are read-only by convention: callers build new records instead of
+changing cached ones.
+
+For compatibility with code written against the raw dicts, every record
+answers get(), [] and "in" with the field names of the API, and to_dict()
+returns the API representation.
+"""
+
+from datetime import datetime, timezone
+
+# Los registros sin fecha válida se ordenan como los más antiguos
+UNKNOWN_TIMESTAMP = float("-inf")
+
+def parse_timestamp(value):
+    """
+    Converts a created_at value of the API into a POSIX timestamp.
+
+    Dates without a time zone are taken as UTC.
+
+    Args:
+        value (str, datetime or number): ISO 8601 date, datetime or timestamp
+
+    Returns:
+        float: The timestamp, or None if the value cannot be interpreted
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, str) and value:
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def format_timestamp(timestamp):
+    """
+    Converts a timestamp back into an ISO 8601 date in UTC.
+
+    Args:
+        timestamp (float): POSIX timestamp, or None
+
+    Returns:
+        str: The ISO 8601 date, or None
+    """
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def to_cents(amount):
+    """
+    Converts an amount of the API into integer cents.
+
+    Args:
+        amount (float, str or int): Amount in currency units
+
+    Returns:
+        int: The amount in cents; 0 if it cannot be interpreted
+    """
+    try:
+        return int(round(float(amount or 0) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+def normalize_id(value):
+    """
+    Extracts the ID of a member or record as a string.
+
+    Args:
+        value: ID, or record or dict with "id"
+
+    Returns:
+        str: The ID, or None
+    """
+    if isinstance(value, (dict, Record)):
+        value = value.get("id")
+    return str(value) if value is not None else None
+
+def is_record(value):
+    """
+    Checks whether a value is a record or a raw API object.
+
+    Args:
+        value: Any value
+
+    Returns:
+        bool: True for Record instances and dicts
+    """
+    return isinstance(value, (dict, Record))
+
+def created_order(record):
+    """
+    Sort key of a record by creation date, with undated records first.
+
+    Args:
+        record (Expense or Payment): The record
+
+    Returns:
+        float: The creation timestamp
+    """
+    return record.created_ts if record.created_ts is not None else UNKNOWN_TIMESTAMP
+
+class Record:
+    """
+    Base class of the records.
+
+    Subclasses list in FIELDS the API field names they answer to and the
+    attribute or property holding each one, and define the from_api()
+    classmethod that parses one object of the API (returning an already
+    parsed record unchanged), which parse_list() relies on.
+    """
+
+    __slots__ = ()
+
+    FIELDS = {}
+
+    def get(self, key, default=None):
+        attribute = self.FIELDS.get(key)
+        if attribute is None:
+            return default
+        value = getattr(self, attribute)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        attribute = self.FIELDS.get(key)
+        if attribute is None:
+            raise KeyError(key)
+        return getattr(self, attribute)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS.keys()
+
+    def to_dict(self):
+        """
+        Returns the API representation of the record.
+
+        Returns:
+            dict: Field name to value, with nested records converted too
+        """
+        result = {}
+        for key, attribute in self.FIELDS.items():
+            value = getattr(self, attribute)
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = [item.to_dict() if isinstance(item, Record) else item for item in value]
+            result[key] = value
+        return result
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    @classmethod
+    def parse_list(cls, records):
+        """
+        Parses a list response of the API, skipping entries without an ID.
+
+        Args:
+            records (list): Objects of the API or parsed records
+
+        Returns:
+            list: The records, in the same order
+        """
+        return [
+            cls.from_api(record)
+            for record in records or []
+            if is_record(record) and record.get("id") is not None
+        ]
+
+class Member(Record):
+    """
+    A member of a family.
+
+    Attributes:
+        id (str): ID of the member
+        name (str): Name, or None if the API sent only the ID
+        telegram_id (str): Telegram ID, or None
+        family_id (str): ID of the family, or None
+    """
+
+    __slots__ = ("id", "name", "telegram_id", "family_id")
+
+    FIELDS = {"id": "id", "name": "name", "telegram_id": "telegram_id", "family_id": "family_id"}
+
+    def __init__(self, id, name=None, telegram_id=None, family_id=None):
+        self.id = id
+        self.name = name
+        self.telegram_id = telegram_id
+        self.family_id = family_id
+
+    @property
+    def display_name(self):
+        """Name of the member, or "Usuario <id>" if it is not known."""
+        return self.name or f"Usuario {self.id}"
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Parses a member object of the API, or a bare member ID.
+
+        Args:
+            data (dict, Member or ID): The member
+
+        Returns:
+            Member: The member
+        """
+        if isinstance(data, Member):
+            return data
+        if not isinstance(data, dict):
+            return cls(normalize_id(data))
+        return cls(
+            normalize_id(data.get("id")),
+            data.get("name"),
+            normalize_id(data.get("telegram_id")),
+            normalize_id(data.get("family_id"))
+        )
+
+class Family(Record):
+    """
+    A family with its members.
+
+    Attributes:
+        id (str): ID of the family
+        name (str): Name of the family
+        members (tuple): Member records
+        created_ts (float): Creation timestamp, or None
+    """
+
+    __slots__ = ("id", "name", "members", "created_ts")
+
+    FIELDS = {"id": "id", "name": "name", "members": "members", "created_at": "created_at"}
+
+    def __init__(self, id, name, members, created_ts=None):
+        self.id = id
+        self.name = name
+        self.members = tuple(members)
+        self.created_ts = created_ts
+
+    @property
+    def created_at(self):
+        """Creation date as an ISO 8601 string, or None."""
+        return format_timestamp(self.created_ts)
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Parses a family object of the API.
+
+        Args:
+            data (dict or Family): The family
+
+        Returns:
+            Family: The family
+        """
+        if isinstance(data, Family):
+            return data
+        return cls(
+            normalize_id(data.get("id")),
+            data.get("name"),
+            Member.parse_list(data.get("members")),
+            parse_timestamp(data.get("created_at"))
+        )
+
+class Expense(Record):
+    """
+    An expense.
+
+    Attributes:
+        id (str): ID of the expense
+        description (str): Description
+        amount_cents (int): Amount in cents
+        paid_by (str): Member ID of the payer
+        split_among (tuple): Member records sharing the expense; empty if it
+            is shared by the whole family
+        family_id (str): ID of the family
+        created_ts (float): Creation timestamp, or None
+    """
+
+    __slots__ = ("id", "description", "amount_cents", "paid_by", "split_among", "family_id", "created_ts")
+
+    FIELDS = {
+        "id": "id",
+        "description": "description",
+        "amount": "amount",
+        "paid_by": "paid_by",
+        "split_among": "split_among",
+        "family_id": "family_id",
+        "created_at": "created_at"
+    }
+
+    def __init__(self, id, description, amount_cents, paid_by, split_among=(), family_id=None, created_ts=None):
+        self.id = id
+        self.description = description
+        self.amount_cents = amount_cents
+        self.paid_by = paid_by
+        self.split_among = tuple(split_among)
+        self.family_id = family_id
+        self.created_ts = created_ts
+
+    @property
+    def amount(self):
+        """Amount in currency units."""
+        return self.amount_cents / 100
+
+    @property
+    def created_at(self):
+        """Creation date as an ISO 8601 string, or None."""
+        return format_timestamp(self.created_ts)
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Parses an expense object of the API.
+
+        Args:
+            data (dict or Expense): The expense
+
+        Returns:
+            Expense: The expense
+        """
+        if isinstance(data, Expense):
+            return data
+        return cls(
+            normalize_id(data.get("id")),
+            data.get("description") or "Sin descripción",
+            to_cents(data.get("amount")),
+            normalize_id(data.get("paid_by")),
+            (Member.from_api(member) for member in data.get("split_among") or []),
+            normalize_id(data.get("family_id")),
+            parse_timestamp(data.get("created_at"))
+        )
+
+class Payment(Record):
+    """
+    A payment between two members, or a debt adjustment.
+
+    Attributes:
+        id (str): ID of the payment
+        from_member (Member): Member who pays
+        to_member (Member): Member who receives the payment
+        amount_cents (int): Amount in cents
+        status (str): PENDING, CONFIRM, REJECT or INACTIVE
+        family_id (str): ID of the family, or None
+        created_ts (float): Creation timestamp, or None
+    """
+
+    __slots__ = ("id", "from_member", "to_member", "amount_cents", "status", "family_id", "created_ts")
+
+    FIELDS = {
+        "id": "id",
+        "from_member": "from_member",
+        "to_member": "to_member",
+        "amount": "amount",
+        "status": "status",
+        "family_id": "family_id",
+        "created_at": "created_at"
+    }
+
+    def __init__(self, id, from_member, to_member, amount_cents, status="PENDING", family_id=None, created_ts=None):
+        self.id = id
+        self.from_member = from_member
+        self.to_member = to_member
+        self.amount_cents = amount_cents
+        self.status = status
+        self.family_id = family_id
+        self.created_ts = created_ts
+
+    @property
+    def amount(self):
+        """Amount in currency units."""
+        return self.amount_cents / 100
+
+    @property
+    def created_at(self):
+        """Creation date as an ISO 8601 string, or None."""
+        return format_timestamp(self.created_ts)
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Parses a payment object of the API.
+
+        Args:
+            data (dict or Payment): The payment
+
+        Returns:
+            Payment: The payment
+        """
+        if isinstance(data, Payment):
+            return data
+        return cls(
+            normalize_id(data.get("id")),
+            Member.from_api(data.get("from_member")),
+            Member.from_api(data.get("to_member")),
+            to_cents(data.get("amount")),
+            data.get("status") or "PENDING",
+            normalize_id(data.get("family_id")),
+            parse_timestamp(data.get("created_at"))
+        )
+
+class Debt(Record):
+    """
+    Amount a member owes to another member.
+
+    Attributes:
+        to_id (str): Member ID of the creditor
+        to_name (str): Name of the creditor
+        amount_cents (int): Amount in cents
+    """
+
+    __slots__ = ("to_id", "to_name", "amount_cents")
+
+    FIELDS = {"to": "to_name", "to_id": "to_id", "amount": "amount"}
+
+    def __init__(self, to_id, to_name, amount_cents):
+        self.to_id = to_id
+        self.to_name = to_name
+        self.amount_cents = amount_cents
+
+    @property
+    def amount(self):
+        """Amount in currency units."""
+        return self.amount_cents / 100
+
+    @classmethod
+    def from_api(cls, data):
+        if isinstance(data, Debt):
+            return data
+        return cls(normalize_id(data.get("to_id")), data.get("to"), to_cents(data.get("amount")))
+
+class Credit(Record):
+    """
+    Amount a member is owed by another member.
+
+    Attributes:
+        from_id (str): Member ID of the debtor
+        from_name (str): Name of the debtor
+        amount_cents (int): Amount in cents
+    """
+
+    __slots__ = ("from_id", "from_name", "amount_cents")
+
+    FIELDS = {"from": "from_name", "from_id": "from_id", "amount": "amount"}
+
+    def __init__(self, from_id, from_name, amount_cents):
+        self.from_id = from_id
+        self.from_name = from_name
+        self.amount_cents = amount_cents
+
+    @property
+    def amount(self):
+        """Amount in currency units."""
+        return self.amount_cents / 100
+
+    @classmethod
+    def from_api(cls, data):
+        if isinstance(data, Credit):
+            return data
+        return cls(normalize_id(data.get("from_id")), data.get("from"), to_cents(data.get("amount")))
+
+class MemberBalance(Record):
+    """
+    Balance of one member, in the per-member format of /families/{id}/balances.
+
+    Attributes:
+        member_id (str): ID of the member
+        name (str): Name of the member
+        debts (tuple): Debt records
+        credits (tuple): Credit records
+        total_owed_cents (int): Amount the member is owed, in cents
+        total_debt_cents (int): Amount the member owes, in cents
+        net_balance_cents (int): Net balance, in cents
+
+    The totals are the ones reported by the API when present, since they may
+    include rounding or adjustments not visible in the debts and credits;
+    otherwise they are computed from the entries.
+    """
+
+    __slots__ = ("member_id", "name", "debts", "credits", "total_owed_cents", "total_debt_cents", "net_balance_cents")
+
+    FIELDS = {
+        "member_id": "member_id",
+        "name": "name",
+        "debts": "debts",
+        "credits": "credits",
+        "total_owed": "total_owed",
+        "total_debt": "total_debt",
+        "net_balance": "net_balance"
+    }
+
+    def __init__(self, member_id, name, debts=(), credits=(), total_owed_cents=None, total_debt_cents=None, net_balance_cents=None):
+        self.member_id = member_id
+        self.name = name
+        self.debts = tuple(debts)
+        self.credits = tuple(credits)
+        if total_owed_cents is None:
+            total_owed_cents = sum(credit.amount_cents for credit in self.credits)
+        if total_debt_cents is None:
+            total_debt_cents = sum(debt.amount_cents for debt in self.debts)
+        if net_balance_cents is None:
+            net_balance_cents = total_owed_cents - total_debt_cents
+        self.total_owed_cents = total_owed_cents
+        self.total_debt_cents = total_debt_cents
+        self.net_balance_cents = net_balance_cents
+
+    @property
+    def total_owed(self):
+        """Amount the member is owed, in currency units."""
+        return self.total_owed_cents / 100
+
+    @property
+    def total_debt(self):
+        """Amount the member owes, in currency units."""
+        return self.total_debt_cents / 100
+
+    @property
+    def net_balance(self):
+        """Net balance in currency units; positive if the member is owed money."""
+        return self.net_balance_cents / 100
+
+    def with_entries(self, debts, credits):
+        """
+        Returns a copy of the balance with other debts and credits.
+
+        The totals follow the new entries but keep whatever difference the API
+        totals had with the old ones.
+
+        Args:
+            debts (list): Debt records
+            credits (list): Credit records
+
+        Returns:
+            MemberBalance: The new balance
+        """
+        balance = MemberBalance(self.member_id, self.name, debts, credits)
+        owed_offset = self.total_owed_cents - sum(credit.amount_cents for credit in self.credits)
+        debt_offset = self.total_debt_cents - sum(debt.amount_cents for debt in self.debts)
+        net_offset = self.net_balance_cents - (self.total_owed_cents - self.total_debt_cents)
+        balance.total_owed_cents += owed_offset
+        balance.total_debt_cents += debt_offset
+        balance.net_balance_cents = balance.total_owed_cents - balance.total_debt_cents + net_offset
+        return balance
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Parses the balance of one member.
+
+        Args:
+            data (dict or MemberBalance): The balance
+
+        Returns:
+            MemberBalance: The balance
+        """
+        if isinstance(data, MemberBalance):
+            return data
+        member_id = normalize_id(data.get("member_id"))
+        # Los totales de la API se respetan; solo se calculan si faltan
+        totals = [data.get(field) for field in ("total_owed", "total_debt", "net_balance")]
+        return cls(
+            member_id,
+            data.get("name") or f"Usuario {member_id}",
+            (Debt.from_api(debt) for debt in data.get("debts") or [] if is_record(debt)),
+            (Credit.from_api(credit) for credit in data.get("credits") or [] if is_record(credit)),
+            *(to_cents(total) if total is not None else None for total in totals)
+        )
+
+    @classmethod
+    def parse_list(cls, balances):
+        """
+        Parses a balances response, if it has the per-member format.
+
+        Args:
+            balances (list): Response of /families/{id}/balances
+
+        Returns:
+            list: MemberBalance records, or the response unchanged if it has
+            another format
+        """
+        if not isinstance(balances, list) or not all(
+            is_record(balance) and balance.get("member_id") is not None for balance in balances
+        ):
+            return balances
+        return [cls.from_api(balance) for balance in balances]
@@ -0,0 +1,403 @@
+"""
+Pagination Module
+
+This module pages through the expense and payment lists of a family, newest
+first. The list of a family, made of records whose created_at was parsed into
+a timestamp (services/models.py), is sorted by (timestamp, id) into an index.
+The index is built from the list kept by the Ledger and stored with it, so it
+lives exactly as long as that list; if the ledger is disabled, the list is
+fetched and its index kept here for PAGINATION_INDEX_TTL seconds, or until the
+bot writes to that family. Pages are addressed by a cursor: the record that ends
+the current page. Each tap on "◀" or "▶" finds the cursor with a binary search
+and slices one page, so its cost depends on the page size and not on the
+length of the history. Date windows ("last week", "this month" or any
+since/until range) are answered from the same index with two binary searches.
+
+A cursor is the (timestamp, id) sort key of that record, so it still points to
+the right place if the record was deleted or the index rebuilt without it.
+Cursors travel in the callback data of inline buttons as
+"page:<kind>:<direction>:<timestamp>:<record id>", with the timestamp in hex
+microseconds, which stays within the 64 bytes allowed by Telegram for UUID
+record IDs.
+"""
+
+import bisect
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from config import PAGE_SIZE, PAGINATION_INDEX_TTL, PAGINATION_MAX_INDEXES
+from services.models import UNKNOWN_TIMESTAMP, created_order, parse_timestamp
+from services.ledger import Ledger
+from services.api_service import ApiService
+
+# Listas paginables
+EXPENSES = "exp"
+PAYMENTS = "pay"
+
+# Lista del Ledger de cada tipo
+_LEDGER_LISTS = {EXPENSES: "expenses", PAYMENTS: "payments"}
+
+# Dirección de la página pedida respecto al cursor
+OLDER = "o"
+NEWER = "n"
+
+_CALLBACK_PREFIX = "page"
+
+# Marca de la fecha de los registros sin fecha en un cursor
+_UNKNOWN_TIMESTAMP_CODE = "-"
+
+def last_days(days, now=None):
+    """
+    Returns the window of the last days.
+    
+    Args:
+        days (int): Number of days
+        now (datetime, optional): End of the window; the current time by default
+        
+    Returns:
+        tuple: (since, until) datetimes; until is None (open)
+    """
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(days=days), None
+
+def this_month(now=None):
+    """
+    Returns the window of the current calendar month, in UTC.
+    
+    Args:
+        now (datetime, optional): A moment in the month; the current time by default
+        
+    Returns:
+        tuple: (since, until) datetimes; until is None (open)
+    """
+    now = now or datetime.now(timezone.utc)
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), None
+
+class Page:
+    """
+    One page of records, newest first.
+
+    Attributes:
+        records (list): Records of the page
+        total (int): Records in the whole list
+        first (int): Position of the first record, counting from the newest (1-based)
+        has_newer (bool): Whether there are newer records
+        has_older (bool): Whether there are older records
+    """
+
+    __slots__ = ("records", "total", "first", "has_newer", "has_older")
+
+    def __init__(self, records, total, first, has_newer, has_older):
+        self.records = records
+        self.total = total
+        self.first = first
+        self.has_newer = has_newer
+        self.has_older = has_older
+
+    @property
+    def last(self):
+        """Position of the last record of the page, counting from the newest."""
+        return self.first + len(self.records) - 1
+
+    @property
+    def newest_cursor(self):
+        """Sort key of the newest record of the page, the cursor of the previous page."""
+        return (created_order(self.records[0]), self.records[0].id) if self.records else None
+
+    @property
+    def oldest_cursor(self):
+        """Sort key of the oldest record of the page, the cursor of the next page."""
+        return (created_order(self.records[-1]), self.records[-1].id) if self.records else None
+
+class SortedIndex:
+    """
+    Records of one list sorted by (created_at timestamp, id), oldest first.
+
+    The records are Expense or Payment records, whose timestamps were parsed
+    when the list was fetched.
+
+    Attributes:
+        keys (list): (timestamp, id) sort key of each record
+        records (list): Records, in the order of keys
+        positions (dict): Record ID to its sort key
+        built_at (float): time.monotonic() when the index was built
+    """
+
+    __slots__ = ("keys", "records", "positions", "built_at")
+
+    def __init__(self, records):
+        entries = sorted(
+            (((created_order(record), record.id), record) for record in records if record.id is not None),
+            key=lambda entry: entry[0]
+        )
+        self.keys = [key for key, _ in entries]
+        self.records = [record for _, record in entries]
+        self.positions = {key[1]: key for key in self.keys}
+        self.built_at = time.monotonic()
+
+    def page(self, cursor=None, direction=OLDER, size=PAGE_SIZE):
+        """
+        Returns the page next to a cursor.
+
+        Args:
+            cursor (tuple, optional): (timestamp, id) sort key of the record that
+                ends the current page. The record does not need to be in the
+                index any more; the newest page is returned if the cursor is
+                omitted, or if it has no timestamp and its record is unknown
+            direction (str, optional): OLDER or NEWER than the cursor
+            size (int, optional): Records per page
+
+        Returns:
+            Page: The page
+        """
+        total = len(self.keys)
+        key = self._cursor_key(cursor)
+        if key is None:
+            end = total
+            start = max(0, end - size)
+        elif direction == NEWER:
+            start = bisect.bisect_right(self.keys, key)
+            end = min(total, start + size)
+        else:
+            end = bisect.bisect_left(self.keys, key)
+            start = max(0, end - size)
+
+        return Page(
+            records=self.records[start:end][::-1],
+            total=total,
+            first=total - end + 1,
+            has_newer=end < total,
+            has_older=start > 0
+        )
+
+    def _cursor_key(self, cursor):
+        """Returns the sort key to search for a cursor, or None for the newest page."""
+        if cursor is None:
+            return None
+        timestamp, cursor_id = cursor
+        cursor_id = str(cursor_id) if cursor_id is not None else ""
+        # Si el registro sigue en el índice, su clave es exacta
+        key = self.positions.get(cursor_id)
+        if key is None and timestamp is not None:
+            key = (timestamp, cursor_id)
+        return key
+
+    def _bound(self, moment):
+        """Returns the position of the first record created at or after a moment."""
+        timestamp = parse_timestamp(moment)
+        if timestamp is None:
+            raise ValueError(f"Invalid date: {moment!r}")
+        return bisect.bisect_left(self.keys, (timestamp, ""))
+
+    def window(self, since=None, until=None):
+        """
+        Returns the records created in a date window.
+
+        Args:
+            since (datetime or str, optional): Start of the window, inclusive
+            until (datetime or str, optional): End of the window, exclusive
+
+        Returns:
+            list: The records, newest first
+        """
+        start = self._bound(since) if since is not None else 0
+        end = self._bound(until) if until is not None else len(self.keys)
+        return self.records[start:end][::-1]
+
+class PageIndex:
+    """
+    Sorted indexes used for pagination.
+
+    With the ledger open, the indexes are taken from it. Otherwise this class
+    keeps its own process-wide cache of them.
+    """
+
+    _indexes = OrderedDict()
+
+    @staticmethod
+    async def get(kind, family_id, fetch):
+        """
+        Returns the sorted index of a list, building it if needed.
+
+        Args:
+            kind (str): EXPENSES or PAYMENTS
+            family_id (str): ID of the family
+            fetch (callable): Coroutine function returning (status_code, records)
+                with the whole list
+
+        Returns:
+            tuple: (200, SortedIndex), (STALE_OK, SortedIndex) if the list was
+            served from an old copy, or the (status_code, response) of the fetch
+        """
+        if Ledger.is_open():
+            index = await Ledger.get_index(family_id, _LEDGER_LISTS[kind], SortedIndex)
+            if index is not None:
+                return 200, index
+            # La descarga actualiza el Ledger, que guarda el índice
+            status_code, records = await fetch()
+            if status_code != 200 or not isinstance(records, list):
+                return status_code, records
+            if ApiService.is_stale(status_code):
+                return status_code, SortedIndex(records)
+            index = await Ledger.get_index(family_id, _LEDGER_LISTS[kind], SortedIndex)
+            # Si una escritura impidió guardar la lista, el índice solo sirve para esta página
+            return 200, index if index is not None else SortedIndex(records)
+
+        key = (kind, str(family_id))
+        index = PageIndex._indexes.get(key)
+        if index is not None and time.monotonic() - index.built_at <= PAGINATION_INDEX_TTL:
+            PageIndex._indexes.move_to_end(key)
+            return 200, index
+
+        status_code, records = await fetch()
+        if status_code != 200 or not isinstance(records, list):
+            return status_code, records
+        if ApiService.is_stale(status_code):
+            # Una copia antigua no se guarda: la próxima página vuelve a intentar la API
+            return status_code, SortedIndex(records)
+
+        index = SortedIndex(records)
+        PageIndex._indexes[key] = index
+        PageIndex._indexes.move_to_end(key)
+        while len(PageIndex._indexes) > PAGINATION_MAX_INDEXES:
+            PageIndex._indexes.popitem(last=False)
+        return 200, index
+
+    @staticmethod
+    async def page(kind, family_id, fetch, cursor=None, direction=OLDER, size=None):
+        """
+        Returns one page of a list.
+
+        Args:
+            kind (str): EXPENSES or PAYMENTS
+            family_id (str): ID of the family
+            fetch (callable): Coroutine function returning the whole list
+            cursor (tuple, optional): (timestamp, id) of the record that ends
+                the current page
+            direction (str, optional): OLDER or NEWER than the cursor
+            size (int, optional): Records per page; PAGE_SIZE by default
+
+        Returns:
+            tuple: (200 or STALE_OK, Page) or the (status_code, response) of the fetch
+        """
+        status_code, index = await PageIndex.get(kind, family_id, fetch)
+        if status_code != 200:
+            return status_code, index
+        return status_code, index.page(cursor, direction, size or PAGE_SIZE)
+
+    @staticmethod
+    async def window(kind, family_id, fetch, since=None, until=None):
+        """
+        Returns the records of a list created in a date window.
+
+        Args:
+            kind (str): EXPENSES or PAYMENTS
+            family_id (str): ID of the family
+            fetch (callable): Coroutine function returning the whole list
+            since (datetime, optional): Start of the window, inclusive
+            until (datetime, optional): End of the window, exclusive
+
+        Returns:
+            tuple: (200 or STALE_OK, records newest first) or the
+            (status_code, response) of the fetch
+        """
+        status_code, index = await PageIndex.get(kind, family_id, fetch)
+        if status_code != 200:
+            return status_code, index
+        return status_code, index.window(since, until)
+
+    @staticmethod
+    def date_params(since=None, until=None):
+        """
+        Builds the since/until query parameters of a date window for the API.
+
+        Args:
+            since (datetime, optional): Start of the window, inclusive
+            until (datetime, optional): End of the window, exclusive
+
+        Returns:
+            dict: The query parameters, as ISO 8601 dates
+        """
+        params = {}
+        for name, moment in (("since", since), ("until", until)):
+            if moment is not None:
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=timezone.utc)
+                params[name] = moment.isoformat()
+        return params
+
+    @staticmethod
+    def invalidate(family_id):
+        """
+        Drops the indexes of a family after a write, or every index if the
+        family is unknown.
+
+        Args:
+            family_id (str, optional): ID of the family
+        """
+        if not family_id:
+            PageIndex._indexes.clear()
+            return
+        for kind in (EXPENSES, PAYMENTS):
+            PageIndex._indexes.pop((kind, str(family_id)), None)
+
+    @staticmethod
+    def callback_data(kind, direction, cursor):
+        """
+        Builds the callback data of a navigation button.
+
+        Args:
+            kind (str): EXPENSES or PAYMENTS
+            direction (str): OLDER or NEWER
+            cursor (tuple): (timestamp, id) of the record that ends the current page
+
+        Returns:
+            str: The callback data
+        """
+        timestamp, cursor_id = cursor
+        if timestamp is None or timestamp == UNKNOWN_TIMESTAMP:
+            code = _UNKNOWN_TIMESTAMP_CODE
+        else:
+            code = format(round(timestamp * 1_000_000), "x")
+        return f"{_CALLBACK_PREFIX}:{kind}:{direction}:{code}:{cursor_id}"
+
+    @staticmethod
+    def parse_callback(data):
+        """
+        Reads the callback data of a navigation button.
+
+        Only the "page:<kind>:<direction>:<timestamp>:<record id>" format
+        written by callback_data() is accepted.
+
+        Args:
+            data (str): The callback data
+
+        Returns:
+            tuple: (kind, direction, cursor), or None if it is not a
+            navigation button
+        """
+        parts = (data or "").split(":", 4)
+        if len(parts) != 5 or parts[0] != _CALLBACK_PREFIX or parts[2] not in (OLDER, NEWER):
+            return None
+
+        code, cursor_id = parts[3], parts[4]
+        if code == _UNKNOWN_TIMESTAMP_CODE:
+            return parts[1], parts[2], (UNKNOWN_TIMESTAMP, cursor_id)
+        try:
+            timestamp = int(code, 16) / 1_000_000
+        except ValueError:
+            return None
+        return parts[1], parts[2], (timestamp, cursor_id)
+
+    @staticmethod
+    def callback_pattern(kind):
+        """
+        Returns the pattern matching the navigation buttons of a list.
+
+        Args:
+            kind (str): EXPENSES or PAYMENTS
+
+        Returns:
+            str: Regular expression for a CallbackQueryHandler
+        """
+        return f"^{_CALLBACK_PREFIX}:{kind}:"
@@ -1,19 +1,44 @@
-from services.api_service import ApiService
+from services.api_service import ApiService, UNAVAILABLE_STATUS_CODES, STALE_OK
+from services.response_cache import ResponseCache
+from services.balance_cache import BalanceCache
+from services.ledger import (
+    Ledger,
+    PAYMENT_CREATED,
+    PAYMENT_CONFIRMED,
+    PAYMENT_UPDATED,
+    PAYMENT_DELETED,
+    PAYMENT_STATUS_EVENTS,
+    DEBT_ADJUSTMENT
+)
+from services.pagination import PageIndex, SortedIndex, PAYMENTS
+from services.models import Payment
+from config import API_DATE_FILTER_ENABLED
+from services.write_retry import WriteRetry, IDEMPOTENCY_HEADER
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class PaymentService:
     """Servicio para interactuar con pagos."""
     
     @staticmethod
-    def create_payment(from_member, to_member, amount, family_id=None, telegram_id=None):
+    async def create_payment(from_member, to_member, amount, family_id=None, telegram_id=None, on_retry_result=None, submission_id=None):
         """
         Registra un nuevo pago entre dos miembros.
         
+        Si la API no responde, el pago se reintenta en segundo plano con la misma
+        clave de idempotencia y se devuelve 202 con {"queued": True}.
+        
         Args:
             from_member (str): ID del miembro que realiza el pago
             to_member (str): ID del miembro que recibe el pago
             amount (float): Monto del pago
-            family_id (str, optional): ID de la familia (no se utiliza en el endpoint actual)
+            family_id (str, optional): ID de la familia (no se envía al endpoint; se usa para invalidar la caché)
             telegram_id (str, optional): ID de Telegram del usuario para autenticación
+            on_retry_result (callable, optional): Corrutina llamada con (status_code, response)
+                cuando termina un reintento en segundo plano
+            submission_id (str, optional): ID de la conversación que creó la escritura
+                (WriteRetry.new_submission_id), parte de la clave de idempotencia
             
         Returns:
             tuple: (status_code, response_data)
@@ -30,18 +55,17 @@ class PaymentService:
             "amount": amount_float
         }
         
-        print(f"Datos de solicitud de pago: {data}")
+        logger.debug("Datos de solicitud de pago: %s", Payload(data))
         
-        # Usar el endpoint correcto y pasar telegram_id como parámetro de consulta
-        return ApiService.request(
-            method="POST",
-            endpoint="/payments",
-            data=data,
-            token=telegram_id
+        idempotency_key = WriteRetry.make_key(telegram_id, "payment", data, submission_id)
+        return await WriteRetry.submit(
+            idempotency_key,
+            lambda: PaymentService._send_write("/payments", data, telegram_id, family_id, idempotency_key, True, event=PAYMENT_CREATED),
+            on_retry_result
         )
     
     @staticmethod
-    def get_family_payments(family_id, telegram_id=None):
+    async def get_family_payments(family_id, telegram_id=None):
         """Obtiene los pagos de una familia.
         
         Args:
@@ -49,29 +73,87 @@ class PaymentService:
             telegram_id: ID de Telegram del usuario para autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, lista de Payment) o (status_code, respuesta de error);
+            el código es STALE_OK si la lista sale del registro local porque la
+            API no responde
         """
-        return ApiService.request(
-            "GET", 
-            f"/payments/family/{family_id}", 
+        # Usar la lista reconstruida desde el registro local si es reciente
+        payments = await Ledger.get_payments(family_id)
+        if payments is not None:
+            return 200, payments
+        
+        version = Ledger.version(family_id)
+        status_code, response = await ApiService.get_list(
+            f"/payments/family/{family_id}",
             token=telegram_id,
-            check_status=False
+            parse=Payment.from_api,
+            family_id=family_id
+        )
+        if status_code == 200:
+            await Ledger.sync_payments(family_id, response, version)
+        elif status_code in UNAVAILABLE_STATUS_CODES:
+            # La API no responde: usar la última lista conocida, aunque sea antigua
+            payments = await Ledger.get_payments(family_id, stale=True)
+            if payments is not None:
+                logger.warning("API unavailable (%s), serving the last known payments of family %s", status_code, family_id)
+                return STALE_OK, payments
+        return status_code, response
+    
+    @staticmethod
+    async def get_family_payments_between(family_id, telegram_id=None, since=None, until=None):
+        """Obtiene los pagos de una familia creados en una ventana de fechas.
+        
+        Si la API admite filtros de fecha, solo se descargan los pagos de la
+        ventana. Si no, la ventana se busca por bisección en el índice ordenado
+        de la familia, que se reutiliza entre consultas.
+        
+        Args:
+            family_id: ID de la familia
+            telegram_id: ID de Telegram del usuario para autenticación (opcional)
+            since: datetime; inicio de la ventana, incluido (opcional)
+            until: datetime; fin de la ventana, excluido (opcional)
+            
+        Returns:
+            tuple: (status_code, Payment ordenados del más reciente al más antiguo)
+        """
+        if API_DATE_FILTER_ENABLED:
+            status_code, response = await ApiService.get_list(
+                f"/payments/family/{family_id}",
+                token=telegram_id,
+                params=PageIndex.date_params(since, until),
+                parse=Payment.from_api,
+                family_id=family_id
+            )
+            if status_code != 200:
+                return status_code, response
+            return 200, SortedIndex(response).window(since, until)
+        
+        return await PageIndex.window(
+            PAYMENTS, family_id, lambda: PaymentService.get_family_payments(family_id, telegram_id), since, until
         )
     
     @staticmethod
-    def delete_payment(payment_id):
+    async def delete_payment(payment_id, family_id=None):
         """Elimina un pago.
         
         Args:
             payment_id: ID del pago (UUID como string)
+            family_id: ID de la familia, para invalidar la caché (opcional)
             
         Returns:
             tuple: (status_code, response)
         """
-        return ApiService.request("DELETE", f"/payments/{payment_id}", check_status=False)
+        status_code, response = await ApiService.request("DELETE", f"/payments/{payment_id}", check_status=False)
+        if status_code < 400:
+            family_id = family_id or ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            BalanceCache.invalidate(family_id)
+            Ledger.record(family_id, PAYMENT_DELETED, payment_id)
+        return status_code, response
 
     @staticmethod
-    def get_payment(payment_id, telegram_id=None):
+    async def get_payment(payment_id, telegram_id=None):
         """Obtiene un pago específico por su ID.
         
         Args:
@@ -79,41 +161,53 @@ class PaymentService:
             telegram_id: ID de Telegram del usuario para autenticación (opcional)
             
         Returns:
-            tuple: (status_code, response)
+            tuple: (status_code, Payment) o (status_code, respuesta de error)
         """
-        return ApiService.request(
+        status_code, response = await ApiService.request(
             "GET", 
             f"/payments/{payment_id}", 
             token=telegram_id,
             check_status=False
         )
+        if status_code == 200 and isinstance(response, dict):
+            response = Payment.from_api(response)
+        return status_code, response
     
     @staticmethod
-    def confirm_payment(payment_id, telegram_id=None):
+    async def confirm_payment(payment_id, telegram_id=None, family_id=None):
         """Confirma un pago cambiando su estado a CONFIRM.
         
         Args:
             payment_id: ID del pago (UUID como string)
             telegram_id: ID de Telegram del usuario para autenticación (opcional)
+            family_id: ID de la familia, para invalidar la caché (opcional)
             
         Returns:
             tuple: (status_code, response)
         """
-        return ApiService.request(
+        status_code, response = await ApiService.request(
             "POST",
             f"/payments/{payment_id}/confirm",
             token=telegram_id,
             check_status=False
         )
+        if status_code < 400:
+            family_id = family_id or ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            BalanceCache.invalidate(family_id)
+            Ledger.record(family_id, PAYMENT_CONFIRMED, payment_id, response if isinstance(response, dict) else {"status": "CONFIRM"})
+        return status_code, response
     
     @staticmethod
-    def update_payment_status(payment_id, status, telegram_id=None):
+    async def update_payment_status(payment_id, status, telegram_id=None, family_id=None):
         """Actualiza el estado de un pago.
         
         Args:
             payment_id: ID del pago (UUID como string)
             status: Nuevo estado del pago (PENDING, CONFIRM, INACTIVE)
             telegram_id: ID de Telegram del usuario para autenticación (opcional)
+            family_id: ID de la familia, para invalidar la caché (opcional)
             
         Returns:
             tuple: (status_code, response)
@@ -122,27 +216,45 @@ class PaymentService:
             "status": status
         }
         
-        return ApiService.request(
+        status_code, response = await ApiService.request(
             "PATCH",
             f"/payments/{payment_id}/status",
             data=data,
             token=telegram_id,
             check_status=False
         )
+        if status_code < 400:
+            family_id = family_id or ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            BalanceCache.invalidate(family_id)
+            Ledger.record(
+                family_id,
+                PAYMENT_STATUS_EVENTS.get(status, PAYMENT_UPDATED),
+                payment_id,
+                response if isinstance(response, dict) else data
+            )
+        return status_code, response
     
     @staticmethod
-    def create_debt_adjustment(from_member, to_member, amount, telegram_id=None):
+    async def create_debt_adjustment(from_member, to_member, amount, telegram_id=None, family_id=None, on_retry_result=None, submission_id=None):
         """
         Crea un ajuste de deuda entre dos miembros.
         
         Un ajuste de deuda permite reducir parcialmente la deuda que un miembro
-        tiene hacia otro, sin involucrar un pago real.
+        tiene hacia otro, sin involucrar un pago real. Si la API no responde, el
+        ajuste se reintenta en segundo plano como en create_payment.
         
         Args:
             from_member (str): ID del miembro deudor
             to_member (str): ID del miembro acreedor
             amount (float): Monto del ajuste
             telegram_id (str, optional): ID de Telegram para autenticación
+            family_id (str, optional): ID de la familia, para invalidar la caché
+            on_retry_result (callable, optional): Corrutina llamada con (status_code, response)
+                cuando termina un reintento en segundo plano
+            submission_id (str, optional): ID de la conversación que creó la escritura
+                (WriteRetry.new_submission_id), parte de la clave de idempotencia
             
         Returns:
             tuple: (status_code, response_data)
@@ -159,13 +271,54 @@ class PaymentService:
             "amount": amount_float
         }
         
-        print(f"Datos de solicitud de ajuste de deuda: {data}")
+        logger.debug("Datos de solicitud de ajuste de deuda: %s", Payload(data))
         
         # Usar el endpoint para ajuste de deuda
-        return ApiService.request(
+        idempotency_key = WriteRetry.make_key(telegram_id, "debt_adjustment", data, submission_id)
+        return await WriteRetry.submit(
+            idempotency_key,
+            lambda: PaymentService._send_write("/payments/debt-adjustment/", data, telegram_id, family_id, idempotency_key, False, confirmed=True, event=DEBT_ADJUSTMENT),
+            on_retry_result
+        )
+    
+    @staticmethod
+    async def _send_write(endpoint, data, telegram_id, family_id, idempotency_key, check_status, confirmed=False, event=PAYMENT_CREATED):
+        """
+        Realiza un intento de una escritura de pago e invalida la caché si tiene éxito.
+        
+        Args:
+            endpoint (str): Endpoint de la API
+            data (dict): Datos de la solicitud
+            telegram_id (str): ID de Telegram para autenticación
+            family_id (str): ID de la familia, para invalidar la caché
+            idempotency_key (str): Clave de idempotencia compartida por todos los intentos
+            check_status (bool): Si es True, registra los códigos de error
+            confirmed (bool): Si es True, la escritura afecta a los balances aunque la
+                respuesta no indique el estado (ajustes de deuda)
+            event (str): Tipo de evento que se registra en el registro local
+            
+        Returns:
+            tuple: (status_code, response_data)
+        """
+        status_code, response = await ApiService.request(
             method="POST",
-            endpoint="/payments/debt-adjustment/",
+            endpoint=endpoint,
             data=data,
             token=telegram_id,
-            check_status=False
-        ) 
\ No newline at end of file
+            check_status=check_status,
+            headers={IDEMPOTENCY_HEADER: idempotency_key}
+        )
+        if status_code < 400:
+            family_id = family_id or ResponseCache.family_of(response)
+            ResponseCache.invalidate_family(family_id)
+            PageIndex.invalidate(family_id)
+            
+            # Actualizar los balances locales: los pagos pendientes no los cambian
+            payment_status = response.get("status") if isinstance(response, dict) else None
+            if confirmed or payment_status == "CONFIRM":
+                BalanceCache.apply_payment(family_id, data["from_member"], data["to_member"], data["amount"])
+            elif payment_status != "PENDING":
+                BalanceCache.invalidate(family_id)
+            if isinstance(response, dict):
+                Ledger.record(family_id, event, response.get("id"), response)
+        return status_code, response
@@ -0,0 +1,124 @@
+"""
+Request Coalescer Module
+
+This module implements single-flight coalescing for read requests to the API.
+When several users trigger the same GET at the same time (for example after a
+new expense notifies the whole family), only one upstream request is made and
+every caller receives the same parsed result.
+"""
+
+import asyncio
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+class RequestCoalescer:
+    """
+    Shares one in-flight upstream call among identical concurrent requests.
+
+    Requests are identified by a key built from the method, the URL and the
+    query parameters (which include the telegram_id scope). The first caller
+    starts the upstream call; callers arriving while it is still running wait
+    for the same task instead of starting their own.
+    """
+
+    _in_flight = {}
+    _families = {}
+    _upstream_calls = 0
+    _coalesced_calls = 0
+
+    @staticmethod
+    def make_key(method, url, params=None):
+        """
+        Builds the key that identifies identical requests.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute request URL
+            params (dict, optional): Query parameters, including telegram_id
+
+        Returns:
+            tuple: Hashable key for the request
+        """
+        normalized_params = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return (method.upper(), url, normalized_params)
+
+    @staticmethod
+    async def run(key, call, family_id=None):
+        """
+        Runs the call, or joins the identical call that is already in flight.
+
+        The upstream call runs as its own task and is shielded, so a caller
+        that gets cancelled does not cancel the request for the others.
+
+        Args:
+            key (tuple): Key returned by make_key
+            call (callable): Zero-argument function returning the coroutine to run
+            family_id (str, optional): Family the response belongs to, so that
+                forget_family() can stop later callers from joining the call
+
+        Returns:
+            Any: The result of the upstream call, shared by every caller
+        """
+        task = RequestCoalescer._in_flight.get(key)
+
+        if task is not None:
+            RequestCoalescer._coalesced_calls += 1
+            logger.debug("Coalesced request %s %s (saved calls: %s)", key[0], key[1], RequestCoalescer._coalesced_calls)
+            return await asyncio.shield(task)
+
+        RequestCoalescer._upstream_calls += 1
+        task = asyncio.ensure_future(call())
+        RequestCoalescer._in_flight[key] = task
+        if family_id is not None:
+            RequestCoalescer._families[key] = str(family_id)
+        task.add_done_callback(lambda _: RequestCoalescer._forget(key, task))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _forget(key, task):
+        """
+        Removes a finished task from the in-flight table.
+
+        Args:
+            key (tuple): Key of the finished request
+            task (asyncio.Task): The task that finished
+        """
+        if RequestCoalescer._in_flight.get(key) is task:
+            del RequestCoalescer._in_flight[key]
+            RequestCoalescer._families.pop(key, None)
+
+    @staticmethod
+    def forget_family(family_id=None):
+        """
+        Stops later requests from joining the calls of a family in flight.
+
+        The calls keep running for the callers already waiting for them; an
+        identical request made afterwards starts a new upstream call. Used
+        after a write, whose changes the calls in flight may not include.
+
+        Args:
+            family_id (str, optional): ID of the family; every call if omitted
+        """
+        if family_id is None:
+            keys = list(RequestCoalescer._in_flight)
+        else:
+            family_id = str(family_id)
+            keys = [key for key, family in RequestCoalescer._families.items() if family == family_id]
+        for key in keys:
+            RequestCoalescer._in_flight.pop(key, None)
+            RequestCoalescer._families.pop(key, None)
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing how effective coalescing has been.
+
+        Returns:
+            dict: upstream_calls, coalesced_calls (calls saved) and in_flight
+        """
+        return {
+            "upstream_calls": RequestCoalescer._upstream_calls,
+            "coalesced_calls": RequestCoalescer._coalesced_calls,
+            "in_flight": len(RequestCoalescer._in_flight)
+        }
@@ -0,0 +1,331 @@
+"""
+Response Cache Module
+
+This module provides a read-through cache for GET responses from the backend API.
+Entries expire after a per-endpoint TTL, the cache is bounded by an LRU policy
+on both entry count and approximate size, and every entry is tagged with the
+family it belongs to so that writes can invalidate exactly the affected keys.
+
+Responses are stored already parsed into records (services/models.py): each
+caching rule names the parser of its endpoint, which runs once when the
+response is fetched, so cache hits do not parse the body again. Records are
+read-only and are shared by every hit; the lists and dicts around them are
+copied on each read, so a caller that changes its answer never changes the
+cached one.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from config import (
+    API_CACHE_ENABLED,
+    API_CACHE_MAX_ENTRIES,
+    API_CACHE_MAX_BYTES,
+    API_CACHE_TTL_MEMBER,
+    API_CACHE_TTL_FAMILY,
+    API_CACHE_TTL_BALANCES
+)
+from services.json_codec import JsonCodec
+from services.models import Family, Member, MemberBalance
+from services.request_coalescer import RequestCoalescer
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+def _parse_object(model):
+    """Returns a parser of one API object into a record; other bodies are kept."""
+    return lambda data: model.from_api(data) if isinstance(data, dict) else data
+
+def _parse_list(model):
+    """Returns a parser of an API list into records; other bodies are kept."""
+    return lambda data: model.parse_list(data) if isinstance(data, list) else data
+
+# Endpoints que se pueden cachear, su TTL en segundos y el parser de su respuesta.
+# El grupo "family" (si existe) indica la familia a la que pertenece la respuesta.
+CACHEABLE_ENDPOINTS = [
+    (re.compile(r"^/members/id/[^/]+$"), API_CACHE_TTL_MEMBER, _parse_object(Member)),
+    (re.compile(r"^/members/[^/]+$"), API_CACHE_TTL_MEMBER, _parse_object(Member)),
+    (re.compile(r"^/families/(?P<family>[^/]+)$"), API_CACHE_TTL_FAMILY, _parse_object(Family)),
+    (re.compile(r"^/families/(?P<family>[^/]+)/members$"), API_CACHE_TTL_FAMILY, _parse_list(Member)),
+    (re.compile(r"^/families/(?P<family>[^/]+)/balances$"), API_CACHE_TTL_BALANCES, MemberBalance.parse_list),
+]
+# Las listas de gastos y pagos no se cachean aquí: se guardan ya interpretadas
+# en el Ledger (o en el PageIndex si el Ledger está desactivado)
+
+def _detached(data):
+    """
+    Copies the lists and dicts of a cached response, sharing the records.
+
+    Args:
+        data: Cached response data
+
+    Returns:
+        A value the caller can modify without changing the cache
+    """
+    if isinstance(data, list):
+        return [_detached(item) for item in data]
+    if isinstance(data, dict):
+        return {key: _detached(value) for key, value in data.items()}
+    return data
+
+class _CacheEntry:
+    """A cached response together with its expiry, family tag and size."""
+
+    __slots__ = ("value", "expires_at", "family_id", "size")
+
+    def __init__(self, value, expires_at, family_id, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.family_id = family_id
+        self.size = size
+
+class ResponseCache:
+    """
+    Process-wide LRU cache for successful GET responses.
+
+    Keys are the same tuples used by the RequestCoalescer, so the telegram_id
+    scope of a request is part of its key. Values are the (status_code,
+    response_data) tuples returned by ApiService.request, with response_data
+    already parsed by the parser of the caching rule.
+
+    Each family also has a version that changes with every invalidation, so a
+    response requested before a write is not stored after it.
+    """
+
+    _entries = OrderedDict()
+    _family_keys = {}
+    _versions = {}
+    _epoch = 0
+    _writes = 0
+    _total_bytes = 0
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+
+    @staticmethod
+    def get_rule(endpoint):
+        """
+        Finds the caching rule for an endpoint.
+
+        Args:
+            endpoint (str): API endpoint, starting with a slash
+
+        Returns:
+            tuple: (ttl, family_id, parse) or None if the endpoint is not
+            cacheable; parse turns a successful response into records
+        """
+        if not API_CACHE_ENABLED:
+            return None
+        for pattern, ttl, parse in CACHEABLE_ENDPOINTS:
+            match = pattern.match(endpoint)
+            if match:
+                return ttl, match.groupdict().get("family"), parse
+        return None
+
+    @staticmethod
+    def get(key):
+        """
+        Returns a cached response if it exists and has not expired.
+
+        Args:
+            key (tuple): Request key
+
+        Returns:
+            tuple: (status_code, response_data) or None on a miss; the data is
+            a copy whose records are shared with the cache
+        """
+        entry = ResponseCache._entries.get(key)
+        if entry is None:
+            ResponseCache._misses += 1
+            return None
+
+        # Las entradas caducadas se conservan para get_stale hasta que el LRU las desaloje
+        if entry.expires_at <= time.monotonic():
+            ResponseCache._misses += 1
+            return None
+
+        ResponseCache._entries.move_to_end(key)
+        ResponseCache._hits += 1
+        status_code, response_data = entry.value
+        return status_code, _detached(response_data)
+
+    @staticmethod
+    def version(family_id=None):
+        """
+        Returns the current version of a family, to be passed to put().
+
+        Args:
+            family_id (str, optional): ID of the family; if unknown, the
+                version changes with the invalidation of any family
+
+        Returns:
+            tuple: The version
+        """
+        if family_id is None:
+            return None, ResponseCache._epoch, ResponseCache._writes
+        family_id = str(family_id)
+        return family_id, ResponseCache._epoch, ResponseCache._versions.get(family_id, 0)
+
+    @staticmethod
+    def put(key, value, ttl, family_id=None, version=None):
+        """
+        Stores a response in the cache, evicting least recently used entries if needed.
+
+        Args:
+            key (tuple): Request key
+            value (tuple): (status_code, response_data)
+            ttl (float): Time to live in seconds
+            family_id (str, optional): Family the response belongs to
+            version (tuple, optional): Value of version() before the request
+                was made; the response is not stored if it changed
+        """
+        if version is not None and version != ResponseCache.version(version[0]):
+            # Una escritura invalidó la familia mientras se pedía la respuesta
+            return
+
+        # Las respuestas de miembros indican su familia en el cuerpo
+        response_data = value[1]
+        if family_id is None and isinstance(response_data, dict):
+            family_id = response_data.get("family_id")
+        family_id = str(family_id) if family_id is not None else None
+
+        size = ResponseCache._estimate_size(response_data)
+        if size > API_CACHE_MAX_BYTES:
+            return
+
+        if key in ResponseCache._entries:
+            ResponseCache._remove(key)
+
+        # El que pidió la respuesta se queda con el original
+        value = value[0], _detached(response_data)
+        ResponseCache._entries[key] = _CacheEntry(value, time.monotonic() + ttl, family_id, size)
+        ResponseCache._total_bytes += size
+        if family_id is not None:
+            ResponseCache._family_keys.setdefault(family_id, set()).add(key)
+
+        while (len(ResponseCache._entries) > API_CACHE_MAX_ENTRIES
+               or ResponseCache._total_bytes > API_CACHE_MAX_BYTES):
+            oldest_key = next(iter(ResponseCache._entries))
+            ResponseCache._remove(oldest_key)
+            ResponseCache._evictions += 1
+
+    @staticmethod
+    def get_stale(key):
+        """
+        Returns a cached response even if its TTL has expired.
+
+        Used as a degraded answer while the API is unavailable.
+
+        Args:
+            key (tuple): Request key
+
+        Returns:
+            tuple: (status_code, response_data) or None if nothing is cached;
+            the data is a copy whose records are shared with the cache
+        """
+        entry = ResponseCache._entries.get(key)
+        if entry is None:
+            return None
+        status_code, response_data = entry.value
+        return status_code, _detached(response_data)
+
+    @staticmethod
+    def invalidate_family(family_id=None):
+        """
+        Removes every cached response that belongs to a family.
+
+        When the family is unknown, every entry is removed, since any of them
+        could be affected by the write that triggered the invalidation. The
+        requests of the family still in flight are not joined by later callers
+        and their responses are not stored.
+
+        Args:
+            family_id (str, optional): ID of the family whose data changed
+        """
+        ResponseCache._writes += 1
+        RequestCoalescer.forget_family(family_id)
+        if family_id is None:
+            ResponseCache._epoch += 1
+            ResponseCache.clear()
+            logger.debug("Response cache cleared after a write with unknown family")
+            return
+
+        family_id = str(family_id)
+        ResponseCache._versions[family_id] = ResponseCache._versions.get(family_id, 0) + 1
+        keys = ResponseCache._family_keys.pop(family_id, set())
+        for key in keys:
+            ResponseCache._remove(key)
+        logger.debug("Response cache invalidated %s entries for family %s", len(keys), family_id)
+
+    @staticmethod
+    def family_of(response_data):
+        """
+        Extracts the family ID from a write response, if present.
+
+        Args:
+            response_data: Parsed response from the API
+
+        Returns:
+            str: The family ID or None
+        """
+        if isinstance(response_data, dict):
+            return response_data.get("family_id")
+        return None
+
+    @staticmethod
+    def clear():
+        """Removes every entry from the cache."""
+        ResponseCache._entries.clear()
+        ResponseCache._family_keys.clear()
+        ResponseCache._total_bytes = 0
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing the cache state.
+
+        Returns:
+            dict: entries, bytes, hits, misses and evictions
+        """
+        return {
+            "entries": len(ResponseCache._entries),
+            "bytes": ResponseCache._total_bytes,
+            "hits": ResponseCache._hits,
+            "misses": ResponseCache._misses,
+            "evictions": ResponseCache._evictions
+        }
+
+    @staticmethod
+    def _remove(key):
+        """
+        Removes one entry and its family tag.
+
+        Args:
+            key (tuple): Request key
+        """
+        entry = ResponseCache._entries.pop(key, None)
+        if entry is None:
+            return
+        ResponseCache._total_bytes -= entry.size
+        if entry.family_id is not None:
+            keys = ResponseCache._family_keys.get(entry.family_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del ResponseCache._family_keys[entry.family_id]
+
+    @staticmethod
+    def _estimate_size(response_data):
+        """
+        Estimates the memory used by a response from its serialized length.
+
+        Args:
+            response_data: Parsed response from the API
+
+        Returns:
+            int: Approximate size in bytes
+        """
+        try:
+            return len(JsonCodec.dumps(response_data))
+        except (TypeError, ValueError):
+            return 0
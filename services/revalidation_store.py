@@ -0,0 +1,165 @@
+"""
+Revalidation Store Module
+
+This module keeps the last body received for GET requests whose responses
+carry an ETag or Last-Modified validator. Later requests send the validator
+back with If-None-Match / If-Modified-Since, and a 304 Not Modified answer
+reuses the stored body instead of downloading it again.
+"""
+
+from collections import OrderedDict
+from config import (
+    API_REVALIDATE_ENABLED,
+    API_REVALIDATE_MAX_ENTRIES,
+    API_REVALIDATE_MAX_BYTES
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+class _StoredResponse:
+    """A response body together with the validators the API sent for it."""
+
+    __slots__ = ("etag", "last_modified", "data", "size")
+
+    def __init__(self, etag, last_modified, data, size):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.data = data
+        self.size = size
+
+class RevalidationStore:
+    """
+    LRU store of validated GET responses, keyed like the RequestCoalescer.
+
+    Responses without validators are never stored, so the store degrades to a
+    plain request when the backend does not send ETag or Last-Modified.
+    """
+
+    _entries = OrderedDict()
+    _total_bytes = 0
+    _revalidated = 0
+    _downloads = 0
+
+    @staticmethod
+    def conditional_headers(key):
+        """
+        Builds the conditional headers for a request, if a validated body is stored.
+
+        Args:
+            key (tuple): Request key
+
+        Returns:
+            dict: If-None-Match / If-Modified-Since headers (empty if nothing is stored)
+        """
+        if not API_REVALIDATE_ENABLED:
+            return {}
+
+        entry = RevalidationStore._entries.get(key)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    @staticmethod
+    def reuse(key):
+        """
+        Returns the stored body after the API answered 304 Not Modified.
+
+        Args:
+            key (tuple): Request key
+
+        Returns:
+            Any: The stored response data, or None if it was evicted meanwhile
+        """
+        entry = RevalidationStore._entries.get(key)
+        if entry is None:
+            return None
+        RevalidationStore._entries.move_to_end(key)
+        RevalidationStore._revalidated += 1
+        logger.debug("Reusing stored body for %s after 304 (saved %s bytes)", key[1], entry.size)
+        return entry.data
+
+    @staticmethod
+    def peek(key):
+        """
+        Returns the stored body without revalidating it.
+
+        Used as a degraded answer while the API is unavailable.
+
+        Args:
+            key (tuple): Request key
+
+        Returns:
+            Any: The stored response data, or None if nothing is stored
+        """
+        entry = RevalidationStore._entries.get(key)
+        return entry.data if entry is not None else None
+
+    @staticmethod
+    def store(key, response, data):
+        """
+        Stores a 200 response body if the API sent validators for it.
+
+        Args:
+            key (tuple): Request key
+            response (httpx.Response): The raw response, used for headers and size
+            data: Parsed response data
+        """
+        if not API_REVALIDATE_ENABLED:
+            return
+
+        RevalidationStore._downloads += 1
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        # Sin validadores no hay nada que revalidar; descartar lo almacenado
+        if not etag and not last_modified:
+            RevalidationStore._remove(key)
+            return
+
+        size = len(response.content)
+        if size > API_REVALIDATE_MAX_BYTES:
+            RevalidationStore._remove(key)
+            return
+
+        RevalidationStore._remove(key)
+        RevalidationStore._entries[key] = _StoredResponse(etag, last_modified, data, size)
+        RevalidationStore._total_bytes += size
+
+        while (len(RevalidationStore._entries) > API_REVALIDATE_MAX_ENTRIES
+               or RevalidationStore._total_bytes > API_REVALIDATE_MAX_BYTES):
+            oldest_key = next(iter(RevalidationStore._entries))
+            RevalidationStore._remove(oldest_key)
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing how often revalidation avoided a download.
+
+        Returns:
+            dict: entries, bytes, revalidated (304 reuses) and downloads (full bodies)
+        """
+        return {
+            "entries": len(RevalidationStore._entries),
+            "bytes": RevalidationStore._total_bytes,
+            "revalidated": RevalidationStore._revalidated,
+            "downloads": RevalidationStore._downloads
+        }
+
+    @staticmethod
+    def _remove(key):
+        """
+        Removes one stored response.
+
+        Args:
+            key (tuple): Request key
+        """
+        entry = RevalidationStore._entries.pop(key, None)
+        if entry is not None:
+            RevalidationStore._total_bytes -= entry.size
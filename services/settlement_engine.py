@@ -0,0 +1,348 @@
+"""
+Settlement Engine Module
+
+This module computes the balances of a family locally, from its raw expenses
+and payments, in the same per-member format returned by
+/families/{id}/balances: net_balance, total_owed, total_debt, debts and credits.
+It is used when the balances route of the API is unavailable or too slow, and
+to cross-check the server results.
+
+The amounts owed between every pair of members are accumulated in an n×n
+matrix indexed by member. Expenses are reduced to flat arrays of payer, set of
+members sharing it and amount. With NumPy installed the arrays are filled with
+np.fromiter and filtered with boolean masks, and the amounts are accumulated
+with weighted bincounts and one small matrix product, so the cost grows linearly with the number of expenses.
+Without NumPy the same computation runs in pure Python.
+"""
+
+import asyncio
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from services.api_service import ApiService, STALE_OK
+from services.expense_service import ExpenseService
+from services.payment_service import PaymentService
+from services.models import is_record, normalize_id
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Solo los pagos confirmados cuentan en los balances; PENDING y REJECT no
+COUNTED_PAYMENT_STATUSES = ("CONFIRM",)
+
+# Diferencias menores que esto se consideran cero, como hace la API
+_EPSILON = 0.01
+
+# Una fila por gasto o pago al volcarlos con np.fromiter en una sola pasada
+if np is not None:
+    _EXPENSE_DTYPE = np.dtype([("payer", np.int64), ("subset", np.int64), ("amount", np.float64)])
+    _PAYMENT_DTYPE = np.dtype([("counted", np.bool_), ("debtor", np.int64), ("creditor", np.int64), ("amount", np.float64)])
+
+class _SubsetIndex(dict):
+    """
+    Position of every set of members sharing an expense, keyed by the tuple of
+    member IDs of split_among (None for the whole family).
+
+    Unknown keys are resolved on first access, so the per-expense cost is a
+    single dict lookup. Sets with no known member map to -1.
+    """
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+        self.subsets = [tuple(range(len(index)))]
+        self[None] = 0
+
+    def __missing__(self, key):
+        participants = tuple(sorted({self.index[item] for item in key if item in self.index}))
+        position = -1
+        if participants:
+            position = len(self.subsets)
+            self.subsets.append(participants)
+        self[key] = position
+        return position
+
+class SettlementEngine:
+    """Local computation of family balances from expenses and payments."""
+
+    @staticmethod
+    def _flatten(members, expenses, payments):
+        """
+        Converts expenses and payments into flat index lists in pure Python.
+
+        Each expense becomes (payer, subset, amount), where subset identifies the
+        set of members sharing it; families reuse a handful of subsets, so the
+        per-member work is done once per subset instead of once per expense.
+
+        Args:
+            members (list): Member records or dicts with "id"
+            expenses (list): Expense records, or dicts with "paid_by", "amount" and
+                optional "split_among"
+            payments (list): Payment records, or dicts with "from_member",
+                "to_member", "amount" and "status"
+
+        Returns:
+            tuple: (subsets as tuples of member indexes, expense payers, expense
+            subsets, expense amounts, payment debtors, payment creditors,
+            payment amounts)
+        """
+        index = {str(member["id"]): position for position, member in enumerate(members)}
+        member_id = normalize_id
+        everyone = tuple(range(len(members)))
+        subsets = [everyone]
+        subset_index = {None: 0}
+        payers, expense_subsets, expense_amounts = [], [], []
+
+        for expense in expenses:
+            payer = index.get(member_id(expense.get("paid_by")))
+            if payer is None:
+                continue
+            split_among = expense.get("split_among")
+            key = tuple(member_id(member) for member in split_among) if split_among else None
+            position = subset_index.get(key)
+            if position is None:
+                participants = tuple(sorted({index[item] for item in key if item in index}))
+                if not participants:
+                    continue
+                position = subset_index[key] = len(subsets)
+                subsets.append(participants)
+            payers.append(payer)
+            expense_subsets.append(position)
+            expense_amounts.append(float(expense.get("amount", 0) or 0))
+
+        debtors, creditors, payment_amounts = [], [], []
+        for payment in payments:
+            if payment.get("status") not in COUNTED_PAYMENT_STATUSES:
+                continue
+            debtor = index.get(member_id(payment.get("from_member")))
+            creditor = index.get(member_id(payment.get("to_member")))
+            if debtor is None or creditor is None or debtor == creditor:
+                continue
+            debtors.append(debtor)
+            creditors.append(creditor)
+            payment_amounts.append(float(payment.get("amount", 0) or 0))
+
+        return subsets, payers, expense_subsets, expense_amounts, debtors, creditors, payment_amounts
+
+    @staticmethod
+    def _flatten_numpy(members, expenses, payments):
+        """
+        Converts expenses and payments into flat index arrays with NumPy.
+
+        Same result as _flatten, but each expense and payment is read in one pass
+        into a structured array with np.fromiter, and the ones that cannot be
+        counted are dropped with boolean masks instead of Python branches.
+
+        Returns:
+            tuple: (subsets as tuples of member indexes, expense payers, expense
+            subsets, expense amounts, payment debtors, payment creditors,
+            payment amounts), the last six as NumPy arrays
+        """
+        index = {str(member["id"]): position for position, member in enumerate(members)}
+        member_id = normalize_id
+        subsets = _SubsetIndex(index)
+
+        expenses = np.fromiter(
+            (
+                (
+                    index.get(member_id(expense.get("paid_by")), -1),
+                    subsets[tuple(map(member_id, split_among)) if (split_among := expense.get("split_among")) else None],
+                    float(expense.get("amount", 0) or 0)
+                )
+                for expense in expenses
+            ),
+            dtype=_EXPENSE_DTYPE
+        )
+        payers, expense_subsets, expense_amounts = expenses["payer"], expenses["subset"], expenses["amount"]
+        kept = (payers >= 0) & (expense_subsets >= 0)
+
+        payments = np.fromiter(
+            (
+                (
+                    payment.get("status") in COUNTED_PAYMENT_STATUSES,
+                    index.get(member_id(payment.get("from_member")), -1),
+                    index.get(member_id(payment.get("to_member")), -1),
+                    float(payment.get("amount", 0) or 0)
+                )
+                for payment in payments
+            ),
+            dtype=_PAYMENT_DTYPE
+        )
+        debtors, creditors, payment_amounts = payments["debtor"], payments["creditor"], payments["amount"]
+        counted = payments["counted"].copy()
+        counted &= (debtors >= 0) & (creditors >= 0) & (debtors != creditors)
+
+        return (
+            subsets.subsets, payers[kept], expense_subsets[kept], expense_amounts[kept],
+            debtors[counted], creditors[counted], payment_amounts[counted]
+        )
+
+    @staticmethod
+    def _net_numpy(size, subsets, payers, expense_subsets, expense_amounts, debtors, creditors, payment_amounts):
+        """
+        Accumulates the amounts owed into an antisymmetric n×n matrix with NumPy.
+
+        Shares are summed per (subset, payer) with one weighted bincount, and the
+        membership matrix of the subsets spreads them over the members.
+
+        Returns:
+            list: n×n nested lists; [i][j] > 0 means member i owes member j
+        """
+        membership = np.zeros((len(subsets), size), dtype=np.float64)
+        for position, participants in enumerate(subsets):
+            membership[position, list(participants)] = 1.0
+
+        subset_ids = np.asarray(expense_subsets, dtype=np.int64)
+        shares = np.asarray(expense_amounts, dtype=np.float64) / membership.sum(axis=1)[subset_ids]
+        by_subset = np.bincount(
+            subset_ids * size + np.asarray(payers, dtype=np.int64),
+            weights=shares,
+            minlength=len(subsets) * size
+        ).reshape(len(subsets), size)
+
+        # owed[i][j]: lo que el miembro i debe al miembro j por los gastos que pagó j
+        owed = membership.T @ by_subset
+        np.fill_diagonal(owed, 0.0)
+
+        # Un pago reduce lo que el pagador debe al receptor
+        owed -= np.bincount(
+            np.asarray(debtors, dtype=np.int64) * size + np.asarray(creditors, dtype=np.int64),
+            weights=np.asarray(payment_amounts, dtype=np.float64),
+            minlength=size * size
+        ).reshape(size, size)
+        return (owed - owed.T).tolist()
+
+    @staticmethod
+    def _net_python(size, subsets, payers, expense_subsets, expense_amounts, debtors, creditors, payment_amounts):
+        """
+        Accumulates the amounts owed into an antisymmetric n×n matrix in pure Python.
+
+        Returns:
+            list: n×n nested lists; [i][j] > 0 means member i owes member j
+        """
+        by_subset = {}
+        for payer, position, amount in zip(payers, expense_subsets, expense_amounts):
+            by_subset[(position, payer)] = by_subset.get((position, payer), 0.0) + amount / len(subsets[position])
+
+        owed = [[0.0] * size for _ in range(size)]
+        for (position, payer), share in by_subset.items():
+            for participant in subsets[position]:
+                if participant != payer:
+                    owed[participant][payer] += share
+        for debtor, creditor, amount in zip(debtors, creditors, payment_amounts):
+            owed[debtor][creditor] -= amount
+        return [[owed[i][j] - owed[j][i] for j in range(size)] for i in range(size)]
+
+    @staticmethod
+    def compute(members, expenses, payments, use_numpy=None):
+        """
+        Computes the balances of a family.
+
+        Args:
+            members (list): Member records or dicts with "id" and "name"
+            expenses (list): Expenses of the family
+            payments (list): Payments of the family
+            use_numpy (bool, optional): Force or disable NumPy; by default it is
+                used when installed
+
+        Returns:
+            list: [{member_id, name, net_balance, total_owed, total_debt,
+            debts: [{to, to_id, amount}], credits: [{from, from_id, amount}]}]
+        """
+        members = [member for member in members if is_record(member) and member.get("id") is not None]
+        size = len(members)
+
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise RuntimeError("NumPy is not installed")
+        if size == 0:
+            return []
+        if use_numpy:
+            net = SettlementEngine._net_numpy(size, *SettlementEngine._flatten_numpy(members, expenses, payments))
+        else:
+            net = SettlementEngine._net_python(size, *SettlementEngine._flatten(members, expenses, payments))
+
+        balances = [
+            {"member_id": member["id"], "name": member.get("name", f"Usuario {member['id']}"), "debts": [], "credits": []}
+            for member in members
+        ]
+        for i in range(size):
+            for j in range(i + 1, size):
+                amount = net[i][j]
+                if abs(amount) < _EPSILON:
+                    continue
+                debtor, creditor = (i, j) if amount > 0 else (j, i)
+                amount = round(abs(amount), 2)
+                balances[debtor]["debts"].append({"to": balances[creditor]["name"], "to_id": balances[creditor]["member_id"], "amount": amount})
+                balances[creditor]["credits"].append({"from": balances[debtor]["name"], "from_id": balances[debtor]["member_id"], "amount": amount})
+
+        for balance in balances:
+            balance["total_owed"] = round(sum(credit["amount"] for credit in balance["credits"]), 2)
+            balance["total_debt"] = round(sum(debt["amount"] for debt in balance["debts"]), 2)
+            balance["net_balance"] = round(balance["total_owed"] - balance["total_debt"], 2)
+        return balances
+
+    @staticmethod
+    async def compute_family(family_id, members, token=None):
+        """
+        Fetches the expenses and payments of a family and computes its balances.
+
+        Args:
+            family_id (str): ID of the family
+            members (list): Member records of the family
+            token (str, optional): Telegram ID used as token
+
+        Returns:
+            tuple: (200, balances), or (STALE_OK, balances) if a list was served
+            from an old copy, or the (status_code, response) of the request
+            that failed
+        """
+        (expenses_status, expenses), (payments_status, payments) = await asyncio.gather(
+            ExpenseService.get_family_expenses(family_id, token),
+            PaymentService.get_family_payments(family_id, token)
+        )
+        if expenses_status != 200 or not isinstance(expenses, list):
+            return expenses_status, expenses
+        if payments_status != 200 or not isinstance(payments, list):
+            return payments_status, payments
+        status_code = STALE_OK if ApiService.is_stale(expenses_status) or ApiService.is_stale(payments_status) else 200
+        return status_code, SettlementEngine.compute(members, expenses, payments)
+
+    @staticmethod
+    def cross_check(server_balances, local_balances, tolerance=_EPSILON):
+        """
+        Compares the debts of two balance lists.
+
+        Args:
+            server_balances (list): Balances returned by the API
+            local_balances (list): Balances computed by compute()
+            tolerance (float, optional): Largest difference considered equal
+
+        Returns:
+            list: (debtor_id, creditor_id, server_amount, local_amount) for every
+            pair that differs; empty if both agree
+        """
+        def debts(balances):
+            balances = [balance for balance in balances or [] if is_record(balance)]
+            ids_by_name = {balance.get("name"): str(balance.get("member_id")) for balance in balances}
+            result = {}
+            for balance in balances:
+                for debt in balance.get("debts", []) or []:
+                    creditor = debt.get("to_id")
+                    creditor = str(creditor) if creditor is not None else ids_by_name.get(debt.get("to"), str(debt.get("to")))
+                    result[(str(balance.get("member_id")), creditor)] = float(debt.get("amount", 0) or 0)
+            return result
+
+        server, local = debts(server_balances), debts(local_balances)
+        differences = []
+        for key in sorted(set(server) | set(local)):
+            # Margen extra para diferencias de redondeo del orden de suma
+            if abs(server.get(key, 0.0) - local.get(key, 0.0)) > tolerance + 1e-6:
+                differences.append((key[0], key[1], server.get(key), local.get(key)))
+        if differences:
+            logger.warning("Balance cross-check found %s differing pairs", len(differences))
+        return differences
@@ -0,0 +1,165 @@
+"""
+Warm-up Service Module
+
+This module preloads the caches after a restart. The users restored by the
+persistence are ranked by their last activity, and for the most recently
+active families the member, family and balances requests are made in the
+background, with bounded concurrency. The first tap of those users after a
+deploy is then served from the member index, the family directory and the
+response cache instead of waiting for the whole chain of API calls.
+"""
+
+import asyncio
+import time
+from services.member_service import MemberService
+from services.family_service import FamilyService
+from config import (
+    WARMUP_ENABLED,
+    WARMUP_MAX_FAMILIES,
+    WARMUP_CONCURRENCY
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+class WarmupService:
+    """Background preloading of member and family data at startup."""
+
+    _task = None
+    _last_run = None
+
+    @staticmethod
+    async def _recent_users(application):
+        """
+        Lists the restored users, most recently active first.
+
+        Args:
+            application (Application): The telegram bot application
+
+        Returns:
+            list: User IDs
+        """
+        user_ids = list(application.user_data)
+        persistence = application.persistence
+        if persistence is not None and hasattr(persistence, "get_recent_user_ids"):
+            try:
+                recent = await persistence.get_recent_user_ids(len(user_ids))
+                return [user_id for user_id in recent if user_id in application.user_data]
+            except Exception as e:
+                logger.warning("Could not rank users for warm-up: %s", e)
+        return user_ids
+
+    @staticmethod
+    async def collect_families(application, max_families=None):
+        """
+        Groups the most recently active restored users by family.
+
+        Args:
+            application (Application): The telegram bot application
+            max_families (int, optional): Maximum number of families
+
+        Returns:
+            dict: Family ID to the list of Telegram IDs of its restored users,
+            in order of activity
+        """
+        max_families = WARMUP_MAX_FAMILIES if max_families is None else max_families
+        families = {}
+        for user_id in await WarmupService._recent_users(application):
+            user_data = application.user_data.get(user_id) or {}
+            family_id = user_data.get("family_id")
+            if not family_id:
+                continue
+            if family_id not in families:
+                if len(families) >= max_families:
+                    continue
+                families[family_id] = []
+            families[family_id].append(str(user_data.get("telegram_id") or user_id))
+        return families
+
+    @staticmethod
+    async def _warm_family(family_id, telegram_ids, semaphore):
+        """
+        Preloads the members, family and balances of one family.
+
+        Args:
+            family_id (str): ID of the family
+            telegram_ids (list): Telegram IDs of its restored users
+            semaphore (asyncio.Semaphore): Limits the concurrent requests
+
+        Returns:
+            bool: True if the family was loaded
+        """
+        token = telegram_ids[0]
+        async with semaphore:
+            family_status, _ = await FamilyService.get_family(family_id, token)
+        async with semaphore:
+            await FamilyService.get_family_balances(family_id, token)
+        for telegram_id in telegram_ids:
+            async with semaphore:
+                await MemberService.get_member(telegram_id)
+        return family_status == 200
+
+    @staticmethod
+    async def run(application):
+        """
+        Preloads the data of the most recently active families.
+
+        Args:
+            application (Application): The telegram bot application
+
+        Returns:
+            dict: families warmed, families that failed and elapsed seconds
+        """
+        started = time.monotonic()
+        families = await WarmupService.collect_families(application)
+        if not families:
+            WarmupService._last_run = {"families": 0, "failed": 0, "seconds": 0.0}
+            return WarmupService._last_run
+
+        semaphore = asyncio.Semaphore(max(1, WARMUP_CONCURRENCY))
+        results = await asyncio.gather(
+            *(WarmupService._warm_family(family_id, telegram_ids, semaphore) for family_id, telegram_ids in families.items()),
+            return_exceptions=True
+        )
+        failed = sum(1 for result in results if result is not True)
+        WarmupService._last_run = {
+            "families": len(families) - failed,
+            "failed": failed,
+            "seconds": round(time.monotonic() - started, 2)
+        }
+        logger.info(
+            "Cache warm-up loaded %s families (%s failed) in %ss",
+            WarmupService._last_run["families"], failed, WarmupService._last_run["seconds"]
+        )
+        return WarmupService._last_run
+
+    @staticmethod
+    def start(application):
+        """
+        Starts the warm-up in the background, if enabled.
+
+        Args:
+            application (Application): The telegram bot application
+        """
+        if not WARMUP_ENABLED or WARMUP_MAX_FAMILIES <= 0:
+            return
+        WarmupService._task = asyncio.get_running_loop().create_task(WarmupService._run_safely(application))
+
+    @staticmethod
+    async def _run_safely(application):
+        """Runs the warm-up, logging instead of raising errors."""
+        try:
+            await WarmupService.run(application)
+        except Exception as e:
+            logger.error("Error during cache warm-up: %s", e)
+
+    @staticmethod
+    async def stop():
+        """Cancels the warm-up if it is still running."""
+        task, WarmupService._task = WarmupService._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
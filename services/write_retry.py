@@ -0,0 +1,173 @@
+"""
+Write Retry Module
+
+This module retries write requests (expenses, payments and debt adjustments)
+that failed because the API was unreachable. The first attempt is made inline;
+if it fails with a transient error, further attempts run in the background with
+jittered exponential backoff while the handler tells the user the operation was
+queued. Every attempt carries the same idempotency key, derived from the user,
+the flow, the request payload and a submission ID drawn when the conversation
+starts, so the backend can recognise repeated deliveries of the same write
+while two identical expenses entered in separate conversations stay distinct.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import secrets
+from config import (
+    API_WRITE_RETRY_ATTEMPTS,
+    API_WRITE_RETRY_BASE_DELAY,
+    API_WRITE_RETRY_MAX_DELAY
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Cabecera con la que se envía la clave de idempotencia
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+# Códigos que indican un fallo transitorio de la API y justifican reintentar
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+
+# Código devuelto al handler cuando la escritura queda en cola de reintentos
+QUEUED_STATUS_CODE = 202
+
+class WriteRetry:
+    """
+    Retries transient write failures in the background with an idempotency key.
+
+    Writes are identified by their idempotency key; submitting a write whose
+    key is already being retried does not start a second retry loop.
+    """
+
+    _pending = {}
+
+    @staticmethod
+    def new_submission_id():
+        """
+        Draws the submission ID of a new conversation, to be stored in its user_data.
+
+        Returns:
+            str: Random hexadecimal ID
+        """
+        return secrets.token_hex(8)
+
+    @staticmethod
+    def make_key(telegram_id, flow, payload, submission_id=None):
+        """
+        Derives the idempotency key of a write from the conversation that produced it.
+
+        Args:
+            telegram_id (str): Telegram ID of the user
+            flow (str): Name of the flow (e.g. "expense", "payment", "debt_adjustment")
+            payload (dict): Data sent to the API
+            submission_id (str, optional): ID drawn with new_submission_id() when
+                the conversation started; retries of the same submission share it
+
+        Returns:
+            str: Hexadecimal idempotency key
+        """
+        material = json.dumps([str(telegram_id), flow, payload, submission_id], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def is_queued(status_code, response):
+        """
+        Tells whether a service result means the write was queued for retries.
+
+        Args:
+            status_code (int): Status code returned by the service
+            response: Response returned by the service
+
+        Returns:
+            bool: True if the write is being retried in the background
+        """
+        return status_code == QUEUED_STATUS_CODE and isinstance(response, dict) and response.get("queued") is True
+
+    @staticmethod
+    async def submit(idempotency_key, send, on_result=None):
+        """
+        Sends a write, moving it to background retries if the API is unreachable.
+
+        Args:
+            idempotency_key (str): Key returned by make_key
+            send (callable): Zero-argument function returning a coroutine that
+                performs one attempt and returns (status_code, response)
+            on_result (callable, optional): Coroutine function called with
+                (status_code, response) when a background retry finishes
+
+        Returns:
+            tuple: (status_code, response) of the first attempt, or
+            (QUEUED_STATUS_CODE, {"queued": True, ...}) if it was queued
+        """
+        queued_response = {
+            "queued": True,
+            "idempotency_key": idempotency_key,
+            "message": "La API no responde; la operación se reintentará automáticamente"
+        }
+
+        if idempotency_key in WriteRetry._pending:
+            logger.info("Write %s is already being retried, not sending it again", idempotency_key)
+            return QUEUED_STATUS_CODE, queued_response
+
+        status_code, response = await send()
+        if status_code not in RETRYABLE_STATUS_CODES or API_WRITE_RETRY_ATTEMPTS <= 0:
+            return status_code, response
+
+        logger.warning("Write %s failed with %s, retrying in the background", idempotency_key, status_code)
+        task = asyncio.ensure_future(WriteRetry._retry(idempotency_key, send, on_result))
+        WriteRetry._pending[idempotency_key] = task
+        task.add_done_callback(lambda _: WriteRetry._pending.pop(idempotency_key, None))
+        return QUEUED_STATUS_CODE, queued_response
+
+    @staticmethod
+    def backoff_delay(attempt):
+        """
+        Computes the delay before a retry using exponential backoff with full jitter.
+
+        Args:
+            attempt (int): Retry number, starting at 1
+
+        Returns:
+            float: Delay in seconds
+        """
+        ceiling = min(API_WRITE_RETRY_MAX_DELAY, API_WRITE_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    async def _retry(idempotency_key, send, on_result):
+        """
+        Retries a write until it gets a non-transient answer or attempts run out.
+
+        Args:
+            idempotency_key (str): Key of the write
+            send (callable): Function performing one attempt
+            on_result (callable, optional): Coroutine function notified with the final result
+        """
+        status_code, response = None, None
+        for attempt in range(1, API_WRITE_RETRY_ATTEMPTS + 1):
+            await asyncio.sleep(WriteRetry.backoff_delay(attempt))
+            status_code, response = await send()
+            logger.info("Retry %s/%s of write %s: %s", attempt, API_WRITE_RETRY_ATTEMPTS, idempotency_key, status_code)
+            if status_code not in RETRYABLE_STATUS_CODES:
+                break
+        else:
+            logger.error("Write %s failed after %s retries", idempotency_key, API_WRITE_RETRY_ATTEMPTS)
+
+        if on_result is not None:
+            try:
+                await on_result(status_code, response)
+            except Exception as e:
+                logger.error("Error notifying the result of write %s: %s", idempotency_key, e)
+
+    @staticmethod
+    def get_pending_count():
+        """
+        Returns the number of writes currently being retried.
+
+        Returns:
+            int: Pending writes
+        """
+        return len(WriteRetry._pending)
@@ -0,0 +1,13 @@
+"""
+Shared setup of the unit tests.
+
+config.py exits when no bot token is set, so a placeholder is provided before
+any module of the bot is imported. The tests never talk to Telegram or to the
+backend API.
+"""
+
+import os
+
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_QUEUE_ENABLED", "false")
@@ -0,0 +1,130 @@
+"""Tests of the local balance cache updated with write deltas."""
+
+import pytest
+
+import services.balance_cache as balance_cache
+from services.balance_cache import BalanceCache, FamilyBalances
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(monkeypatch):
+    for name, value in (("_families", {}), ("_versions", {}), ("_epoch", 0), ("_hits", 0),
+                        ("_deltas", 0), ("_reconciles", 0), ("_mismatches", 0)):
+        monkeypatch.setattr(BalanceCache, name, value)
+    monkeypatch.setattr(balance_cache, "BALANCE_CACHE_ENABLED", True)
+
+
+def server_balances(debts, names=("Ana", "Luis", "Eva")):
+    """Builds a balances response from {(debtor, creditor): amount} with member IDs 1..n."""
+    balances = [{"member_id": str(n), "name": name, "debts": [], "credits": []} for n, name in enumerate(names, 1)]
+    for (debtor, creditor), amount in debts.items():
+        balances[int(debtor) - 1]["debts"].append({"to": names[int(creditor) - 1], "to_id": creditor, "amount": amount})
+        balances[int(creditor) - 1]["credits"].append({"from": names[int(debtor) - 1], "from_id": debtor, "amount": amount})
+    return balances
+
+
+def store(family_id, debts):
+    BalanceCache.store(family_id, server_balances(debts), BalanceCache.version(family_id))
+
+
+def debts_of(balances):
+    return {(balance.member_id, debt.to_id): debt.amount for balance in balances for debt in balance.debts}
+
+
+def test_parse_rejects_other_formats():
+    assert FamilyBalances.parse({"detail": "error"}) is None
+    assert FamilyBalances.parse([{"name": "sin id"}]) is None
+    assert FamilyBalances.parse([{"member_id": "1", "debts": [{"to": "Nadie", "amount": 3}]}]) is None
+
+
+def test_parse_resolves_creditors_by_name():
+    balances = server_balances({("1", "2"): 10})
+    del balances[0]["debts"][0]["to_id"]
+    assert FamilyBalances.parse(balances).pairs() == {("1", "2"): 10}
+
+
+def test_stored_balances_are_served_until_reconcile_interval(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(balance_cache.time, "monotonic", lambda: now[0])
+    store("7", {("1", "2"): 10})
+    assert debts_of(BalanceCache.get("7")) == {("1", "2"): 10}
+
+    now[0] += balance_cache.BALANCE_RECONCILE_INTERVAL + 1
+    assert BalanceCache.get("7") is None
+
+
+def test_expense_is_split_among_the_family():
+    store("7", {})
+    BalanceCache.apply_expense("7", "1", 30)
+    assert debts_of(BalanceCache.get("7")) == {("2", "1"): 10, ("3", "1"): 10}
+
+
+def test_expense_split_among_some_members_nets_existing_debts():
+    store("7", {("1", "2"): 4})
+    BalanceCache.apply_expense("7", "1", 10, split_among=[{"id": "1"}, {"id": "2"}])
+    assert debts_of(BalanceCache.get("7")) == {("2", "1"): 1}
+
+
+def test_payment_reduces_the_debt_and_can_settle_it():
+    store("7", {("2", "1"): 10})
+    BalanceCache.apply_payment("7", "2", "1", 4)
+    assert debts_of(BalanceCache.get("7")) == {("2", "1"): 6}
+    BalanceCache.apply_payment("7", "2", "1", 6)
+    assert debts_of(BalanceCache.get("7")) == {}
+
+
+def test_unknown_member_drops_the_family():
+    store("7", {})
+    BalanceCache.apply_payment("7", "2", "99", 4)
+    assert BalanceCache.get("7") is None
+
+
+def test_write_with_unknown_family_drops_every_family():
+    store("7", {})
+    store("8", {})
+    BalanceCache.apply_payment(None, "1", "2", 5)
+    assert BalanceCache.get("7") is None
+    assert BalanceCache.get("8") is None
+
+
+def test_response_requested_before_a_write_is_not_stored():
+    version = BalanceCache.version("7")
+    BalanceCache.invalidate("7")
+    BalanceCache.store("7", server_balances({("1", "2"): 10}), version)
+    assert BalanceCache.get("7") is None
+
+
+def test_response_requested_before_an_unknown_family_write_is_not_stored():
+    version = BalanceCache.version("7")
+    BalanceCache.apply_expense(None, "1", 30)
+    BalanceCache.store("7", server_balances({}), version)
+    assert BalanceCache.get("7") is None
+
+
+def test_reconcile_counts_mismatches_and_keeps_the_server_copy():
+    store("7", {("2", "1"): 10})
+    BalanceCache.apply_payment("7", "2", "1", 4)
+    store("7", {("2", "1"): 5})
+    assert debts_of(BalanceCache.get("7")) == {("2", "1"): 5}
+
+    BalanceCache.apply_payment("7", "2", "1", 5)
+    store("7", {})
+    stats = BalanceCache.get_stats()
+    assert (stats["reconciles"], stats["mismatches"]) == (2, 1)
+
+
+def test_server_totals_are_kept_across_local_deltas():
+    balances = server_balances({("2", "1"): 10})
+    balances[1].update(total_debt=10.01, total_owed=0, net_balance=-10.02)
+    BalanceCache.store("7", balances, BalanceCache.version("7"))
+    assert [balance.net_balance for balance in BalanceCache.get("7")][:2] == [10, -10.02]
+
+    BalanceCache.apply_payment("7", "2", "1", 4)
+    luis = BalanceCache.get("7")[1]
+    assert (luis.total_debt, luis.net_balance) == (6.01, -6.02)
+
+
+def test_disabled_cache_stores_nothing(monkeypatch):
+    monkeypatch.setattr(balance_cache, "BALANCE_CACHE_ENABLED", False)
+    store("7", {})
+    assert BalanceCache.get("7") is None
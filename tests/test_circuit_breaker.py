@@ -0,0 +1,132 @@
+"""Tests of the per endpoint group circuit breaker and adaptive timeouts."""
+
+import math
+import random
+
+import pytest
+
+import services.circuit_breaker as circuit_breaker
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture(autouse=True)
+def reset_circuits(monkeypatch):
+    monkeypatch.setattr(CircuitBreaker, "_circuits", {})
+    monkeypatch.setattr(circuit_breaker, "API_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(circuit_breaker, "API_BREAKER_RESET_TIMEOUT", 30)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+def state(group):
+    return CircuitBreaker.get_stats()[group]["state"]
+
+
+def open_circuit(group):
+    for _ in range(3):
+        assert CircuitBreaker.allow(group)
+        CircuitBreaker.record_failure(group)
+
+
+def test_group_for_uses_the_first_path_segment(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "API_BASE_URL", "https://api.example.com/v1")
+    assert CircuitBreaker.group_for("https://api.example.com/v1/families/3/balances") == "families"
+    assert CircuitBreaker.group_for("https://api.example.com/v1/payments") == "payments"
+    assert CircuitBreaker.group_for("https://api.example.com/v1/health") == "other"
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    CircuitBreaker.record_failure("expenses")
+    CircuitBreaker.record_failure("expenses")
+    CircuitBreaker.record_success("expenses", 0.1)
+    CircuitBreaker.record_failure("expenses")
+    CircuitBreaker.record_failure("expenses")
+    assert state("expenses") == CLOSED
+
+    CircuitBreaker.record_failure("expenses")
+    assert state("expenses") == OPEN
+    assert not CircuitBreaker.allow("expenses")
+    assert CircuitBreaker.allow("payments")
+
+
+def test_half_open_lets_exactly_one_probe_through(clock):
+    open_circuit("families")
+    clock.now += 29
+    assert not CircuitBreaker.allow("families")
+
+    clock.now += 1
+    assert CircuitBreaker.allow("families")
+    assert state("families") == HALF_OPEN
+    assert not CircuitBreaker.allow("families")
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    open_circuit("families")
+    clock.now += 30
+    assert CircuitBreaker.allow("families")
+    CircuitBreaker.record_success("families", 0.2)
+    assert state("families") == CLOSED
+    assert CircuitBreaker.allow("families")
+    assert CircuitBreaker.allow("families")
+
+
+def test_failed_probe_reopens_for_a_new_cool_down(clock):
+    open_circuit("families")
+    clock.now += 30
+    assert CircuitBreaker.allow("families")
+    CircuitBreaker.record_failure("families")
+    assert state("families") == OPEN
+
+    clock.now += 29
+    assert not CircuitBreaker.allow("families")
+    clock.now += 1
+    assert CircuitBreaker.allow("families")
+
+
+def test_abandoned_probe_frees_the_slot(clock):
+    open_circuit("members")
+    clock.now += 30
+    assert CircuitBreaker.allow("members")
+    CircuitBreaker.record_abandoned("members")
+    assert CircuitBreaker.allow("members")
+
+
+def test_timeout_uses_the_default_until_enough_samples():
+    for _ in range(circuit_breaker.MIN_LATENCY_SAMPLES - 1):
+        CircuitBreaker.record_success("payments", 0.5)
+    assert CircuitBreaker.timeout_for("payments", 15) == 15
+
+
+def test_timeout_adapts_to_p99_and_is_clamped(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "API_TIMEOUT_MIN", 3)
+    monkeypatch.setattr(circuit_breaker, "API_TIMEOUT_P99_FACTOR", 3)
+    for _ in range(99):
+        CircuitBreaker.record_success("payments", 1.0)
+    CircuitBreaker.record_success("payments", 2.0)
+    assert CircuitBreaker.timeout_for("payments", 15) == 3.0
+
+    for _ in range(5):
+        CircuitBreaker.record_success("payments", 2.0)
+    assert CircuitBreaker.timeout_for("payments", 15) == 6.0
+    assert CircuitBreaker.timeout_for("payments", 4) == 4
+
+    for _ in range(200):
+        CircuitBreaker.record_success("expenses", 0.01)
+    assert CircuitBreaker.timeout_for("expenses", 15) == 3
+
+
+def test_p99_follows_the_sliding_window(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "API_LATENCY_WINDOW", 50)
+    rng = random.Random(7)
+    samples = [rng.uniform(0.01, 2) for _ in range(500)]
+    for n, latency in enumerate(samples, 1):
+        CircuitBreaker.record_success("members", latency)
+        window = sorted(samples[max(0, n - 50):n])
+        assert CircuitBreaker.get_stats()["members"]["p99"] == window[min(len(window) - 1, math.ceil(0.99 * len(window)) - 1)]
@@ -0,0 +1,37 @@
+"""Tests of the dashboard snapshot: concurrent fetches and error handling."""
+
+import asyncio
+
+import pytest
+
+from services.dashboard_service import DashboardService
+from services.family_service import FamilyService
+from services.member_service import MemberService
+
+
+def test_failed_call_becomes_an_error_response():
+    assert DashboardService._unpack(RuntimeError("boom")) == (500, {"error": "boom"})
+    assert DashboardService._unpack((200, {"id": "1"})) == (200, {"id": "1"})
+
+
+def test_cancellation_is_not_swallowed():
+    with pytest.raises(asyncio.CancelledError):
+        DashboardService._unpack(asyncio.CancelledError())
+
+
+def test_snapshot_with_a_failing_call(monkeypatch):
+    async def member(telegram_id):
+        return 200, {"id": "3", "family_id": "7"}
+
+    async def family(family_id, telegram_id):
+        return 200, {"id": "7", "name": "Casa", "members": []}
+
+    async def balances(family_id, telegram_id):
+        raise RuntimeError("timeout")
+
+    monkeypatch.setattr(MemberService, "get_member", member)
+    monkeypatch.setattr(FamilyService, "get_family", family)
+    monkeypatch.setattr(FamilyService, "get_family_balances", balances)
+
+    snapshot = asyncio.run(DashboardService.get_snapshot("42", "7"))
+    assert (snapshot.member_status, snapshot.family_status, snapshot.balances_status) == (200, 200, 500)
@@ -0,0 +1,101 @@
+"""Tests of the minimum-transfer settlement of family balances."""
+
+import itertools
+import random
+
+import pytest
+
+from services.debt_simplifier import DebtSimplifier
+from services.models import MemberBalance
+
+
+def nets_of(amounts):
+    return {str(n): {"id": str(n), "name": f"M{n}", "net": amount} for n, amount in enumerate(amounts, 1)}
+
+
+def settle(nets, transfers):
+    """Applies the transfers to the nets and returns the remaining cents of each member."""
+    remaining = {key: round(member["net"] * 100) for key, member in nets.items()}
+    for transfer in transfers:
+        assert transfer.amount > 0
+        remaining[str(transfer.from_id)] += round(transfer.amount * 100)
+        remaining[str(transfer.to_id)] -= round(transfer.amount * 100)
+    return remaining
+
+
+def minimum_transfers(amounts):
+    """Brute force: members with a balance minus the most zero-sum groups they split into."""
+    members = [amount for amount in amounts if amount]
+
+    def most_groups(rest):
+        if not rest:
+            return 0
+        first, others = rest[0], rest[1:]
+        best = 0
+        for size in range(len(others) + 1):
+            for combination in itertools.combinations(range(len(others)), size):
+                if first + sum(others[i] for i in combination) == 0:
+                    left = [others[i] for i in range(len(others)) if i not in combination]
+                    best = max(best, 1 + most_groups(left))
+        return best
+
+    return len(members) - most_groups(members)
+
+
+def test_net_balances_accepts_both_api_formats():
+    per_member = [
+        {"member_id": 1, "name": "Ana", "debts": [], "credits": [{"from": "Luis", "from_id": 2, "amount": 10}]},
+        {"member_id": 2, "name": "Luis", "debts": [{"to": "Ana", "to_id": 1, "amount": 10}], "credits": []}
+    ]
+    per_pair = [{"from_member": {"id": 2, "name": "Luis"}, "to_member": {"id": 1, "name": "Ana"}, "amount": 10}]
+    parsed = [MemberBalance.from_api(balance) for balance in per_member]
+
+    for balances in (per_member, per_pair, parsed):
+        nets = DebtSimplifier.net_balances(balances)
+        assert {key: member["net"] for key, member in nets.items()} == {"1": 10, "2": -10}
+
+
+def test_settled_family_needs_no_transfers():
+    assert DebtSimplifier.simplify(nets_of([0, 0.004, -0.004])) == []
+
+
+def test_exact_solver_beats_greedy_when_groups_cancel_out():
+    amounts = [-7, 5, 6, -6, 3, -1]
+    nets = nets_of(amounts)
+    greedy = DebtSimplifier.simplify(nets, exact_max=0)
+    exact = DebtSimplifier.simplify(nets)
+
+    assert len(greedy) == 5
+    assert len(exact) == 4 == minimum_transfers(amounts)
+    assert set(settle(nets, exact).values()) == {0}
+    assert set(settle(nets, greedy).values()) == {0}
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_exact_solver_is_minimal_and_settles_everyone(seed):
+    generator = random.Random(seed)
+    amounts = [generator.choice([-1, 1]) * generator.randint(1, 9) for _ in range(generator.randint(2, 7))]
+    amounts.append(-sum(amounts))
+    nets = nets_of(amounts)
+
+    transfers = DebtSimplifier.simplify(nets)
+    assert set(settle(nets, transfers).values()) == {0}
+    assert len(transfers) == minimum_transfers(amounts)
+    assert [transfer.amount for transfer in transfers] == sorted((transfer.amount for transfer in transfers), reverse=True)
+
+
+def test_greedy_solver_needs_at_most_one_transfer_less_than_members():
+    generator = random.Random(7)
+    amounts = [round(generator.uniform(-50, 50), 2) for _ in range(19)]
+    amounts.append(round(-sum(amounts), 2))
+    nets = nets_of(amounts)
+
+    transfers = DebtSimplifier.simplify(nets, exact_max=5)
+    assert len(transfers) <= len(amounts) - 1
+    assert set(settle(nets, transfers).values()) == {0}
+
+
+def test_rounding_drift_is_absorbed_by_the_largest_balance():
+    nets = nets_of([10.005, -5.0, -5.0])
+    transfers = DebtSimplifier.simplify(nets)
+    assert sorted(round(transfer.amount, 2) for transfer in transfers) == [5.0, 5.0]
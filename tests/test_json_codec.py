@@ -0,0 +1,87 @@
+"""Tests of the JSON codec and the incremental decoder of list responses."""
+
+import asyncio
+import json
+
+import pytest
+
+from services.json_codec import JsonCodec
+from services.models import Member
+
+
+async def chunked(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def decode(data, size):
+    async def collect():
+        return [item async for item in JsonCodec.iter_array(chunked(data, size))]
+    return asyncio.run(collect())
+
+
+DOCUMENT = [
+    {"id": 1, "description": "Cena, postre y café", "amount": -4.5},
+    {"id": 2, "description": "Entradas [cine]", "amount": 12, "tags": ["a", "b"]},
+    {"id": 3, "description": "Ñandú \"con\" comillas é€", "amount": 1e3},
+    123,
+    -0.25,
+    "texto",
+    None,
+    True,
+    [[], {}]
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10000])
+def test_iter_array_yields_every_element_whatever_the_chunk_size(size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+    assert decode(data, size) == DOCUMENT
+
+
+def test_numbers_split_between_chunks_are_not_cut():
+    assert decode(b"[-4.5,10,2e3]", 1) == [-4.5, 10, 2000.0]
+    assert decode(b"[12345]", 3) == [12345]
+
+
+def test_empty_array_and_surrounding_whitespace():
+    assert decode(b"  [ ]  ", 1) == []
+    assert decode(b"\n[1 , 2]\n", 2) == [1, 2]
+
+
+def test_document_that_is_not_an_array_is_rejected():
+    with pytest.raises(ValueError):
+        decode(b'{"error": "not found"}', 4)
+
+
+@pytest.mark.parametrize("data", [b"[1, 2", b'[{"id": 1}, {"id":', b"[1 2]", b"[1,,2]", b"[1,]", b"[,1]"])
+def test_truncated_or_invalid_arrays_raise(data):
+    with pytest.raises(ValueError):
+        decode(data, 3)
+
+
+def test_elements_are_produced_before_the_body_ends():
+    arrived = []
+
+    async def slow_body():
+        yield b'[{"id": 1}, '
+        arrived.append("second chunk")
+        yield b'{"id": 2}]'
+
+    async def first_element():
+        async for item in JsonCodec.iter_array(slow_body()):
+            return item
+
+    assert asyncio.run(first_element()) == {"id": 1}
+    assert arrived == []
+
+
+def test_loads_accepts_bytes_and_text():
+    assert JsonCodec.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    assert JsonCodec.loads('"é"') == "é"
+
+
+def test_dumps_encodes_records_and_unknown_values():
+    member = Member.from_api({"id": 5, "name": "Ana"})
+    assert json.loads(JsonCodec.dumps({"member": member})) == {"member": member.to_dict()}
+    assert json.loads(JsonCodec.dumps([object.__name__, {1, 2} and 3])) == ["object", 3]
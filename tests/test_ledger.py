@@ -0,0 +1,259 @@
+"""Tests of the append-only ledger: replay, snapshots, resync and invalidation."""
+
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pytest
+
+import services.ledger as ledger
+from services.ledger import Ledger, EXPENSE_CREATED, EXPENSE_UPDATED, EXPENSE_DELETED, PAYMENT_CONFIRMED
+
+
+@pytest.fixture(autouse=True)
+def fresh_ledger(monkeypatch, tmp_path):
+    monkeypatch.setattr(ledger, "LEDGER_ENABLED", True)
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "ledger.sqlite3"))
+    for name, value in (("_connection", None), ("_states", OrderedDict()), ("_family_seq", {}),
+                        ("_seq", 0), ("_epoch", 0), ("_stale_before", 0.0), ("_pending", []),
+                        ("_flush_task", None), ("_retrying", False), ("_closing", False), ("_dropped", 0),
+                        ("_events", 0), ("_replays", 0), ("_local_reads", 0)):
+        monkeypatch.setattr(Ledger, name, value)
+    return tmp_path / "ledger.sqlite3"
+
+
+def expense(expense_id, amount=10, description="Gasto"):
+    return {"id": expense_id, "description": description, "amount": amount, "paid_by": "1", "family_id": "7",
+            "created_at": f"2026-01-{int(expense_id):02d}T12:00:00"}
+
+
+async def sync_expenses(family_id, expenses):
+    await Ledger.sync_expenses(family_id, expenses, Ledger.version(family_id))
+
+
+async def amounts(family_id, stale=False):
+    expenses = await Ledger.get_expenses(family_id, stale=stale)
+    return None if expenses is None else {record.id: record.amount for record in expenses}
+
+
+def run(scenario):
+    async def wrapped():
+        await Ledger.open()
+        try:
+            return await scenario()
+        finally:
+            await Ledger.close()
+    return asyncio.run(wrapped())
+
+
+def test_closed_ledger_serves_nothing(monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_ENABLED", False)
+
+    async def scenario():
+        await Ledger.open()
+        Ledger.record("7", EXPENSE_CREATED, "1", expense(1))
+        return Ledger.is_open(), await Ledger.get_expenses("7")
+
+    assert asyncio.run(scenario()) == (False, None)
+
+
+def test_events_are_applied_to_a_fetched_list():
+    async def scenario():
+        await sync_expenses("7", [expense(1), expense(2)])
+        Ledger.record("7", EXPENSE_CREATED, "3", expense(3, 30))
+        Ledger.record("7", EXPENSE_UPDATED, 1, {"amount": 15})
+        Ledger.record("7", EXPENSE_DELETED, "2")
+        return await amounts("7"), (await Ledger.get_expenses("7"))[0].description
+
+    assert run(scenario) == ({"1": 15, "3": 30}, "Gasto")
+
+
+def test_events_for_a_list_never_fetched_are_ignored():
+    async def scenario():
+        Ledger.record("7", EXPENSE_CREATED, "1", expense(1))
+        return await Ledger.get_expenses("7")
+
+    assert run(scenario) is None
+
+
+def test_state_is_replayed_from_snapshot_and_later_events():
+    async def first_session():
+        await sync_expenses("7", [expense(1), expense(2)])
+        Ledger.record("7", EXPENSE_CREATED, "3", expense(3, 30))
+        Ledger.record("7", EXPENSE_DELETED, "1")
+        return await amounts("7")
+
+    async def second_session():
+        return await amounts("7"), Ledger.get_stats()["replays"]
+
+    before = run(first_session)
+    replays_before = Ledger.get_stats()["replays"]
+    after, replays = run(second_session)
+    assert after == before == {"2": 10, "3": 30}
+    assert replays == replays_before + 1
+
+
+def test_snapshot_is_taken_every_n_events(monkeypatch, fresh_ledger):
+    monkeypatch.setattr(ledger, "LEDGER_SNAPSHOT_EVERY", 3)
+
+    async def scenario():
+        await sync_expenses("7", [])
+        for n in range(1, 8):
+            Ledger.record("7", EXPENSE_CREATED, str(n), expense(n, n))
+
+    run(scenario)
+    with sqlite3.connect(fresh_ledger) as connection:
+        snapshot_seq = connection.execute("SELECT seq FROM ledger_snapshots WHERE family_id = '7'").fetchone()[0]
+        pending_events = connection.execute("SELECT COUNT(*) FROM ledger_events WHERE seq > ?", (snapshot_seq,)).fetchone()[0]
+    assert snapshot_seq == 6
+    assert pending_events == 1
+
+    Ledger._states.clear()
+    assert run(lambda: amounts("7")) == {str(n): n for n in range(1, 8)}
+
+
+def test_lists_older_than_the_resync_interval_are_fetched_again(monkeypatch):
+    async def scenario():
+        await sync_expenses("7", [expense(1)])
+        monkeypatch.setattr(ledger, "LEDGER_RESYNC_INTERVAL", -1)
+        return await amounts("7"), await amounts("7", stale=True)
+
+    assert run(scenario) == (None, {"1": 10})
+
+
+def test_fetch_raced_by_a_write_is_not_stored():
+    async def scenario():
+        version = Ledger.version("7")
+        Ledger.record("7", PAYMENT_CONFIRMED, "5", {"status": "CONFIRM"})
+        await Ledger.sync_expenses("7", [expense(1)], version)
+        return await amounts("7")
+
+    assert run(scenario) is None
+
+
+def test_write_with_unknown_family_marks_every_family_for_resync():
+    async def scenario():
+        await sync_expenses("7", [expense(1)])
+        await sync_expenses("8", [expense(2)])
+        version = Ledger.version("7")
+
+        Ledger.record(None, EXPENSE_CREATED, "3", expense(3))
+        stale_lists = (await amounts("7"), await amounts("8"), await amounts("7", stale=True))
+
+        await Ledger.sync_expenses("7", [expense(1), expense(3)], version)
+        raced = await amounts("7")
+        await sync_expenses("7", [expense(1), expense(3)])
+        return stale_lists, raced, await amounts("7")
+
+    stale_lists, raced, refreshed = run(scenario)
+    assert stale_lists == (None, None, {"1": 10})
+    assert raced is None
+    assert refreshed == {"1": 10, "3": 10}
+
+
+def test_index_is_kept_until_the_list_changes():
+    built = []
+
+    def build(records):
+        built.append(1)
+        return sorted(record.id for record in records)
+
+    async def scenario():
+        await sync_expenses("7", [expense(2), expense(1)])
+        first = await Ledger.get_index("7", "expenses", build)
+        second = await Ledger.get_index("7", "expenses", build)
+        Ledger.record("7", EXPENSE_CREATED, "3", expense(3))
+        third = await Ledger.get_index("7", "expenses", build)
+        return first, second, third
+
+    first, second, third = run(scenario)
+    assert first is second
+    assert third == ["1", "2", "3"]
+    assert len(built) == 2
+
+
+def test_history_lists_recent_events_first():
+    async def scenario():
+        await sync_expenses("7", [])
+        Ledger.record("7", EXPENSE_CREATED, "1", expense(1))
+        Ledger.record("7", EXPENSE_DELETED, "1")
+        Ledger.record("8", EXPENSE_CREATED, "2", expense(2))
+        return await Ledger.history("7")
+
+    history = run(scenario)
+    assert [(event["kind"], event["entity_id"]) for event in history] == [(EXPENSE_DELETED, "1"), (EXPENSE_CREATED, "1")]
+    assert history[1]["data"]["amount"] == 10
+
+
+def test_snapshots_are_encoded_by_the_writer(monkeypatch):
+    encoded = []
+    encode_row = ledger.FamilyLedger.encode_row
+
+    def spy(row):
+        encoded.append(threading.current_thread() is threading.main_thread())
+        return encode_row(row)
+
+    monkeypatch.setattr(ledger.FamilyLedger, "encode_row", staticmethod(spy))
+
+    async def scenario():
+        await sync_expenses("7", [expense(1)])
+        _, row = Ledger._pending[-1]
+        # La fila guarda los registros, no su JSON
+        assert row[2][0].id == "1"
+
+    run(scenario)
+    assert encoded == [False]
+
+
+def test_failed_writes_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_RETRY_BASE_DELAY", 0.01)
+    write = Ledger._write
+    failures = []
+
+    def flaky(operations):
+        if len(failures) < 2:
+            failures.append(len(operations))
+            raise sqlite3.OperationalError("database is locked")
+        write(operations)
+
+    monkeypatch.setattr(Ledger, "_write", staticmethod(flaky))
+
+    async def scenario():
+        await sync_expenses("7", [])
+        Ledger.record("7", EXPENSE_CREATED, "1", expense(1))
+        await asyncio.sleep(0.1)
+        return Ledger.get_stats()["pending"], await Ledger.history("7")
+
+    pending, history = run(scenario)
+    assert len(failures) == 2
+    assert pending == 0
+    assert [event["entity_id"] for event in history] == ["1"]
+
+
+def test_buffer_is_capped_while_writes_fail(monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_MAX_PENDING", 3)
+    monkeypatch.setattr(ledger, "LEDGER_RETRY_BASE_DELAY", 60)
+
+    def broken(operations):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(Ledger, "_write", staticmethod(broken))
+
+    async def scenario():
+        for n in range(1, 6):
+            Ledger.record("7", EXPENSE_CREATED, str(n), expense(n))
+        await asyncio.sleep(0.05)
+        state = Ledger._epoch, [row[3] for _, row in Ledger._pending], Ledger.get_stats()["dropped"]
+        # close() no espera al siguiente reintento
+        await asyncio.wait_for(Ledger.close(), 1)
+        return state
+
+    async def wrapped():
+        await Ledger.open()
+        return await scenario()
+
+    epoch, kept, dropped = asyncio.run(wrapped())
+    assert epoch == 1
+    assert kept == ["3", "4", "5"]
+    assert dropped == 2
@@ -0,0 +1,104 @@
+"""Tests of the eviction of heavy user_data keys by the memory sweep."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import CommandHandler, ConversationHandler
+
+import utils.memory_manager as memory_manager
+from utils.memory_manager import MemoryManager
+
+
+@pytest.fixture(autouse=True)
+def fresh_manager(monkeypatch):
+    monkeypatch.setattr(memory_manager, "MEMORY_IDLE_TTL", 100)
+    monkeypatch.setattr(memory_manager, "MEMORY_USER_DATA_MAX_BYTES", 10_000)
+    for name, value in (("_last_seen", {}), ("_evicted_users", 0), ("_evicted_bytes", 0),
+                        ("_trimmed_users", 0), ("_last_sweep", None)):
+        monkeypatch.setattr(MemoryManager, name, value)
+
+
+async def noop(update, context):
+    return ConversationHandler.END
+
+
+def application(user_data, conversations=()):
+    handler = ConversationHandler(entry_points=[CommandHandler("gasto", noop)], states={}, fallbacks=[])
+    for user_id in conversations:
+        handler._conversations[(user_id, user_id)] = 1
+    return SimpleNamespace(user_data=user_data, handlers={0: [handler]}, persistence=None)
+
+
+def context(**extra):
+    return {"telegram_id": "1", "family_id": "7", "member": {"id": "3"}, "family_members": [{"id": "3"}], **extra}
+
+
+def test_idle_users_lose_cached_and_flow_keys():
+    app = application({1: context(expense_data={"description": "Luz"}), 2: context()})
+    MemoryManager._last_seen.update({1: 0, 2: 150})
+
+    result = asyncio.run(MemoryManager.sweep(app, now=200))
+
+    assert app.user_data[1] == {"telegram_id": "1", "family_id": "7"}
+    assert "member" in app.user_data[2]
+    assert result["evicted_users"] == 1 and result["freed_bytes"] > 0
+
+
+def test_idle_users_in_a_conversation_keep_their_flow_keys():
+    app = application({1: context(expense_data={"description": "Luz"})}, conversations=[1])
+    MemoryManager._last_seen[1] = 0
+
+    asyncio.run(MemoryManager.sweep(app, now=200))
+
+    assert app.user_data[1] == {"telegram_id": "1", "family_id": "7", "expense_data": {"description": "Luz"}}
+
+
+def test_oversized_users_are_trimmed_cached_keys_first():
+    big = [{"id": str(n), "name": "x" * 50} for n in range(300)]
+    app = application({1: context(family_members=big, payment_data={"amount": 5})})
+    MemoryManager._last_seen[1] = 190
+
+    result = asyncio.run(MemoryManager.sweep(app, now=200))
+
+    assert "family_members" not in app.user_data[1]
+    assert app.user_data[1]["payment_data"] == {"amount": 5}
+    assert result["trimmed_users"] == 1
+
+
+def test_flow_keys_of_a_conversation_survive_the_size_limit():
+    sizes = {"member": 10, "expense_data": 50_000}
+    assert MemoryManager.select_evictions(sizes, idle=False) == ["member", "expense_data"]
+    assert MemoryManager.select_evictions(sizes, idle=False, keep_flow=True) == ["member"]
+
+
+def test_sizes_are_measured_off_the_event_loop(monkeypatch):
+    threads = []
+    estimate_size = MemoryManager.estimate_size
+
+    def spy(value):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return estimate_size(value)
+
+    monkeypatch.setattr(MemoryManager, "estimate_size", staticmethod(spy))
+    asyncio.run(MemoryManager.sweep(application({1: context()}), now=0))
+
+    assert threads and not any(threads)
+
+
+def test_keys_changed_during_the_measure_are_kept(monkeypatch):
+    app = application({1: context(expense_data={"step": 1})})
+    MemoryManager._last_seen[1] = 0
+    measure = MemoryManager._measure
+
+    def racing(contexts, families):
+        # Un manejador empieza un flujo nuevo mientras se mide
+        app.user_data[1]["expense_data"] = {"step": 2}
+        return measure(contexts, families)
+
+    monkeypatch.setattr(MemoryManager, "_measure", staticmethod(racing))
+    asyncio.run(MemoryManager.sweep(app, now=200))
+
+    assert app.user_data[1]["expense_data"] == {"step": 2}
+    assert "member" not in app.user_data[1]
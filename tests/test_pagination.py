@@ -0,0 +1,227 @@
+"""Tests of cursor paging, date windows and the page index cache."""
+
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import pytest
+
+import services.ledger as ledger
+import services.pagination as pagination
+from services.ledger import Ledger
+from services.models import Expense, UNKNOWN_TIMESTAMP
+from services.pagination import PageIndex, SortedIndex, EXPENSES, PAYMENTS, OLDER, NEWER
+
+
+@pytest.fixture(autouse=True)
+def reset_indexes(monkeypatch):
+    monkeypatch.setattr(PageIndex, "_indexes", OrderedDict())
+    monkeypatch.setattr(Ledger, "_connection", None)
+
+
+def expense(expense_id, day=None, hour=12):
+    data = {"id": expense_id, "description": f"Gasto {expense_id}", "amount": 1}
+    if day is not None:
+        data["created_at"] = f"2026-03-{day:02d}T{hour:02d}:00:00+00:00"
+    return Expense.from_api(data)
+
+
+def ids(records):
+    return [record.id for record in records]
+
+
+def walk(index, size):
+    """Visits every page, from the newest to the oldest."""
+    page = index.page(None, OLDER, size)
+    pages = [page]
+    while page.has_older:
+        page = index.page(page.oldest_cursor, OLDER, size)
+        pages.append(page)
+    return pages
+
+
+@pytest.fixture
+def index():
+    # Dos gastos por día, el 1 y el 2 a la misma hora para probar el desempate por ID
+    records = [expense(str(n), day=(n + 1) // 2, hour=12 if n in (1, 2) else n) for n in range(1, 12)]
+    return SortedIndex(reversed(records))
+
+
+def test_newest_page_comes_first(index):
+    page = index.page(size=4)
+    assert ids(page.records) == ["11", "10", "9", "8"]
+    assert (page.first, page.last, page.total, page.has_newer, page.has_older) == (1, 4, 11, False, True)
+
+
+def test_walking_older_visits_every_record_once(index):
+    pages = walk(index, 4)
+    assert [ids(page.records) for page in pages] == [
+        ["11", "10", "9", "8"], ["7", "6", "5", "4"], ["3", "2", "1"]
+    ]
+    assert [page.first for page in pages] == [1, 5, 9]
+
+
+def test_newer_from_a_cursor_returns_the_previous_page(index):
+    second = index.page(index.page(size=4).oldest_cursor, OLDER, 4)
+    back = index.page(second.newest_cursor, NEWER, 4)
+    assert ids(back.records) == ["11", "10", "9", "8"]
+    assert not back.has_newer
+
+
+def test_equal_timestamps_are_ordered_by_id():
+    index = SortedIndex([expense("b", day=1), expense("c", day=1), expense("a", day=1)])
+    assert [ids(page.records) for page in walk(index, 1)] == [["c"], ["b"], ["a"]]
+
+
+def test_deleted_cursor_record_keeps_the_position(index):
+    first = index.page(size=4)
+    cursor = first.oldest_cursor
+    expected = ids(index.page(cursor, OLDER, 4).records)
+
+    rebuilt = SortedIndex(record for record in index.records if record.id != cursor[1])
+    assert ids(rebuilt.page(cursor, OLDER, 4).records) == expected
+    assert ids(rebuilt.page(cursor, NEWER, 4).records) == ["11", "10", "9"]
+
+
+def test_cursor_without_timestamp_uses_the_record_if_still_indexed(index):
+    cursor = (None, "8")
+    assert ids(index.page(cursor, OLDER, 2).records) == ["7", "6"]
+    assert ids(index.page((None, "gone"), OLDER, 2).records) == ["11", "10"]
+
+
+def test_records_without_date_sort_oldest():
+    index = SortedIndex([expense("a"), expense("b", day=1), expense("c", day=2)])
+    pages = walk(index, 1)
+    assert [ids(page.records) for page in pages] == [["c"], ["b"], ["a"]]
+    assert pages[-1].oldest_cursor == (UNKNOWN_TIMESTAMP, "a")
+
+
+def test_records_without_id_are_skipped():
+    assert SortedIndex([expense(None, day=1), expense("1", day=1)]).page().total == 1
+
+
+def test_window_bounds_are_inclusive_then_exclusive(index):
+    since = datetime(2026, 3, 2, tzinfo=timezone.utc)
+    until = datetime(2026, 3, 4, tzinfo=timezone.utc)
+    assert ids(index.window(since, until)) == ["6", "5", "4", "3"]
+    assert ids(index.window(until=since)) == ["2", "1"]
+    assert len(index.window()) == 11
+    with pytest.raises(ValueError):
+        index.window(since="not a date")
+
+
+@pytest.mark.parametrize("cursor", [(1767225600.123456, "42"), (UNKNOWN_TIMESTAMP, "7"), (None, "7")])
+def test_callback_data_round_trips(cursor):
+    data = PageIndex.callback_data(EXPENSES, OLDER, cursor)
+    kind, direction, parsed = PageIndex.parse_callback(data)
+    assert (kind, direction) == (EXPENSES, OLDER)
+    if cursor[0] is None:
+        assert parsed == (UNKNOWN_TIMESTAMP, "7")
+    else:
+        assert parsed[1] == cursor[1]
+        assert parsed[0] == pytest.approx(cursor[0], abs=1e-6)
+
+
+def test_callback_data_fits_telegram_limit_with_uuid_ids():
+    data = PageIndex.callback_data(PAYMENTS, NEWER, (4102444800.999999, str(uuid.uuid4())))
+    assert len(data.encode("utf-8")) <= 64
+
+
+def test_malformed_and_foreign_data():
+    assert PageIndex.parse_callback("page:exp:o:42") is None
+    assert PageIndex.parse_callback("page:exp:x:1:42") is None
+    assert PageIndex.parse_callback("page:exp:o:zz:42") is None
+    assert PageIndex.parse_callback("menu:back") is None
+    assert PageIndex.parse_callback(None) is None
+
+
+class Fetch:
+    def __init__(self, records, status_code=200):
+        self.records = records
+        self.status_code = status_code
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.status_code, self.records
+
+
+def test_index_is_reused_until_the_family_is_written():
+    fetch = Fetch([expense(str(n), day=n) for n in range(1, 4)])
+
+    async def scenario():
+        first = await PageIndex.page(EXPENSES, "7", fetch, size=2)
+        second = await PageIndex.page(EXPENSES, "7", fetch, cursor=first[1].oldest_cursor, size=2)
+        PageIndex.invalidate("7")
+        await PageIndex.page(EXPENSES, "7", fetch)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert ids(first[1].records) + ids(second[1].records) == ["3", "2", "1"]
+    assert fetch.calls == 2
+
+
+def test_index_expires_and_unknown_family_clears_all(monkeypatch):
+    fetch = Fetch([expense("1", day=1)])
+
+    async def scenario():
+        await PageIndex.page(EXPENSES, "7", fetch)
+        await PageIndex.page(PAYMENTS, "8", fetch)
+        PageIndex.invalidate(None)
+        cleared = len(PageIndex._indexes)
+        monkeypatch.setattr(pagination, "PAGINATION_INDEX_TTL", -1)
+        await PageIndex.page(EXPENSES, "7", fetch)
+        await PageIndex.page(EXPENSES, "7", fetch)
+        return cleared
+
+    assert asyncio.run(scenario()) == 0
+    assert fetch.calls == 4
+
+
+def test_least_recently_used_index_is_dropped(monkeypatch):
+    monkeypatch.setattr(pagination, "PAGINATION_MAX_INDEXES", 2)
+    fetch = Fetch([])
+
+    async def scenario():
+        for family_id in ("1", "2", "1", "3"):
+            await PageIndex.get(EXPENSES, family_id, fetch)
+
+    asyncio.run(scenario())
+    assert list(PageIndex._indexes) == [(EXPENSES, "1"), (EXPENSES, "3")]
+
+
+def test_fetch_errors_are_returned():
+    fetch = Fetch({"error": "not found"}, status_code=404)
+    assert asyncio.run(PageIndex.page(EXPENSES, "7", fetch)) == (404, {"error": "not found"})
+    assert not PageIndex._indexes
+
+
+def test_ledger_index_is_shared_between_pages(monkeypatch, tmp_path):
+    monkeypatch.setattr(ledger, "LEDGER_ENABLED", True)
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "ledger.sqlite3"))
+    for name, value in (("_states", OrderedDict()), ("_family_seq", {}), ("_seq", 0), ("_epoch", 0),
+                        ("_stale_before", 0.0), ("_pending", []), ("_flush_task", None)):
+        monkeypatch.setattr(Ledger, name, value)
+    records = [expense(str(n), day=n) for n in range(1, 6)]
+
+    async def fetch():
+        fetch.calls += 1
+        version = Ledger.version("7")
+        await Ledger.sync_expenses("7", [record.to_dict() for record in records], version)
+        return 200, records
+    fetch.calls = 0
+
+    async def scenario():
+        await Ledger.open()
+        try:
+            first = await PageIndex.get(EXPENSES, "7", fetch)
+            second = await PageIndex.get(EXPENSES, "7", fetch)
+            return first[1], second[1]
+        finally:
+            await Ledger.close()
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert fetch.calls == 1
+    assert not PageIndex._indexes
@@ -0,0 +1,137 @@
+"""Tests of the coalescing of identical in-flight GET requests."""
+
+import asyncio
+
+import pytest
+
+from services.request_coalescer import RequestCoalescer
+
+
+@pytest.fixture(autouse=True)
+def reset_coalescer(monkeypatch):
+    monkeypatch.setattr(RequestCoalescer, "_in_flight", {})
+    monkeypatch.setattr(RequestCoalescer, "_families", {})
+    monkeypatch.setattr(RequestCoalescer, "_upstream_calls", 0)
+    monkeypatch.setattr(RequestCoalescer, "_coalesced_calls", 0)
+
+
+class Upstream:
+    """Fake upstream call that blocks until released and counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call_number = self.calls
+        await self.release.wait()
+        return 200, {"call": call_number}
+
+
+def test_make_key_ignores_parameter_order_and_types():
+    first = RequestCoalescer.make_key("get", "http://api/x", {"a": 1, "b": "2"})
+    second = RequestCoalescer.make_key("GET", "http://api/x", {"b": 2, "a": "1"})
+    assert first == second
+    assert first != RequestCoalescer.make_key("GET", "http://api/x", {"a": 1, "b": 3})
+
+
+def test_identical_requests_share_one_upstream_call():
+    async def scenario():
+        upstream = Upstream()
+        key = RequestCoalescer.make_key("GET", "http://api/x")
+        callers = [asyncio.ensure_future(RequestCoalescer.run(key, upstream)) for _ in range(5)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await asyncio.gather(*callers)
+
+    upstream, results = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert results == [(200, {"call": 1})] * 5
+    assert RequestCoalescer.get_stats() == {"upstream_calls": 1, "coalesced_calls": 4, "in_flight": 0}
+
+
+def test_different_keys_are_not_coalesced():
+    async def scenario():
+        upstream = Upstream()
+        upstream.release.set()
+        await asyncio.gather(
+            RequestCoalescer.run(RequestCoalescer.make_key("GET", "http://api/x", {"telegram_id": 1}), upstream),
+            RequestCoalescer.run(RequestCoalescer.make_key("GET", "http://api/x", {"telegram_id": 2}), upstream)
+        )
+        return upstream
+
+    assert asyncio.run(scenario()).calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        upstream = Upstream()
+        key = RequestCoalescer.make_key("GET", "http://api/x")
+        first = asyncio.ensure_future(RequestCoalescer.run(key, upstream))
+        second = asyncio.ensure_future(RequestCoalescer.run(key, upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        upstream.release.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == (200, {"call": 1})
+
+
+def test_forget_family_makes_later_callers_start_a_new_call():
+    async def scenario():
+        upstream = Upstream()
+        key = RequestCoalescer.make_key("GET", "http://api/families/7/balances")
+        before_write = asyncio.ensure_future(RequestCoalescer.run(key, upstream, family_id=7))
+        await asyncio.sleep(0)
+
+        RequestCoalescer.forget_family("7")
+        after_write = asyncio.ensure_future(RequestCoalescer.run(key, upstream, family_id=7))
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await before_write, await after_write
+
+    upstream, before_write, after_write = asyncio.run(scenario())
+    assert upstream.calls == 2
+    assert before_write == (200, {"call": 1})
+    assert after_write == (200, {"call": 2})
+    assert RequestCoalescer._families == {}
+
+
+def test_forget_family_leaves_other_families_in_flight():
+    async def scenario():
+        upstream = Upstream()
+        ours = RequestCoalescer.make_key("GET", "http://api/families/1")
+        theirs = RequestCoalescer.make_key("GET", "http://api/families/2")
+        tasks = [
+            asyncio.ensure_future(RequestCoalescer.run(ours, upstream, family_id=1)),
+            asyncio.ensure_future(RequestCoalescer.run(theirs, upstream, family_id=2))
+        ]
+        await asyncio.sleep(0)
+        RequestCoalescer.forget_family(1)
+        in_flight = set(RequestCoalescer._in_flight)
+        upstream.release.set()
+        await asyncio.gather(*tasks)
+        return theirs, in_flight
+
+    theirs, in_flight = asyncio.run(scenario())
+    assert in_flight == {theirs}
+
+
+def test_forget_every_family():
+    async def scenario():
+        upstream = Upstream()
+        tasks = [
+            asyncio.ensure_future(RequestCoalescer.run(RequestCoalescer.make_key("GET", f"http://api/{n}"), upstream, family_id=family))
+            for n, family in enumerate((1, 2, None))
+        ]
+        await asyncio.sleep(0)
+        RequestCoalescer.forget_family()
+        in_flight = dict(RequestCoalescer._in_flight)
+        upstream.release.set()
+        await asyncio.gather(*tasks)
+        return in_flight
+
+    assert asyncio.run(scenario()) == {}
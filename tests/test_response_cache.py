@@ -0,0 +1,205 @@
+"""Tests of the read-through response cache and its write invalidation."""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+import services.response_cache as response_cache
+from services.api_service import ApiService
+from services.models import Family, Member, MemberBalance
+from services.request_coalescer import RequestCoalescer
+from services.response_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(monkeypatch):
+    for name, value in (("_entries", OrderedDict()), ("_family_keys", {}), ("_versions", {}),
+                        ("_epoch", 0), ("_writes", 0), ("_total_bytes", 0),
+                        ("_hits", 0), ("_misses", 0), ("_evictions", 0)):
+        monkeypatch.setattr(ResponseCache, name, value)
+    monkeypatch.setattr(RequestCoalescer, "_in_flight", {})
+    monkeypatch.setattr(RequestCoalescer, "_families", {})
+
+
+class Clock:
+    """Replaces time.monotonic() in the cache module."""
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(response_cache.time, "monotonic", lambda: self.now)
+
+
+def test_rules_tag_family_endpoints():
+    assert ResponseCache.get_rule("/families/7/balances")[1] == "7"
+    assert ResponseCache.get_rule("/members/42")[1] is None
+    assert ResponseCache.get_rule("/families/7/expenses") is None
+
+
+def test_entry_expires_after_its_ttl_but_stays_available_as_stale(monkeypatch):
+    clock = Clock(monkeypatch)
+    ResponseCache.put("k", (200, {"a": 1}), ttl=10, family_id="1")
+    assert ResponseCache.get("k") == (200, {"a": 1})
+
+    clock.now += 10
+    assert ResponseCache.get("k") is None
+    assert ResponseCache.get_stale("k") == (200, {"a": 1})
+
+
+def test_lru_evicts_least_recently_used_entry(monkeypatch):
+    monkeypatch.setattr(response_cache, "API_CACHE_MAX_ENTRIES", 2)
+    ResponseCache.put("a", (200, 1), ttl=60)
+    ResponseCache.put("b", (200, 2), ttl=60)
+    ResponseCache.get("a")
+    ResponseCache.put("c", (200, 3), ttl=60)
+
+    assert ResponseCache.get_stale("b") is None
+    assert ResponseCache.get("a") == (200, 1)
+    assert ResponseCache.get("c") == (200, 3)
+    assert ResponseCache.get_stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_and_skips_oversized_responses(monkeypatch):
+    monkeypatch.setattr(response_cache, "API_CACHE_MAX_BYTES", 40)
+    ResponseCache.put("small", (200, "x" * 10), ttl=60)
+    ResponseCache.put("huge", (200, "x" * 100), ttl=60)
+    assert ResponseCache.get_stale("huge") is None
+    assert ResponseCache.get("small") is not None
+
+    ResponseCache.put("other", (200, "y" * 30), ttl=60)
+    assert ResponseCache.get_stale("small") is None
+    assert ResponseCache.get_stats()["bytes"] <= 40
+
+
+def test_member_responses_are_tagged_with_their_family():
+    ResponseCache.put("member", (200, {"id": 1, "family_id": 9}), ttl=60)
+    ResponseCache.invalidate_family(9)
+    assert ResponseCache.get_stale("member") is None
+
+
+def test_invalidate_family_only_drops_that_family():
+    ResponseCache.put("one", (200, 1), ttl=60, family_id="1")
+    ResponseCache.put("two", (200, 2), ttl=60, family_id="2")
+    ResponseCache.invalidate_family("1")
+    assert ResponseCache.get_stale("one") is None
+    assert ResponseCache.get("two") == (200, 2)
+
+
+def test_invalidate_unknown_family_drops_everything():
+    ResponseCache.put("one", (200, 1), ttl=60, family_id="1")
+    ResponseCache.put("plain", (200, 2), ttl=60)
+    ResponseCache.invalidate_family(None)
+    assert ResponseCache.get_stats()["entries"] == 0
+
+
+def test_put_is_skipped_when_the_family_changed_during_the_request():
+    version = ResponseCache.version("1")
+    ResponseCache.invalidate_family("1")
+    ResponseCache.put("k", (200, "before write"), ttl=60, family_id="1", version=version)
+    assert ResponseCache.get_stale("k") is None
+
+    ResponseCache.put("k", (200, "after write"), ttl=60, family_id="1", version=ResponseCache.version("1"))
+    assert ResponseCache.get("k") == (200, "after write")
+
+
+def test_write_to_another_family_does_not_skip_put():
+    version = ResponseCache.version("1")
+    ResponseCache.invalidate_family("2")
+    ResponseCache.put("k", (200, "body"), ttl=60, family_id="1", version=version)
+    assert ResponseCache.get("k") == (200, "body")
+
+
+def test_write_with_unknown_family_skips_every_pending_put():
+    family_version = ResponseCache.version("1")
+    untagged_version = ResponseCache.version(None)
+    ResponseCache.invalidate_family(None)
+    ResponseCache.put("a", (200, 1), ttl=60, family_id="1", version=family_version)
+    ResponseCache.put("b", (200, 2), ttl=60, version=untagged_version)
+    assert ResponseCache.get_stats()["entries"] == 0
+
+
+def test_get_in_flight_during_a_write_is_neither_cached_nor_joined(monkeypatch):
+    """A GET that started before a write must not serve or cache the pre-write body."""
+    bodies = ["before write", "after write"]
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fake_send(method, url, data, request_params, check_status, revalidation_key=None, extra_headers=None):
+        body = bodies.pop(0)
+        if body == "before write":
+            started.set()
+            await release.wait()
+        return 200, body
+
+    monkeypatch.setattr(ApiService, "_send", staticmethod(fake_send))
+
+    async def scenario():
+        before = asyncio.ensure_future(ApiService.request("GET", "/families/1/balances"))
+        await started.wait()
+        ResponseCache.invalidate_family("1")
+        after = asyncio.ensure_future(ApiService.request("GET", "/families/1/balances"))
+        await asyncio.sleep(0)
+        release.set()
+        return await before, await after, await ApiService.request("GET", "/families/1/balances")
+
+    before, after, cached = asyncio.run(scenario())
+    assert before == (200, "before write")
+    assert after == (200, "after write")
+    assert cached == (200, "after write")
+
+
+def test_responses_are_cached_as_parsed_records(monkeypatch):
+    sent = []
+
+    async def fake_send(method, url, data, request_params, check_status, revalidation_key=None, extra_headers=None):
+        sent.append(url)
+        if url.endswith("/members"):
+            return 200, [{"id": 3, "name": "Ana"}, {"name": "sin id"}]
+        return 200, {"id": 7, "name": "Casa", "members": [{"id": 3, "name": "Ana"}]}
+
+    monkeypatch.setattr(ApiService, "_send", staticmethod(fake_send))
+    parsed = []
+    from_api = Family.from_api.__func__
+
+    def counting(cls, data):
+        parsed.append(data)
+        return from_api(cls, data)
+
+    monkeypatch.setattr(Family, "from_api", classmethod(counting))
+
+    async def scenario():
+        first = await ApiService.request("GET", "/families/7")
+        second = await ApiService.request("GET", "/families/7")
+        members = await ApiService.request("GET", "/families/7/members")
+        return first, second, members
+
+    first, second, members = asyncio.run(scenario())
+    assert isinstance(first[1], Family) and first[1].members[0].id == "3"
+    # El acierto devuelve el registro ya interpretado, sin volver a parsearlo
+    assert second[1] is first[1]
+    assert len(parsed) == 1 and len(sent) == 2
+    assert [type(member) for member in members[1]] == [Member]
+
+
+def test_error_bodies_are_not_parsed():
+    rule = ResponseCache.get_rule("/families/7/balances")
+    assert rule[2]([{"member_id": 1}])[0] == MemberBalance.from_api({"member_id": 1})
+    assert rule[2]({"detail": "x"}) == {"detail": "x"}
+    assert ResponseCache.get_rule("/members/42")[2]("texto") == "texto"
+
+
+def test_callers_cannot_change_the_cached_response():
+    member = Member("3", "Ana")
+    stored = [member, {"raw": [1]}]
+    ResponseCache.put("k", (200, stored), ttl=60)
+    stored.pop()
+
+    hit = ResponseCache.get("k")[1]
+    hit.append("extra")
+    hit[1]["raw"].append(2)
+    ResponseCache.get_stale("k")[1].clear()
+
+    status_code, cached = ResponseCache.get("k")
+    assert cached == [member, {"raw": [1]}]
+    # Los registros son de solo lectura y se comparten
+    assert cached[0] is member
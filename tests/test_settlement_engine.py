@@ -0,0 +1,93 @@
+"""Tests of the local balance computation against the mock API balances."""
+
+import pytest
+
+from scripts.mock_api_server import MockDataset
+from services.models import Expense, Member, Payment
+from services.settlement_engine import SettlementEngine, np
+
+ENGINES = [False] + ([True] if np is not None else [])
+
+
+def family_data(dataset, family_id):
+    members = dataset.family_view(family_id)["members"]
+    expenses = [expense for expense in dataset.expenses.values() if expense["family_id"] == family_id]
+    payments = [payment for payment in dataset.payments.values() if payment["family_id"] == family_id]
+    return members, expenses, payments
+
+
+def build_dataset(seed):
+    dataset = MockDataset(families=2, members_per_family=5, expenses=150, payments=60, seed=seed)
+    # El generador solo crea pagos PENDING y CONFIRM
+    for position, payment in enumerate(dataset.payments.values()):
+        payment["status"] = ("PENDING", "CONFIRM", "REJECT")[position % 3]
+    return dataset
+
+
+def assert_same_balances(server, local):
+    assert SettlementEngine.cross_check(server, local) == []
+    server = {balance["member_id"]: balance for balance in server}
+    for balance in local:
+        expected = server[balance["member_id"]]
+        for field in ("total_owed", "total_debt", "net_balance"):
+            assert balance[field] == pytest.approx(expected[field], abs=0.011)
+
+
+@pytest.mark.parametrize("use_numpy", ENGINES)
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_mock_balances(seed, use_numpy):
+    dataset = build_dataset(seed)
+    for family_id in dataset.families:
+        members, expenses, payments = family_data(dataset, family_id)
+        assert any(len(expense["split_among"]) < len(members) for expense in expenses)
+        local = SettlementEngine.compute(members, expenses, payments, use_numpy=use_numpy)
+        assert_same_balances(dataset.balances(family_id), local)
+
+
+@pytest.mark.parametrize("use_numpy", ENGINES)
+def test_matches_mock_balances_with_records(use_numpy):
+    dataset = build_dataset(4)
+    family_id = next(iter(dataset.families))
+    members, expenses, payments = family_data(dataset, family_id)
+    local = SettlementEngine.compute(
+        Member.parse_list(members),
+        [Expense.from_api(expense) for expense in expenses],
+        [Payment.from_api(payment) for payment in payments],
+        use_numpy=use_numpy
+    )
+    assert_same_balances(dataset.balances(family_id), local)
+
+
+@pytest.mark.parametrize("use_numpy", ENGINES)
+@pytest.mark.parametrize("status, counted", [("PENDING", False), ("CONFIRM", True), ("REJECT", False)])
+def test_only_confirmed_payments_count(status, counted, use_numpy):
+    dataset = MockDataset(families=1, members_per_family=3, expenses=0, payments=0, seed=1)
+    family_id = next(iter(dataset.families))
+    first, second, third = dataset.family_member_ids(family_id)
+    dataset.add_expense({"amount": 90, "paid_by": first, "split_among": [first, second, third]})
+    dataset.add_expense({"amount": 40, "paid_by": second, "split_among": [second, third]})
+    dataset.add_payment({"from_member": third, "to_member": first, "amount": 10}, status=status)
+
+    members, expenses, payments = family_data(dataset, family_id)
+    local = SettlementEngine.compute(members, expenses, payments, use_numpy=use_numpy)
+    assert_same_balances(dataset.balances(family_id), local)
+
+    debts = {(balance["member_id"], debt["to_id"]): debt["amount"] for balance in local for debt in balance["debts"]}
+    assert debts == {(second, first): 30, (third, first): 20 if counted else 30, (third, second): 20}
+
+
+@pytest.mark.parametrize("use_numpy", ENGINES)
+def test_unknown_members_are_ignored(use_numpy):
+    members = [{"id": "1", "name": "A"}, {"id": "2", "name": "B"}]
+    expenses = [
+        {"paid_by": "1", "amount": 10, "split_among": [{"id": "1"}, {"id": "2"}]},
+        {"paid_by": "9", "amount": 50},
+        {"paid_by": "2", "amount": 50, "split_among": [{"id": "9"}]},
+    ]
+    payments = [
+        {"from_member": {"id": "2"}, "to_member": {"id": "9"}, "amount": 5, "status": "CONFIRM"},
+        {"from_member": {"id": "2"}, "to_member": {"id": "2"}, "amount": 5, "status": "CONFIRM"},
+    ]
+    local = SettlementEngine.compute(members, expenses, payments, use_numpy=use_numpy)
+    assert local[1]["debts"] == [{"to": "A", "to_id": "1", "amount": 5.0}]
+    assert local[0]["net_balance"] == 5.0
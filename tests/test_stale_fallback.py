@@ -0,0 +1,86 @@
+"""Tests of the stale answers served while the API is unavailable."""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+import services.response_cache as response_cache
+from config import API_BASE_URL
+from services.api_service import ApiService, STALE_OK
+from services.models import Expense
+from services.pagination import PageIndex, EXPENSES
+from services.request_coalescer import RequestCoalescer
+from services.response_cache import ResponseCache
+from services.revalidation_store import RevalidationStore
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    for name, value in (("_entries", OrderedDict()), ("_family_keys", {}), ("_versions", {}),
+                        ("_epoch", 0), ("_writes", 0), ("_total_bytes", 0)):
+        monkeypatch.setattr(ResponseCache, name, value)
+    monkeypatch.setattr(RevalidationStore, "_entries", OrderedDict())
+    monkeypatch.setattr(RequestCoalescer, "_in_flight", {})
+    monkeypatch.setattr(RequestCoalescer, "_families", {})
+    monkeypatch.setattr(PageIndex, "_indexes", OrderedDict())
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Fake transport whose answers are taken from a list."""
+    answers = []
+
+    async def fake_send(method, url, data, request_params, check_status, revalidation_key=None, extra_headers=None):
+        return answers.pop(0)
+
+    monkeypatch.setattr(ApiService, "_send", staticmethod(fake_send))
+    return answers
+
+
+def test_stale_status_compares_as_success():
+    assert STALE_OK == 200
+    assert ApiService.is_stale(STALE_OK)
+    assert not ApiService.is_stale(200)
+
+
+def test_expired_cache_entry_is_served_as_stale(api, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    api.extend([(200, [{"member_id": 1}]), (503, {"error": "down"})])
+
+    fresh = asyncio.run(ApiService.request("GET", "/families/1/balances"))
+    now[0] += 3600
+    stale = asyncio.run(ApiService.request("GET", "/families/1/balances"))
+
+    assert not ApiService.is_stale(fresh[0])
+    assert ApiService.is_stale(stale[0])
+    assert [balance.member_id for balance in stale[1]] == ["1"]
+
+
+def test_revalidation_store_copy_is_served_as_stale(api, monkeypatch):
+    key = RequestCoalescer.make_key("GET", f"{API_BASE_URL}/families/1/expenses", {})
+    monkeypatch.setattr(RevalidationStore, "peek", staticmethod(lambda k: ["old"] if k == key else None))
+    api.append((502, {"error": "bad gateway"}))
+
+    status_code, data = asyncio.run(ApiService.request("GET", "/families/1/expenses"))
+    assert ApiService.is_stale(status_code)
+    assert data == ["old"]
+
+
+def test_unavailable_without_copy_keeps_the_error(api):
+    api.append((504, {"error": "timeout"}))
+    assert asyncio.run(ApiService.request("GET", "/families/1/balances")) == (504, {"error": "timeout"})
+
+
+def test_stale_list_is_paged_but_not_kept_as_index():
+    expenses = [Expense.from_api({"id": n, "amount": n, "created_at": f"2026-01-0{n}T00:00:00"}) for n in range(1, 4)]
+
+    async def fetch():
+        return STALE_OK, expenses
+
+    status_code, page = asyncio.run(PageIndex.page(EXPENSES, "1", fetch))
+    assert ApiService.is_stale(status_code)
+    assert [record.id for record in page.records] == ["3", "2", "1"]
+    assert not PageIndex._indexes
+
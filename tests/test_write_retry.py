@@ -0,0 +1,172 @@
+"""Tests of the background retries of failed writes and their idempotency keys."""
+
+import asyncio
+
+import pytest
+
+import services.write_retry as write_retry
+from services.expense_service import ExpenseService
+from services.write_retry import WriteRetry, QUEUED_STATUS_CODE
+
+
+@pytest.fixture(autouse=True)
+def reset_retries(monkeypatch):
+    monkeypatch.setattr(WriteRetry, "_pending", {})
+    monkeypatch.setattr(write_retry, "API_WRITE_RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(write_retry, "API_WRITE_RETRY_BASE_DELAY", 2)
+    monkeypatch.setattr(write_retry, "API_WRITE_RETRY_MAX_DELAY", 10)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(write_retry.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+class Api:
+    """Fake write endpoint answering with a fixed sequence of status codes."""
+
+    def __init__(self, *status_codes):
+        self.status_codes = list(status_codes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.status_codes.pop(0), {"attempt": self.calls}
+
+
+async def drain():
+    while WriteRetry._pending:
+        await asyncio.gather(*WriteRetry._pending.values())
+
+
+def test_key_is_stable_for_retries_of_one_submission():
+    submission_id = WriteRetry.new_submission_id()
+    payload = {"description": "Pan", "amount": 3.5, "paid_by": "1"}
+    assert WriteRetry.make_key(42, "expense", payload, submission_id) == WriteRetry.make_key("42", "expense", dict(payload), submission_id)
+
+
+def test_identical_writes_of_different_submissions_get_different_keys():
+    payload = {"description": "Pan", "amount": 3.5, "paid_by": "1"}
+    first = WriteRetry.make_key(42, "expense", payload, WriteRetry.new_submission_id())
+    second = WriteRetry.make_key(42, "expense", payload, WriteRetry.new_submission_id())
+    assert first != second
+
+
+def test_key_depends_on_flow_and_payload():
+    submission_id = WriteRetry.new_submission_id()
+    key = WriteRetry.make_key(42, "payment", {"amount": 5}, submission_id)
+    assert key != WriteRetry.make_key(42, "debt_adjustment", {"amount": 5}, submission_id)
+    assert key != WriteRetry.make_key(42, "payment", {"amount": 6}, submission_id)
+
+
+def test_create_expense_uses_the_submission_id(monkeypatch):
+    keys = []
+
+    async def fake_submit(idempotency_key, send, on_result=None):
+        keys.append(idempotency_key)
+        return 201, {}
+
+    monkeypatch.setattr(WriteRetry, "submit", staticmethod(fake_submit))
+
+    async def create(submission_id):
+        return await ExpenseService.create_expense("Pan", 3.5, "1", "7", telegram_id="42", submission_id=submission_id)
+
+    asyncio.run(create("a"))
+    asyncio.run(create("a"))
+    asyncio.run(create("b"))
+    assert keys[0] == keys[1] != keys[2]
+
+
+def test_backoff_is_exponential_capped_and_jittered(monkeypatch):
+    monkeypatch.setattr(write_retry.random, "uniform", lambda low, high: (low, high))
+    assert [WriteRetry.backoff_delay(attempt) for attempt in range(1, 6)] == [
+        (0, 2), (0, 4), (0, 8), (0, 10), (0, 10)
+    ]
+
+
+def test_success_and_client_errors_are_not_retried():
+    for status_code in (201, 400):
+        api = Api(status_code)
+        assert asyncio.run(WriteRetry.submit("key", api))[0] == status_code
+        assert api.calls == 1
+    assert WriteRetry.get_pending_count() == 0
+
+
+def test_transient_failure_is_queued_and_retried_until_success(no_sleep):
+    results = []
+
+    async def on_result(status_code, response):
+        results.append((status_code, response))
+
+    async def scenario():
+        api = Api(503, 502, 201)
+        queued = await WriteRetry.submit("key", api, on_result)
+        pending = WriteRetry.get_pending_count()
+        await drain()
+        return api, queued, pending
+
+    api, queued, pending = asyncio.run(scenario())
+    assert queued[0] == QUEUED_STATUS_CODE
+    assert WriteRetry.is_queued(*queued)
+    assert queued[1]["idempotency_key"] == "key"
+    assert pending == 1
+    assert api.calls == 3
+    assert len(no_sleep) == 2
+    assert results == [(201, {"attempt": 3})]
+    assert WriteRetry.get_pending_count() == 0
+
+
+def test_retries_stop_after_the_configured_attempts(no_sleep):
+    results = []
+
+    async def on_result(status_code, response):
+        results.append(status_code)
+
+    async def scenario():
+        api = Api(503, 503, 503, 503)
+        await WriteRetry.submit("key", api, on_result)
+        await drain()
+        return api
+
+    assert asyncio.run(scenario()).calls == 4
+    assert results == [503]
+
+
+def test_resubmitting_a_pending_write_does_not_send_it_again(no_sleep):
+    async def scenario():
+        api = Api(503, 201)
+        await WriteRetry.submit("key", api)
+        again = await WriteRetry.submit("key", api)
+        await drain()
+        return api, again
+
+    api, again = asyncio.run(scenario())
+    assert WriteRetry.is_queued(*again)
+    assert api.calls == 2
+
+
+def test_retries_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(write_retry, "API_WRITE_RETRY_ATTEMPTS", 0)
+    api = Api(503)
+    assert asyncio.run(WriteRetry.submit("key", api)) == (503, {"attempt": 1})
+    assert WriteRetry.get_pending_count() == 0
+
+
+def test_failing_notification_does_not_break_the_retry(no_sleep):
+    async def on_result(status_code, response):
+        raise RuntimeError("chat not found")
+
+    async def scenario():
+        await WriteRetry.submit("key", Api(503, 201), on_result)
+        await drain()
+
+    asyncio.run(scenario())
+    assert WriteRetry.get_pending_count() == 0
@@ -1,3 +1,10 @@
+from datetime import datetime, timezone
+from ui.messages import Messages
+from services.models import Expense, is_record
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
 class Formatters:
     """Formateadores para mostrar datos en Telegram."""
     
@@ -38,6 +45,23 @@ class Formatters:
         except Exception:
             return date_str
     
+    @staticmethod
+    def format_timestamp(timestamp, with_time=False):
+        """
+        Formatea una marca de tiempo ya interpretada para mostrar en Telegram.
+        
+        Args:
+            timestamp (float): Marca de tiempo POSIX (created_ts de un registro), o None
+            with_time (bool, optional): Incluir la hora y los minutos
+            
+        Returns:
+            str: Fecha formateada en UTC (ej: 10/03/2025 o 10/03/2025 18:30)
+        """
+        if timestamp is None:
+            return "Fecha desconocida"
+        moment = datetime.fromtimestamp(timestamp, timezone.utc)
+        return moment.strftime("%d/%m/%Y %H:%M" if with_time else "%d/%m/%Y")
+    
     @staticmethod
     def format_members(members):
         """Formatea la lista de miembros para mostrar en Telegram."""
@@ -55,9 +79,9 @@ class Formatters:
             str: Texto formateado con la información de la familia
         """
         try:
-            # Verificar que family sea un diccionario
-            if not isinstance(family, dict):
-                print(f"Error: family no es un diccionario, es {type(family)}")
+            # Verificar que family sea un registro de familia o un diccionario
+            if not is_record(family):
+                logger.error("Error: family no es un diccionario, es %s", type(family))
                 return "Error al formatear la información de la familia."
             
             # Obtener datos básicos de la familia
@@ -92,9 +116,7 @@ class Formatters:
             )
             
         except Exception as e:
-            print(f"Error al formatear información de familia: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error al formatear información de familia: %s", e)
             return "Error al formatear la información de la familia."
     
     @staticmethod
@@ -102,14 +124,12 @@ class Formatters:
         """Formatea la lista de gastos para mostrar en Telegram.
         
         Args:
-            expenses: Lista de gastos
+            expenses: Lista de gastos (registros Expense o diccionarios de la API)
             member_names: Diccionario de ID -> nombre para mostrar nombres en lugar de IDs
             
         Returns:
             str: Texto formateado con los gastos
         """
-        print(f"Formateando gastos: {expenses}")
-        
         if not expenses:
             return "No hay gastos registrados."
         
@@ -117,95 +137,34 @@ class Formatters:
         if member_names is None:
             member_names = {}
         
-        print(f"Nombres de miembros disponibles: {member_names}")
-        
         result = []
         for expense in expenses:
             try:
-                print(f"Procesando gasto: {expense}")
-                
-                # Formatear la fecha
-                created_at = expense.get("created_at", "")
-                date_str = Formatters.format_date(created_at) if hasattr(Formatters, 'format_date') else (created_at.split("T")[0] if created_at else "Fecha desconocida")
-                
-                # Obtener el nombre de quien pagó
-                paid_by_id = expense.get("paid_by", "")
-                print(f"Gasto pagado por ID={paid_by_id} ({type(paid_by_id)})")
-                
-                # Buscar el nombre del miembro de varias maneras
-                paid_by_name = None
-                
-                # 1. Buscar como string (el caso más común y seguro)
-                if paid_by_id is not None:
-                    str_id = str(paid_by_id)
-                    if str_id in member_names:
-                        paid_by_name = member_names[str_id]
-                        print(f"Nombre encontrado usando string ID: {paid_by_name}")
-                
-                # 2. Buscar como número si es aplicable
-                if not paid_by_name and paid_by_id is not None:
-                    if isinstance(paid_by_id, int) or (isinstance(paid_by_id, str) and paid_by_id.isdigit()):
-                        numeric_id = int(paid_by_id) if isinstance(paid_by_id, str) else paid_by_id
-                        if numeric_id in member_names:
-                            paid_by_name = member_names[numeric_id]
-                            print(f"Nombre encontrado usando numeric ID: {paid_by_name}")
-                
-                # 3. Valor por defecto si no se encuentra
-                if not paid_by_name:
-                    paid_by_name = f"Usuario {paid_by_id}"
-                    print(f"No se encontró nombre, usando valor por defecto: {paid_by_name}")
+                # Los IDs y la fecha ya vienen normalizados en el registro
+                expense = Expense.from_api(expense)
+                paid_by_name = member_names.get(expense.paid_by) or f"Usuario {expense.paid_by}"
                 
                 # Formatear la lista de miembros entre los que se divide
-                split_among = expense.get("split_among", [])
-                if split_among and isinstance(split_among, list):
-                    # Verificar si cada elemento es un diccionario (formato API) o un ID (formato antiguo)
-                    if split_among and isinstance(split_among[0], dict):
-                        # Formato API: cada elemento es un diccionario con información del miembro
-                        split_names = [member.get("name", f"Usuario {member.get('id', 'Desconocido')}") for member in split_among]
-                    else:
-                        # Formato antiguo: cada elemento es un ID
-                        split_names = []
-                        for member_id in split_among:
-                            # Buscar el nombre del miembro de varias maneras
-                            name = None
-                            
-                            # 1. Buscar como string
-                            if member_id is not None:
-                                str_id = str(member_id)
-                                if str_id in member_names:
-                                    name = member_names[str_id]
-                            
-                            # 2. Buscar como número
-                            if not name and member_id is not None:
-                                if isinstance(member_id, int) or (isinstance(member_id, str) and member_id.isdigit()):
-                                    numeric_id = int(member_id) if isinstance(member_id, str) else member_id
-                                    if numeric_id in member_names:
-                                        name = member_names[numeric_id]
-                            
-                            # 3. Valor por defecto
-                            if not name:
-                                name = f"Usuario {member_id}"
-                                
-                            split_names.append(name)
-                    
-                    split_text = ", ".join(split_names)
+                if expense.split_among:
+                    split_text = ", ".join(
+                        member.name or member_names.get(member.id) or f"Usuario {member.id}"
+                        for member in expense.split_among
+                    )
                 else:
                     split_text = "Todos los miembros"
                 
                 # Crear el texto del gasto
                 expense_text = (
-                    f"🧾 *{expense.get('description', 'Sin descripción')}*\n"
-                    f"💰 Monto: *${expense.get('amount', 0):.2f}*\n"
+                    f"🧾 *{expense.description}*\n"
+                    f"💰 Monto: *${expense.amount:.2f}*\n"
                     f"👤 Pagado por: *{paid_by_name}*\n"
                     f"👥 Dividido entre: *{split_text}*\n"
-                    f"📅 Fecha: *{date_str}*\n"
-                    f"🆔 ID: `{expense.get('id', 'Desconocido')}`"
+                    f"📅 Fecha: *{Formatters.format_timestamp(expense.created_ts)}*\n"
+                    f"🆔 ID: `{expense.id}`"
                 )
                 result.append(expense_text)
             except Exception as e:
-                print(f"Error al formatear gasto: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error al formatear gasto: %s", e)
                 continue
         
         if not result:
@@ -213,6 +172,32 @@ class Formatters:
             
         return "\n\n" + "\n\n".join(result)
     
+    @staticmethod
+    def format_settlement_plan(transfers, pairwise_count, current_member_id=None):
+        """
+        Formatea el plan de liquidación simplificado de una familia.
+        
+        Args:
+            transfers (list): Transferencias devueltas por DebtSimplifier.simplify
+            pairwise_count (int): Número de deudas entre pares antes de simplificar
+            current_member_id: ID del miembro actual, que se muestra como "Tú"
+            
+        Returns:
+            str: Texto del plan en formato Markdown
+        """
+        def display(member_id, name):
+            if current_member_id is not None and str(member_id) == str(current_member_id):
+                return "*Tú*"
+            return name
+        
+        lines = [Messages.SETTLEMENT_PLAN_HEADER.format(count=len(transfers), pairwise=pairwise_count)]
+        for transfer in transfers:
+            lines.append(
+                f"• {display(transfer.from_id, transfer.from_name)} → {display(transfer.to_id, transfer.to_name)}: "
+                f"{Formatters.format_currency(transfer.amount)}"
+            )
+        return "\n".join(lines)
+    
     @staticmethod
     def format_balances(balances, member_names=None, current_member_id=None):
         """Formatea los balances para mostrar en Telegram según el esquema de la API.
@@ -226,7 +211,7 @@ class Formatters:
                           vienen incluidos en la respuesta de la API)
             current_member_id: ID del miembro actual que realiza la consulta (para mostrarlo primero)
         """
-        print(f"Formateando balances")
+        logger.debug("Formateando balances")
         
         # Si no hay balances, mostrar un mensaje
         if not balances:
@@ -237,12 +222,12 @@ class Formatters:
             member_names = {}
         
         # Determinar el formato de los balances por la presencia de campos específicos
-        if isinstance(balances, list) and len(balances) > 0 and isinstance(balances[0], dict):
+        if isinstance(balances, list) and len(balances) > 0 and is_record(balances[0]):
             if "member_id" in balances[0] and "debts" in balances[0] and "credits" in balances[0]:
                 return Formatters._format_member_balances(balances, member_names, current_member_id)
         
         # Si no se puede determinar el formato, mostrar mensaje de error
-        print(f"Formato de balances no reconocido")
+        logger.warning("Formato de balances no reconocido")
         return "Formato de balances no reconocido. Por favor contacte al administrador."
     
     @staticmethod
@@ -252,13 +237,13 @@ class Formatters:
         current_member_balance = None
         other_members_balances = []
         
-        print(f"Formateando balances de miembros, current_member_id={current_member_id}")
+        logger.debug("Formateando balances de miembros, current_member_id=%s", current_member_id)
         
         for balance in balances:
             try:
-                # Verificar que balance sea un diccionario
-                if not isinstance(balance, dict):
-                    print(f"Error: balance no es un diccionario, es {type(balance)}")
+                # Verificar que balance sea un registro de balance o un diccionario
+                if not is_record(balance):
+                    logger.error("Error: balance no es un diccionario, es %s", type(balance))
                     continue
                 
                 # Obtener el ID y nombre del miembro
@@ -267,7 +252,7 @@ class Formatters:
                 
                 # Formatear deudas (lo que debe a otros)
                 debts = balance.get('debts', [])
-                if debts and len(debts) > 0 and isinstance(debts, list):
+                if debts and len(debts) > 0 and isinstance(debts, (list, tuple)):
                     debts_list = []
                     for d in debts:
                         # Usar preferentemente el campo to_id para la lógica interna
@@ -276,7 +261,7 @@ class Formatters:
                         to_name = d.get('to', 'Desconocido')
                         
                         # Registrar la información para depuración
-                        print(f"Deuda: to_id={to_id}, to_name={to_name}")
+                        logger.debug("Deuda: to_id=%s, to_name=%s", to_id, to_name)
                         
                         debts_list.append(f"• {to_name}: ${d.get('amount', 0):.2f}")
                     debts_text = "\n".join(debts_list)
@@ -285,7 +270,7 @@ class Formatters:
                 
                 # Formatear créditos (lo que le deben)
                 credits = balance.get('credits', [])
-                if credits and len(credits) > 0 and isinstance(credits, list):
+                if credits and len(credits) > 0 and isinstance(credits, (list, tuple)):
                     credits_list = []
                     for c in credits:
                         # Usar preferentemente el campo from_id para la lógica interna
@@ -294,7 +279,7 @@ class Formatters:
                         from_name = c.get('from', 'Desconocido')
                         
                         # Registrar la información para depuración
-                        print(f"Crédito: from_id={from_id}, from_name={from_name}")
+                        logger.debug("Crédito: from_id=%s, from_name=%s", from_id, from_name)
                         
                         credits_list.append(f"• {from_name}: ${c.get('amount', 0):.2f}")
                     credits_text = "\n".join(credits_list)
@@ -332,15 +317,13 @@ class Formatters:
                 
                 # Determinar si este es el miembro actual o no
                 if is_current_member:
-                    print(f"Este es el miembro actual: {member_id} == {current_member_id}")
+                    logger.debug("Este es el miembro actual: %s == %s", member_id, current_member_id)
                     current_member_balance = member_text
                 else:
                     other_members_balances.append(member_text)
                 
             except Exception as e:
-                print(f"Error al formatear balance: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error al formatear balance: %s", e)
                 continue
         
         # Organizar los resultados: primero el miembro actual, luego los demás
@@ -1,4 +1,5 @@
-from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+from ui.messages import Messages
 
 class Keyboards:
     """Teclados personalizados para Telegram."""
@@ -118,4 +119,23 @@ class Keyboards:
         
         keyboard.append(["❌ Cancelar"])
         
-        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True) 
\ No newline at end of file
+        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True) 
+    
+    @staticmethod
+    def get_page_keyboard(newer_data=None, older_data=None):
+        """
+        Genera los botones en línea para navegar entre páginas de una lista.
+        
+        Args:
+            newer_data (str, optional): Callback data del botón de registros más recientes
+            older_data (str, optional): Callback data del botón de registros más antiguos
+            
+        Returns:
+            InlineKeyboardMarkup: Botones de navegación, o None si solo hay una página
+        """
+        buttons = []
+        if newer_data:
+            buttons.append(InlineKeyboardButton(Messages.PAGE_NEWER_BUTTON, callback_data=newer_data))
+        if older_data:
+            buttons.append(InlineKeyboardButton(Messages.PAGE_OLDER_BUTTON, callback_data=older_data))
+        return InlineKeyboardMarkup([buttons]) if buttons else None
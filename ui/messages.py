@@ -25,6 +25,8 @@ class Messages:
     ERROR_DELETING_EXPENSE = "❌ Error al eliminar el gasto. Por favor, intenta nuevamente más tarde."
     ERROR_DELETING_PAYMENT = "❌ Error al eliminar el pago. Por favor, intenta nuevamente más tarde."
     ERROR_UPDATING_EXPENSE = "❌ Error al actualizar el gasto. Por favor, intenta nuevamente más tarde."
+    ERROR_CREATING_PAYMENT = "❌ Error al registrar el pago. Por favor, intenta nuevamente más tarde."
+    ERROR_CREATING_ADJUSTMENT = "❌ Error al registrar el ajuste de deuda. Por favor, intenta nuevamente más tarde."
     
     # Mensajes de éxito
     SUCCESS_FAMILY_CREATED = "✅ Familia '{name}' creada con éxito.\n*ID:* `{id}`"
@@ -36,6 +38,9 @@ class Messages:
     SUCCESS_EXPENSE_UPDATED = "✅ Gasto actualizado con éxito."
     EXPENSE_UPDATED_SUCCESS = "✅ El monto del gasto ha sido actualizado con éxito."
     
+    # Mensajes de reintentos en segundo plano
+    WRITE_QUEUED = "⏳ El servidor no responde en este momento. Lo reintentaremos automáticamente y te avisaremos del resultado; no hace falta repetir la operación."
+    
     # Mensajes de flujo de creación de familia
     CREATE_FAMILY_INTRO = "🏠 Vamos a crear una nueva familia.\n\n" \
                          "¿Cómo se llamará tu familia?"
@@ -97,6 +102,13 @@ class Messages:
         "----------------------------\n\n"
     )
     
+    # Navegación entre páginas de las listas
+    PAGE_NEWER_BUTTON = "◀ Más recientes"
+    PAGE_OLDER_BUTTON = "Más antiguos ▶"
+    PAGE_FOOTER = "_Mostrando {first}-{last} de {total}_"
+    EXPENSES_MONTH_SUMMARY = "🗓️ Este mes: {count} gastos por {amount}\n\n"
+    PAYMENTS_WEEK_SUMMARY = "🗓️ Última semana: {count} pagos por {amount}\n\n"
+    
     # Mensajes para gastos y pagos no encontrados
     NO_EXPENSES = "📋 No hay gastos registrados en esta familia."
     NO_PAYMENTS = "💳 No hay pagos registrados en esta familia."
@@ -150,6 +162,9 @@ class Messages:
     # Mensajes para balances
     BALANCES_HEADER = "💰 *Balances de la familia*\n\n"
     
+    # Aviso de datos servidos desde una copia antigua porque la API no responde
+    STALE_DATA_NOTICE = "⚠️ _Datos posiblemente desactualizados: no se pudo contactar con el servidor._\n\n"
+    
     # Mensajes para compartir invitación
     SHARE_INVITATION_INTRO = "🔗 Comparte este enlace para invitar a alguien a unirse a tu familia:"
     
@@ -173,8 +188,7 @@ class Messages:
     DEBT_ADJUSTMENT_INTRO = "💱 *Ajuste de Deudas*\n\nAquí puedes reducir la deuda que otros miembros tienen contigo, sin registrar un pago real."
     NO_CREDITS = "✅ En este momento no tienes créditos pendientes con ningún miembro de tu familia."
     SELECT_CREDIT = "💱 Selecciona el crédito que deseas ajustar:"
-    ADJUSTMENT_AMOUNT_PROMPT = "💱 *{debtor_name}* te debe *${total_amount:.2f}*\n\n¿Qué cantidad deseas ajustar de esta deuda?"
-    ADJUSTMENT_AMOUNT_TOO_HIGH = "❌ El monto ingresado (${amount:.2f}) excede la deuda total (${total:.2f}). Por favor, ingresa un monto menor o igual a la deuda."
+    SETTLEMENT_PLAN_HEADER = "📉 *Plan de liquidación simplificado:* {count} transferencias en lugar de {pairwise}"
+    SELECT_SETTLEMENT = "💱 Selecciona una transferencia para registrarla como ajuste con un solo toque:"
     ADJUSTMENT_CONFIRM = "📝 Resumen del ajuste de deuda:\n\n*Deudor:* {debtor_name}\n*Acreedor:* {creditor_name}\n*Monto a ajustar:* ${amount:.2f}\n\n¿Confirmas este ajuste? La deuda se reducirá permanentemente."
-    ADJUSTMENT_SUCCESS = "✅ ¡Ajuste de deuda registrado con éxito! La deuda ha sido reducida."
-    INVALID_ADJUSTMENT_AMOUNT = "❌ Monto no válido. Por favor, ingresa un número positivo." 
\ No newline at end of file
+    ADJUSTMENT_SUCCESS = "✅ ¡Ajuste de deuda registrado con éxito! La deuda ha sido reducida."
\ No newline at end of file
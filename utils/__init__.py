@@ -1,5 +1,9 @@
-import requests
+import httpx
 from config import API_BASE_URL
+from services.http_client import HttpClient
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 def api_request(method, endpoint, data=None, check_status=True):
     """Realiza una solicitud HTTP a la API.
@@ -14,26 +18,21 @@ def api_request(method, endpoint, data=None, check_status=True):
         tuple: (status_code, response_data)
     """
     url = f"{API_BASE_URL}{endpoint}"
-    print(f"Realizando solicitud {method} a {url}")
+    logger.debug("Realizando solicitud %s a %s", method, url)
     if data:
-        print(f"Datos: {data}")
+        logger.debug("Datos: %s", Payload(data))
         
     try:
         # Configurar headers para JSON
         headers = {'Content-Type': 'application/json'}
         
-        if method == "GET":
-            response = requests.get(url, headers=headers, timeout=10)
-        elif method == "POST":
-            response = requests.post(url, json=data, headers=headers, timeout=10)
-        elif method == "PUT":
-            response = requests.put(url, json=data, headers=headers, timeout=10)
-        elif method == "DELETE":
-            response = requests.delete(url, headers=headers, timeout=10)
+        # Usar el cliente compartido para reutilizar conexiones persistentes
+        json_body = data if method in ("POST", "PUT") else None
+        response = HttpClient.request_sync(method, url, json=json_body, headers=headers, timeout=10)
         
         # Obtener el status code
         status_code = response.status_code
-        print(f"Status code: {status_code}")
+        logger.debug("Status code: %s", status_code)
         
         # Intentar obtener el contenido como JSON
         try:
@@ -42,11 +41,11 @@ def api_request(method, endpoint, data=None, check_status=True):
             else:
                 response_data = {"message": "Success"}
         except Exception as e:
-            print(f"Error al parsear la respuesta como JSON: {e}")
-            print(f"Contenido de la respuesta: {response.content}")
+            logger.error("Error al parsear la respuesta como JSON: %s", e)
+            logger.debug("Contenido de la respuesta: %s", Payload(response.content))
             response_data = {"message": "Error parsing response", "content": str(response.content)}
         
-        print(f"Respuesta: status_code={status_code}, data={response_data}")
+        logger.debug("Respuesta: status_code=%s, data=%s", status_code, Payload(response_data))
         
         # Si check_status es True, lanzar excepción si hay error
         if check_status:
@@ -54,8 +53,8 @@ def api_request(method, endpoint, data=None, check_status=True):
             
         # Devolver status_code y datos
         return status_code, response_data
-    except requests.exceptions.RequestException as e:
-        print(f"Error al realizar la solicitud: {e}")
+    except httpx.HTTPError as e:
+        logger.error("Error al realizar la solicitud: %s", e)
         # Si hay una excepción, devolver el status code (si está disponible) y None como datos
         if 'response' in locals() and hasattr(response, 'status_code'):
             return response.status_code, None
@@ -10,7 +10,9 @@ from telegram.ext import ContextTypes
 from services.family_service import FamilyService
 from services.member_service import MemberService
 from services.auth_service import AuthService
-import traceback
+from services.log import get_logger, Payload
+
+logger = get_logger(__name__)
 
 class ContextManager:
     """
@@ -38,82 +40,46 @@ class ContextManager:
         """
         # Check if we already have the family_id in the context to avoid unnecessary API calls
         if "family_id" in context.user_data:
-            print(f"Usuario ya tiene family_id en el contexto: {context.user_data['family_id']}")
+            logger.debug("Usuario ya tiene family_id en el contexto: %s", context.user_data['family_id'])
             return True
         
         # If not in context, verify with the API if the user is in a family
-        print(f"Verificando si el usuario {telegram_id} está en una familia con la API")
+        logger.debug("Verificando si el usuario %s está en una familia con la API", telegram_id)
         try:
             # Save the Telegram ID in the context for identification purposes
             context.user_data["telegram_id"] = telegram_id
             
             # Get member information directly from the API
-            status_code, response = MemberService.get_member(telegram_id)
+            status_code, response = await MemberService.get_member(telegram_id)
             
-            print(f"Respuesta de get_member: status_code={status_code}, response={response}")
+            logger.debug("Respuesta de get_member: status_code=%s, response=%s", status_code, Payload(response))
             
             # If the user is in a family, save the family ID in the context
             if status_code == 200 and response and response.get("family_id"):
                 family_id = response.get("family_id")
                 context.user_data["family_id"] = family_id
-                print(f"ID de familia guardado en el contexto: {family_id}")
+                logger.debug("ID de familia guardado en el contexto: %s", family_id)
                 
                 # También guardamos el ID del miembro para futuras consultas
                 if "id" in response:
                     context.user_data["member_id"] = response["id"]
-                    print(f"ID del miembro guardado en el contexto: {response['id']}")
+                    logger.debug("ID del miembro guardado en el contexto: %s", response['id'])
                 
                 # Guardar información del miembro completa si está disponible
                 context.user_data["member"] = response
                 
                 return True
             
-            # Si no lo encontramos, intentar una forma alternativa
-            if status_code != 200 or not response or not response.get("family_id"):
-                print(f"No se encontró familia con el método normal. Código: {status_code}")
-                
-                # Intentar obtener la información del miembro directamente
-                status_code, member = MemberService.get_member(telegram_id)
-                
-                if status_code == 200 and member and member.get("family_id"):
-                    family_id = member.get("family_id")
-                    context.user_data["family_id"] = family_id
-                    print(f"ID de familia encontrado mediante consulta directa: {family_id}")
-                    
-                    # Guardar también el ID del miembro y su información
-                    if "id" in member:
-                        context.user_data["member_id"] = member["id"]
-                    context.user_data["member"] = member
-                    
-                    return True
-            
-            print("Usuario no está en ninguna familia según la API")
+            # No repetimos la consulta: el mismo endpoint devolvería la misma respuesta
+            # y, si la API no responde, el circuit breaker ya falla de inmediato
+            if status_code in (502, 503, 504):
+                logger.debug("La API no está disponible (código %s); no se pudo verificar la familia", status_code)
+            else:
+                logger.debug("Usuario no está en ninguna familia según la API")
             return False
         except Exception as e:
             # Handle any unexpected errors
-            print(f"Error en check_user_in_family: {str(e)}")
-            traceback.print_exc()
-            
-            # Último intento: consultar directamente por el telegram_id
-            try:
-                print("Intentando obtener miembro directamente como último recurso")
-                status_code, member = MemberService.get_member(telegram_id)
-                
-                if status_code == 200 and member and member.get("family_id"):
-                    family_id = member.get("family_id")
-                    context.user_data["family_id"] = family_id
-                    print(f"ID de familia obtenido en último intento: {family_id}")
-                    
-                    # Guardar también datos del miembro
-                    if "id" in member:
-                        context.user_data["member_id"] = member["id"]
-                    context.user_data["member"] = member
-                    
-                    return True
-            except Exception as inner_e:
-                print(f"Error en último intento de obtener miembro: {str(inner_e)}")
-                traceback.print_exc()
-            
+            logger.exception("Error en check_user_in_family: %s", e)
             return False
     
     @staticmethod
@@ -136,50 +102,42 @@ class ContextManager:
             telegram_id = context.user_data.get("telegram_id")
             
             if not telegram_id:
-                print("No se encontró telegram_id en el contexto")
+                logger.debug("No se encontró telegram_id en el contexto")
                 return False
             
-            # Get family information from the API
-            print(f"Cargando miembros de la familia {family_id} con telegram_id={telegram_id}")
-            status_code, family = FamilyService.get_family(family_id, telegram_id)
-            
-            print(f"Respuesta de get_family: status_code={status_code}, family={family}")
+            # Get the shared family record (fetched from the API only if needed)
+            logger.debug("Cargando miembros de la familia %s con telegram_id=%s", family_id, telegram_id)
+            status_code, record = await FamilyService.get_family_record(family_id, telegram_id)
             
             # If there was an error or no family was found, return False
-            if status_code != 200 or not family:
-                print(f"Error al obtener la familia: status_code={status_code}")
+            if status_code != 200:
+                logger.error("Error al obtener la familia: status_code=%s", status_code)
                 return False
             
-            # Extract member information and store in the context
-            members = family.get("members", [])
-            
-            # Create a dictionary mapping member IDs to names for easy lookup
-            member_names = {}
-            for member in members:
-                member_id = member.get("id")
-                member_name = member.get("name", "Unknown")
-                if member_id:
-                    # Asegurarnos de que los IDs se guarden como strings
-                    member_names[str(member_id)] = member_name
-                    # También guardar el mismo valor con el ID como integer, para compatibilidad
-                    if isinstance(member_id, int) or (isinstance(member_id, str) and member_id.isdigit()):
-                        numeric_id = int(member_id) if isinstance(member_id, str) else member_id
-                        member_names[numeric_id] = member_name
-            
-            # Save the member names dictionary in the context
-            context.user_data["member_names"] = member_names
-            print(f"Nombres de miembros guardados en el contexto: {member_names}")
-            
-            # Also save the complete family information for reference
-            context.user_data["family"] = family
+            ContextManager.attach_family(context, record)
+            logger.debug("Nombres de miembros enlazados en el contexto: %s", record.member_names)
             
             return True
         except Exception as e:
             # Handle any unexpected errors
-            print(f"Error en load_family_members: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error en load_family_members: %s", e)
             return False
     
+    @staticmethod
+    def attach_family(context: ContextTypes.DEFAULT_TYPE, record):
+        """
+        Points the user context at the shared record of their family.
+        
+        The "family" and "member_names" keys reference the FamilyDirectory
+        record instead of holding a per-user copy.
+        
+        Args:
+            context (ContextTypes.DEFAULT_TYPE): Telegram context
+            record (FamilyRecord): Shared record of the family
+        """
+        context.user_data["member_names"] = record.member_names
+        context.user_data["family"] = record.family
+    
     @staticmethod
     def get_family_id(context: ContextTypes.DEFAULT_TYPE):
         """
@@ -195,7 +153,7 @@ class ContextManager:
         family_id = context.user_data.get("family_id")
         
         if not family_id:
-            print("No se encontró family_id en el contexto")
+            logger.debug("No se encontró family_id en el contexto")
         
         return family_id
     
@@ -214,7 +172,7 @@ class ContextManager:
         member_names = context.user_data.get("member_names", {})
         
         if not member_names:
-            print("No se encontraron nombres de miembros en el contexto")
+            logger.debug("No se encontraron nombres de miembros en el contexto")
         
         return member_names
     
@@ -233,7 +191,7 @@ class ContextManager:
         telegram_id = context.user_data.get("telegram_id")
         
         if not telegram_id:
-            print("No se encontró telegram_id en el contexto")
+            logger.debug("No se encontró telegram_id en el contexto")
         
         return telegram_id
     
@@ -255,15 +213,14 @@ class ContextManager:
                 for key in keys:
                     if key in context.user_data:
                         del context.user_data[key]
-                        print(f"Clave {key} eliminada del contexto")
+                        logger.debug("Clave %s eliminada del contexto", key)
             # Otherwise, clear the entire user_data dictionary
             else:
                 context.user_data.clear()
-                print("Contexto completamente limpiado")
+                logger.debug("Contexto completamente limpiado")
             
             return True
         except Exception as e:
             # Handle any unexpected errors
-            print(f"Error en clear_context: {str(e)}")
-            traceback.print_exc()
+            logger.exception("Error en clear_context: %s", e)
             return False 
\ No newline at end of file
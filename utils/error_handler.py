@@ -12,7 +12,9 @@ import os
 from telegram import Update
 from telegram.ext import ContextTypes, Application
 from telegram.constants import ParseMode
-from config import logger
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -9,6 +9,9 @@ import qrcode
 from io import BytesIO
 from telegram import Update
 from telegram.ext import ContextTypes
+from services.log import get_logger
+
+logger = get_logger(__name__)
 
 async def send_error(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str):
     """
@@ -81,6 +84,27 @@ def parse_deep_link(args):
     
     return None, None 
 
+def make_retry_notifier(context: ContextTypes.DEFAULT_TYPE, chat_id, success_message: str, failure_message: str):
+    """
+    Builds the callback that tells the user how a background write retry ended.
+    
+    Args:
+        context (ContextTypes.DEFAULT_TYPE): Telegram context
+        chat_id: Chat where the result is sent
+        success_message (str): Message sent if the write succeeded
+        failure_message (str): Message sent if the write failed
+        
+    Returns:
+        callable: Coroutine function accepting (status_code, response)
+    """
+    bot = context.bot
+    
+    async def notify(status_code, response):
+        text = success_message if status_code in (200, 201) else failure_message
+        await bot.send_message(chat_id=chat_id, text=text)
+    
+    return notify
+
 async def notify_unknown_username(update: Update, context: ContextTypes.DEFAULT_TYPE, member_id: str, location: str):
     """
     Notifies the developer about an unknown username.
@@ -97,7 +121,6 @@ async def notify_unknown_username(update: Update, context: ContextTypes.DEFAULT_
     import os
     import html
     from telegram.constants import ParseMode
-    from config import logger
     
     user_id = update.effective_user.id
     username = update.effective_user.username or "sin username"
@@ -139,5 +162,5 @@ async def notify_unknown_username(update: Update, context: ContextTypes.DEFAULT_
         except Exception as e:
             logger.error(f"Failed to send unknown username notification to admin: {e}")
     else:
-        # Si no hay chat de administrador, imprimir en la consola
-        print(notification)
\ No newline at end of file
+        # Si no hay chat de administrador, la notificación solo queda en el log
+        logger.debug("Sin chat de administrador; la notificación solo queda en el log")
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""
+Memory Manager Module
+
+This module keeps the memory used by context.user_data bounded. Handlers leave
+flow data (expense_data, payment_data, edit_data, adjustment_data) and cached
+API data (member, family_members, family_info) in the context of each user, and
+nothing frees it if the user never finishes or repeats a flow. A periodic sweep
+drops those keys from users that have been idle for MEMORY_IDLE_TTL seconds and
+trims any user whose context is larger than MEMORY_USER_DATA_MAX_BYTES. The
+small identifiers (telegram_id, family_id, member_id) are always kept, so an
+evicted user only needs to reload data from the API, and the flow data of a
+user with an open conversation is kept until the conversation ends. Sizes are
+estimated from the JSON encoding in a worker thread, off the event loop.
+"""
+
+import asyncio
+import time
+from telegram.ext import ConversationHandler
+from services.json_codec import JsonCodec
+from config import (
+    MEMORY_IDLE_TTL,
+    MEMORY_USER_DATA_MAX_BYTES,
+    MEMORY_SWEEP_INTERVAL
+)
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+# Datos en caché que se pueden volver a pedir a la API, en orden de descarte
+CACHED_KEYS = ("family_members", "family_info", "member")
+
+# Datos de los flujos en curso; solo se descartan si el usuario está inactivo
+# o si su contexto supera el límite
+FLOW_KEYS = ("edit_data", "payment_data", "adjustment_data", "expense_data")
+
+# Referencias al FamilyDirectory compartidas entre los usuarios de una familia
+SHARED_KEYS = ("family", "member_names")
+
+class MemoryManager:
+    """
+    Tracks user activity and evicts heavy context keys of idle or oversized users.
+
+    The sweep runs every MEMORY_SWEEP_INTERVAL seconds in a background task
+    started with the application.
+    """
+
+    _last_seen = {}
+    _task = None
+    _evicted_users = 0
+    _evicted_bytes = 0
+    _trimmed_users = 0
+    _last_sweep = None
+
+    @staticmethod
+    async def touch(update, context):
+        """
+        Records the activity of the user of an update.
+
+        Registered as a TypeHandler in a group that runs before every other
+        handler; it never stops the processing of the update.
+
+        Args:
+            update (Update): Telegram Update object
+            context (ContextTypes.DEFAULT_TYPE): Telegram context
+        """
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            MemoryManager._last_seen[user.id] = time.monotonic()
+
+    @staticmethod
+    def estimate_size(value):
+        """
+        Estimates the memory used by a context value from its JSON size.
+
+        Args:
+            value: Any value stored in user_data
+
+        Returns:
+            int: Approximate size in bytes
+        """
+        try:
+            return len(JsonCodec.dumps(value))
+        except Exception:
+            return 0
+
+    @staticmethod
+    def key_sizes(user_data):
+        """
+        Estimates the memory used by each private key of one user context.
+
+        The shared family references are not counted, since they belong to
+        the family and not to the user.
+
+        Args:
+            user_data (dict): user_data of one user
+
+        Returns:
+            dict: Approximate size in bytes of every key
+        """
+        return {
+            key: MemoryManager.estimate_size(value)
+            for key, value in user_data.items()
+            if key not in SHARED_KEYS
+        }
+
+    @staticmethod
+    def select_evictions(sizes, idle, keep_flow=False, max_bytes=None):
+        """
+        Chooses the keys to drop from a user context.
+
+        Idle users lose every heavy key. Active users only lose keys while
+        their context is larger than the size limit: cached API data goes
+        first, then flow data from the largest entry. Flow data is never
+        chosen when keep_flow is set.
+
+        Args:
+            sizes (dict): Size of every key, as returned by key_sizes
+            idle (bool): Whether the user has been idle for MEMORY_IDLE_TTL
+            keep_flow (bool, optional): Keep the flow keys, because the user
+                is in the middle of a conversation that needs them
+            max_bytes (int, optional): Size limit; MEMORY_USER_DATA_MAX_BYTES by default
+
+        Returns:
+            list: Keys to drop, in order
+        """
+        cached_keys = [key for key in CACHED_KEYS if key in sizes]
+        flow_keys = [] if keep_flow else sorted((key for key in FLOW_KEYS if key in sizes), key=sizes.get, reverse=True)
+        if idle:
+            return cached_keys + flow_keys
+
+        max_bytes = MEMORY_USER_DATA_MAX_BYTES if max_bytes is None else max_bytes
+        size = sum(sizes.values())
+        keys = []
+        for key in cached_keys + flow_keys:
+            if size <= max_bytes:
+                break
+            keys.append(key)
+            size -= sizes[key]
+        return keys
+
+    @staticmethod
+    def users_in_conversation(application):
+        """
+        Returns the users with an open conversation in any ConversationHandler.
+
+        Includes the conversations restored by the persistence after a restart.
+        python-telegram-bot has no public accessor for the open conversations,
+        so the state dict of each handler is read directly.
+
+        Args:
+            application (Application): The telegram bot application
+
+        Returns:
+            set: User IDs
+        """
+        users = set()
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if not isinstance(handler, ConversationHandler) or not handler.per_user:
+                    continue
+                # Las claves son (chat_id, user_id) o (user_id,), más el mensaje si es per_message
+                position = 1 if handler.per_chat else 0
+                users.update(key[position] for key in getattr(handler, "_conversations", {}))
+        return users
+
+    @staticmethod
+    def _measure(contexts, families):
+        """
+        Computes the key sizes of every user context and of the shared families.
+
+        Runs in a worker thread: contexts are shallow copies taken on the event
+        loop, so the JSON encoding does not block it.
+
+        Args:
+            contexts (dict): user_id -> shallow copy of its user_data
+            families (list): Shared family references, each counted once
+
+        Returns:
+            tuple: (user_id -> key sizes, bytes of the shared families)
+        """
+        sizes = {user_id: MemoryManager.key_sizes(user_data) for user_id, user_data in contexts.items()}
+        return sizes, sum(MemoryManager.estimate_size(family) for family in families)
+
+    @staticmethod
+    async def sweep(application, now=None):
+        """
+        Evicts heavy keys of idle users and trims oversized contexts.
+
+        The flow keys of users with an open conversation are kept even when
+        they are idle, since the next step of the conversation reads them.
+        Sizes are estimated in a worker thread; a key is only dropped if it
+        still holds the value that was measured.
+
+        Args:
+            application (Application): The telegram bot application
+            now (float, optional): Current time.monotonic() value
+
+        Returns:
+            dict: users evicted for inactivity, users trimmed, bytes freed and
+            total bytes of context left
+        """
+        now = time.monotonic() if now is None else now
+        evicted = trimmed = freed = 0
+        changed = []
+
+        contexts = {user_id: dict(user_data) for user_id, user_data in application.user_data.items()}
+        families = {}
+        for user_data in contexts.values():
+            family = user_data.get("family")
+            if isinstance(family, dict):
+                families[id(family)] = family
+        in_conversation = MemoryManager.users_in_conversation(application)
+        sizes, total = await asyncio.to_thread(MemoryManager._measure, contexts, list(families.values()))
+
+        for user_id, user_sizes in sizes.items():
+            user_data = application.user_data.get(user_id)
+            if user_data is None:
+                continue
+            total += sum(user_sizes.values())
+            # Usuarios restaurados tras un reinicio: contar desde ahora
+            last_seen = MemoryManager._last_seen.setdefault(user_id, now)
+            idle = now - last_seen > MEMORY_IDLE_TTL
+            user_freed = 0
+            for key in MemoryManager.select_evictions(user_sizes, idle, keep_flow=user_id in in_conversation):
+                # El manejador pudo cambiar la clave mientras se medía
+                if key in user_data and user_data[key] is contexts[user_id][key]:
+                    del user_data[key]
+                    user_freed += user_sizes[key]
+            if user_freed:
+                if idle:
+                    evicted += 1
+                else:
+                    trimmed += 1
+                freed += user_freed
+                total -= user_freed
+                changed.append(user_id)
+
+        # Olvidar la actividad de usuarios que ya no tienen contexto
+        for user_id in set(MemoryManager._last_seen) - set(application.user_data):
+            del MemoryManager._last_seen[user_id]
+
+        if changed and application.persistence is not None:
+            application.mark_data_for_update_persistence(user_ids=changed)
+
+        MemoryManager._evicted_users += evicted
+        MemoryManager._trimmed_users += trimmed
+        MemoryManager._evicted_bytes += freed
+        MemoryManager._last_sweep = {
+            "users": len(application.user_data),
+            "evicted_users": evicted,
+            "trimmed_users": trimmed,
+            "freed_bytes": freed,
+            "total_bytes": total
+        }
+        if freed:
+            logger.info("Memory sweep freed ~%s bytes (%s idle users, %s trimmed)", freed, evicted, trimmed)
+        return MemoryManager._last_sweep
+
+    @staticmethod
+    async def _run(application):
+        """Runs the sweep every MEMORY_SWEEP_INTERVAL seconds."""
+        while True:
+            await asyncio.sleep(MEMORY_SWEEP_INTERVAL)
+            try:
+                await MemoryManager.sweep(application)
+            except Exception as e:
+                logger.error("Error in memory sweep: %s", e)
+
+    @staticmethod
+    def start(application):
+        """
+        Starts the periodic sweep.
+
+        Args:
+            application (Application): The telegram bot application
+        """
+        if MEMORY_SWEEP_INTERVAL <= 0 or (MemoryManager._task is not None and not MemoryManager._task.done()):
+            return
+        MemoryManager._task = asyncio.get_running_loop().create_task(MemoryManager._run(application))
+        logger.info("Memory manager started (idle TTL %ss, sweep every %ss)", MEMORY_IDLE_TTL, MEMORY_SWEEP_INTERVAL)
+
+    @staticmethod
+    async def stop():
+        """Stops the periodic sweep."""
+        task, MemoryManager._task = MemoryManager._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    def get_stats():
+        """
+        Returns counters describing the memory used by the user contexts.
+
+        Returns:
+            dict: tracked users, totals of evictions and the result of the last sweep
+        """
+        return {
+            "tracked_users": len(MemoryManager._last_seen),
+            "evicted_users": MemoryManager._evicted_users,
+            "trimmed_users": MemoryManager._trimmed_users,
+            "evicted_bytes": MemoryManager._evicted_bytes,
+            "last_sweep": MemoryManager._last_sweep
+        }
+
+    @staticmethod
+    def format_report():
+        """
+        Formats the memory used by the user contexts as a text report.
+
+        Returns:
+            str: Plain text report
+        """
+        last = MemoryManager._last_sweep
+        if last is None:
+            return "Memoria de contexto: todavía no se ha hecho ningún barrido."
+        return (
+            f"Memoria de contexto: ≈{last['total_bytes']}B en {last['users']} usuarios\n"
+            f"  último barrido: {last['evicted_users']} inactivos, {last['trimmed_users']} recortados, "
+            f"≈{last['freed_bytes']}B liberados | total liberado ≈{MemoryManager._evicted_bytes}B"
+        )
@@ -0,0 +1,334 @@
+"""
+SQLite Persistence Module
+
+This module stores the user_data, chat_data and conversation states of the bot
+in a local SQLite database, so a redeploy or a crash does not lose the flows in
+progress nor the family data cached in each user context.
+
+Writes are batched: the application hands over the changed data every
+PERSISTENCE_UPDATE_INTERVAL seconds, the changes are buffered in memory and a
+single background transaction writes them, off the event loop. Data is only
+read from the database once, when the application starts.
+"""
+
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from telegram.ext import BasePersistence, PersistenceInput
+from services.family_directory import FamilyDirectory
+from services.log import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_data (
+    chat_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    conversation_key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, conversation_key)
+);
+"""
+
+# Marca de borrado en los cambios pendientes
+_DELETED = object()
+
+class SQLitePersistence(BasePersistence):
+    """
+    Write-behind persistence of user_data, chat_data and conversations in SQLite.
+
+    bot_data and callback_data are not used by the bot and are not stored.
+
+    Args:
+        path (str): Path of the SQLite database file
+        update_interval (float): Seconds between the updates made by the application
+    """
+
+    def __init__(self, path, update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self._connection = None
+        self._db_lock = threading.Lock()
+        self._pending = {"user_data": {}, "chat_data": {}, "conversations": {}}
+        self._flush_task = None
+        self._conversations = None
+        self._writes = 0
+        self._batches = 0
+
+    # ------------------------------------------------------------------
+    # Base de datos
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        """
+        Opens the database, creating the tables the first time.
+
+        Returns:
+            sqlite3.Connection: The open connection
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+            logger.info("SQLite persistence opened at %s", self.path)
+        return self._connection
+
+    def _load_table(self, table, key_column):
+        """
+        Reads every row of a data table.
+
+        Args:
+            table (str): user_data or chat_data
+            key_column (str): user_id or chat_id
+
+        Returns:
+            dict: ID to unpickled data
+        """
+        result = {}
+        with self._db_lock:
+            rows = self._connect().execute(f"SELECT {key_column}, data FROM {table}").fetchall()
+        for key, blob in rows:
+            try:
+                result[key] = pickle.loads(blob)
+            except Exception as e:
+                logger.warning("Discarding unreadable %s row %s: %s", table, key, e)
+        return result
+
+    def _load_conversations(self):
+        """
+        Reads the states of every persistent conversation.
+
+        Returns:
+            dict: Conversation name to {key tuple: state}
+        """
+        conversations = {}
+        with self._db_lock:
+            rows = self._connect().execute("SELECT name, conversation_key, state FROM conversations").fetchall()
+        for name, key, blob in rows:
+            try:
+                conversations.setdefault(name, {})[tuple(json.loads(key))] = pickle.loads(blob)
+            except Exception as e:
+                logger.warning("Discarding unreadable state of conversation %s %s: %s", name, key, e)
+        return conversations
+
+    def _write(self, changes):
+        """
+        Writes a batch of changes in a single transaction.
+
+        Args:
+            changes (dict): Pending changes, as stored in self._pending
+        """
+        now = time.time()
+        count = 0
+        with self._db_lock:
+            connection = self._connect()
+            with connection:
+                for table, key_column in (("user_data", "user_id"), ("chat_data", "chat_id")):
+                    for key, data in changes[table].items():
+                        if data is _DELETED:
+                            connection.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+                        else:
+                            connection.execute(
+                                f"INSERT OR REPLACE INTO {table} ({key_column}, data, updated_at) VALUES (?, ?, ?)",
+                                (key, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), now)
+                            )
+                        count += 1
+                for (name, key), state in changes["conversations"].items():
+                    if state is _DELETED:
+                        connection.execute(
+                            "DELETE FROM conversations WHERE name = ? AND conversation_key = ?", (name, key)
+                        )
+                    else:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO conversations (name, conversation_key, state, updated_at) VALUES (?, ?, ?, ?)",
+                            (name, key, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), now)
+                        )
+                    count += 1
+        self._writes += count
+        self._batches += 1
+        logger.debug("SQLite persistence wrote %s changes", count)
+
+    # ------------------------------------------------------------------
+    # Escritura diferida
+    # ------------------------------------------------------------------
+
+    def _take_pending(self):
+        """
+        Returns the buffered changes and starts a new buffer.
+
+        Returns:
+            dict: The changes, or None if there are none
+        """
+        if not any(self._pending.values()):
+            return None
+        changes = self._pending
+        self._pending = {"user_data": {}, "chat_data": {}, "conversations": {}}
+        return changes
+
+    def _schedule_flush(self):
+        """Starts the background write of the buffered changes, if it is not running."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_pending())
+
+    async def _flush_pending(self):
+        """Writes the buffered changes in a thread until the buffer is empty."""
+        # Dejar que la aplicación entregue el resto de cambios de esta ronda
+        await asyncio.sleep(0)
+        while True:
+            changes = self._take_pending()
+            if changes is None:
+                return
+            try:
+                await asyncio.to_thread(self._write, changes)
+            except Exception as e:
+                logger.error("Error writing SQLite persistence: %s", e)
+                # Conservar los cambios para el siguiente intento sin pisar los más recientes
+                for table, entries in changes.items():
+                    for key, value in entries.items():
+                        self._pending[table].setdefault(key, value)
+                return
+
+    # ------------------------------------------------------------------
+    # BasePersistence
+    # ------------------------------------------------------------------
+
+    async def get_user_data(self):
+        user_data = await asyncio.to_thread(self._load_table, "user_data", "user_id")
+        for data in user_data.values():
+            SQLitePersistence._relink_family(data)
+        logger.info("Restored user_data of %s users", len(user_data))
+        return user_data
+
+    async def get_chat_data(self):
+        return await asyncio.to_thread(self._load_table, "chat_data", "chat_id")
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        if self._conversations is None:
+            self._conversations = await asyncio.to_thread(self._load_conversations)
+        return self._conversations.pop(name, {})
+
+    async def update_conversation(self, name, key, new_state):
+        self._pending["conversations"][(name, json.dumps(list(key)))] = _DELETED if new_state is None else new_state
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id, data):
+        # La aplicación entrega una copia, así que se puede serializar más tarde en otro hilo
+        self._pending["user_data"][user_id] = data
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        self._pending["chat_data"][chat_id] = data
+        self._schedule_flush()
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._pending["user_data"][user_id] = _DELETED
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id):
+        self._pending["chat_data"][chat_id] = _DELETED
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Writes every buffered change and closes the database."""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        changes = self._take_pending()
+        if changes is not None:
+            await asyncio.to_thread(self._write, changes)
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        logger.info("SQLite persistence flushed (%s rows in %s batches)", self._writes, self._batches)
+
+    # ------------------------------------------------------------------
+    # Utilidades
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _relink_family(user_data):
+        """
+        Replaces the restored copy of the family of a user by the shared record.
+
+        Users of the same family share one FamilyDirectory record while the bot
+        runs; after a restart each user_data holds its own unpickled copy, so
+        the first one seeds the directory and the rest reference its record.
+
+        Args:
+            user_data (dict): Restored user_data of one user
+        """
+        family = user_data.get("family") if isinstance(user_data, dict) else None
+        family_id = user_data.get("family_id") if isinstance(user_data, dict) else None
+        if not isinstance(family, dict) or not family_id or str(family.get("id")) != str(family_id):
+            return
+        record = FamilyDirectory.update(family_id, family.get("members", []) or [], family.get("name"))
+        user_data["family"] = record.family
+        user_data["member_names"] = record.member_names
+
+    async def get_recent_user_ids(self, limit):
+        """
+        Returns the users whose data changed most recently.
+
+        Args:
+            limit (int): Maximum number of users
+
+        Returns:
+            list: User IDs, most recent first
+        """
+        def query():
+            with self._db_lock:
+                return [row[0] for row in self._connect().execute(
+                    "SELECT user_id FROM user_data ORDER BY updated_at DESC LIMIT ?", (limit,)
+                )]
+        return await asyncio.to_thread(query)
+
+    def get_stats(self):
+        """
+        Returns counters describing the persistence.
+
+        Returns:
+            dict: pending changes, rows written and write batches
+        """
+        return {
+            "pending": sum(len(entries) for entries in self._pending.values()),
+            "writes": self._writes,
+            "batches": self._batches
+        }